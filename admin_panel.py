@@ -55,9 +55,11 @@ from src.services.audit_system import log_security_event
 
 # Import auth dependencies
 from src.services.auth_system import auth_manager, get_current_user
+from src.services.cache_system import cache_manager
 from src.services.http_rate_limit import http_rate_limiter
 from src.services.metrics import inc_counter, observe_histogram, set_gauge
 from src.services.multi_provider_llm import llm_manager
+from src.services.queue_signals import queue_wakeup
 from src.services.queue_system import queue_manager
 
 
@@ -173,6 +175,8 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     run_startup_migrations()
     initialize_schema()
     ensure_bot_disabled_by_default()
+    # Importaciones de audiencia que murieron con un proceso anterior (los jobs viven en memoria)
+    queue_manager.expire_stale_imports(float(os.getenv("AUDIENCE_IMPORT_STALE_SECONDS", "3600")))
 
     shared_http_session: aiohttp.ClientSession | None = None
     try:
@@ -197,6 +201,16 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     except Exception as e:
         logger.warning("Error closing HTTP rate limiter: %s", e)
 
+    try:
+        await cache_manager.aclose()
+    except Exception as e:
+        logger.warning("Error closing cache manager: %s", e)
+
+    try:
+        await asyncio.to_thread(queue_wakeup.stop_listener)
+    except Exception as e:
+        logger.warning("Error stopping queue wakeup listener: %s", e)
+
     try:
         cleanup_connections()
     except Exception as e:
@@ -760,6 +774,7 @@ async def ws_metrics(websocket: WebSocket) -> None:
         await websocket.close(code=1008, reason="Invalid websocket scope")
         return
 
+    refresh_seconds = max(1.0, float(os.getenv("WS_METRICS_REFRESH_SECONDS", "5")))
     try:
         async with _ws_connections_lock:
             _ws_connections_count += 1
@@ -772,7 +787,10 @@ async def ws_metrics(websocket: WebSocket) -> None:
                     "queue_pending": len(queue_manager.get_pending_messages(limit=200)),
                 }
             )
-            await asyncio.sleep(5)
+            # Nuevo snapshot al encolar o, como mucho, cada WS_METRICS_REFRESH_SECONDS:
+            # los reclamos y envíos no emiten señal y vacían la cola sin avisar. Mínimo 1s entre envíos
+            await queue_wakeup.wait_async(timeout=refresh_seconds)
+            await asyncio.sleep(1)
     except WebSocketDisconnect:
         return
     finally:
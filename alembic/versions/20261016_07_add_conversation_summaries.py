@@ -0,0 +1,36 @@
+"""add conversation summaries for token budget
+
+Revision ID: 20261016_07
+Revises: 20260217_06
+Create Date: 2026-10-16 09:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_07"
+down_revision = "20260217_06"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    return table_name in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade() -> None:
+    if not _table_exists("conversation_summaries"):
+        op.create_table(
+            "conversation_summaries",
+            sa.Column("chat_id", sa.String(), primary_key=True),
+            sa.Column("summary", sa.Text(), nullable=False),
+            sa.Column("covered_messages", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("fingerprint", sa.String(length=64), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    if _table_exists("conversation_summaries"):
+        op.drop_table("conversation_summaries")
@@ -0,0 +1,77 @@
+"""add message queue leases and claimable partial index
+
+Revision ID: 20261016_08
+Revises: 20261016_07
+Create Date: 2026-10-16 12:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_08"
+down_revision = "20261016_07"
+branch_labels = None
+depends_on = None
+
+CLAIMABLE_WHERE = sa.text("status IN ('pending', 'retry')")
+PROCESSING_WHERE = sa.text("status = 'processing'")
+
+
+def _columns(table_name: str) -> set[str]:
+    inspector = sa.inspect(op.get_bind())
+    if table_name not in inspector.get_table_names():
+        return set()
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(op.get_bind())
+    if table_name not in inspector.get_table_names():
+        return False
+    return any(idx.get("name") == index_name for idx in inspector.get_indexes(table_name))
+
+
+def upgrade() -> None:
+    columns = _columns("message_queue")
+    if not columns:
+        return
+
+    if "claimed_by" not in columns:
+        op.add_column("message_queue", sa.Column("claimed_by", sa.String(length=100), nullable=True))
+    if "lease_until" not in columns:
+        op.add_column("message_queue", sa.Column("lease_until", sa.DateTime(), nullable=True))
+
+    if not _index_exists("message_queue", "ix_message_queue_claimable"):
+        op.create_index(
+            "ix_message_queue_claimable",
+            "message_queue",
+            [sa.text("priority DESC"), "created_at"],
+            postgresql_where=CLAIMABLE_WHERE,
+            sqlite_where=CLAIMABLE_WHERE,
+        )
+    if not _index_exists("message_queue", "ix_message_queue_lease_until"):
+        op.create_index(
+            "ix_message_queue_lease_until",
+            "message_queue",
+            ["lease_until"],
+            postgresql_where=PROCESSING_WHERE,
+            sqlite_where=PROCESSING_WHERE,
+        )
+
+
+def downgrade() -> None:
+    columns = _columns("message_queue")
+    if not columns:
+        return
+
+    if _index_exists("message_queue", "ix_message_queue_lease_until"):
+        op.drop_index("ix_message_queue_lease_until", table_name="message_queue")
+    if _index_exists("message_queue", "ix_message_queue_claimable"):
+        op.drop_index("ix_message_queue_claimable", table_name="message_queue")
+
+    with op.batch_alter_table("message_queue") as batch_op:
+        if "lease_until" in columns:
+            batch_op.drop_column("lease_until")
+        if "claimed_by" in columns:
+            batch_op.drop_column("claimed_by")
@@ -0,0 +1,97 @@
+"""add indexed campaign_id to message_queue (backfilled from extra_data)
+
+Revision ID: 20261016_09
+Revises: 20261016_08
+Create Date: 2026-10-16 15:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_09"
+down_revision = "20261016_08"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _columns(table_name: str) -> set[str]:
+    inspector = sa.inspect(op.get_bind())
+    if table_name not in inspector.get_table_names():
+        return set()
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(op.get_bind())
+    if table_name not in inspector.get_table_names():
+        return False
+    return any(idx.get("name") == index_name for idx in inspector.get_indexes(table_name))
+
+
+def _backfill_campaign_ids() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "UPDATE message_queue SET campaign_id = extra_data::json ->> 'campaign_id' "
+            "WHERE campaign_id IS NULL AND extra_data IS NOT NULL AND extra_data::json ->> 'campaign_id' IS NOT NULL"
+        )
+        return
+    if bind.dialect.name == "sqlite":
+        op.execute(
+            "UPDATE message_queue SET campaign_id = json_extract(extra_data, '$.campaign_id') "
+            "WHERE campaign_id IS NULL AND json_valid(extra_data) AND json_extract(extra_data, '$.campaign_id') IS NOT NULL"
+        )
+        return
+
+    # Otros motores: recorrido por lotes de id
+    queue = sa.table(
+        "message_queue",
+        sa.column("id", sa.Integer),
+        sa.column("extra_data", sa.JSON),
+        sa.column("campaign_id", sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(queue.c.id, queue.c.extra_data)
+            .where(queue.c.id > last_id, queue.c.campaign_id.is_(None))
+            .order_by(queue.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        for row in rows:
+            extra_data = row.extra_data if isinstance(row.extra_data, dict) else {}
+            campaign_id = extra_data.get("campaign_id")
+            if campaign_id:
+                bind.execute(sa.update(queue).where(queue.c.id == row.id).values(campaign_id=str(campaign_id)))
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    columns = _columns("message_queue")
+    if not columns:
+        return
+
+    if "campaign_id" not in columns:
+        op.add_column("message_queue", sa.Column("campaign_id", sa.String(length=100), nullable=True))
+    _backfill_campaign_ids()
+
+    if not _index_exists("message_queue", "ix_message_queue_campaign_status"):
+        op.create_index("ix_message_queue_campaign_status", "message_queue", ["campaign_id", "status"])
+
+
+def downgrade() -> None:
+    columns = _columns("message_queue")
+    if not columns:
+        return
+
+    if _index_exists("message_queue", "ix_message_queue_campaign_status"):
+        op.drop_index("ix_message_queue_campaign_status", table_name="message_queue")
+
+    if "campaign_id" in columns:
+        with op.batch_alter_table("message_queue") as batch_op:
+            batch_op.drop_column("campaign_id")
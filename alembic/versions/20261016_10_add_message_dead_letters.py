@@ -0,0 +1,53 @@
+"""add message_dead_letters (failed sends moved out of the hot queue)
+
+Revision ID: 20261016_10
+Revises: 20261016_09
+Create Date: 2026-10-16 18:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_10"
+down_revision = "20261016_09"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def upgrade() -> None:
+    if _table_exists("message_dead_letters"):
+        return
+
+    op.create_table(
+        "message_dead_letters",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("message_id", sa.String(length=100), nullable=False),
+        sa.Column("chat_id", sa.String(length=200), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("priority", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("campaign_id", sa.String(length=100), nullable=True),
+        sa.Column("extra_data", sa.JSON(), nullable=True),
+        sa.Column("retry_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_retries", sa.Integer(), nullable=False, server_default="3"),
+        sa.Column("error_class", sa.String(length=40), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("queued_at", sa.DateTime(), nullable=True),
+        sa.Column("failed_at", sa.DateTime(), nullable=False),
+        sa.Column("requeue_batch", sa.String(length=32), nullable=True),
+    )
+    op.create_index("ix_message_dead_letters_message_id", "message_dead_letters", ["message_id"], unique=True)
+    op.create_index("ix_message_dead_letters_failed_at", "message_dead_letters", ["failed_at"])
+    op.create_index("ix_dead_letters_campaign_failed", "message_dead_letters", ["campaign_id", "failed_at"])
+    op.create_index("ix_dead_letters_error_class_failed", "message_dead_letters", ["error_class", "failed_at"])
+
+
+def downgrade() -> None:
+    if _table_exists("message_dead_letters"):
+        op.drop_table("message_dead_letters")
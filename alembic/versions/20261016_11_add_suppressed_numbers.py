@@ -0,0 +1,43 @@
+"""add suppressed_numbers (opt-out / blocked / invalid recipients)
+
+Revision ID: 20261016_11
+Revises: 20261016_10
+Create Date: 2026-10-16 20:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_11"
+down_revision = "20261016_10"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def upgrade() -> None:
+    if _table_exists("suppressed_numbers"):
+        return
+
+    op.create_table(
+        "suppressed_numbers",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("phone", sa.String(length=20), nullable=False),
+        sa.Column("reason", sa.String(length=20), nullable=False),
+        sa.Column("source", sa.String(length=50), nullable=True),
+        sa.Column("created_by", sa.String(length=100), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_suppressed_numbers_phone", "suppressed_numbers", ["phone"], unique=True)
+    op.create_index("ix_suppressed_numbers_reason", "suppressed_numbers", ["reason"])
+
+
+def downgrade() -> None:
+    if _table_exists("suppressed_numbers"):
+        op.drop_table("suppressed_numbers")
@@ -0,0 +1,40 @@
+"""add suppression_removals (tombstones so other processes drop removed numbers)
+
+Revision ID: 20261016_12
+Revises: 20261016_11
+Create Date: 2026-10-16 23:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_12"
+down_revision = "20261016_11"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def upgrade() -> None:
+    if _table_exists("suppression_removals"):
+        return
+
+    op.create_table(
+        "suppression_removals",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("phone", sa.String(length=20), nullable=False),
+        sa.Column("removed_by", sa.String(length=100), nullable=True),
+        sa.Column("removed_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_suppression_removals_removed_at", "suppression_removals", ["removed_at"])
+
+
+def downgrade() -> None:
+    if _table_exists("suppression_removals"):
+        op.drop_table("suppression_removals")
@@ -0,0 +1,38 @@
+"""index suppressed_numbers.created_at (overlap window of the incremental refresh)
+
+Revision ID: 20261016_13
+Revises: 20261016_12
+Create Date: 2026-10-16 23:30:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261016_13"
+down_revision = "20261016_12"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(op.get_bind())
+    if table_name not in inspector.get_table_names():
+        return False
+    return any(idx.get("name") == index_name for idx in inspector.get_indexes(table_name))
+
+
+def upgrade() -> None:
+    if _table_exists("suppressed_numbers") and not _index_exists("suppressed_numbers", "ix_suppressed_numbers_created_at"):
+        op.create_index("ix_suppressed_numbers_created_at", "suppressed_numbers", ["created_at"])
+
+
+def downgrade() -> None:
+    if _index_exists("suppressed_numbers", "ix_suppressed_numbers_created_at"):
+        op.drop_index("ix_suppressed_numbers_created_at", table_name="suppressed_numbers")
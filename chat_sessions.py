@@ -19,9 +19,18 @@ from models import (
     ChatStrategy,
     Contact,
     Conversation,
+    ConversationSummary,
 )
 
 
+def _invalidate_context_cache(chat_id: str) -> None:
+    """Invalida la sección de contextos cacheada para el chat (si el loader está disponible)."""
+    with contextlib.suppress(Exception):
+        from src.services.context_loader import context_loader
+
+        context_loader.invalidate(chat_id)
+
+
 # Compatibilidad: inicializa esquema SQLAlchemy al importar
 def initialize_db() -> None:
     """Inicializa el esquema de base de datos al importar el módulo."""
@@ -137,6 +146,39 @@ def load_last_context(chat_id: str) -> list[dict[str, Any]]:
     return []
 
 
+def get_conversation_summary(chat_id: str) -> dict[str, Any] | None:
+    """Devuelve el resumen incremental de turnos antiguos (descifrado) o `None`."""
+    session = get_session()
+    try:
+        row = session.get(ConversationSummary, chat_id)
+    finally:
+        session.close()
+    if not row:
+        return None
+    try:
+        summary = decrypt_text(row.summary)
+    except Exception:
+        return None
+    return {"summary": summary, "covered_messages": int(row.covered_messages or 0), "fingerprint": row.fingerprint}
+
+
+def save_conversation_summary(chat_id: str, summary: str, covered_messages: int, fingerprint: str) -> None:
+    """Guarda (reemplaza) el resumen incremental de los primeros `covered_messages` turnos."""
+    session = get_session()
+    try:
+        row = session.get(ConversationSummary, chat_id)
+        if not row:
+            row = ConversationSummary(chat_id=chat_id)
+            session.add(row)
+        row.summary = encrypt_text(summary)
+        row.covered_messages = int(covered_messages)
+        row.fingerprint = fingerprint
+        row.updated_at = datetime.now(timezone.utc)
+        session.commit()
+    finally:
+        session.close()
+
+
 def clear_conversation_history(chat_id: str) -> int:
     """Borra TODO el historial (tabla conversations) para un chat_id dado.
     Devuelve el número de filas eliminadas."""
@@ -145,6 +187,7 @@ def clear_conversation_history(chat_id: str) -> int:
         q = session.query(Conversation).filter(Conversation.chat_id == chat_id)
         count = q.count()
         q.delete(synchronize_session=False)
+        session.query(ConversationSummary).filter(ConversationSummary.chat_id == chat_id).delete(synchronize_session=False)
         session.commit()
         return count
     finally:
@@ -158,6 +201,7 @@ def clear_all_conversation_histories() -> int:
     try:
         count = session.query(Conversation).count()
         session.query(Conversation).delete(synchronize_session=False)
+        session.query(ConversationSummary).delete(synchronize_session=False)
         session.commit()
         return count
     finally:
@@ -214,6 +258,7 @@ def upsert_profile(
         session.commit()
     finally:
         session.close()
+    _invalidate_context_cache(chat_id)
 
 
 def get_profile(chat_id: str) -> ChatProfile | None:
@@ -316,9 +361,10 @@ def activate_new_strategy(chat_id: str, strategy_text: str, source_snapshot: str
         ctr.strategy_version = next_ver
         ctr.last_reasoned_at = _dt.now(timezone.utc)
         session.commit()
-        return next_ver
     finally:
         session.close()
+    _invalidate_context_cache(chat_id)
+    return next_ver
 
 
 def load_recent_conversations(limit: int = 25, min_messages: int = 2) -> list[dict[str, Any]]:
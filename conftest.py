@@ -179,6 +179,18 @@ def reset_rate_limiter_state():
         http_rate_limiter._memory_store.update(previous_memory_store)
 
 
+@pytest.fixture(autouse=True)
+def reset_suppression_list_state():
+    """Reload the in-memory suppression list from the (per-test) database."""
+    from src.services.suppression_list import suppression_list
+
+    suppression_list.invalidate()
+    try:
+        yield
+    finally:
+        suppression_list.invalidate()
+
+
 @pytest.fixture(autouse=True)
 def reset_auth_runtime_security_state():
     """Reset in-memory auth security state (blacklists, lockout, attempts) between tests."""
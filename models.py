@@ -22,6 +22,7 @@ from src.models.models import (
     ConversationMessage,
     ConversationObjective,
     ConversationProfile,
+    ConversationSummary,
     DailyContext,
     HumanizationMetric,
     ModelConfig,
@@ -50,6 +51,7 @@ __all__ = [
     "ConversationMessage",
     "ConversationObjective",
     "ConversationProfile",
+    "ConversationSummary",
     "DailyContext",
     "HumanizationMetric",
     "ModelConfig",
@@ -29,6 +29,17 @@ class Conversation(Base):
     context = Column(Text, nullable=False)
 
 
+class ConversationSummary(Base):
+    """Resumen incremental (cifrado) de los turnos antiguos de una conversación"""
+
+    __tablename__ = "conversation_summaries"
+    chat_id = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False)
+    covered_messages = Column(Integer, default=0, nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
+
+
 class AnalyticsMetric(Base):
     __tablename__ = "analytics_metrics"
 
@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from src.services.audit_system import log_config_change
 from src.services.auth_system import get_current_user, require_admin
 from src.services.business_config_manager import business_config
+from src.services.multi_provider_llm import llm_manager
 from src.services.queue_system import queue_manager
 
 router = APIRouter(tags=["ai-models-admin"])
@@ -294,6 +295,39 @@ async def get_available_providers(current_user: dict[str, Any] = Depends(get_cur
     )
 
 
+@router.get("/api/ai-models/routing")
+async def get_llm_routing_state(current_user: dict[str, Any] = Depends(get_current_user)) -> dict[str, Any]:
+    """Estado del router adaptativo: orden de fallback actual y scores por proveedor."""
+    return {
+        "adaptive_routing_enabled": llm_manager.adaptive_routing_enabled,
+        "fallback_order": {
+            "normal": [p.value for p in llm_manager.get_fallback_order("normal")],
+            "reasoning": [p.value for p in llm_manager.get_fallback_order("reasoning")],
+            "free_only": [p.value for p in llm_manager.get_fallback_order(free_only=True)],
+        },
+        "providers": llm_manager.get_available_providers(),
+    }
+
+
+@router.get("/api/ai-models/faq-cache")
+async def get_faq_cache_stats(current_user: dict[str, Any] = Depends(get_current_user)) -> dict[str, Any]:
+    """Estadísticas del caché FAQ (preguntas normalizadas de primer turno)."""
+    return llm_manager.faq_cache.stats()
+
+
+@router.delete("/api/ai-models/faq-cache")
+async def purge_faq_cache(all_versions: bool = True, current_user: dict[str, Any] = Depends(require_admin)) -> dict[str, Any]:
+    """Purga el caché FAQ (todas las versiones de configuración o solo la actual)."""
+    deleted = await llm_manager.faq_cache.purge(all_versions=all_versions)
+    log_config_change(
+        current_user.get("username", "admin"),
+        current_user.get("role", "admin"),
+        "faq_cache_purge",
+        {"purged_keys": deleted, "all_versions": all_versions},
+    )
+    return {"success": True, "deleted": deleted}
+
+
 @router.get("/api/llm/providers")
 async def get_llm_providers_compat(
     current_user: dict[str, Any] = Depends(get_current_user),
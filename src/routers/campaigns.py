@@ -4,10 +4,12 @@ Extracted from admin_panel.py.
 """
 
 import logging
+import os
+import tempfile
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from pydantic import BaseModel
 
 from src.routers.deps import (
@@ -16,11 +18,18 @@ from src.routers.deps import (
     queue_manager,
     require_admin,
 )
+from src.services.audience_import import audience_importer
+from src.services.queue_system import CampaignImportingError
+from src.services.suppression_list import suppression_list
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/campaigns", tags=["campaigns"])
 
+AUDIENCE_FORMATS = {".csv": "csv", ".txt": "csv", ".xlsx": "xlsx"}
+AUDIENCE_MAX_BYTES = int(os.getenv("AUDIENCE_IMPORT_MAX_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_READ_BYTES = 1024 * 1024
+
 
 class CampaignCreate(BaseModel):
     name: str
@@ -30,6 +39,20 @@ class CampaignCreate(BaseModel):
     delay_between_messages: int | None = 5  # seconds
 
 
+class DeadLetterRequeue(BaseModel):
+    campaign_id: str | None = None
+    error_class: str | None = None
+    failed_after: datetime | None = None
+    failed_before: datetime | None = None
+
+
+def _parse_scheduled_at(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
 @router.get("")
 async def list_campaigns(
     status: str | None = None,
@@ -60,17 +83,17 @@ async def create_campaign(
                 detail="Se requiere al menos un contacto",
             )
 
-        scheduled_base: datetime | None = None
-        if campaign.scheduled_at:
-            parsed = campaign.scheduled_at.replace("Z", "+00:00")
-            scheduled_base = datetime.fromisoformat(parsed)
-            if scheduled_base.tzinfo is None:
-                scheduled_base = scheduled_base.replace(tzinfo=timezone.utc)
+        # Opt-outs, bloqueados e inválidos no entran en la campaña
+        contacts, suppressed = suppression_list.partition(campaign.contacts)
+        if not contacts:
+            raise HTTPException(status_code=400, detail="Todos los contactos están en la lista de supresión")
+
+        scheduled_base = _parse_scheduled_at(campaign.scheduled_at)
 
         campaign_id = queue_manager.create_campaign(
             name=campaign.name,
             created_by=current_user.get("username", "admin"),
-            total_messages=len(campaign.contacts),
+            total_messages=len(contacts),
             metadata={
                 "template": campaign.template,
                 "scheduled_at": campaign.scheduled_at,
@@ -80,7 +103,7 @@ async def create_campaign(
 
         delay_seconds = campaign.delay_between_messages or 5
         bulk_rows: list[dict[str, Any]] = []
-        for index, contact in enumerate(campaign.contacts):
+        for index, contact in enumerate(contacts):
             send_at = None
             if scheduled_base is not None:
                 send_at = scheduled_base + timedelta(seconds=delay_seconds * index)
@@ -99,7 +122,7 @@ async def create_campaign(
             )
 
         queued_ids = queue_manager.enqueue_bulk_messages(bulk_rows)
-        if len(queued_ids) != len(campaign.contacts):
+        if len(queued_ids) != len(contacts):
             raise HTTPException(status_code=500, detail="Error encolando campaña masiva")
 
         if campaign_id:
@@ -107,14 +130,15 @@ async def create_campaign(
                 current_user.get("username", "admin"),
                 current_user.get("role", "admin"),
                 campaign_id,
-                len(campaign.contacts),
+                len(contacts),
             )
 
             return {
                 "success": True,
                 "campaign_id": campaign_id,
-                "message": (f"Campaña '{campaign.name}' creada con {len(campaign.contacts)} contactos"),
-                "total_messages": len(campaign.contacts),
+                "message": (f"Campaña '{campaign.name}' creada con {len(contacts)} contactos"),
+                "total_messages": len(contacts),
+                "suppressed": len(suppressed),
             }
         raise HTTPException(status_code=500, detail="Error creando campaña")
 
@@ -125,6 +149,114 @@ async def create_campaign(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/import", status_code=202)
+async def import_campaign_audience(
+    file: UploadFile = File(...),
+    name: str = Form(...),
+    template: str = Form(...),
+    scheduled_at: str | None = Form(None),
+    delay_between_messages: int = Form(5),
+    current_user: dict[str, Any] = Depends(require_admin),
+) -> dict[str, Any]:
+    """Crear una campaña con la audiencia de un CSV/XLSX; la importación corre en segundo plano"""
+    if not name or not template:
+        raise HTTPException(status_code=400, detail="Nombre y template son requeridos")
+    file_format = AUDIENCE_FORMATS.get(os.path.splitext(file.filename or "")[1].lower())
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="Formato no soportado (CSV o XLSX)")
+    try:
+        scheduled_base = _parse_scheduled_at(scheduled_at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="scheduled_at inválido")
+
+    # Copiar el upload a disco por bloques: el job lo lee después de terminar la request
+    handle, path = tempfile.mkstemp(prefix="audience_", suffix=f".{file_format}")
+    size = 0
+    try:
+        with os.fdopen(handle, "wb") as target:
+            while chunk := await file.read(UPLOAD_READ_BYTES):
+                size += len(chunk)
+                if size > AUDIENCE_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Archivo demasiado grande")
+                target.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    campaign_id = queue_manager.create_campaign(
+        name=name,
+        created_by=current_user.get("username", "admin"),
+        total_messages=0,
+        metadata={
+            "template": template,
+            "scheduled_at": scheduled_at,
+            "delay_between_messages": delay_between_messages,
+            "source_file": file.filename,
+        },
+        status="importing",
+    )
+    job = audience_importer.start(
+        path,
+        file_format,
+        campaign_id,
+        template,
+        filename=file.filename or "",
+        scheduled_base=scheduled_base,
+        delay_seconds=delay_between_messages,
+        campaign_name=name,
+    )
+    log_bulk_send(
+        current_user.get("username", "admin"),
+        current_user.get("role", "admin"),
+        campaign_id,
+        0,
+        details={"action": "import_audience", "job_id": job.job_id, "file": file.filename, "bytes": size},
+    )
+    return {"success": True, "campaign_id": campaign_id, "job_id": job.job_id, "status": job.status}
+
+
+@router.get("/import/{job_id}")
+async def get_import_status(
+    job_id: str,
+    current_user: dict[str, Any] = Depends(get_current_user),
+) -> dict[str, Any]:
+    """Progreso de una importación de audiencia (filas/s, aceptadas, rechazadas por motivo)"""
+    job = audience_importer.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    return job.to_dict()
+
+
+@router.get("/dead-letters")
+async def list_dead_letters(
+    current_user: dict[str, Any] = Depends(get_current_user),
+) -> list[dict[str, Any]]:
+    """Resumen de dead letters por campaña y clase de error"""
+    return queue_manager.dead_letter_summary()
+
+
+@router.post("/dead-letters/requeue")
+async def requeue_dead_letters(
+    body: DeadLetterRequeue,
+    current_user: dict[str, Any] = Depends(require_admin),
+) -> dict[str, Any]:
+    """Reencolar en bloque dead letters por campaña, clase de error y/o ventana de tiempo"""
+    filters = body.model_dump(exclude_none=True)
+    if not filters:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un filtro (campaña, clase de error o fechas)")
+
+    requeued = queue_manager.requeue_dead_letters(**filters)
+    if requeued:
+        log_bulk_send(
+            current_user.get("username", "admin"),
+            current_user.get("role", "admin"),
+            body.campaign_id or "*",
+            requeued,
+            details={"action": "requeue_dead_letters", **body.model_dump(mode="json", exclude_none=True)},
+        )
+    return {"success": True, "requeued": requeued}
+
+
 @router.get("/{campaign_id}")
 async def get_campaign_status(
     campaign_id: str,
@@ -155,6 +287,8 @@ async def pause_campaign(
         return {"success": True, "message": f"Campaña {campaign_id} pausada"}
     except HTTPException:
         raise
+    except CampaignImportingError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -175,6 +309,8 @@ async def resume_campaign(
         }
     except HTTPException:
         raise
+    except CampaignImportingError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -17,7 +17,10 @@ import chat_sessions
 from src.services.adaptive_layer import adaptive_layer_manager
 from src.services.auth_system import get_current_user, require_admin
 from src.services.business_config_manager import business_config
+from src.services.deadline import Deadline, DeadlineExceeded, run_sync_with_deadline
+from src.services.multi_provider_llm import llm_manager
 from src.services.queue_system import queue_manager
+from src.services.suppression_list import SuppressedRecipientError
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["chat-core"])
@@ -38,13 +41,16 @@ def api_schedule(payload: ScheduleIn, current_user: dict[str, Any] = Depends(get
         parsed = datetime.fromisoformat((payload.when or "").replace("Z", "+00:00"))
         when_dt = parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
-    queue_manager.enqueue_message(
-        chat_id=payload.chat_id,
-        message=payload.message,
-        when=when_dt,
-        priority=1,
-        metadata={"source": "api_schedule", "requested_by": current_user.get("username", "unknown")},
-    )
+    try:
+        queue_manager.enqueue_message(
+            chat_id=payload.chat_id,
+            message=payload.message,
+            when=when_dt,
+            priority=1,
+            metadata={"source": "api_schedule", "requested_by": current_user.get("username", "unknown")},
+        )
+    except SuppressedRecipientError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return {"ok": True}
 
 
@@ -99,51 +105,97 @@ class ChatIn(BaseModel):
     message: str
 
 
+def _prepare_user_message(payload: ChatIn) -> str:
+    """Register the interaction in the adaptive layer and prefix its style hint to the message."""
+    adaptive_overrides: dict[str, Any] = {}
+    try:
+        adaptive_layer_manager.business_config = business_config
+        adaptive_layer_manager.sync_runtime_settings()
+        adaptive_layer_manager.register_interaction(payload.chat_id)
+        adaptive_overrides = adaptive_layer_manager.get_runtime_overrides(payload.chat_id)
+        adaptive_layer_manager.apply_runtime_overrides(
+            adaptive_overrides, os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        )
+    except Exception as adaptive_error:
+        logger.warning(f"Adaptive override warning: {adaptive_error}")
+
+    style_hint = adaptive_overrides.get("style") if adaptive_overrides else None
+    if style_hint == "concise":
+        return f"[Estilo: respuesta breve, directa y profesional]\n{payload.message}"
+    if style_hint == "empathetic":
+        return f"[Estilo: tono empático, cálido y conversacional]\n{payload.message}"
+    return payload.message
+
+
+async def _run_adaptive_cycle() -> None:
+    """Run the adaptive layer over recent conversations when it is due."""
+    try:
+        adaptive_layer_manager.business_config = business_config
+        adaptive_layer_manager.sync_runtime_settings()
+
+        if adaptive_layer_manager.should_run_now():
+            batch = chat_sessions.load_recent_conversations(limit=adaptive_layer_manager.default_batch_limit)
+            await adaptive_layer_manager.run_adaptive_cycle(conversations=batch)
+    except Exception as adaptive_error:
+        logger.warning(f"Adaptive layer warning: {adaptive_error}")
+
+
 @router.post("/api/chat")
 async def api_chat(payload: ChatIn, current_user: dict[str, Any] = Depends(get_current_user)) -> JSONResponse:
     """Generate chat response and persist user/assistant context."""
+    deadline = Deadline.from_env()
     try:
         history = chat_sessions.load_last_context(payload.chat_id) or []
-        adaptive_overrides: dict[str, Any] = {}
+        user_message = _prepare_user_message(payload)
 
         try:
-            adaptive_layer_manager.business_config = business_config
-            adaptive_layer_manager.sync_runtime_settings()
-            adaptive_layer_manager.register_interaction(payload.chat_id)
-            adaptive_overrides = adaptive_layer_manager.get_runtime_overrides(payload.chat_id)
-            adaptive_layer_manager.apply_runtime_overrides(
-                adaptive_overrides, os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+            # Copia: el hilo que vence el deadline sigue vivo y no debe mutar el historial que se guarda abajo
+            reply = await run_sync_with_deadline(
+                deadline, "pipeline", stub_chat.chat, user_message, payload.chat_id, list(history)
             )
-        except Exception as adaptive_error:
-            logger.warning(f"Adaptive override warning: {adaptive_error}")
-
-        user_message = payload.message
-        style_hint = adaptive_overrides.get("style") if adaptive_overrides else None
-        if style_hint == "concise":
-            user_message = f"[Estilo: respuesta breve, directa y profesional]\n{payload.message}"
-        elif style_hint == "empathetic":
-            user_message = f"[Estilo: tono empático, cálido y conversacional]\n{payload.message}"
+        except DeadlineExceeded:
+            # Fallback humanizado (None si se activó transferencia silenciosa)
+            reply = llm_manager.deadline_fallback_response(payload.message, payload.chat_id, history).get("response")
 
-        reply = stub_chat.chat(user_message, payload.chat_id, history)
         history.append({"role": "user", "content": payload.message})
-        history.append({"role": "assistant", "content": reply})
+        if reply:
+            history.append({"role": "assistant", "content": reply})
         chat_sessions.save_context(payload.chat_id, history)
 
-        try:
-            adaptive_layer_manager.business_config = business_config
-            adaptive_layer_manager.sync_runtime_settings()
-
-            if adaptive_layer_manager.should_run_now():
-                batch = chat_sessions.load_recent_conversations(limit=adaptive_layer_manager.default_batch_limit)
-                await adaptive_layer_manager.run_adaptive_cycle(conversations=batch)
-        except Exception as adaptive_error:
-            logger.warning(f"Adaptive layer warning: {adaptive_error}")
+        await _run_adaptive_cycle()
 
         return JSONResponse({"reply": reply})
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@router.post("/api/chat/stream")
+async def api_chat_stream(payload: ChatIn, current_user: dict[str, Any] = Depends(get_current_user)) -> StreamingResponse:
+    """Stream the chat reply as SSE events (delta/reset/done) and persist context once it completes.
+
+    Applies the same adaptive style hint as /api/chat, but the prompt is built by
+    llm_manager (chat context injection and token budget) instead of stub_chat,
+    whose synchronous pipeline cannot stream partial text.
+    """
+    history = chat_sessions.load_last_context(payload.chat_id) or []
+    messages = [*history, {"role": "user", "content": _prepare_user_message(payload)}]
+
+    async def _reply_events() -> AsyncIterator[str]:
+        try:
+            async for event in llm_manager.generate_response_stream(messages, business_context={"chat_id": payload.chat_id}):
+                if event.get("type") == "done" and event.get("response"):
+                    history.append({"role": "user", "content": payload.message})
+                    history.append({"role": "assistant", "content": event["response"]})
+                    chat_sessions.save_context(payload.chat_id, history)
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            await _run_adaptive_cycle()
+        except Exception as e:
+            logger.error("Error streaming chat reply: %s", e)
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    return StreamingResponse(_reply_events(), media_type="text/event-stream")
+
+
 class ChatTestIn(BaseModel):
     message: str
     chat_id: str | None = "test_chat"
@@ -13,6 +13,7 @@ from reasoner import update_chat_context_and_profile
 from src.models.admin_db import get_session
 from src.models.models import ChatProfile
 from src.services.auth_system import get_current_user
+from src.services.context_loader import context_loader
 
 router = APIRouter(tags=["chat-files-admin"])
 
@@ -272,6 +273,7 @@ def api_update_chat_context(
                 profile.objective = update.objetivo
             session.commit()
             session.close()
+            context_loader.invalidate(chat_id)
         except Exception:
             pass
 
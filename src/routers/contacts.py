@@ -9,7 +9,10 @@ from pydantic import BaseModel
 from crypto import decrypt_text, encrypt_text
 from src.models.admin_db import get_session
 from src.models.models import AllowedContact, ChatCounter, ChatProfile, Contact
-from src.services.auth_system import get_current_user
+from src.services.audit_system import log_config_change
+from src.services.auth_system import get_current_user, require_admin
+from src.services.context_loader import context_loader
+from src.services.suppression_list import SUPPRESSION_REASONS, suppression_list
 
 router = APIRouter(tags=["contacts"])
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -28,6 +31,12 @@ class AllowedContactCreate(BaseModel):
     perfil: str | None = ""
 
 
+class SuppressionCreate(BaseModel):
+    phones: list[str]
+    reason: str = "opt_out"
+    source: str | None = "manual"
+
+
 def _write_secure_context_file(path: str, content: str) -> None:
     token = encrypt_text(content or "")
     with open(path, "w", encoding="utf-8") as f:
@@ -53,6 +62,7 @@ def api_create_contact(payload: ContactCreate, current_user: dict[str, Any] = De
         session.add(c)
         session.commit()
         session.refresh(c)
+        context_loader.invalidate(payload.contact_id)
         return {"id": c.id, "label": c.label}
     finally:
         session.close()
@@ -95,6 +105,7 @@ def api_create_allowed_contact(
             profile.is_ready = True
 
         session.commit()
+        context_loader.invalidate(payload.chat_id)
 
         try:
             chat_dir = ROOT_DIR / "contextos" / f"chat_{payload.chat_id}"
@@ -173,9 +184,58 @@ def api_remove_allowed_contact(chat_id: str, current_user: dict[str, Any] = Depe
             session.delete(counter)
 
         session.commit()
+        context_loader.invalidate(chat_id)
         return {"success": True, "message": f"Contact {chat_id} removed successfully"}
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         session.close()
+
+
+@router.get("/api/suppressions")
+def api_suppression_summary(
+    phone: str | None = None, current_user: dict[str, Any] = Depends(get_current_user)
+) -> dict[str, Any]:
+    """Suppression list totals; with ?phone= also tells whether that number is suppressed."""
+    summary = suppression_list.summary()
+    if phone is not None:
+        summary["phone"] = phone
+        summary["suppressed"] = suppression_list.is_suppressed(phone)
+    return summary
+
+
+@router.post("/api/suppressions")
+def api_add_suppressions(payload: SuppressionCreate, current_user: dict[str, Any] = Depends(require_admin)) -> dict[str, Any]:
+    """Stop sending to the given numbers (opt-out, blocked or invalid)."""
+    if payload.reason not in SUPPRESSION_REASONS:
+        raise HTTPException(status_code=400, detail=f"reason must be one of {', '.join(SUPPRESSION_REASONS)}")
+    if not payload.phones:
+        raise HTTPException(status_code=400, detail="At least one phone is required")
+    try:
+        added = suppression_list.add(
+            payload.phones, payload.reason, source=payload.source, created_by=current_user.get("username", "admin")
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    log_config_change(
+        current_user.get("username", "admin"),
+        current_user.get("role", "admin"),
+        "suppression_list",
+        details={"action": "add", "reason": payload.reason, "added": len(added)},
+    )
+    return {"success": True, "added": len(added), "ignored": len(payload.phones) - len(added), "phones": added}
+
+
+@router.delete("/api/suppressions/{phone}")
+def api_remove_suppression(phone: str, current_user: dict[str, Any] = Depends(require_admin)) -> dict[str, Any]:
+    """Allow sending to a previously suppressed number again."""
+    if not suppression_list.remove(phone, removed_by=current_user.get("username", "admin")):
+        raise HTTPException(status_code=404, detail=f"{phone} is not suppressed")
+    log_config_change(
+        current_user.get("username", "admin"),
+        current_user.get("role", "admin"),
+        "suppression_list",
+        details={"action": "remove", "phone": phone},
+    )
+    return {"success": True, "message": f"{phone} removed from the suppression list"}
@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from src.models.admin_db import get_session
 from src.models.models import DailyContext, UserContext
 from src.services.auth_system import get_current_user
+from src.services.context_loader import context_loader
 
 router = APIRouter(tags=["contexts-data"])
 
@@ -28,6 +29,8 @@ def api_create_daily_context(
 
         session.add(context)
         session.commit()
+        # El contexto diario es global: invalida la sección cacheada de todos los chats
+        context_loader.invalidate()
 
         return {
             "id": context.id,
@@ -80,6 +83,7 @@ def api_create_user_context(
 
         session.add(context)
         session.commit()
+        context_loader.invalidate(payload.user_id)
 
         return {
             "id": context.id,
@@ -14,6 +14,8 @@ from fastapi.responses import JSONResponse
 
 from src.services.alert_system import alert_manager
 from src.services.auth_system import get_current_user
+from src.services.deadline import Deadline, DeadlineExceeded, run_sync_with_deadline
+from src.services.multi_provider_llm import llm_manager
 from src.services.whatsapp_cloud_provider import verify_webhook, verify_webhook_signature
 from src.services.whatsapp_provider import get_provider
 
@@ -49,6 +51,8 @@ async def whatsapp_webhook_verify(request: Request) -> JSONResponse:
 @router.post("/webhooks/whatsapp")
 async def whatsapp_webhook_receive(request: Request) -> dict[str, str]:
     """Recepción de mensajes de WhatsApp Cloud API"""
+    # El presupuesto de respuesta empieza a contar al recibir el webhook
+    deadline = Deadline.from_env()
     try:
         raw_body = await request.body()
         signature = request.headers.get("X-Hub-Signature-256", "")
@@ -80,15 +84,48 @@ async def whatsapp_webhook_receive(request: Request) -> dict[str, str]:
                 stub_chat_module = import_module("stub_chat")
                 chat_sessions_module = import_module("chat_sessions")
 
-                history = await run_in_threadpool(chat_sessions_module.load_last_context, normalized_msg.chat_id)
+                history_loaded = True
+                try:
+                    history = await run_sync_with_deadline(
+                        deadline, "context_loading", chat_sessions_module.load_last_context, normalized_msg.chat_id
+                    )
+                except DeadlineExceeded:
+                    history = []
+                    history_loaded = False
                 history = history or []
 
-                reply = await run_in_threadpool(stub_chat_module.chat, normalized_msg.text, normalized_msg.chat_id, history)
+                try:
+                    # Copia: si se agota el deadline el hilo del pipeline sigue en segundo plano
+                    # (no se puede cancelar; hereda el deadline y no abre nuevos intentos al LLM)
+                    # y su respuesta se descarta, pero no debe tocar el historial que se guarda aquí
+                    reply = await run_sync_with_deadline(
+                        deadline,
+                        "pipeline",
+                        stub_chat_module.chat,
+                        normalized_msg.text,
+                        normalized_msg.chat_id,
+                        list(history),
+                    )
+                except DeadlineExceeded:
+                    # Fallback humanizado inmediato (o transferencia silenciosa: response=None)
+                    fallback = llm_manager.deadline_fallback_response(normalized_msg.text, normalized_msg.chat_id, history)
+                    reply = fallback.get("response")
 
                 if reply:
-                    history.append({"role": "user", "content": normalized_msg.text})
-                    history.append({"role": "assistant", "content": reply})
-                    await run_in_threadpool(chat_sessions_module.save_context, normalized_msg.chat_id, history)
+                    if not history_loaded:
+                        # El historial vacío fue solo para responder a tiempo: guardarlo borraría la
+                        # conversación (save_context escribe un snapshot nuevo), se recarga sin deadline
+                        try:
+                            history = await run_in_threadpool(chat_sessions_module.load_last_context, normalized_msg.chat_id)
+                            history = history or []
+                        except Exception as e:
+                            logger.error("❌ No se pudo recargar historial de %s, no se guarda: %s", normalized_msg.chat_id, e)
+                            history = None
+
+                    if history is not None:
+                        history.append({"role": "user", "content": normalized_msg.text})
+                        history.append({"role": "assistant", "content": reply})
+                        await run_in_threadpool(chat_sessions_module.save_context, normalized_msg.chat_id, history)
 
                     send_result = await run_in_threadpool(provider.send_message, normalized_msg.chat_id, reply)
                     if not send_result.success:
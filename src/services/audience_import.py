@@ -0,0 +1,320 @@
+"""
+📥 Importación de audiencias de campaña desde CSV/XLSX
+Lee el archivo fila a fila (CSV con el módulo csv, XLSX con openpyxl en modo
+read_only), normaliza y deduplica los números, descarta los de la lista de supresión
+y los inserta por bloques en la cola (COPY en PostgreSQL, executemany en SQLite) sin
+armar la audiencia completa en memoria.
+
+Cada importación corre en un hilo en segundo plano; su progreso (filas/s, aceptadas,
+rechazadas por motivo) se consulta por job_id. Los jobs viven en memoria del proceso
+que recibió el archivo.
+"""
+
+import contextlib
+import csv
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from src.services.phone_numbers import normalize_phone
+from src.services.queue_system import build_message_record, queue_manager
+from src.services.suppression_list import suppression_list
+
+logger = logging.getLogger(__name__)
+
+try:
+    from openpyxl import load_workbook
+
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+try:
+    from src.services.metrics import inc_counter
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Encabezados reconocidos como columna de teléfono (si no hay ninguno se usa la primera columna)
+PHONE_HEADERS = ("phone", "telefono", "teléfono", "numero", "número", "celular", "movil", "móvil", "whatsapp", "chat_id")
+# Muestras de filas rechazadas que se guardan por job (además del conteo por motivo)
+REJECTED_SAMPLE_LIMIT = 20
+# Jobs terminados que se conservan para consultar su estado
+FINISHED_JOBS_LIMIT = 100
+
+
+class PhoneDeduper:
+    """
+    Deduplicación con memoria acotada: los números (como int) se guardan en un set
+    hasta max_entries; pasado el tope, seen() devuelve None y el llamador deduplica
+    contra la base de datos el resto del archivo.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._seen: set[int] = set()
+
+    @property
+    def full(self) -> bool:
+        return len(self._seen) >= self.max_entries
+
+    def seen(self, phone: str) -> bool | None:
+        key = int(phone)
+        if key in self._seen:
+            return True
+        if self.full:
+            return None
+        self._seen.add(key)
+        return False
+
+
+def _csv_rows(path: str) -> Iterator[list[Any]]:
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as handle:
+        sample = handle.read(4096)
+        handle.seek(0)
+        try:
+            dialect: Any = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(handle, dialect)
+
+
+def _xlsx_rows(path: str) -> Iterator[list[Any]]:
+    if not OPENPYXL_AVAILABLE:
+        raise RuntimeError("openpyxl no está instalado: no se pueden importar archivos XLSX")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def iter_phone_cells(path: str, file_format: str) -> Iterator[tuple[int, Any]]:
+    """(número de fila, celda de teléfono) recorriendo el archivo sin cargarlo entero"""
+    rows = _xlsx_rows(path) if file_format == "xlsx" else _csv_rows(path)
+    phone_column = 0
+    for row_number, row in enumerate(rows, start=1):
+        if row_number == 1:
+            headers = [str(cell or "").strip().lower() for cell in row]
+            matches = [index for index, header in enumerate(headers) if header in PHONE_HEADERS]
+            if matches:
+                phone_column = matches[0]
+                continue
+            if headers and normalize_phone(headers[0])[0] is None and any(ch.isalpha() for ch in headers[0]):
+                # Encabezado sin columna reconocida: el teléfono es la primera columna
+                continue
+        yield row_number, row[phone_column] if phone_column < len(row) else None
+
+
+@dataclass
+class AudienceImportJob:
+    """Estado de una importación en curso o terminada"""
+
+    job_id: str
+    campaign_id: str
+    filename: str
+    status: str = "queued"
+    rows_read: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    rejected_reasons: dict[str, int] = field(default_factory=dict)
+    rejected_samples: list[dict[str, Any]] = field(default_factory=list)
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def reject(self, row_number: int, value: Any, reason: str) -> None:
+        self.rejected += 1
+        self.rejected_reasons[reason] = self.rejected_reasons.get(reason, 0) + 1
+        if len(self.rejected_samples) < REJECTED_SAMPLE_LIMIT:
+            self.rejected_samples.append({"row": row_number, "value": None if value is None else str(value), "reason": reason})
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.rows_read / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "campaign_id": self.campaign_id,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_read": self.rows_read,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rejected_reasons": dict(self.rejected_reasons),
+            "rejected_samples": list(self.rejected_samples),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat() if self.started_at else None,
+            "finished_at": datetime.fromtimestamp(self.finished_at, timezone.utc).isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
+
+
+class AudienceImporter:
+    """Registro de importaciones y ejecución en hilos de fondo"""
+
+    def __init__(
+        self,
+        chunk_size: int | None = None,
+        dedupe_max_entries: int | None = None,
+        default_country_code: str | None = None,
+    ) -> None:
+        self.chunk_size = max(1, chunk_size or int(os.getenv("AUDIENCE_IMPORT_CHUNK_SIZE", "5000")))
+        self.dedupe_max_entries = dedupe_max_entries or int(os.getenv("AUDIENCE_DEDUPE_MAX_ENTRIES", "2000000"))
+        self.default_country_code = (
+            default_country_code if default_country_code is not None else os.getenv("AUDIENCE_DEFAULT_COUNTRY_CODE", "")
+        )
+        self._jobs: dict[str, AudienceImportJob] = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> AudienceImportJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def start(
+        self,
+        path: str,
+        file_format: str,
+        campaign_id: str,
+        template: str,
+        filename: str = "",
+        scheduled_base: datetime | None = None,
+        delay_seconds: int = 5,
+        campaign_name: str = "",
+    ) -> AudienceImportJob:
+        """Registrar el job y procesar el archivo en un hilo; el archivo se borra al terminar"""
+        job = AudienceImportJob(job_id=f"imp_{uuid.uuid4().hex[:16]}", campaign_id=campaign_id, filename=filename)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        threading.Thread(
+            target=self.run,
+            args=(job, path, file_format, template, scheduled_base, delay_seconds, campaign_name),
+            name=f"audience-import-{job.job_id}",
+            daemon=True,
+        ).start()
+        return job
+
+    def _prune(self) -> None:
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in sorted(finished, key=lambda item: item.finished_at or 0)[: max(0, len(finished) - FINISHED_JOBS_LIMIT)]:
+            del self._jobs[job.job_id]
+
+    def run(
+        self,
+        job: AudienceImportJob,
+        path: str,
+        file_format: str,
+        template: str,
+        scheduled_base: datetime | None = None,
+        delay_seconds: int = 5,
+        campaign_name: str = "",
+    ) -> AudienceImportJob:
+        """Procesar el archivo completo (síncrono; start() lo llama en un hilo)"""
+        job.status = "running"
+        job.started_at = time.time()
+        deduper = PhoneDeduper(self.dedupe_max_entries)
+        metadata = {"campaign_id": job.campaign_id, "campaign_name": campaign_name}
+        pending: list[tuple[int, str]] = []
+        try:
+            for row_number, cell in iter_phone_cells(path, file_format):
+                job.rows_read += 1
+                phone, reason = normalize_phone(cell, self.default_country_code)
+                if phone is None:
+                    job.reject(row_number, cell, reason or "invalid")
+                    continue
+                if suppression_list.is_suppressed(phone):
+                    job.reject(row_number, cell, "suppressed")
+                    continue
+                seen = deduper.seen(phone)
+                if seen:
+                    job.reject(row_number, cell, "duplicate")
+                    continue
+                pending.append((row_number, phone))
+                if len(pending) >= self.chunk_size:
+                    if not self._flush(job, pending, template, metadata, scheduled_base, delay_seconds, deduper.full):
+                        return job
+                    pending = []
+            if pending and not self._flush(job, pending, template, metadata, scheduled_base, delay_seconds, deduper.full):
+                return job
+            job.status = "completed"
+        except Exception as e:
+            logger.error("❌ Error importando audiencia de %s: %s", job.campaign_id, e)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            # Lo ya insertado queda en la campaña aunque la importación falle a mitad
+            queue_manager.finish_campaign_import(job.campaign_id)
+            job.finished_at = time.time()
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            logger.info(
+                "📥 Importación %s (%s): %d aceptados, %d rechazados (%.0f filas/s)",
+                job.job_id,
+                job.status,
+                job.accepted,
+                job.rejected,
+                job.rows_per_second,
+            )
+        return job
+
+    def _flush(
+        self,
+        job: AudienceImportJob,
+        pending: list[tuple[int, str]],
+        template: str,
+        metadata: dict[str, Any],
+        scheduled_base: datetime | None,
+        delay_seconds: int,
+        check_database: bool,
+    ) -> bool:
+        if check_database:
+            # Pasado el tope del set, la duplicación se resuelve contra lo ya insertado
+            existing = queue_manager.get_campaign_chat_ids(job.campaign_id, [phone for _, phone in pending])
+            unique: list[tuple[int, str]] = []
+            for row_number, phone in pending:
+                if phone in existing:
+                    job.reject(row_number, phone, "duplicate")
+                else:
+                    existing.add(phone)
+                    unique.append((row_number, phone))
+            pending = unique
+
+        now = datetime.now(timezone.utc)
+        records = [
+            build_message_record(
+                chat_id=phone,
+                message=template,
+                scheduled_at=(
+                    scheduled_base + timedelta(seconds=delay_seconds * (job.accepted + index))
+                    if scheduled_base is not None
+                    else None
+                ),
+                metadata=metadata,
+                created_at=now,
+            )
+            for index, (_, phone) in enumerate(pending)
+        ]
+        if queue_manager.append_campaign_messages(job.campaign_id, records) is None:
+            job.status = "cancelled"
+            return False
+        job.accepted += len(records)
+        if METRICS_AVAILABLE:
+            inc_counter("audience_rows_imported", len(records))
+        return True
+
+
+# Instancia global
+audience_importer = AudienceImporter()
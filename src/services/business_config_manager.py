@@ -3,6 +3,7 @@
 Sistema para que los usuarios personalicen completamente su chatbot
 """
 
+import hashlib
 import json
 import logging
 import os
@@ -27,6 +28,10 @@ class BusinessConfigManager:
         self.payload_file.parent.mkdir(parents=True, exist_ok=True)
         self.reasoner_file.parent.mkdir(parents=True, exist_ok=True)
 
+        # Versión (hash del archivo) cacheada por (mtime, tamaño)
+        self._version_stamp: tuple[int, int] | None = None
+        self._version = "default"
+
         # Cargar configuración inicial
         self.config = self.load_config()
 
@@ -190,6 +195,24 @@ class BusinessConfigManager:
             logger.error(f"Error cargando configuración: {e}")
             return self.get_default_config()
 
+    def config_version(self) -> str:
+        """
+        Versión de la configuración: hash corto del archivo guardado.
+        Solo se recalcula si cambian mtime/tamaño, así otros procesos ven la versión nueva.
+        """
+        try:
+            stat = self.config_file.stat()
+        except OSError:
+            return self._version
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._version_stamp:
+            try:
+                self._version = hashlib.sha256(self.config_file.read_bytes()).hexdigest()[:16]
+                self._version_stamp = stamp
+            except OSError as e:
+                logger.warning(f"No se pudo calcular versión de configuración: {e}")
+        return self._version
+
     def _merge_configs(self, default: dict, user: dict) -> dict:
         """Mergea configuración de usuario con defaults"""
         result = default.copy()
@@ -0,0 +1,156 @@
+"""
+🗜️ Codec de valores para el caché en Redis
+Serializa con orjson (o json estándar si no está instalado) y comprime de forma
+transparente los valores por encima de un umbral (zstd si está disponible, si no
+zlib). Los valores sin comprimir se guardan como JSON plano, igual que antes; los
+comprimidos llevan un byte de cabecera que ningún JSON puede tener al inicio. Así las
+entradas antiguas (y las de workers aún no actualizados) se siguen leyendo.
+"""
+
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+# Byte de cabecera de los valores comprimidos (un JSON nunca empieza con bytes de control)
+HEADER_ZLIB = b"\x02"
+HEADER_ZSTD = b"\x03"
+
+
+def _to_bytes(raw: bytes | str) -> bytes:
+    return raw.encode("utf-8") if isinstance(raw, str) else raw
+
+
+class CacheCodec:
+    """
+    Serializador + compresor de los valores guardados en Redis.
+
+    - CACHE_CODEC: auto | orjson | json (auto = orjson si está instalado)
+    - CACHE_COMPRESSION: auto | zstd | zlib | none (auto = zstd si está instalado, si no zlib)
+    - CACHE_COMPRESS_MIN_BYTES: tamaño serializado a partir del cual se comprime
+    """
+
+    def __init__(
+        self,
+        serializer: str | None = None,
+        compression: str | None = None,
+        min_compress_bytes: int | None = None,
+        level: int | None = None,
+    ) -> None:
+        serializer = (serializer or os.getenv("CACHE_CODEC", "auto")).lower()
+        if serializer == "auto":
+            serializer = "orjson" if ORJSON_AVAILABLE else "json"
+        if serializer == "orjson" and not ORJSON_AVAILABLE:
+            logger.warning("orjson no disponible, usando json estándar para el caché")
+            serializer = "json"
+        self.serializer = serializer
+
+        compression = (compression or os.getenv("CACHE_COMPRESSION", "auto")).lower()
+        if compression == "auto":
+            compression = "zstd" if ZSTD_AVAILABLE else "zlib"
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard no disponible, usando zlib para el caché")
+            compression = "zlib"
+        self.compression = compression
+
+        self.min_compress_bytes = (
+            min_compress_bytes if min_compress_bytes is not None else int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+        )
+        default_level = "3" if self.compression == "zstd" else "6"
+        self.level = level if level is not None else int(os.getenv("CACHE_COMPRESSION_LEVEL", default_level))
+        self._zstd_compressor = zstandard.ZstdCompressor(level=self.level) if self.compression == "zstd" else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if ZSTD_AVAILABLE else None
+
+        self.stats = {
+            "encoded": 0,
+            "compressed": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "encode_seconds": 0.0,
+            "decoded": 0,
+            "decode_seconds": 0.0,
+        }
+
+    def _serialize(self, value: Any) -> bytes:
+        if self.serializer == "orjson":
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, default=str).encode("utf-8")
+
+    def _deserialize(self, payload: bytes) -> Any:
+        if ORJSON_AVAILABLE:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+    def encode(self, value: Any) -> bytes:
+        """Valor → bytes para Redis (JSON plano o cabecera + JSON comprimido)"""
+        started = time.perf_counter()
+        payload = self._serialize(value)
+        stored = payload
+        if self.compression != "none" and len(payload) >= self.min_compress_bytes:
+            if self.compression == "zstd":
+                candidate = HEADER_ZSTD + self._zstd_compressor.compress(payload)
+            else:
+                candidate = HEADER_ZLIB + zlib.compress(payload, self.level)
+            # Solo si realmente ahorra bytes
+            if len(candidate) < len(payload):
+                stored = candidate
+                self.stats["compressed"] += 1
+
+        self.stats["encoded"] += 1
+        self.stats["raw_bytes"] += len(payload)
+        self.stats["stored_bytes"] += len(stored)
+        self.stats["encode_seconds"] += time.perf_counter() - started
+        return stored
+
+    def decode(self, raw: bytes | str) -> Any:
+        """bytes de Redis → valor (acepta entradas JSON antiguas sin cabecera)"""
+        started = time.perf_counter()
+        data = _to_bytes(raw)
+        header = data[:1]
+        if header == HEADER_ZLIB:
+            data = zlib.decompress(data[1:])
+        elif header == HEADER_ZSTD:
+            if self._zstd_decompressor is None:
+                raise ValueError("Entrada de caché comprimida con zstd pero zstandard no está instalado")
+            data = self._zstd_decompressor.decompress(data[1:])
+        value = self._deserialize(data)
+        self.stats["decoded"] += 1
+        self.stats["decode_seconds"] += time.perf_counter() - started
+        return value
+
+    def get_stats(self) -> dict[str, Any]:
+        encoded = self.stats["encoded"]
+        decoded = self.stats["decoded"]
+        stored = self.stats["stored_bytes"]
+        return {
+            "serializer": self.serializer,
+            "compression": self.compression,
+            "min_compress_bytes": self.min_compress_bytes,
+            "encoded": encoded,
+            "compressed": self.stats["compressed"],
+            "raw_bytes": self.stats["raw_bytes"],
+            "stored_bytes": stored,
+            "compression_ratio": round(self.stats["raw_bytes"] / stored, 3) if stored else 1.0,
+            "avg_encode_ms": round(self.stats["encode_seconds"] * 1000 / encoded, 4) if encoded else 0.0,
+            "avg_decode_ms": round(self.stats["decode_seconds"] * 1000 / decoded, 4) if decoded else 0.0,
+        }
@@ -4,15 +4,22 @@ Caché de configuraciones, respuestas LLM y datos frecuentes
 """
 
 import asyncio
+import contextlib
+import fnmatch
 import hashlib
 import json
 import logging
 import os
+import time
+import uuid
+import weakref
 from datetime import datetime, timezone
 from typing import Any
 
 from cachetools import TTLCache
 
+from src.services.cache_codec import CacheCodec
+
 try:
     import redis.asyncio as redis
 
@@ -23,22 +30,162 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Libera el lock solo si sigue perteneciendo a quien lo adquirió
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Marca de las entradas escritas por get_or_set (valor + vencimiento blando)
+_ENVELOPE_MARK = "__cache_entry__"
+
+
+class AccountedTTLCache(TTLCache):
+    """
+    TTLCache que lleva la cuenta incremental de claves, bytes y eventos por namespace.
+
+    El tamaño de cada valor se mide una sola vez al escribirlo; altas, reemplazos,
+    borrados, expiraciones y evicciones LRU ajustan los contadores, así que leer las
+    estadísticas es O(namespaces) y no recorre las entradas.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, namespace_of=None, **kwargs) -> None:
+        super().__init__(maxsize, ttl, **kwargs)
+        self._namespace_of = namespace_of or (lambda key: "")
+        self._entries: dict[Any, tuple[str, int]] = {}
+        self._namespaces: dict[str, dict[str, int]] = {}
+        self.total_bytes = 0
+        self._removal_reason: str | None = None
+
+    def _bucket(self, namespace: str) -> dict[str, int]:
+        bucket = self._namespaces.get(namespace)
+        if bucket is None:
+            bucket = {"keys": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+            self._namespaces[namespace] = bucket
+        return bucket
+
+    def _forget(self, key: Any, reason: str | None) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        namespace, size = entry
+        bucket = self._bucket(namespace)
+        bucket["keys"] -= 1
+        bucket["bytes"] -= size
+        self.total_bytes -= size
+        if reason:
+            bucket[reason] += 1
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        # Reemplazo: la entrada anterior sigue registrada (si hubiera expirado, expire() ya la quitó)
+        self._forget(key, None)
+        namespace = self._namespace_of(key)
+        size = len(str(value))
+        self._entries[key] = (namespace, size)
+        bucket = self._bucket(namespace)
+        bucket["keys"] += 1
+        bucket["bytes"] += size
+        self.total_bytes += size
+
+    def __delitem__(self, key: Any) -> None:
+        self._forget(key, self._removal_reason)
+        super().__delitem__(key)
+
+    def popitem(self) -> tuple[Any, Any]:
+        # Solo la evicción LRU por capacidad pasa por aquí (clear() marca su propio motivo)
+        previous = self._removal_reason
+        if previous is None:
+            self._removal_reason = "evictions"
+        try:
+            return super().popitem()
+        finally:
+            self._removal_reason = previous
+
+    def expire(self, now: float | None = None) -> list[tuple[Any, Any]]:
+        expired = super().expire(now)
+        for key, _value in expired:
+            self._forget(key, "expirations")
+        return expired
+
+    def clear(self) -> None:
+        self._removal_reason = ""
+        try:
+            super().clear()
+        finally:
+            self._removal_reason = None
+
+    def record_lookup(self, key: Any, hit: bool) -> None:
+        self._bucket(self._namespace_of(key))["hits" if hit else "misses"] += 1
+
+    def namespace_stats(self) -> dict[str, dict[str, int]]:
+        """Copia de los contadores por namespace (expira antes las entradas vencidas)"""
+        self.expire()
+        return {namespace or "_": dict(bucket) for namespace, bucket in self._namespaces.items()}
+
 
 class CacheManager:
-    """Gestor de caché con soporte Redis y fallback en memoria"""
+    """
+    Gestor de caché con soporte Redis y fallback en memoria.
+
+    Con Redis activo y CACHE_TWO_TIER_ENABLED, un L1 por proceso (TTLCache pequeño y de
+    TTL corto) atiende las lecturas repetidas sin ida y vuelta a Redis (L2). Guarda los
+    bytes codificados (cada lectura devuelve una copia) y una entrada nunca vive más que
+    el TTL restante de su clave en Redis. Las
+    escrituras y borrados publican la invalidación en un canal pub/sub al que todos
+    los workers están suscritos, para que ningún L1 sirva datos ya reemplazados.
+
+    En Redis las claves llevan la generación de su namespace (el segmento antes del
+    primer ":"): `business_config:abc` se guarda como `chatbot:business_config:g3:abc`
+    (generación 0 = clave sin etiqueta). Limpiar `namespace:*` es un solo HINCRBY; las
+    claves de generaciones anteriores dejan de leerse y expiran por su TTL. El conteo
+    de claves por namespace sale de un HyperLogLog por generación, sin SCAN.
+    """
 
     def __init__(self) -> None:
         self.redis_client = None
+        # Cliente binario (decode_responses=False) para leer valores comprimidos
+        self._value_client = None
         self.memory_cache = None  # type: ignore[assignment]
         self.cache_enabled = False
-        self._key_locks: dict[str, asyncio.Lock] = {}
-        self._locks_guard = asyncio.Lock()
+        # Un lock vive mientras alguna corrutina lo use: la tabla no crece con cada clave
+        self._key_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
 
         # Configuración desde variables de entorno
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         self.cache_prefix = os.getenv("CACHE_PREFIX", "chatbot:")
         self.default_ttl = int(os.getenv("CACHE_DEFAULT_TTL", "3600"))  # 1 hora
-        self.memory_cache = TTLCache(maxsize=10000, ttl=max(1, self.default_ttl))
+        # get_or_set: margen servido como dato viejo mientras se recalcula, TTL de "no encontrado" y lock Redis
+        self.stale_ttl = int(os.getenv("CACHE_STALE_TTL_SECONDS", "60"))
+        self.negative_ttl = int(os.getenv("CACHE_NEGATIVE_TTL_SECONDS", "30"))
+        self.lock_ttl_seconds = float(os.getenv("CACHE_LOCK_TTL_SECONDS", "10"))
+        self.lock_poll_seconds = float(os.getenv("CACHE_LOCK_POLL_SECONDS", "0.05"))
+        self.memory_cache = AccountedTTLCache(maxsize=10000, ttl=max(1, self.default_ttl), namespace_of=self._memory_namespace)
+
+        # L1 por proceso delante de Redis (solo se usa con Redis conectado)
+        self.two_tier_enabled = os.getenv("CACHE_TWO_TIER_ENABLED", "true").lower() == "true"
+        self.l1_cache: TTLCache = TTLCache(
+            maxsize=max(1, int(os.getenv("CACHE_L1_MAX_ENTRIES", "1000"))),
+            ttl=max(1, int(os.getenv("CACHE_L1_TTL_SECONDS", "30"))),
+        )
+        self.invalidation_channel = os.getenv("CACHE_INVALIDATION_CHANNEL", f"{self.cache_prefix}cache:invalidate")
+        self._instance_id = uuid.uuid4().hex
+        self._invalidation_task: asyncio.Task | None = None
+        self._tier_stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0, "memory_hits": 0, "memory_misses": 0}
+
+        # Generaciones por namespace (copia local de un hash en Redis)
+        self.generations_key = f"{self.cache_prefix}cache:generations"
+        self.namespaces_key = f"{self.cache_prefix}cache:namespaces"
+        self.generation_refresh_seconds = float(os.getenv("CACHE_GENERATION_REFRESH_SECONDS", "5"))
+        self._generations: dict[str, int] = {}
+        self._generations_synced_at = 0.0
+        self._registered_namespaces: set[str] = set()
+
+        # Serialización + compresión de los valores guardados en Redis
+        self.codec = CacheCodec()
 
         # Intentar conectar a Redis
         if REDIS_AVAILABLE:
@@ -70,20 +217,113 @@ class CacheManager:
                 health_check_interval=30,
             )
 
+            self._value_client = redis.from_url(
+                self.redis_url,
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True,
+                health_check_interval=30,
+            )
+
             # Probar conexión
             await self.redis_client.ping()
             self.cache_enabled = True
             logger.info("✅ Redis conectado exitosamente")
+            self._start_invalidation_listener()
 
         except Exception as e:
             logger.warning(f"⚠️ No se pudo conectar a Redis: {e}. Usando caché en memoria")
             self.redis_client = None
+            self._value_client = None
             self.cache_enabled = False
 
     def _get_key(self, key: str) -> str:
         """Generar clave con prefijo"""
         return f"{self.cache_prefix}{key}"
 
+    def _memory_namespace(self, cache_key: str) -> str:
+        return self._split_namespace(cache_key.removeprefix(self.cache_prefix))[0]
+
+    def _record_memory_lookup(self, cache_key: str, hit: bool) -> None:
+        self._count("memory_hits" if hit else "memory_misses")
+        if isinstance(self.memory_cache, AccountedTTLCache):
+            self.memory_cache.record_lookup(cache_key, hit)
+
+    # ─────────────── Generaciones por namespace ───────────────
+
+    @staticmethod
+    def _split_namespace(key: str) -> tuple[str, str]:
+        """(namespace, resto); las claves sin ":" pertenecen al namespace raíz ("")"""
+        namespace, sep, rest = key.partition(":")
+        return (namespace, rest) if sep else ("", key)
+
+    def _versioned_key(self, key: str) -> str:
+        """Clave física en Redis con la generación vigente del namespace"""
+        namespace, rest = self._split_namespace(key)
+        generation = self._generations.get(namespace, 0)
+        if not generation:
+            return self._get_key(key)
+        if not namespace:
+            return f"{self.cache_prefix}g{generation}:{rest}"
+        return f"{self.cache_prefix}{namespace}:g{generation}:{rest}"
+
+    def _count_key(self, namespace: str) -> str:
+        return f"{self.cache_prefix}cache:count:{namespace or '_'}:g{self._generations.get(namespace, 0)}"
+
+    async def _sync_generations(self, force: bool = False) -> None:
+        """Refrescar la copia local de generaciones (un HGETALL cada pocos segundos)"""
+        if not force and time.monotonic() - self._generations_synced_at < self.generation_refresh_seconds:
+            return
+        try:
+            remote = await self.redis_client.hgetall(self.generations_key)
+        except Exception as e:
+            logger.debug(f"No se pudieron leer generaciones de caché: {e}")
+            return
+        for namespace, generation in (remote or {}).items():
+            self._generations[namespace] = max(self._generations.get(namespace, 0), int(generation))
+        self._generations_synced_at = time.monotonic()
+
+    def _queue_write_bookkeeping(self, pipe, keys: list[str], ttl: int) -> None:
+        """Registrar namespaces nuevos y alimentar el conteo aproximado por namespace"""
+        by_namespace: dict[str, list[str]] = {}
+        for key in keys:
+            by_namespace.setdefault(self._split_namespace(key)[0], []).append(key)
+        for namespace, namespace_keys in by_namespace.items():
+            if namespace not in self._registered_namespaces:
+                pipe.sadd(self.namespaces_key, namespace)
+            count_key = self._count_key(namespace)
+            pipe.pfadd(count_key, *namespace_keys)
+            pipe.expire(count_key, max(ttl, self.default_ttl))
+
+    async def bump_namespace(self, *namespaces: str) -> int:
+        """
+        Invalidar namespaces completos en O(1) cada uno (HINCRBY de su generación).
+
+        Devuelve el número aproximado de claves que quedaron obsoletas.
+        """
+        await self._sync_generations(force=True)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for namespace in namespaces:
+                pipe.pfcount(self._count_key(namespace))
+                pipe.hincrby(self.generations_key, namespace, 1)
+            results = await pipe.execute()
+
+        invalidated = 0
+        new_generations: dict[str, int] = {}
+        for index, namespace in enumerate(namespaces):
+            invalidated += int(results[2 * index] or 0)
+            new_generations[namespace] = int(results[2 * index + 1])
+        self._apply_generations(new_generations)
+        await self._publish_invalidation(generations=new_generations)
+        logger.info(f"🧹 Namespaces de caché invalidados: {new_generations}")
+        return invalidated
+
+    def _apply_generations(self, generations: dict[str, int]) -> None:
+        # El L1 está indexado por clave física: con la generación nueva sus entradas ya no se leen
+        for namespace, generation in generations.items():
+            self._generations[namespace] = max(self._generations.get(namespace, 0), int(generation))
+
     def _hash_key(self, data: Any) -> str:
         """Generar hash para claves complejas"""
         if isinstance(data, dict):
@@ -94,20 +334,72 @@ class CacheManager:
 
         return hashlib.sha256(serialized.encode()).hexdigest()
 
+    def _reader(self):
+        return self._value_client or self.redis_client
+
+    def _l1_active(self) -> bool:
+        return self.two_tier_enabled and self.redis_client is not None and self.cache_enabled
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        self._tier_stats[stat] += amount
+
+    def _l1_get(self, cache_key: str) -> tuple[bool, Any]:
+        """(encontrado, valor) del L1; cada lectura decodifica una copia propia del valor"""
+        entry = self.l1_cache.get(cache_key)
+        if entry is None:
+            return False, None
+        expires_at, encoded = entry
+        if expires_at <= time.monotonic():
+            self.l1_cache.pop(cache_key, None)
+            return False, None
+        return True, self.codec.decode(encoded)
+
+    def _l1_put(self, cache_key: str, encoded: Any, remaining_ms: int | None) -> None:
+        """
+        Guardar los bytes codificados en L1 sin sobrevivir a la clave en Redis.
+
+        remaining_ms es el PTTL de la clave (-1 = sin expiración, -2/None = ya no existe).
+        """
+        lifetime = float(self.l1_cache.ttl)
+        if remaining_ms is None or remaining_ms in (0, -2):
+            return
+        if remaining_ms > 0:
+            lifetime = min(lifetime, remaining_ms / 1000)
+        self.l1_cache[cache_key] = (time.monotonic() + lifetime, encoded)
+
     async def get(self, key: str) -> Any | None:
         """Obtener valor del caché"""
         try:
             await self._ensure_redis_initialized()
-            cache_key = self._get_key(key)
 
             if self.redis_client and self.cache_enabled:
-                # Obtener de Redis
-                value = await self.redis_client.get(cache_key)
+                await self._sync_generations()
+                cache_key = self._versioned_key(key)
+                if not self._l1_active():
+                    value = await self._reader().get(cache_key)
+                    self._count("l2_hits" if value else "l2_misses")
+                    return self.codec.decode(value) if value else None
+                hit, cached = self._l1_get(cache_key)
+                if hit:
+                    self._count("l1_hits")
+                    return cached
+                self._count("l1_misses")
+                # GET + PTTL en una ida y vuelta: el L1 no debe durar más que la clave en Redis
+                async with self._reader().pipeline(transaction=False) as pipe:
+                    pipe.get(cache_key)
+                    pipe.pttl(cache_key)
+                    value, remaining_ms = await pipe.execute()
                 if value:
-                    return json.loads(value)
+                    self._count("l2_hits")
+                    self._l1_put(cache_key, value, remaining_ms)
+                    return self.codec.decode(value)
+                self._count("l2_misses")
                 return None
             # Obtener de memoria (TTLCache expira automáticamente)
-            return self.memory_cache.get(cache_key)
+            cache_key = self._get_key(key)
+            value = self.memory_cache.get(cache_key)
+            self._record_memory_lookup(cache_key, value is not None)
+            return value
 
         except Exception as e:
             logger.error(f"Error obteniendo caché {key}: {e}")
@@ -117,29 +409,125 @@ class CacheManager:
         """Guardar valor en caché"""
         try:
             await self._ensure_redis_initialized()
-            cache_key = self._get_key(key)
             ttl = ttl or self.default_ttl
 
             if self.redis_client and self.cache_enabled:
-                # Guardar en Redis
-                serialized_value = json.dumps(value, default=str)
-                await self.redis_client.setex(cache_key, ttl, serialized_value)
-                return True
+                return await self._redis_write({key: value}, ttl)
             # Guardar en memoria (evicción automática LRU+TTL)
-            self.memory_cache[cache_key] = value
+            self.memory_cache[self._get_key(key)] = value
             return True
 
         except Exception as e:
             logger.error(f"Error guardando caché {key}: {e}")
             return False
 
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Obtener varias claves en una sola ida y vuelta (MGET). Omite las ausentes"""
+        if not keys:
+            return {}
+        try:
+            await self._ensure_redis_initialized()
+
+            if self.redis_client and self.cache_enabled:
+                await self._sync_generations()
+                found: dict[str, Any] = {}
+                pending = [(key, self._versioned_key(key)) for key in keys]
+                l1_active = self._l1_active()
+                if l1_active:
+                    remaining = []
+                    for key, cache_key in pending:
+                        hit, cached = self._l1_get(cache_key)
+                        if hit:
+                            found[key] = cached
+                        else:
+                            remaining.append((key, cache_key))
+                    self._count("l1_hits", len(pending) - len(remaining))
+                    self._count("l1_misses", len(remaining))
+                    pending = remaining
+                if not pending:
+                    return found
+
+                cache_keys = [cache_key for _, cache_key in pending]
+                if l1_active:
+                    # MGET + PTTL de cada clave en una ida y vuelta para acotar la vida en L1
+                    async with self._reader().pipeline(transaction=False) as pipe:
+                        pipe.mget(cache_keys)
+                        for cache_key in cache_keys:
+                            pipe.pttl(cache_key)
+                        values, *remaining_ms = await pipe.execute()
+                else:
+                    values = await self._reader().mget(cache_keys)
+                    remaining_ms = [None] * len(cache_keys)
+                for (key, cache_key), value, key_remaining_ms in zip(pending, values, remaining_ms, strict=True):
+                    if not value:
+                        self._count("l2_misses")
+                        continue
+                    self._count("l2_hits")
+                    found[key] = self.codec.decode(value)
+                    if l1_active:
+                        self._l1_put(cache_key, value, key_remaining_ms)
+                return found
+            found = {}
+            for key in keys:
+                cache_key = self._get_key(key)
+                value = self.memory_cache.get(cache_key)
+                self._record_memory_lookup(cache_key, value is not None)
+                if value is not None:
+                    found[key] = value
+            return found
+
+        except Exception as e:
+            logger.error(f"Error obteniendo caché múltiple ({len(keys)} claves): {e}")
+            return {}
+
+    async def set_many(self, items: dict[str, Any], ttl: int | None = None) -> bool:
+        """Guardar varias claves con el mismo TTL en una sola ida y vuelta (pipeline)"""
+        if not items:
+            return True
+        try:
+            await self._ensure_redis_initialized()
+            ttl = ttl or self.default_ttl
+
+            if self.redis_client and self.cache_enabled:
+                return await self._redis_write(items, ttl)
+            for key, value in items.items():
+                self.memory_cache[self._get_key(key)] = value
+            return True
+
+        except Exception as e:
+            logger.error(f"Error guardando caché múltiple ({len(items)} claves): {e}")
+            return False
+
+    async def _redis_write(self, items: dict[str, Any], ttl: int) -> bool:
+        """SETEX de cada clave + contabilidad + invalidación de L1 remotos en una ida y vuelta"""
+        await self._sync_generations()
+        cache_keys = {key: self._versioned_key(key) for key in items}
+        encoded = {key: self.codec.encode(value) for key, value in items.items()}
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for key in items:
+                pipe.setex(cache_keys[key], ttl, encoded[key])
+            self._queue_write_bookkeeping(pipe, list(items), ttl)
+            if self._l1_active():
+                pipe.publish(self.invalidation_channel, self._invalidation_message(keys=list(cache_keys.values())))
+            await pipe.execute()
+        self._registered_namespaces.update(self._split_namespace(key)[0] for key in items)
+        if self._l1_active():
+            for key in items:
+                self._l1_put(cache_keys[key], encoded[key], ttl * 1000)
+        return True
+
     async def delete(self, key: str) -> bool:
         """Eliminar valor del caché"""
         try:
             cache_key = self._get_key(key)
 
             if self.redis_client and self.cache_enabled:
+                await self._sync_generations()
+                cache_key = self._versioned_key(key)
                 await self.redis_client.delete(cache_key)
+                if self._l1_active():
+                    self.l1_cache.pop(cache_key, None)
+                    await self._publish_invalidation(keys=[cache_key])
             else:
                 if cache_key in self.memory_cache:
                     del self.memory_cache[cache_key]
@@ -151,17 +539,25 @@ class CacheManager:
             return False
 
     async def clear_pattern(self, pattern: str) -> int:
-        """Limpiar claves que coincidan con patrón"""
+        """
+        Limpiar claves que coincidan con patrón.
+
+        En Redis, `*` y `namespace:*` (también `prefijo_*:*`) suben la generación de los
+        namespaces afectados sin recorrer claves. Si el resto es literal
+        (`business_*:{id}`) se borra con DEL la clave de cada namespace. Solo los
+        globs dentro del namespace recurren a SCAN, acotado a la generación vigente.
+        """
         try:
             if self.redis_client and self.cache_enabled:
-                # Redis scan para encontrar claves
-                keys = []
-                async for key in self.redis_client.scan_iter(match=self._get_key(pattern)):
-                    keys.append(key)
-
-                if keys:
-                    await self.redis_client.delete(*keys)
-                return len(keys)
+                namespace_pattern, rest = self._split_namespace(pattern)
+                if pattern == "*":
+                    namespace_pattern, rest = "*", "*"
+                namespaces = await self._matching_namespaces(namespace_pattern)
+                if rest == "*":
+                    return await self.bump_namespace(*namespaces) if namespaces else 0
+                if not any(ch in rest for ch in "*?["):
+                    return await self._delete_exact(namespaces, rest)
+                return await self._scan_delete(namespaces, rest)
             # Limpiar memoria
             pattern_key = self._get_key(pattern.replace("*", ""))
             keys_to_delete = [k for k in self.memory_cache if k.startswith(pattern_key)]
@@ -173,33 +569,262 @@ class CacheManager:
             logger.error(f"Error limpiando patrón {pattern}: {e}")
             return 0
 
-    async def get_or_set(self, key: str, factory_func, ttl: int | None = None) -> Any:
-        """Obtener del caché o calcular y guardar"""
-        value = await self.get(key)
-        if value is not None:
+    async def _matching_namespaces(self, namespace_pattern: str) -> list[str]:
+        if not any(ch in namespace_pattern for ch in "*?["):
+            return [namespace_pattern]
+        known = set(await self.redis_client.smembers(self.namespaces_key) or []) | self._registered_namespaces
+        known.add("")
+        if namespace_pattern == "*":
+            return sorted(known)
+        return sorted(ns for ns in known if ns and fnmatch.fnmatchcase(ns, namespace_pattern))
+
+    async def _delete_exact(self, namespaces: list[str], rest: str) -> int:
+        """DEL directo de `{ns}:{rest}` en cada namespace (resto literal: nada que recorrer)"""
+        if not namespaces:
+            return 0
+        await self._sync_generations()
+        keys = [self._versioned_key(f"{ns}:{rest}" if ns else rest) for ns in namespaces]
+        deleted = int(await self.redis_client.delete(*keys) or 0)
+        if self._l1_active():
+            self._invalidate_l1(keys=keys)
+            await self._publish_invalidation(keys=keys)
+        return deleted
+
+    async def _scan_delete(self, namespaces: list[str], rest_pattern: str) -> int:
+        """Borrado por SCAN dentro de la generación vigente (patrones que no son un namespace completo)"""
+        await self._sync_generations()
+        physical_patterns = [self._versioned_key(f"{ns}:{rest_pattern}" if ns else rest_pattern) for ns in namespaces]
+        keys: list[str] = []
+        for physical_pattern in physical_patterns:
+            async for key in self.redis_client.scan_iter(match=physical_pattern):
+                keys.append(key)
+        if keys:
+            await self.redis_client.delete(*keys)
+        if self._l1_active():
+            self._invalidate_l1(patterns=physical_patterns)
+            await self._publish_invalidation(patterns=physical_patterns)
+        return len(keys)
+
+    # ─────────────── Invalidación L1 entre procesos (pub/sub) ───────────────
+
+    def _invalidation_message(
+        self,
+        keys: list[str] | None = None,
+        patterns: list[str] | None = None,
+        generations: dict[str, int] | None = None,
+    ) -> str:
+        return json.dumps(
+            {"origin": self._instance_id, "keys": keys or [], "patterns": patterns or [], "generations": generations or {}}
+        )
+
+    async def _publish_invalidation(
+        self,
+        keys: list[str] | None = None,
+        patterns: list[str] | None = None,
+        generations: dict[str, int] | None = None,
+    ) -> None:
+        try:
+            await self.redis_client.publish(self.invalidation_channel, self._invalidation_message(keys, patterns, generations))
+        except Exception as e:
+            logger.warning(f"No se pudo publicar invalidación de caché: {e}")
+
+    def _invalidate_l1(self, keys: list[str] | None = None, patterns: list[str] | None = None) -> None:
+        for cache_key in keys or []:
+            self.l1_cache.pop(cache_key, None)
+        for pattern in patterns or []:
+            for cache_key in [k for k in list(self.l1_cache.keys()) if fnmatch.fnmatchcase(k, pattern)]:
+                self.l1_cache.pop(cache_key, None)
+
+    def _handle_invalidation(self, raw: Any) -> None:
+        """Aplicar un mensaje de invalidación recibido de otro worker"""
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self._instance_id:
+            return
+        self._apply_generations(message.get("generations") or {})
+        self._invalidate_l1(message.get("keys"), message.get("patterns"))
+
+    def _start_invalidation_listener(self) -> None:
+        if self._invalidation_task and not self._invalidation_task.done():
+            return
+        try:
+            self._invalidation_task = asyncio.get_running_loop().create_task(self._listen_invalidations())
+        except RuntimeError:
+            logger.debug("Sin event loop: suscripción de invalidaciones omitida")
+
+    async def _listen_invalidations(self) -> None:
+        """Suscripción permanente al canal de invalidación (se reconecta con backoff)"""
+        delay = 1.0
+        while self.redis_client is not None:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.invalidation_channel)
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._handle_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Suscripción de invalidación de caché interrumpida: {e}")
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.aclose()
+            # Pudimos perder invalidaciones mientras no había suscripción
+            self.l1_cache.clear()
+            self._generations_synced_at = 0.0
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def aclose(self) -> None:
+        """Detener la suscripción de invalidaciones y cerrar Redis"""
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._invalidation_task
+            self._invalidation_task = None
+        for client in (self._value_client, self.redis_client):
+            if client is not None:
+                with contextlib.suppress(Exception):
+                    await client.aclose()
+
+    async def get_or_set(
+        self,
+        key: str,
+        factory_func,
+        ttl: int | None = None,
+        stale_ttl: int | None = None,
+        negative_ttl: int | None = None,
+    ) -> Any:
+        """
+        Obtener del caché o calcular y guardar, con una sola llamada a factory por clave.
+
+        - ttl es el vencimiento blando: pasado ese tiempo y hasta ttl + stale_ttl se sirve el
+          valor anterior y se recalcula en segundo plano (stale-while-revalidate).
+        - Si factory devuelve None se guarda una entrada negativa durante negative_ttl.
+        - Con Redis, un lock SET NX PX hace que solo un worker calcule; los demás esperan
+          el valor publicado.
+        """
+        ttl = ttl or self.default_ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        negative_ttl = self.negative_ttl if negative_ttl is None else negative_ttl
+
+        found, value, fresh = self._unwrap(await self.get(key))
+        if found:
+            if not fresh:
+                self._schedule_refresh(key, factory_func, ttl, stale_ttl, negative_ttl)
             return value
 
-        async with self._locks_guard:
-            lock = self._key_locks.get(key)
-            if lock is None:
-                lock = asyncio.Lock()
-                self._key_locks[key] = lock
+        lock = self._key_locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._key_locks[key] = lock
 
         async with lock:
             # Double-check después de adquirir el lock para evitar stampede
-            value = await self.get(key)
-            if value is not None:
+            found, value, _fresh = self._unwrap(await self.get(key))
+            if found:
                 return value
+            return await self._compute_with_distributed_lock(key, factory_func, ttl, stale_ttl, negative_ttl)
+
+    @staticmethod
+    def _unwrap(entry: Any) -> tuple[bool, Any, bool]:
+        """(encontrado, valor, fresco) de una entrada de get_or_set (o de un valor plano)"""
+        if entry is None:
+            return False, None, False
+        if isinstance(entry, dict) and entry.get(_ENVELOPE_MARK):
+            now = time.time()
+            # El caché en memoria usa un TTL global: el vencimiento duro también se valida al leer
+            if now >= float(entry.get("hard_expires_at", now + 1)):
+                return False, None, False
+            return True, entry.get("value"), now < float(entry.get("soft_expires_at", 0))
+        return True, entry, True
+
+    async def _compute_and_store(self, key: str, factory_func, ttl: int, stale_ttl: int, negative_ttl: int) -> Any:
+        if asyncio.iscoroutinefunction(factory_func):
+            calculated_value = await factory_func()
+        else:
+            calculated_value = factory_func()
+
+        now = time.time()
+        if calculated_value is None:
+            # Entrada negativa: "no encontrado" también se cachea, con TTL corto
+            if negative_ttl > 0:
+                entry = {_ENVELOPE_MARK: 1, "value": None, "soft_expires_at": now + negative_ttl}
+                await self.set(key, {**entry, "hard_expires_at": now + negative_ttl}, negative_ttl)
+            return None
+        hard_ttl = ttl + max(0, stale_ttl)
+        entry = {_ENVELOPE_MARK: 1, "value": calculated_value, "soft_expires_at": now + ttl, "hard_expires_at": now + hard_ttl}
+        await self.set(key, entry, hard_ttl)
+        return calculated_value
+
+    async def _compute_with_distributed_lock(
+        self, key: str, factory_func, ttl: int, stale_ttl: int, negative_ttl: int, wait: bool = True
+    ) -> Any:
+        """Calcular bajo un lock Redis SET NX PX; sin Redis, solo con el lock local"""
+        if not (self.redis_client and self.cache_enabled):
+            return await self._compute_and_store(key, factory_func, ttl, stale_ttl, negative_ttl)
+
+        lock_key = f"{self.cache_prefix}cache:lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl_seconds * 1000))
+        except Exception as e:
+            logger.debug(f"Lock de caché no disponible para {key} ({e}); cálculo local")
+            return await self._compute_and_store(key, factory_func, ttl, stale_ttl, negative_ttl)
 
-            # Calcular valor
-            if asyncio.iscoroutinefunction(factory_func):
-                calculated_value = await factory_func()
-            else:
-                calculated_value = factory_func()
+        if acquired:
+            try:
+                return await self._compute_and_store(key, factory_func, ttl, stale_ttl, negative_ttl)
+            finally:
+                try:
+                    await self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.debug(f"No se pudo liberar lock de caché {key}: {e}")
+
+        if not wait:
+            # Otro worker ya está recalculando
+            return None
 
-            # Guardar en caché
-            await self.set(key, calculated_value, ttl)
-            return calculated_value
+        # Otro worker calcula: esperar su valor mientras el lock exista
+        deadline = time.monotonic() + self.lock_ttl_seconds
+        while time.monotonic() < deadline:
+            found, value, _fresh = self._unwrap(await self.get(key))
+            if found:
+                return value
+            if not await self.redis_client.exists(lock_key):
+                found, value, _fresh = self._unwrap(await self.get(key))
+                if found:
+                    return value
+                break
+            await asyncio.sleep(self.lock_poll_seconds)
+        return await self._compute_and_store(key, factory_func, ttl, stale_ttl, negative_ttl)
+
+    def _schedule_refresh(self, key: str, factory_func, ttl: int, stale_ttl: int, negative_ttl: int) -> None:
+        """Recalcular en segundo plano una entrada vencida (una vez por clave y proceso)"""
+        running = self._refresh_tasks.get(key)
+        if running is not None and not running.done():
+            return
+
+        async def _refresh() -> None:
+            try:
+                await self._compute_with_distributed_lock(key, factory_func, ttl, stale_ttl, negative_ttl, wait=False)
+            except Exception as e:
+                logger.warning(f"⚠️ Falló el recálculo en segundo plano de {key}: {e}")
+            finally:
+                if self._refresh_tasks.get(key) is task:
+                    del self._refresh_tasks[key]
+
+        task = asyncio.get_running_loop().create_task(_refresh())
+        self._refresh_tasks[key] = task
+
+    async def wait_for_refreshes(self) -> None:
+        """Esperar los recálculos en curso (tests y apagado ordenado)"""
+        tasks = [task for task in self._refresh_tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def get_stats(self) -> dict[str, Any]:
         """Obtener estadísticas del caché"""
@@ -208,6 +833,8 @@ class CacheManager:
             "connected": self.cache_enabled,
             "prefix": self.cache_prefix,
             "default_ttl": self.default_ttl,
+            "tiers": self._tier_ratios(),
+            "codec": self.codec.get_stats(),
         }
 
         try:
@@ -223,26 +850,64 @@ class CacheManager:
                     }
                 )
 
-                # Contar claves con nuestro prefijo
-                key_count = 0
-                async for _key in self.redis_client.scan_iter(match=f"{self.cache_prefix}*"):
-                    key_count += 1
-                stats["our_keys"] = key_count
+                # Conteo aproximado por namespace (HyperLogLog de la generación vigente, sin SCAN)
+                namespaces = await self.namespace_stats()
+                stats["namespaces"] = namespaces
+                stats["our_keys"] = sum(item["keys"] for item in namespaces.values())
 
             else:
                 stats.update(
                     {
                         "memory_keys": len(self.memory_cache),
-                        "memory_size_bytes": sum(len(str(v)) for v in self.memory_cache.values()),
                         "memory_cache_maxsize": getattr(self.memory_cache, "maxsize", 10000),
                     }
                 )
+                # Contadores incrementales: O(namespaces), sin recorrer los valores
+                if isinstance(self.memory_cache, AccountedTTLCache):
+                    stats["namespaces"] = self.memory_cache.namespace_stats()
+                    stats["memory_size_bytes"] = self.memory_cache.total_bytes
 
         except Exception as e:
             stats["error"] = str(e)
 
         return stats
 
+    async def namespace_stats(self) -> dict[str, dict[str, int]]:
+        """Generación y claves escritas (aprox.) de cada namespace en Redis"""
+        await self._sync_generations(force=True)
+        namespaces = sorted(set(await self.redis_client.smembers(self.namespaces_key) or []) | self._registered_namespaces)
+        if not namespaces:
+            return {}
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for namespace in namespaces:
+                pipe.pfcount(self._count_key(namespace))
+            counts = await pipe.execute()
+        return {
+            namespace or "_": {"generation": self._generations.get(namespace, 0), "keys": int(count or 0)}
+            for namespace, count in zip(namespaces, counts, strict=True)
+        }
+
+    def _tier_ratios(self) -> dict[str, dict[str, Any]]:
+        """Aciertos por nivel: l1 (proceso), l2 (Redis) y memory (sin Redis)"""
+        tiers: dict[str, dict[str, Any]] = {}
+        for tier in ("l1", "l2", "memory"):
+            hits = self._tier_stats[f"{tier}_hits"]
+            misses = self._tier_stats[f"{tier}_misses"]
+            tiers[tier] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            }
+        tiers["l1"].update(
+            {
+                "enabled": self._l1_active(),
+                "size": len(self.l1_cache),
+                "maxsize": self.l1_cache.maxsize,
+                "ttl": self.l1_cache.ttl,
+            }
+        )
+        return tiers
+
     async def health_check(self) -> bool:
         """Verificar salud del sistema de caché"""
         try:
@@ -292,6 +957,13 @@ async def get_cached_llm_response(prompt_hash: str, provider: str) -> dict[str,
     return await cache_manager.get(key)
 
 
+async def get_cached_llm_responses(prompt_hash: str, providers: list[str]) -> dict[str, dict[str, Any]]:
+    """Respuestas cacheadas de varios proveedores para un prompt (una sola ida y vuelta)"""
+    keys = {f"llm_response:{provider}:{prompt_hash}": provider for provider in providers}
+    found = await cache_manager.get_many(list(keys))
+    return {keys[key]: value for key, value in found.items()}
+
+
 async def cache_conversation_context(session_id: str, context: list[dict], ttl: int = 1800) -> None:
     """Cachear contexto de conversación (30 minutos por defecto)"""
     key = f"conversation:{session_id}"
@@ -11,13 +11,17 @@ from typing import Any
 
 from fastapi import WebSocket
 
+from src.services.multi_provider_llm import llm_manager
+
 logger = logging.getLogger(__name__)
 
 
 class ChatConnectionManager:
-    def __init__(self) -> None:
+    def __init__(self, llm_client: Any | None = None) -> None:
         self.active_connections: list[WebSocket] = []
         self.chat_sessions: dict[str, dict] = {}
+        # Cliente con generate_response_stream() (p.ej. llm_manager); si es None se usa la respuesta simulada
+        self.llm_client = llm_client
 
     async def connect(self, websocket: WebSocket, session_id: str) -> None:
         """Conectar nueva sesión de chat"""
@@ -75,8 +79,11 @@ class ChatConnectionManager:
                 {"type": "typing", "message": "Bot está escribiendo...", "timestamp": datetime.now().isoformat()}, websocket
             )
 
-            # Generar respuesta del bot (aquí integrarías con multi_provider_llm)
-            bot_response = await self.generate_bot_response(session_id, user_message)
+            # Generar respuesta del bot: streaming parcial si hay LLM configurado
+            if self.llm_client is not None:
+                bot_response = await self.stream_bot_response(session_id, websocket)
+            else:
+                bot_response = await self.generate_bot_response(session_id, user_message)
 
             # Agregar respuesta del bot al historial
             self.chat_sessions[session_id]["messages"].append(
@@ -105,6 +112,24 @@ class ChatConnectionManager:
                 websocket,
             )
 
+    async def stream_bot_response(self, session_id: str, websocket: WebSocket) -> str:
+        """Generar respuesta con el LLM enviando fragmentos parciales (bot_message_chunk) al cliente"""
+        history = [{"role": m["role"], "content": m["content"]} for m in self.chat_sessions[session_id]["messages"]]
+        final_text = ""
+
+        async for event in self.llm_client.generate_response_stream(history, business_context={"chat_id": session_id}):
+            event_type = event.get("type")
+            if event_type == "delta":
+                await self.send_personal_message(
+                    {"type": "bot_message_chunk", "delta": event.get("text", ""), "session_id": session_id}, websocket
+                )
+            elif event_type == "reset":
+                await self.send_personal_message({"type": "bot_message_reset", "session_id": session_id}, websocket)
+            elif event_type == "done":
+                final_text = event.get("response") or ""
+
+        return final_text or "Disculpa, hubo un error procesando tu mensaje. ¿Podrías intentar reformular tu pregunta?"
+
     async def generate_bot_response(self, session_id: str, user_message: str) -> str:
         """Generar respuesta del bot usando la configuración actual"""
         try:
@@ -158,5 +183,5 @@ class ChatConnectionManager:
         }
 
 
-# Instancia global del manager
-chat_manager = ChatConnectionManager()
+# Instancia global del manager: respuestas del bot en streaming con el LLM multi-proveedor
+chat_manager = ChatConnectionManager(llm_client=llm_manager)
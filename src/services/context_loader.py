@@ -4,18 +4,55 @@ Sistema unificado para cargar y preparar todos los contextos relevantes
 para inyección en prompts de LLM
 """
 
+import asyncio
+import contextlib
 import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
 from datetime import date, datetime, timezone
 from typing import Any
 
+from cachetools import TTLCache
+
 logger = logging.getLogger(__name__)
 
+try:
+    from src.services.metrics import inc_counter, observe_histogram
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+
+@contextlib.contextmanager
+def _session_scope(session: Any | None = None) -> Iterator[Any]:
+    """Reusar la sesión recibida o abrir una propia con get_db_session()"""
+    if session is not None:
+        yield session
+        return
+
+    from src.models.admin_db import get_db_session
+
+    with get_db_session() as own_session:
+        yield own_session
+
 
 class ContextLoader:
     """Carga y gestiona contextos para inyección en prompts"""
 
-    def __init__(self) -> None:
-        self.cache: dict[str, Any] = {}
+    def __init__(self, cache_ttl_seconds: float | None = None, cache_max_entries: int | None = None) -> None:
+        ttl = cache_ttl_seconds if cache_ttl_seconds is not None else float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "60"))
+        max_entries = (
+            cache_max_entries if cache_max_entries is not None else int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "2000"))
+        )
+        self.cache_enabled = ttl > 0
+        # Sección de prompt ya renderizada por (chat_id, user_id)
+        self.cache: TTLCache = TTLCache(maxsize=max(1, max_entries), ttl=max(1.0, ttl))
+        self._cache_lock = threading.Lock()
+        # Se incrementa en cada invalidación: una carga iniciada antes no se cachea
+        self._generation = 0
 
     def load_all_contexts(self, chat_id: str, user_id: str | None = None) -> dict[str, Any]:
         """
@@ -47,13 +84,83 @@ class ContextLoader:
 
         return contexts
 
-    def load_daily_context(self) -> dict[str, Any] | None:
+    def load_all_contexts_single_session(self, chat_id: str, user_id: str | None = None) -> dict[str, Any]:
+        """Igual que load_all_contexts pero con una sola sesión (una conexión del pool)"""
+        user_id = user_id or chat_id
+
+        try:
+            with _session_scope() as session:
+                contexts = {
+                    "chat_id": chat_id,
+                    "user_id": user_id,
+                    "loaded_at": datetime.now(timezone.utc).isoformat(),
+                    "daily_context": self.load_daily_context(session=session),
+                    "user_contexts": self.load_user_contexts(user_id, session=session),
+                    "contact_profile": self.load_contact_profile(chat_id, session=session),
+                    "active_strategy": self.load_active_strategy(chat_id, session=session),
+                    "contact_objective": None,
+                }
+        except Exception as e:
+            logger.warning(f"Error abriendo sesión para contextos: {e}")
+            return self.load_all_contexts(chat_id, user_id)
+
+        if contexts["contact_profile"]:
+            contexts["contact_objective"] = contexts["contact_profile"].get("objective")
+
+        return contexts
+
+    async def get_context_section(self, chat_id: str, user_id: str | None = None) -> str:
+        """
+        Sección de contextos lista para el prompt, sin bloquear el event loop.
+
+        Sirve la sección renderizada desde un TTLCache por chat; en un miss carga los
+        cuatro contextos en un hilo con una única sesión. Las escrituras en el mismo
+        proceso invalidan la entrada; entre procesos la frescura la acota el TTL.
+        """
+        user_id = user_id or chat_id
+        key = (chat_id, user_id)
+
+        if self.cache_enabled:
+            with self._cache_lock:
+                cached = self.cache.get(key)
+                generation = self._generation
+            if cached is not None:
+                if METRICS_AVAILABLE:
+                    inc_counter("context_cache_hits")
+                return cached
+            if METRICS_AVAILABLE:
+                inc_counter("context_cache_misses")
+        else:
+            generation = self._generation
+
+        start = time.perf_counter()
+        contexts = await asyncio.to_thread(self.load_all_contexts_single_session, chat_id, user_id)
+        section = self.build_context_prompt_section(contexts)
+        if METRICS_AVAILABLE:
+            observe_histogram("context_load_seconds", time.perf_counter() - start)
+
+        if self.cache_enabled:
+            with self._cache_lock:
+                if generation == self._generation:
+                    self.cache[key] = section
+        return section
+
+    def invalidate(self, chat_id: str | None = None) -> None:
+        """Descartar la sección cacheada de un chat (o de todos si chat_id es None)"""
+        with self._cache_lock:
+            self._generation += 1
+            if chat_id is None:
+                self.cache.clear()
+                return
+            for key in [key for key in list(self.cache.keys()) if chat_id in key]:
+                self.cache.pop(key, None)
+
+    def load_daily_context(self, session: Any | None = None) -> dict[str, Any] | None:
         """Carga el contexto diario activo"""
         try:
-            from src.models.admin_db import get_db_session
             from src.models.models import DailyContext
 
-            with get_db_session() as session:
+            with _session_scope(session) as session:
                 today = date.today()
 
                 # Buscar contexto más reciente (prioriza el de hoy si existe)
@@ -78,13 +185,12 @@ class ContextLoader:
             logger.warning(f"Error cargando contexto diario: {e}")
             return None
 
-    def load_user_contexts(self, user_id: str) -> list[dict[str, Any]]:
+    def load_user_contexts(self, user_id: str, session: Any | None = None) -> list[dict[str, Any]]:
         """Carga contextos específicos del usuario"""
         try:
-            from src.models.admin_db import get_db_session
             from src.models.models import UserContext
 
-            with get_db_session() as session:
+            with _session_scope(session) as session:
                 contexts = (
                     session.query(UserContext)
                     .filter(UserContext.user_id == user_id)
@@ -110,13 +216,12 @@ class ContextLoader:
             logger.warning(f"Error cargando contextos de usuario: {e}")
             return []
 
-    def load_contact_profile(self, chat_id: str) -> dict[str, Any] | None:
+    def load_contact_profile(self, chat_id: str, session: Any | None = None) -> dict[str, Any] | None:
         """Carga el perfil del contacto con objetivo y contexto inicial"""
         try:
-            from src.models.admin_db import get_db_session
             from src.models.models import ChatProfile, Contact
 
-            with get_db_session() as session:
+            with _session_scope(session) as session:
                 # Intentar ChatProfile primero
                 profile = session.query(ChatProfile).filter(ChatProfile.chat_id == chat_id).first()
 
@@ -146,19 +251,26 @@ class ContextLoader:
             logger.warning(f"Error cargando perfil de contacto: {e}")
             return None
 
-    def load_active_strategy(self, chat_id: str) -> dict[str, Any] | None:
+    def load_active_strategy(self, chat_id: str, session: Any | None = None) -> dict[str, Any] | None:
         """Carga la estrategia activa para el chat"""
         try:
-            from chat_sessions import get_active_strategy
+            from src.models.models import ChatStrategy
 
-            strategy = get_active_strategy(chat_id)
+            with _session_scope(session) as session:
+                strategy = (
+                    session.query(ChatStrategy)
+                    .filter(ChatStrategy.chat_id == chat_id, ChatStrategy.is_active)
+                    .order_by(ChatStrategy.version.desc(), ChatStrategy.created_at.desc())
+                    .first()
+                )
 
-            if strategy:
-                return {
-                    "version": strategy.version,
-                    "strategy_text": strategy.strategy_text,
-                    "activated_at": strategy.activated_at.isoformat() if strategy.activated_at else None,
-                }
+                if strategy:
+                    activated_at = getattr(strategy, "activated_at", None) or strategy.created_at
+                    return {
+                        "version": strategy.version,
+                        "strategy_text": strategy.strategy_text,
+                        "activated_at": activated_at.isoformat() if activated_at else None,
+                    }
 
             return None
 
@@ -0,0 +1,120 @@
+"""
+⏱️ Presupuesto de tiempo (deadline) para el pipeline de respuesta
+Un Deadline nace donde entra el mensaje (webhook, /api/chat, automator) y se
+propaga vía contextvars a cada etapa: carga de contexto, intentos por proveedor
+(timeouts de aiohttp recortados al presupuesto restante), reintentos y humanización.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextvars import ContextVar
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    from src.services.metrics import inc_counter
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Timeout mínimo para una llamada HTTP: ClientTimeout(total=0) desactivaría el timeout
+MIN_STAGE_TIMEOUT_SECONDS = 0.1
+
+_current_deadline: ContextVar["Deadline | None"] = ContextVar("reply_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """El presupuesto de tiempo se agotó en una etapa del pipeline"""
+
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"Deadline agotado en etapa '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    """Presupuesto de tiempo absoluto (reloj monotónico) para responder un mensaje"""
+
+    def __init__(self, budget_seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.budget_seconds = max(0.0, float(budget_seconds))
+        self._clock = clock
+        self.expires_at = clock() + self.budget_seconds
+        self.exceeded_stages: list[str] = []
+
+    @classmethod
+    def from_env(cls, default_seconds: float = 20.0) -> "Deadline":
+        """Presupuesto desde REPLY_DEADLINE_SECONDS (un usuario de WhatsApp abandona a los ~20 s)"""
+        try:
+            budget = float(os.getenv("REPLY_DEADLINE_SECONDS", str(default_seconds)))
+        except ValueError:
+            budget = default_seconds
+        return cls(budget)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float | None = None) -> float:
+        """Timeout para una etapa: el menor entre `cap` y lo que queda del presupuesto"""
+        remaining = self.remaining()
+        if cap is not None:
+            remaining = min(cap, remaining)
+        return max(MIN_STAGE_TIMEOUT_SECONDS, remaining)
+
+    def record_exceeded(self, stage: str) -> None:
+        """Registrar (una vez por etapa) que el presupuesto se agotó en `stage`"""
+        if stage in self.exceeded_stages:
+            return
+        self.exceeded_stages.append(stage)
+        logger.warning("⏱️ Deadline agotado en etapa %s (presupuesto %.1fs)", stage, self.budget_seconds)
+        if METRICS_AVAILABLE:
+            inc_counter("deadline_exceeded")
+            inc_counter(f"deadline_exceeded_{stage}")
+
+    def check(self, stage: str) -> None:
+        """Lanzar DeadlineExceeded si el presupuesto ya se agotó"""
+        if self.expired():
+            self.record_exceeded(stage)
+            raise DeadlineExceeded(stage)
+
+
+def current_deadline() -> Deadline | None:
+    """Deadline activo en el contexto actual (None si el llamador no definió presupuesto)"""
+    return _current_deadline.get()
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Deadline | None) -> Iterator[Deadline | None]:
+    """Activar `deadline` para el bloque; se hereda en tasks y en run_in_threadpool"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+async def run_sync_with_deadline(deadline: Deadline, stage: str, func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Ejecutar una función síncrona en un hilo con `deadline` activo en su contexto.
+
+    Si no termina a tiempo se registra la etapa y se lanza DeadlineExceeded sin esperar
+    al hilo (que termina en segundo plano), para que el llamador responda con el fallback.
+    """
+    with deadline_scope(deadline):
+        context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, functools.partial(context.run, func, *args))
+    try:
+        return await asyncio.wait_for(future, timeout=deadline.timeout())
+    except asyncio.TimeoutError:
+        deadline.record_exceeded(stage)
+        raise DeadlineExceeded(stage) from None
@@ -0,0 +1,273 @@
+"""
+❓ Caché de respuestas frecuentes (FAQ) por pregunta normalizada
+Segundo nivel del caché LLM: la clave es el último mensaje del usuario normalizado
+(casefold, sin tildes ni puntuación) y no el historial completo, así las preguntas
+repetidas de primer turno ("¿cuál es el horario?") se responden sin llamar al
+proveedor. Las variantes cercanas se encuentran con firmas MinHash sobre shingles
+de caracteres (LSH por bandas). Todo queda bajo la versión actual de la
+configuración de negocio: al editarla, las entradas anteriores dejan de usarse.
+La huella del contexto inyectado (perfil, UserContext, estrategia) también forma
+parte del scope: una respuesta personalizada solo se reutiliza con el mismo contexto.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime, timezone
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    from src.services.cache_system import cache_manager
+
+    CACHE_AVAILABLE = True
+except ImportError:
+    CACHE_AVAILABLE = False
+
+try:
+    from src.services.metrics import inc_counter
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+FAQ_KEY_PREFIX = "llm_faq"
+
+# MinHash: NUM_BANDS x ROWS_PER_BAND permutaciones; con 8x4 una similitud de 0.75 es
+# candidata ~95% de las veces y una de 0.3 solo ~6%
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME or 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME,
+    )
+    for i in range(NUM_PERMUTATIONS)
+]
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_question(text: str) -> str:
+    """Casefold, sin tildes, sin puntuación y con espacios colapsados"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    without_accents = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    without_punctuation = _PUNCTUATION_RE.sub(" ", without_accents).replace("_", " ")
+    return _WHITESPACE_RE.sub(" ", without_punctuation).strip()
+
+
+def _shingles(normalized: str) -> set[str]:
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i : i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(normalized: str) -> list[int]:
+    """Firma MinHash de los shingles de caracteres del texto normalizado"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in _shingles(normalized)
+    ]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def signature_similarity(left: list[int], right: list[int]) -> float:
+    """Estimación de similitud de Jaccard entre dos firmas"""
+    if not left or len(left) != len(right):
+        return 0.0
+    return sum(1 for a, b in zip(left, right, strict=True) if a == b) / len(left)
+
+
+def _band_hashes(signature: list[int]) -> list[str]:
+    bands = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+        bands.append(hashlib.blake2b(",".join(map(str, rows)).encode(), digest_size=8).hexdigest())
+    return bands
+
+
+def _current_config_version() -> str:
+    try:
+        from src.services.business_config_manager import business_config
+
+        return business_config.config_version()
+    except Exception as e:
+        logger.debug("Versión de configuración no disponible: %s", e)
+        return "default"
+
+
+class FAQResponseCache:
+    """
+    Caché de respuestas por pregunta normalizada, con búsqueda de casi-duplicados.
+
+    Solo aplica a turnos con historial corto (primeros mensajes de la conversación) y
+    preguntas cortas. Cada entrada guarda su propio TTL; las bandas LSH apuntan a la
+    entrada y se verifican con la firma completa y los números de la pregunta.
+    """
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        ttl_seconds: int | None = None,
+        max_history_messages: int | None = None,
+        max_question_chars: int | None = None,
+        similarity_threshold: float | None = None,
+    ) -> None:
+        self.enabled = enabled if enabled is not None else os.getenv("LLM_FAQ_CACHE_ENABLED", "true").lower() == "true"
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("LLM_FAQ_CACHE_TTL_SECONDS", "21600"))
+        self.max_history_messages = (
+            max_history_messages
+            if max_history_messages is not None
+            else int(os.getenv("LLM_FAQ_CACHE_MAX_HISTORY_MESSAGES", "2"))
+        )
+        self.max_question_chars = (
+            max_question_chars if max_question_chars is not None else int(os.getenv("LLM_FAQ_CACHE_MAX_QUESTION_CHARS", "200"))
+        )
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None else float(os.getenv("LLM_FAQ_CACHE_SIMILARITY", "0.8"))
+        )
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def question_for(self, messages: list[dict[str, str]]) -> str | None:
+        """Pregunta normalizada si el turno es elegible (historial corto, pregunta corta)"""
+        if not self.enabled or not CACHE_AVAILABLE or not messages:
+            return None
+        last = messages[-1]
+        if last.get("role") != "user":
+            return None
+        conversation = [msg for msg in messages if msg.get("role") != "system"]
+        if len(conversation) > self.max_history_messages:
+            return None
+        text = str(last.get("content") or "")
+        if not text or len(text) > self.max_question_chars:
+            return None
+        normalized = normalize_question(text)
+        return normalized or None
+
+    def _scope(self, use_case: str, context: str = "") -> str:
+        scope = f"{FAQ_KEY_PREFIX}:{_current_config_version()}:{use_case}"
+        return f"{scope}:{context}" if context else scope
+
+    @staticmethod
+    def _entry_id(normalized: str) -> str:
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+    async def lookup(self, normalized: str, use_case: str = "normal", context: str = "") -> dict[str, Any] | None:
+        """Entrada exacta o casi-duplicada para la pregunta normalizada (con la misma huella de contexto)"""
+        scope = self._scope(use_case, context)
+        try:
+            # Una ida y vuelta para la entrada exacta y las bandas LSH; otra para los candidatos
+            signature = minhash_signature(normalized)
+            numbers = _NUMBER_RE.findall(normalized)
+            exact_key = f"{scope}:entry:{self._entry_id(normalized)}"
+            band_keys = [f"{scope}:band:{i}:{band}" for i, band in enumerate(_band_hashes(signature))]
+            found = await cache_manager.get_many([exact_key, *band_keys])
+
+            entry = found.get(exact_key)
+            if self._is_live(entry):
+                self._record("hits")
+                return {**entry, "match": "exact", "similarity": 1.0}
+
+            candidate_keys = [
+                f"{scope}:entry:{entry_id}" for entry_id in dict.fromkeys(found.get(k) for k in band_keys) if entry_id
+            ]
+            candidates = await cache_manager.get_many(candidate_keys)
+            best: dict[str, Any] | None = None
+            best_similarity = 0.0
+            for entry in candidates.values():
+                if not self._is_live(entry) or entry.get("numbers", []) != numbers:
+                    continue
+                similarity = signature_similarity(signature, entry.get("signature", []))
+                if similarity >= self.similarity_threshold and similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+            if best is not None:
+                self._record("near_hits")
+                return {**best, "match": "near", "similarity": round(best_similarity, 3)}
+        except Exception as e:
+            logger.debug("Error consultando caché FAQ: %s", e)
+
+        self._record("misses")
+        return None
+
+    @staticmethod
+    def _is_live(entry: dict[str, Any] | None) -> bool:
+        return bool(entry and entry.get("response") and float(entry.get("expires_at", 0)) > time.time())
+
+    async def store(
+        self,
+        normalized: str,
+        response: str,
+        provider: str,
+        use_case: str = "normal",
+        ttl_seconds: int | None = None,
+        context: str = "",
+    ) -> bool:
+        """Guardar una respuesta (y sus bandas LSH) con TTL propio bajo la huella de contexto"""
+        if not response:
+            return False
+        scope = self._scope(use_case, context)
+        ttl = int(ttl_seconds or self.ttl_seconds)
+        entry_id = self._entry_id(normalized)
+        signature = minhash_signature(normalized)
+        entry = {
+            "question": normalized,
+            "response": response,
+            "provider": provider,
+            "signature": signature,
+            "numbers": _NUMBER_RE.findall(normalized),
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            # El caché en memoria usa un TTL global: el vencimiento propio se valida al leer
+            "expires_at": time.time() + ttl,
+        }
+        try:
+            items: dict[str, Any] = {f"{scope}:entry:{entry_id}": entry}
+            for i, band in enumerate(_band_hashes(signature)):
+                items[f"{scope}:band:{i}:{band}"] = entry_id
+            stored = await cache_manager.set_many(items, ttl)
+        except Exception as e:
+            logger.debug("Error guardando en caché FAQ: %s", e)
+            return False
+        if stored:
+            self.stores += 1
+            if METRICS_AVAILABLE:
+                inc_counter("llm_faq_cache_stores")
+        return bool(stored)
+
+    async def purge(self, all_versions: bool = True) -> int:
+        """Borrar entradas FAQ (todas las versiones o solo la actual)"""
+        pattern = f"{FAQ_KEY_PREFIX}:*" if all_versions else f"{FAQ_KEY_PREFIX}:{_current_config_version()}:*"
+        deleted = await cache_manager.clear_pattern(pattern)
+        logger.info("🧹 Caché FAQ purgado: %d claves", deleted)
+        return deleted
+
+    def _record(self, outcome: str) -> None:
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        if METRICS_AVAILABLE:
+            inc_counter(f"llm_faq_cache_{outcome}")
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "config_version": _current_config_version(),
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0,
+        }
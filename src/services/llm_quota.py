@@ -0,0 +1,254 @@
+"""
+🪣 Gobernador de cuotas por proveedor/modelo LLM
+Token buckets de RPM/RPD en el cliente para no gastar llamadas (y segundos de
+backoff) contra proveedores sin presupuesto. Compartido entre procesos vía Redis
+(script Lua atómico) con fallback en memoria; respeta los `Retry-After` recibidos.
+"""
+
+import logging
+import math
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Ventanas soportadas: nombre -> segundos
+QUOTA_WINDOWS = {"rpm": 60.0, "rpd": 86400.0}
+
+# KEYS[1] = clave de bloqueo (Retry-After), KEYS[2..] = buckets
+# ARGV[1] = ahora (ms), ARGV[2i], ARGV[2i+1] = capacidad y recarga (tokens/ms) del bucket i
+# Retorna {1, restantes...} si se concede o {0, espera_ms}
+_BUCKET_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local blocked = tonumber(redis.call('get', KEYS[1]) or '0')
+if blocked > now then
+    return {0, blocked - now}
+end
+local tokens = {}
+local wait = 0
+for i = 2, #KEYS do
+    local capacity = tonumber(ARGV[2 * (i - 1)])
+    local rate = tonumber(ARGV[2 * (i - 1) + 1])
+    local state = redis.call('hmget', KEYS[i], 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    current = math.min(capacity, current + math.max(0, now - ts) * rate)
+    tokens[i] = current
+    if current < 1 then
+        wait = math.max(wait, math.ceil((1 - current) / rate))
+    end
+end
+if wait > 0 then
+    return {0, wait}
+end
+local result = {1}
+for i = 2, #KEYS do
+    local capacity = tonumber(ARGV[2 * (i - 1)])
+    local rate = tonumber(ARGV[2 * (i - 1) + 1])
+    redis.call('hset', KEYS[i], 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('pexpire', KEYS[i], math.ceil(capacity / rate) + 1000)
+    table.insert(result, math.floor(tokens[i] - 1))
+end
+return result
+"""
+
+
+class QuotaExceededException(Exception):
+    """El proveedor no tiene presupuesto disponible (bucket vacío o Retry-After vigente)"""
+
+    def __init__(self, message: str, retry_after: float = 0.0) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Any) -> float | None:
+    """Interpretar un header Retry-After (segundos o fecha HTTP). None si no es válido"""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class TokenBucket:
+    """Bucket local: capacidad = límite de la ventana, recarga continua"""
+
+    capacity: float
+    refill_per_second: float
+    tokens: float
+    updated_at: float
+
+    def refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def seconds_until_available(self) -> float:
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+
+class QuotaGovernor:
+    """
+    Token buckets por (proveedor, modelo, ventana).
+
+    acquire() consume un token de cada ventana configurada o lanza
+    QuotaExceededException con los segundos hasta que haya presupuesto.
+    block() registra un Retry-After del proveedor. Con cliente Redis ambos se
+    comparten entre workers; si Redis falla se usa el estado en memoria.
+    """
+
+    def __init__(
+        self,
+        redis_enabled: bool | None = None,
+        key_prefix: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.redis_enabled = (
+            redis_enabled if redis_enabled is not None else os.getenv("LLM_QUOTA_REDIS_ENABLED", "true").lower() == "true"
+        )
+        self.key_prefix = key_prefix or f"{os.getenv('CACHE_PREFIX', 'chatbot:')}llm_quota:"
+        self._clock = clock
+        self._buckets: dict[str, TokenBucket] = {}
+        self._blocked_until: dict[str, float] = {}
+
+    @staticmethod
+    def _limits(rpm_limit: int | None, rpd_limit: int | None) -> list[tuple[str, int]]:
+        limits = {"rpm": rpm_limit, "rpd": rpd_limit}
+        return [(window, int(limit)) for window, limit in limits.items() if limit and limit > 0]
+
+    def _scope(self, provider: str, model: str) -> str:
+        return f"{provider}:{model}"
+
+    def _bucket(self, scope: str, window: str, limit: int, now: float) -> TokenBucket:
+        key = f"{scope}:{window}"
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.capacity != limit:
+            bucket = TokenBucket(
+                capacity=float(limit),
+                refill_per_second=limit / QUOTA_WINDOWS[window],
+                tokens=float(limit),
+                updated_at=now,
+            )
+            self._buckets[key] = bucket
+        return bucket
+
+    async def acquire(
+        self,
+        provider: str,
+        model: str,
+        rpm_limit: int | None = None,
+        rpd_limit: int | None = None,
+        redis_client: Any | None = None,
+    ) -> None:
+        """Consumir una petición del presupuesto o lanzar QuotaExceededException"""
+        scope = self._scope(provider, model)
+        limits = self._limits(rpm_limit, rpd_limit)
+
+        if redis_client is not None and self.redis_enabled:
+            try:
+                await self._acquire_redis(redis_client, scope, limits)
+                return
+            except QuotaExceededException:
+                raise
+            except Exception as e:
+                logger.debug("Cuotas LLM en Redis no disponibles (%s); usando memoria", e)
+
+        self._acquire_memory(scope, limits)
+
+    def _acquire_memory(self, scope: str, limits: list[tuple[str, int]]) -> None:
+        now = self._clock()
+        blocked_for = self._blocked_until.get(scope, 0.0) - now
+        if blocked_for > 0:
+            raise QuotaExceededException(f"Retry-After vigente para {scope}", retry_after=blocked_for)
+
+        buckets = [self._bucket(scope, window, limit, now) for window, limit in limits]
+        for bucket in buckets:
+            bucket.refill(now)
+        wait = max((bucket.seconds_until_available() for bucket in buckets), default=0.0)
+        if wait > 0:
+            raise QuotaExceededException(f"Cuota agotada para {scope}", retry_after=wait)
+        for bucket in buckets:
+            bucket.tokens -= 1
+
+    async def _acquire_redis(self, redis_client: Any, scope: str, limits: list[tuple[str, int]]) -> None:
+        now = self._clock()
+        keys = [f"{self.key_prefix}{scope}:blocked"] + [f"{self.key_prefix}{scope}:{w}" for w, _ in limits]
+        args: list[Any] = [int(now * 1000)]
+        for window, limit in limits:
+            args.extend([limit, repr(limit / (QUOTA_WINDOWS[window] * 1000))])
+
+        result = await redis_client.eval(_BUCKET_ACQUIRE_SCRIPT, len(keys), *keys, *args)
+        if not int(result[0]):
+            raise QuotaExceededException(f"Cuota agotada para {scope}", retry_after=int(result[1]) / 1000)
+
+        # Espejo local del presupuesto restante (para snapshot() sin ida y vuelta a Redis)
+        for (window, limit), remaining in zip(limits, result[1:], strict=False):
+            bucket = self._bucket(scope, window, limit, now)
+            bucket.tokens = float(remaining)
+            bucket.updated_at = now
+
+    async def block(
+        self,
+        provider: str,
+        model: str,
+        retry_after_seconds: float,
+        redis_client: Any | None = None,
+    ) -> None:
+        """Registrar un Retry-After: el proveedor queda sin presupuesto hasta que expire"""
+        if retry_after_seconds <= 0:
+            return
+        scope = self._scope(provider, model)
+        until = self._clock() + retry_after_seconds
+        self._blocked_until[scope] = max(self._blocked_until.get(scope, 0.0), until)
+        logger.info("⏳ %s bloqueado %.1fs por Retry-After", scope, retry_after_seconds)
+
+        if redis_client is not None and self.redis_enabled:
+            try:
+                await redis_client.set(
+                    f"{self.key_prefix}{scope}:blocked",
+                    str(int(until * 1000)),
+                    px=max(1, math.ceil(retry_after_seconds * 1000)),
+                )
+            except Exception as e:
+                logger.debug("No se pudo compartir Retry-After en Redis: %s", e)
+
+    def snapshot(
+        self,
+        provider: str,
+        model: str,
+        rpm_limit: int | None = None,
+        rpd_limit: int | None = None,
+    ) -> dict[str, Any]:
+        """Presupuesto restante conocido por este proceso (sin consumir)"""
+        scope = self._scope(provider, model)
+        now = self._clock()
+        snapshot: dict[str, Any] = {
+            "blocked_for_seconds": round(max(0.0, self._blocked_until.get(scope, 0.0) - now), 1),
+        }
+        for window, limit in self._limits(rpm_limit, rpd_limit):
+            bucket = self._bucket(scope, window, limit, now)
+            bucket.refill(now)
+            snapshot[f"{window}_limit"] = limit
+            snapshot[f"{window}_remaining"] = int(bucket.tokens)
+        return snapshot
+
+    def reset(self) -> None:
+        self._buckets.clear()
+        self._blocked_until.clear()
@@ -0,0 +1,132 @@
+"""
+🧭 Enrutamiento adaptativo de proveedores LLM
+Mantiene latencia, tasa de éxito y tasa de 429 (EWMA) por proveedor y reordena
+las listas de fallback según el tiempo esperado hasta obtener una respuesta.
+"""
+
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProviderHealth:
+    """Estado observado de un proveedor (medias móviles exponenciales)"""
+
+    ewma_latency: float
+    success_rate: float = 1.0
+    rate_limit_rate: float = 0.0
+    samples: int = 0
+    last_updated: float = field(default_factory=time.monotonic)
+
+
+class ProviderRouter:
+    """
+    Router adaptativo: score = latencia esperada × penalización por fallos × peso de coste.
+
+    - Latencia esperada: EWMA de la latencia observada.
+    - Probabilidad de fallo: 1 - EWMA de éxito, más la EWMA de respuestas 429.
+    - Proveedores de pago (no is_free) se multiplican por (1 + cost_weight), solo una vez
+      que tienen observaciones: sin muestras el score es el prior y se conserva el orden estático.
+    - Sin observaciones recientes, las estadísticas vuelven gradualmente al prior para
+      que un proveedor degradado pueda recuperar su posición.
+
+    A igualdad de score se respeta el orden estático (AI_FALLBACK_ORDER).
+    """
+
+    def __init__(
+        self,
+        alpha: float | None = None,
+        prior_latency_seconds: float | None = None,
+        failure_penalty: float | None = None,
+        cost_weight: float | None = None,
+        recovery_half_life_seconds: float | None = None,
+    ) -> None:
+        self.alpha = alpha if alpha is not None else float(os.getenv("LLM_ROUTING_EWMA_ALPHA", "0.3"))
+        self.prior_latency_seconds = (
+            prior_latency_seconds
+            if prior_latency_seconds is not None
+            else float(os.getenv("LLM_ROUTING_PRIOR_LATENCY_SECONDS", "2.0"))
+        )
+        self.failure_penalty = (
+            failure_penalty if failure_penalty is not None else float(os.getenv("LLM_ROUTING_FAILURE_PENALTY", "4.0"))
+        )
+        self.cost_weight = cost_weight if cost_weight is not None else float(os.getenv("LLM_ROUTING_COST_WEIGHT", "0.25"))
+        self.recovery_half_life_seconds = (
+            recovery_half_life_seconds
+            if recovery_half_life_seconds is not None
+            else float(os.getenv("LLM_ROUTING_RECOVERY_HALF_LIFE_SECONDS", "300"))
+        )
+        self._health: dict[str, ProviderHealth] = {}
+
+    def record_outcome(self, provider: str, latency_seconds: float, success: bool, rate_limited: bool = False) -> None:
+        """Actualizar las EWMA de un proveedor con el resultado de una llamada"""
+        health = self._current_health(provider)
+        alpha = self.alpha
+        health.ewma_latency = (1 - alpha) * health.ewma_latency + alpha * max(0.0, latency_seconds)
+        health.success_rate = (1 - alpha) * health.success_rate + alpha * (1.0 if success else 0.0)
+        health.rate_limit_rate = (1 - alpha) * health.rate_limit_rate + alpha * (1.0 if rate_limited else 0.0)
+        health.samples += 1
+        health.last_updated = time.monotonic()
+        self._health[provider] = health
+
+    def score(self, provider: str, is_free: bool = True) -> float:
+        """Costo esperado (menor es mejor)"""
+        health = self._current_health(provider)
+        failure_probability = min(1.0, (1.0 - health.success_rate) + health.rate_limit_rate)
+        expected = health.ewma_latency * (1.0 + self.failure_penalty * failure_probability)
+        if not is_free and health.samples:
+            expected *= 1.0 + self.cost_weight
+        return expected
+
+    def rank(self, providers: list[Any], is_free: dict[Any, bool] | None = None) -> list[Any]:
+        """Reordenar proveedores (enum o str) por score; orden estable respecto a la lista original"""
+        is_free = is_free or {}
+        return sorted(
+            providers,
+            key=lambda provider: self.score(getattr(provider, "value", provider), is_free.get(provider, True)),
+        )
+
+    def snapshot(self, provider: str, is_free: bool = True) -> dict[str, Any]:
+        """Estado actual de un proveedor para UI/observabilidad"""
+        health = self._current_health(provider)
+        return {
+            "ewma_latency_ms": round(health.ewma_latency * 1000, 1),
+            "success_rate": round(health.success_rate, 4),
+            "rate_limit_rate": round(health.rate_limit_rate, 4),
+            "samples": health.samples,
+            "score": round(self.score(provider, is_free), 4),
+        }
+
+    def reset(self) -> None:
+        self._health.clear()
+
+    def _current_health(self, provider: str) -> ProviderHealth:
+        """Estadísticas con decaimiento hacia el prior según el tiempo sin observaciones"""
+        stored = self._health.get(provider)
+        if stored is None:
+            return ProviderHealth(ewma_latency=self.prior_latency_seconds)
+
+        idle = max(0.0, time.monotonic() - stored.last_updated)
+        if self.recovery_half_life_seconds <= 0 or idle <= 0:
+            return ProviderHealth(
+                ewma_latency=stored.ewma_latency,
+                success_rate=stored.success_rate,
+                rate_limit_rate=stored.rate_limit_rate,
+                samples=stored.samples,
+                last_updated=stored.last_updated,
+            )
+
+        keep = math.pow(0.5, idle / self.recovery_half_life_seconds)
+        return ProviderHealth(
+            ewma_latency=keep * stored.ewma_latency + (1 - keep) * self.prior_latency_seconds,
+            success_rate=keep * stored.success_rate + (1 - keep) * 1.0,
+            rate_limit_rate=keep * stored.rate_limit_rate,
+            samples=stored.samples,
+            last_updated=stored.last_updated,
+        )
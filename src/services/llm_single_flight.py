@@ -0,0 +1,167 @@
+"""
+🛬 Single-flight para prompts LLM idénticos
+Coalesce llamadas concurrentes con el mismo prompt_hash: la primera ejecuta la
+llamada real y las demás esperan su resultado (en proceso y, opcionalmente,
+entre workers mediante un lock Redis SET NX PX).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Libera el lock solo si sigue perteneciendo a quien lo adquirió
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Tabla de llamadas en curso indexada por clave.
+
+    - En proceso: los duplicados esperan el Future del líder (asyncio.shield, para que
+      cancelar a un seguidor no cancele la llamada del líder).
+    - Entre workers: el líder toma un lock Redis; los demás workers sondean el resultado
+      publicado con TTL corto hasta que aparece o el lock desaparece/expira.
+
+    run() devuelve (resultado, origen) donde origen es None si esta llamada ejecutó
+    la factory, "local" o "redis" si el resultado se reutilizó.
+    """
+
+    def __init__(
+        self,
+        redis_enabled: bool | None = None,
+        lock_ttl_seconds: float | None = None,
+        result_ttl_seconds: float | None = None,
+        poll_interval_seconds: float | None = None,
+        key_prefix: str | None = None,
+    ) -> None:
+        self.redis_enabled = (
+            redis_enabled
+            if redis_enabled is not None
+            else os.getenv("LLM_SINGLE_FLIGHT_REDIS_ENABLED", "true").lower() == "true"
+        )
+        self.lock_ttl_seconds = (
+            lock_ttl_seconds if lock_ttl_seconds is not None else float(os.getenv("LLM_SINGLE_FLIGHT_LOCK_TTL_SECONDS", "60"))
+        )
+        self.result_ttl_seconds = (
+            result_ttl_seconds
+            if result_ttl_seconds is not None
+            else float(os.getenv("LLM_SINGLE_FLIGHT_RESULT_TTL_SECONDS", "10"))
+        )
+        self.poll_interval_seconds = (
+            poll_interval_seconds
+            if poll_interval_seconds is not None
+            else float(os.getenv("LLM_SINGLE_FLIGHT_POLL_INTERVAL_SECONDS", "0.1"))
+        )
+        self.key_prefix = key_prefix or f"{os.getenv('CACHE_PREFIX', 'chatbot:')}llm_singleflight:"
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        redis_client: Any | None = None,
+    ) -> tuple[Any, str | None]:
+        """Ejecutar factory una sola vez por clave entre las llamadas concurrentes"""
+        existing = self._inflight.get(key)
+        if existing is not None:
+            try:
+                return await asyncio.shield(existing), "local"
+            except asyncio.CancelledError:
+                # Si el líder fue cancelado, este seguidor ejecuta su propia llamada
+                if not existing.cancelled():
+                    raise
+                return await self.run(key, factory, redis_client)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result, source = await self._run_leader(key, factory, redis_client)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Marcar la excepción como recuperada aunque no haya seguidores
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, source
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _run_leader(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        redis_client: Any | None,
+    ) -> tuple[Any, str | None]:
+        if redis_client is None or not self.redis_enabled:
+            return await factory(), None
+
+        lock_key = f"{self.key_prefix}lock:{key}"
+        result_key = f"{self.key_prefix}result:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl_seconds * 1000))
+        except Exception as e:
+            logger.debug("Single-flight Redis no disponible (%s); llamada local", e)
+            return await factory(), None
+
+        if acquired:
+            try:
+                result = await factory()
+                try:
+                    await redis_client.set(
+                        result_key,
+                        json.dumps(result, ensure_ascii=False, default=str),
+                        px=int(self.result_ttl_seconds * 1000),
+                    )
+                except Exception as e:
+                    logger.debug("No se pudo publicar resultado single-flight: %s", e)
+                return result, None
+            finally:
+                try:
+                    await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.debug("No se pudo liberar lock single-flight: %s", e)
+
+        shared = await self._wait_for_remote_result(redis_client, lock_key, result_key)
+        if shared is not None:
+            return shared, "redis"
+        return await factory(), None
+
+    async def _wait_for_remote_result(self, redis_client: Any, lock_key: str, result_key: str) -> Any | None:
+        """Sondear el resultado publicado por el worker que tiene el lock"""
+        deadline = time.monotonic() + self.lock_ttl_seconds
+        try:
+            while time.monotonic() < deadline:
+                raw = await redis_client.get(result_key)
+                if raw is not None:
+                    return json.loads(raw)
+                if not await redis_client.exists(lock_key):
+                    # El líder terminó (o falló) entre las dos lecturas
+                    raw = await redis_client.get(result_key)
+                    return json.loads(raw) if raw is not None else None
+                await asyncio.sleep(self.poll_interval_seconds)
+        except Exception as e:
+            logger.debug("Error esperando resultado single-flight: %s", e)
+        return None
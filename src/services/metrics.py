@@ -25,9 +25,27 @@ _start_time = time.monotonic()
 # Canonical metric keys (Phase 6 observability baseline)
 _counters["http_requests"] = 0
 _counters["llm_requests"] = 0
+_counters["llm_coalesced_requests"] = 0
+_counters["deadline_exceeded"] = 0
+_counters["context_cache_hits"] = 0
+_counters["context_cache_misses"] = 0
+_counters["llm_prompt_tokens_saved"] = 0
+_counters["llm_faq_cache_hits"] = 0
+_counters["llm_faq_cache_near_hits"] = 0
+_counters["llm_faq_cache_misses"] = 0
+_counters["scheduler_messages_dispatched"] = 0
+_counters["audience_rows_imported"] = 0
 _histograms["http_request_duration_seconds"] = []
 _histograms["llm_response_time"] = []
+_histograms["llm_time_to_first_token_seconds"] = []
+_histograms["llm_stream_tokens_per_second"] = []
+_histograms["context_load_seconds"] = []
+_histograms["llm_prompt_tokens_estimated"] = []
+_histograms["queue_enqueue_to_claim_seconds"] = []
+_histograms["scheduler_dispatch_lateness_seconds"] = []
+_histograms["send_governor_hold_seconds"] = []
 _gauges["active_ws_connections"] = 0.0
+_gauges["scheduler_dispatch_rate_per_second"] = 0.0
 
 # Maximum histogram samples to keep per metric (sliding window)
 _MAX_HISTOGRAM_SAMPLES = 1000
@@ -9,13 +9,23 @@ import hashlib
 import json
 import logging
 import os
-from contextlib import asynccontextmanager
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from enum import Enum
 from typing import Any
 
 import aiohttp
 
+from src.services.deadline import Deadline, current_deadline, deadline_scope
+from src.services.llm_faq_cache import FAQResponseCache
+from src.services.llm_quota import QuotaExceededException, QuotaGovernor, parse_retry_after
+from src.services.llm_routing import ProviderRouter
+from src.services.llm_single_flight import SingleFlight
+from src.services.token_budget import TokenBudgetManager, provider_family
+
 logger = logging.getLogger(__name__)
 
 # Importar sistema de humanización
@@ -38,7 +48,7 @@ except ImportError:
     CONTEXT_LOADER_AVAILABLE = False
 
 try:
-    from src.services.cache_system import cache_llm_response, get_cached_llm_response
+    from src.services.cache_system import cache_llm_response, cache_manager, get_cached_llm_responses
 
     CACHE_AVAILABLE = True
 except ImportError:
@@ -51,6 +61,10 @@ try:
 except ImportError:
     CIRCUIT_BREAKER_AVAILABLE = False
 
+    class CircuitBreakerOpenException(Exception):  # type: ignore[no-redef]
+        """Placeholder cuando el sistema de protección no está disponible"""
+
+
 try:
     from src.services.metrics import inc_counter, observe_histogram
 
@@ -59,6 +73,31 @@ except ImportError:
     METRICS_AVAILABLE = False
 
 
+def _env_quota_limit(name: str, default: int | None) -> int | None:
+    """Límite de cuota desde env; vacío o 0 desactiva el límite"""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        logger.warning("Valor inválido para %s: %s", name, raw)
+        return default
+    return value if value > 0 else None
+
+
+# Proveedor cuya cuota paga cada reintento HTTP de la llamada en curso (ver _retry_backoff)
+_attempt_quota_provider: ContextVar["LLMProvider | None"] = ContextVar("llm_attempt_quota_provider", default=None)
+
+
+class LLMStreamError(Exception):
+    """Error de un proveedor durante una respuesta en streaming"""
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class LLMProvider(Enum):
     GEMINI = "gemini"
     OPENAI = "openai"
@@ -81,6 +120,8 @@ class APIConfig:
     temperature: float = 0.7
     is_reasoning: bool = False  # Para distinguir modelos de razonamiento
     is_free: bool = False  # Para identificar modelos gratuitos
+    rpm_limit: int | None = None  # Cuota cliente: peticiones por minuto (None = sin límite)
+    rpd_limit: int | None = None  # Cuota cliente: peticiones por día (None = sin límite)
 
 
 class MultiProviderLLM:
@@ -92,6 +133,24 @@ class MultiProviderLLM:
         self.retry_base_delay_seconds = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
         self.cache_enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
         self.cache_ttl_seconds = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+        # Hedging (opt-in): lanzar el siguiente proveedor en paralelo si el primario tarda demasiado
+        self.hedging_enabled = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+        self.hedge_delay_seconds = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "3.0"))
+        self.hedge_use_p95 = os.getenv("LLM_HEDGE_USE_P95", "true").lower() == "true"
+        self._provider_latencies: dict[str, deque[float]] = {}
+        # Enrutamiento adaptativo: reordena el fallback según latencia/errores observados
+        self.adaptive_routing_enabled = os.getenv("LLM_ADAPTIVE_ROUTING_ENABLED", "true").lower() == "true"
+        self.router = ProviderRouter()
+        # Single-flight: prompts idénticos concurrentes comparten una sola llamada al proveedor
+        self.single_flight_enabled = os.getenv("LLM_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+        self.single_flight = SingleFlight()
+        # Gobernador de cuotas RPM/RPD: saltar proveedores sin presupuesto sin llamada de red
+        self.quota_enabled = os.getenv("LLM_QUOTA_GOVERNOR_ENABLED", "true").lower() == "true"
+        self.quota = QuotaGovernor()
+        # Presupuesto de tokens: últimos turnos literales + resumen incremental de los anteriores
+        self.token_budget = TokenBudgetManager()
+        # Caché FAQ: preguntas de primer turno por texto normalizado y versión de configuración
+        self.faq_cache = FAQResponseCache()
         self.load_configurations()
 
     def load_configurations(self) -> None:
@@ -106,6 +165,8 @@ class MultiProviderLLM:
                 model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"),
                 is_reasoning=False,
                 is_free=True,  # 15 RPM gratuitas
+                rpm_limit=_env_quota_limit("GEMINI_RPM_LIMIT", 15),
+                rpd_limit=_env_quota_limit("GEMINI_RPD_LIMIT", None),
             )
 
         # xAI Grok (Excelente para razonamiento y análisis crítico)
@@ -117,6 +178,8 @@ class MultiProviderLLM:
                 model=os.getenv("XAI_MODEL", "grok-4-1-fast"),
                 is_reasoning=True,  # Excelente para razonamiento
                 is_free=True,  # Límites generosos en beta
+                rpm_limit=_env_quota_limit("XAI_RPM_LIMIT", None),
+                rpd_limit=_env_quota_limit("XAI_RPD_LIMIT", None),
             )
 
         # OpenAI (Mejor calidad general, pero más caro)
@@ -128,6 +191,8 @@ class MultiProviderLLM:
                 model=os.getenv("OPENAI_MODEL", "gpt-5.4-mini"),
                 is_reasoning=True,  # GPT-4 es bueno para razonamiento
                 is_free=False,  # Pago después del crédito inicial
+                rpm_limit=_env_quota_limit("OPENAI_RPM_LIMIT", None),
+                rpd_limit=_env_quota_limit("OPENAI_RPD_LIMIT", None),
             )
 
         # Claude (Excelente para análisis profundo)
@@ -139,17 +204,24 @@ class MultiProviderLLM:
                 model=os.getenv("CLAUDE_MODEL", "claude-haiku-4-5-20251001"),
                 is_reasoning=True,
                 is_free=False,
+                rpm_limit=_env_quota_limit("CLAUDE_RPM_LIMIT", None),
+                rpd_limit=_env_quota_limit("CLAUDE_RPD_LIMIT", None),
             )
 
         # OpenRouter (gateway a 300+ modelos, 29 modelos gratuitos con rate limit 200 req/día)
         if os.getenv("OPENROUTER_API_KEY"):
+            openrouter_model = os.getenv("OPENROUTER_MODEL", "google/gemini-2.5-flash-lite:free")
+            openrouter_free_model = openrouter_model.endswith(":free")
             self.providers[LLMProvider.OPENROUTER] = APIConfig(
                 name="OpenRouter",
                 api_key=os.getenv("OPENROUTER_API_KEY"),
                 base_url="https://openrouter.ai/api/v1",
-                model=os.getenv("OPENROUTER_MODEL", "google/gemini-2.5-flash-lite:free"),
+                model=openrouter_model,
                 is_reasoning=False,
                 is_free=True,  # Tier gratuito disponible (límite 200 req/día)
+                # Los modelos :free tienen 20 RPM y 200 req/día
+                rpm_limit=_env_quota_limit("OPENROUTER_RPM_LIMIT", 20 if openrouter_free_model else None),
+                rpd_limit=_env_quota_limit("OPENROUTER_RPD_LIMIT", 200 if openrouter_free_model else None),
             )
 
         # Proveedores locales: se registran sin hacer I/O durante import/init.
@@ -302,15 +374,20 @@ class MultiProviderLLM:
             logger.info("✅ %s: %s", config.name, ", ".join(capabilities) if capabilities else "Estándar")
 
     def get_fallback_order(self, use_case: str = "normal", free_only: bool = False) -> list[LLMProvider]:
-        """Retorna el orden de fallback según el caso de uso"""
+        """Retorna el orden de fallback según el caso de uso (reordenado por el router adaptativo)"""
 
         if free_only or os.getenv("ENABLE_FREE_MODELS_FALLBACK", "false").lower() == "true":
-            return self.free_only_fallback
-        if use_case == "reasoning":
-            return self.reasoning_fallback
-        return self.normal_fallback
+            base_order = self.free_only_fallback
+        elif use_case == "reasoning":
+            base_order = self.reasoning_fallback
+        else:
+            base_order = self.normal_fallback
 
-    def _inject_contexts_into_messages(self, messages: list[dict[str, str]], chat_id: str) -> list[dict[str, str]]:
+        if not self.adaptive_routing_enabled:
+            return base_order
+        return self.router.rank(base_order, {p: self.providers[p].is_free for p in base_order})
+
+    async def _inject_contexts_into_messages(self, messages: list[dict[str, str]], chat_id: str) -> list[dict[str, str]]:
         """
         Carga e inyecta contextos relevantes en los mensajes
         Incluye: DailyContext, UserContext, objetivos, perfil, estrategia
@@ -319,11 +396,18 @@ class MultiProviderLLM:
             return messages
 
         try:
-            # Cargar todos los contextos
-            contexts = context_loader.load_all_contexts(chat_id)
-
-            # Construir sección de contexto
-            context_section = context_loader.build_context_prompt_section(contexts)
+            # Sección renderizada (cache por chat; la carga de DB corre fuera del event loop)
+            deadline = current_deadline()
+            if deadline is None:
+                context_section = await context_loader.get_context_section(chat_id)
+            else:
+                try:
+                    context_section = await asyncio.wait_for(
+                        context_loader.get_context_section(chat_id), timeout=deadline.timeout()
+                    )
+                except asyncio.TimeoutError:
+                    deadline.record_exceeded("context_loading")
+                    return messages
 
             if not context_section:
                 return messages
@@ -354,6 +438,45 @@ class MultiProviderLLM:
             logger.warning("⚠️ Error inyectando contextos: %s", e)
             return messages
 
+    async def _apply_token_budget(
+        self, messages: list[dict[str, str]], chat_id: str, use_case: str, free_only: bool
+    ) -> list[dict[str, str]]:
+        """Ajustar el historial al presupuesto de tokens (estimado con la familia del primer proveedor)"""
+        order = self.get_fallback_order(use_case, free_only)
+        family = provider_family(order[0].value) if order else "openai"
+        return await self.token_budget.apply(
+            messages,
+            chat_id if chat_id != "unknown" else None,
+            family=family,
+            summarizer=self._summarize_history,
+        )
+
+    async def _summarize_history(self, previous_summary: str | None, turns: list[dict[str, str]]) -> str | None:
+        """Resumir turnos antiguos (incremental sobre el resumen previo) con el proveedor más barato"""
+        transcript = "\n".join(f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in turns)
+        previous = f"Resumen previo:\n{previous_summary}\n\n" if previous_summary else ""
+        prompt = [
+            {
+                "role": "system",
+                "content": (
+                    "Resume la conversación entre el cliente (user) y el asistente en máximo 120 palabras. "
+                    "Conserva datos del cliente, acuerdos, objeciones y preguntas pendientes. "
+                    "Responde solo con el resumen, sin preámbulos."
+                ),
+            },
+            {"role": "user", "content": f"{previous}Nuevos mensajes:\n{transcript}"},
+        ]
+
+        for provider in self.get_fallback_order("normal", free_only=True) or self.get_fallback_order("normal"):
+            try:
+                result = await self._call_provider(provider, prompt, max_retries=1)
+            except Exception as e:
+                logger.debug("Resumen con %s falló: %s", provider.value, e)
+                continue
+            if result and result.get("success") and result.get("response"):
+                return str(result["response"])
+        return None
+
     async def generate_response(
         self,
         messages: list[dict[str, str]],
@@ -362,10 +485,14 @@ class MultiProviderLLM:
         free_only: bool = False,
         max_retries: int = 3,
         inject_contexts: bool = True,
+        deadline: Deadline | None = None,
     ) -> dict[str, Any]:
         """
         Genera respuesta usando el proveedor disponible con fallback automático
         Incluye sistema de humanización, detección de respuestas bot, e inyección de contextos
+
+        `deadline` (o el Deadline activo del contexto) acota todas las etapas; si se agota,
+        se salta directamente al fallback humanizado / transferencia silenciosa.
         """
 
         # Obtener mensaje del usuario para análisis contextual
@@ -379,21 +506,491 @@ class MultiProviderLLM:
                 observe_histogram("llm_response_time", elapsed)
             return payload
 
+        deadline = deadline or current_deadline()
+        with deadline_scope(deadline):
+            user_message = messages[-1]["content"] if messages else ""
+            chat_id = business_context.get("chat_id") if business_context else "unknown"
+
+            faq_question = self.faq_cache.question_for(messages) if self.cache_enabled else None
+
+            # INYECTAR CONTEXTOS (DailyContext, UserContext, objetivos, etc)
+            if inject_contexts and chat_id != "unknown":
+                if deadline is not None and deadline.expired():
+                    deadline.record_exceeded("context_loading")
+                else:
+                    messages = await self._inject_contexts_into_messages(messages, chat_id)
+
+            # Preguntas frecuentes de primer turno: sin proveedor, pero solo entre chats con el mismo
+            # contexto inyectado (una respuesta personalizada no se sirve a otro cliente)
+            faq_context = self._faq_context_fingerprint(messages, business_context) if faq_question else ""
+            if faq_question:
+                faq_entry = await self.faq_cache.lookup(faq_question, use_case, context=faq_context)
+                if faq_entry:
+                    return _finalize(self._faq_payload(faq_entry, use_case))
+
+            # Determinar si el admin habilitó solo modelos gratuitos
+            admin_free_only = os.getenv("ENABLE_FREE_MODELS_FALLBACK", "false").lower() == "true"
+            if admin_free_only:
+                free_only = True
+
+            messages = await self._apply_token_budget(messages, chat_id, use_case, free_only)
+
+            prompt_hash = self._compute_prompt_hash(messages, business_context, use_case=use_case, free_only=free_only)
+
+            async def _produce() -> dict[str, Any]:
+                return await self._generate_with_fallback(
+                    messages, business_context, user_message, chat_id, prompt_hash, use_case, free_only, max_retries
+                )
+
+            if not self.single_flight_enabled:
+                payload, coalesced_from = await _produce(), None
+            else:
+                # Coalescer prompts idénticos en curso (reintentos de webhook, ráfagas de campañas)
+                payload, coalesced_from = await self.single_flight.run(
+                    prompt_hash, _produce, redis_client=self._shared_redis_client()
+                )
+            if coalesced_from is not None:
+                logger.info("🛬 Prompt coalescido (%s) para chat %s", coalesced_from, chat_id)
+                self._inc_metric("llm_coalesced_requests")
+                self._inc_metric(f"llm_coalesced_requests_{coalesced_from}")
+                payload = dict(payload)
+            elif faq_question and self._is_provider_answer(payload):
+                await self.faq_cache.store(
+                    faq_question, payload["response"], payload["provider"], use_case, context=faq_context
+                )
+            return _finalize(payload)
+
+    @staticmethod
+    def _faq_context_fingerprint(messages: list[dict[str, str]], business_context: dict | None) -> str:
+        """Huella de lo que personaliza la respuesta: mensajes de sistema (con los contextos inyectados)"""
+        system = [str(msg.get("content") or "") for msg in messages if msg.get("role") == "system"]
+        extra = {key: value for key, value in (business_context or {}).items() if key != "chat_id"}
+        payload = json.dumps({"system": system, "business": extra}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _is_provider_answer(self, payload: dict[str, Any]) -> bool:
+        """Respuesta real de un proveedor (no caché ni fallback humanizado/transferencia)"""
+        return bool(
+            payload.get("success")
+            and payload.get("response")
+            and not payload.get("cached")
+            and payload.get("provider") in {p.value for p in self.providers}
+        )
+
+    def _faq_payload(self, entry: dict[str, Any], use_case: str) -> dict[str, Any]:
+        provider = entry.get("provider", "")
+        config = next((c for p, c in self.providers.items() if p.value == provider), None)
+        logger.info("❓ Respuesta FAQ cacheada (%s, similitud %s)", entry.get("match"), entry.get("similarity"))
+        return {
+            "success": True,
+            "response": entry["response"],
+            "provider": provider,
+            "model": config.model if config else None,
+            "tokens_used": 0,
+            "is_free": config.is_free if config else True,
+            "use_case": use_case,
+            "was_humanized": False,
+            "cached": True,
+            "faq_cache": entry.get("match"),
+        }
+
+    async def _generate_with_fallback(
+        self,
+        messages: list[dict[str, str]],
+        business_context: dict | None,
+        user_message: str,
+        chat_id: str,
+        prompt_hash: str,
+        use_case: str,
+        free_only: bool,
+        max_retries: int,
+    ) -> dict[str, Any]:
+        """Recorrer la lista de fallback (con hedging opcional) hasta obtener respuesta"""
+        fallback_providers = self._resolve_fallback_providers(use_case, free_only, business_context)
+
+        effective_retries = max(1, int(max_retries))
+        hedging = self.hedging_enabled and len(fallback_providers) > 1
+
+        cached = await self._lookup_cached_response(fallback_providers, prompt_hash, use_case)
+        if cached is not None:
+            return cached
+
+        # Intentar con cada proveedor (en parejas primario/hedge si el hedging está activo)
+        deadline = current_deadline()
+        index = 0
+        while index < len(fallback_providers):
+            if deadline is not None and deadline.expired():
+                deadline.record_exceeded("provider_attempt")
+                break
+            provider = fallback_providers[index]
+            hedge_provider = fallback_providers[index + 1] if hedging and index + 1 < len(fallback_providers) else None
+
+            if hedge_provider is not None:
+                payload = await self._attempt_with_hedge(
+                    provider, hedge_provider, messages, business_context, prompt_hash, use_case, effective_retries
+                )
+                index += 2
+            else:
+                payload = await self._attempt_provider(
+                    provider, messages, business_context, prompt_hash, use_case, effective_retries
+                )
+                index += 1
+
+            if payload is not None:
+                return payload
+
+        deadline_exceeded = deadline is not None and deadline.expired()
+        return self._build_all_failed_response(
+            user_message,
+            chat_id,
+            messages,
+            business_context,
+            fallback_providers,
+            use_case,
+            error_type="timeout" if deadline_exceeded else "llm_failure",
+        )
+
+    async def _attempt_provider(
+        self,
+        provider: LLMProvider,
+        messages: list[dict[str, str]],
+        business_context: dict | None,
+        prompt_hash: str,
+        use_case: str,
+        max_retries: int,
+    ) -> dict[str, Any] | None:
+        """Intento completo con un proveedor (caché, llamada y humanización). Retorna None si hay que seguir."""
+        try:
+            logger.info("Intentando con proveedor: %s", provider.value)
+
+            call_start = asyncio.get_event_loop().time()
+            result = await self._call_provider(
+                provider,
+                messages,
+                business_context,
+                max_retries=max_retries,
+            )
+
+            if not (result and result.get("success")):
+                self._record_provider_failure(provider.value)
+                return None
+
+            self._record_provider_latency(provider, asyncio.get_event_loop().time() - call_start)
+            response_text = result["response"]
+
+            # VALIDACIÓN DE HUMANIZACIÓN
+            if HUMANIZATION_AVAILABLE:
+                # 1. Detectar negación ética
+                is_ethical_refusal = humanized_responses.detect_llm_ethical_refusal(response_text)
+
+                if is_ethical_refusal:
+                    logger.error("❌ NEGACIÓN ÉTICA detectada en %s", provider.value)
+                    logger.error("   Respuesta: %s", response_text[:200])
+
+                    # Si no es un modelo sin censura, intentar con siguiente
+                    if provider.value not in ["ollama", "lmstudio", "grok"]:
+                        deadline = current_deadline()
+                        if deadline is not None and deadline.expired():
+                            # Sin presupuesto para otro proveedor: el bucle pasa al fallback humanizado
+                            deadline.record_exceeded("humanization")
+                        logger.info("   Intentando con siguiente proveedor...")
+                        return None
+
+                # 2. Validar que no suene a bot
+                validation = humanized_responses.validate_llm_response(response_text)
+
+                if not validation["is_valid"]:
+                    logger.warning("⚠️ Respuesta suena a BOT: %s", validation["issues"])
+                    # Humanizar respuesta
+                    response_text = humanized_responses.humanize_response(response_text)
+                    logger.info("✅ Respuesta humanizada aplicada")
+
+            if self.cache_enabled and CACHE_AVAILABLE and response_text:
+                await cache_llm_response(
+                    prompt_hash=prompt_hash,
+                    response=response_text,
+                    provider=provider.value,
+                    ttl=self.cache_ttl_seconds,
+                )
+
+            logger.info("✅ Respuesta exitosa de %s", provider.value)
+            return {
+                "success": True,
+                "response": response_text,
+                "provider": provider.value,
+                "model": self.providers[provider].model,
+                "tokens_used": result.get("tokens_used", 0),
+                "is_free": self.providers[provider].is_free,
+                "use_case": use_case,
+                "was_humanized": validation.get("is_valid", True) if HUMANIZATION_AVAILABLE else False,
+            }
+
+        except Exception as e:
+            logger.warning("❌ Error con %s: %s", provider.value, str(e))
+            self._record_provider_failure(provider.value)
+            return None
+
+    async def _lookup_cached_response(
+        self, providers: list[LLMProvider], prompt_hash: str, use_case: str
+    ) -> dict[str, Any] | None:
+        """Respuesta cacheada del primer proveedor (en orden de fallback) que la tenga: un solo MGET"""
+        if not (self.cache_enabled and CACHE_AVAILABLE and providers):
+            return None
+
+        hits = await get_cached_llm_responses(prompt_hash, [p.value for p in providers])
+        for provider in providers:
+            cached = hits.get(provider.value)
+            if cached and cached.get("response"):
+                return {
+                    "success": True,
+                    "response": cached["response"],
+                    "provider": provider.value,
+                    "model": self.providers[provider].model,
+                    "tokens_used": 0,
+                    "is_free": self.providers[provider].is_free,
+                    "use_case": use_case,
+                    "was_humanized": False,
+                    "cached": True,
+                }
+        return None
+
+    async def _attempt_with_hedge(
+        self,
+        primary: LLMProvider,
+        hedge: LLMProvider,
+        messages: list[dict[str, str]],
+        business_context: dict | None,
+        prompt_hash: str,
+        use_case: str,
+        max_retries: int,
+    ) -> dict[str, Any] | None:
+        """
+        Hedged request: si `primary` no respondió tras el retardo de hedge, lanza `hedge` en paralelo,
+        se queda con la primera respuesta exitosa y cancela la petición perdedora.
+        Si `primary` falla antes del retardo, `hedge` se intenta como un fallback normal.
+        """
+
+        def _attempt(provider: LLMProvider) -> asyncio.Task:
+            return asyncio.create_task(
+                self._attempt_provider(provider, messages, business_context, prompt_hash, use_case, max_retries)
+            )
+
+        primary_task = _attempt(primary)
+        delay = self._hedge_delay_seconds(primary)
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        except asyncio.CancelledError:
+            primary_task.cancel()
+            raise
+
+        if done:
+            payload = primary_task.result()
+            if payload is not None:
+                return payload
+            return await self._attempt_provider(hedge, messages, business_context, prompt_hash, use_case, max_retries)
+
+        logger.info("⏱️ %s sin respuesta tras %.2fs, lanzando hedge con %s", primary.value, delay, hedge.value)
+        self._inc_metric(f"llm_hedge_fired_{primary.value}")
+
+        owners = {primary_task: primary, _attempt(hedge): hedge}
+        pending = set(owners)
+        winner: LLMProvider | None = None
+        winner_payload: dict[str, Any] | None = None
+        try:
+            while pending and winner_payload is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    payload = task.result()
+                    if payload is None:
+                        continue
+                    if winner_payload is None:
+                        winner, winner_payload = owners[task], payload
+                    else:
+                        # Ambos terminaron a la vez: los tokens del perdedor se desperdiciaron
+                        self._inc_metric(f"llm_hedge_wasted_tokens_{owners[task].value}", int(payload.get("tokens_used", 0)))
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner_payload is not None:
+            if winner == hedge:
+                self._inc_metric(f"llm_hedge_won_{hedge.value}")
+            # El prompt de la petición cancelada ya se envió (y se factura) aunque no haya respuesta
+            for task in pending:
+                self._inc_metric(f"llm_hedge_wasted_tokens_{owners[task].value}", self._estimate_prompt_tokens(messages))
+        return winner_payload
+
+    def _hedge_delay_seconds(self, provider: LLMProvider) -> float:
+        """Retardo antes de lanzar el hedge: p95 observado del proveedor o el valor configurado"""
+        samples = self._provider_latencies.get(provider.value)
+        if self.hedge_use_p95 and samples and len(samples) >= 20:
+            ordered = sorted(samples)
+            return max(0.05, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))])
+        return self.hedge_delay_seconds
+
+    def _record_provider_latency(self, provider: LLMProvider, seconds: float) -> None:
+        """Registra latencia de llamadas exitosas por proveedor (base del retardo de hedge)"""
+        self._provider_latencies.setdefault(provider.value, deque(maxlen=200)).append(seconds)
+        if METRICS_AVAILABLE:
+            observe_histogram(f"llm_provider_latency_{provider.value}", seconds)
+
+    @staticmethod
+    def _estimate_prompt_tokens(messages: list[dict[str, str]]) -> int:
+        """Estimación rápida de tokens (~4 caracteres por token)"""
+        return sum(len(str(msg.get("content", ""))) for msg in messages) // 4
+
+    @staticmethod
+    def _inc_metric(name: str, amount: int = 1) -> None:
+        if METRICS_AVAILABLE and amount:
+            inc_counter(name, amount)
+
+    @staticmethod
+    def _shared_redis_client() -> Any | None:
+        """Cliente Redis compartido entre workers (single-flight, cuotas) si está conectado"""
+        if CACHE_AVAILABLE and cache_manager.cache_enabled:
+            return cache_manager.redis_client
+        return None
+
+    async def generate_response_stream(
+        self,
+        messages: list[dict[str, str]],
+        business_context: dict | None = None,
+        use_case: str = "normal",
+        free_only: bool = False,
+        max_retries: int = 3,
+        inject_contexts: bool = True,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Versión streaming de generate_response: emite eventos a medida que el proveedor genera texto.
+
+        Mantiene el mismo fallback, circuit breaker, caché y humanización. Eventos:
+          {"type": "delta", "text": str, "provider": str}  -> fragmento parcial
+          {"type": "reset", "provider": str}               -> descartar texto parcial (se cambia de proveedor)
+          {"type": "done", **payload}                      -> payload final, misma forma que generate_response
+        """
+        loop = asyncio.get_event_loop()
+        request_start = loop.time()
+        if METRICS_AVAILABLE:
+            inc_counter("llm_requests")
+            inc_counter("llm_stream_requests")
+
+        def _finalize(payload: dict[str, Any]) -> dict[str, Any]:
+            if METRICS_AVAILABLE:
+                observe_histogram("llm_response_time", max(0.0, loop.time() - request_start))
+            return {"type": "done", **payload}
+
         user_message = messages[-1]["content"] if messages else ""
         chat_id = business_context.get("chat_id") if business_context else "unknown"
 
-        # INYECTAR CONTEXTOS (DailyContext, UserContext, objetivos, etc)
-        if inject_contexts and chat_id != "unknown":
-            messages = self._inject_contexts_into_messages(messages, chat_id)
+        faq_question = self.faq_cache.question_for(messages) if self.cache_enabled else None
 
-        # Determinar si el admin habilitó solo modelos gratuitos
-        admin_free_only = os.getenv("ENABLE_FREE_MODELS_FALLBACK", "false").lower() == "true"
-        if admin_free_only:
+        if inject_contexts and chat_id != "unknown":
+            messages = await self._inject_contexts_into_messages(messages, chat_id)
+
+        faq_context = self._faq_context_fingerprint(messages, business_context) if faq_question else ""
+        if faq_question:
+            faq_entry = await self.faq_cache.lookup(faq_question, use_case, context=faq_context)
+            if faq_entry:
+                payload = self._faq_payload(faq_entry, use_case)
+                yield {"type": "delta", "text": payload["response"], "provider": payload["provider"]}
+                yield _finalize(payload)
+                return
+
+        if os.getenv("ENABLE_FREE_MODELS_FALLBACK", "false").lower() == "true":
             free_only = True
 
+        messages = await self._apply_token_budget(messages, chat_id, use_case, free_only)
+
         prompt_hash = self._compute_prompt_hash(messages, business_context, use_case=use_case, free_only=free_only)
+        fallback_providers = self._resolve_fallback_providers(use_case, free_only, business_context)
 
-        # Para negocios sensibles, priorizar modelos sin censura
+        cached = await self._lookup_cached_response(fallback_providers, prompt_hash, use_case)
+        if cached is not None:
+            yield {"type": "delta", "text": cached["response"], "provider": cached["provider"]}
+            yield _finalize(cached)
+            return
+
+        for provider in fallback_providers:
+            config = self.providers[provider]
+            logger.info("Intentando streaming con proveedor: %s", provider.value)
+
+            chunks: list[str] = []
+            stream_start = loop.time()
+            first_token_at: float | None = None
+            try:
+                async for chunk in self._stream_provider(provider, messages, max_retries=max(1, int(max_retries))):
+                    if first_token_at is None:
+                        first_token_at = loop.time()
+                        if METRICS_AVAILABLE:
+                            observe_histogram("llm_time_to_first_token_seconds", first_token_at - stream_start)
+                    chunks.append(chunk)
+                    yield {"type": "delta", "text": chunk, "provider": provider.value}
+            except Exception as e:
+                logger.warning("❌ Error en streaming con %s: %s", provider.value, str(e))
+                self._record_provider_failure(provider.value)
+                if not isinstance(e.__cause__, (CircuitBreakerOpenException, QuotaExceededException)):
+                    self._record_routing_outcome(provider, loop.time() - stream_start, False, str(e))
+                if chunks:
+                    yield {"type": "reset", "provider": provider.value}
+                continue
+
+            response_text = "".join(chunks)
+            self._record_routing_outcome(provider, loop.time() - stream_start, bool(response_text))
+            if not response_text:
+                self._record_provider_failure(provider.value)
+                continue
+
+            if METRICS_AVAILABLE and first_token_at is not None:
+                # Cada evento del stream equivale aproximadamente a un token
+                generation_seconds = max(loop.time() - first_token_at, 1e-3)
+                observe_histogram("llm_stream_tokens_per_second", len(chunks) / generation_seconds)
+
+            validation: dict[str, Any] = {}
+            if HUMANIZATION_AVAILABLE:
+                if humanized_responses.detect_llm_ethical_refusal(response_text):
+                    logger.error("❌ NEGACIÓN ÉTICA detectada en %s", provider.value)
+                    if provider.value not in ["ollama", "lmstudio", "grok"]:
+                        yield {"type": "reset", "provider": provider.value}
+                        continue
+
+                validation = humanized_responses.validate_llm_response(response_text)
+                if not validation["is_valid"]:
+                    logger.warning("⚠️ Respuesta suena a BOT: %s", validation["issues"])
+                    response_text = humanized_responses.humanize_response(response_text)
+
+            if self.cache_enabled and CACHE_AVAILABLE:
+                await cache_llm_response(
+                    prompt_hash=prompt_hash,
+                    response=response_text,
+                    provider=provider.value,
+                    ttl=self.cache_ttl_seconds,
+                )
+            if faq_question:
+                await self.faq_cache.store(faq_question, response_text, provider.value, use_case, context=faq_context)
+
+            logger.info("✅ Respuesta streaming exitosa de %s", provider.value)
+            yield _finalize(
+                {
+                    "success": True,
+                    "response": response_text,
+                    "provider": provider.value,
+                    "model": config.model,
+                    "tokens_used": len(chunks),
+                    "is_free": config.is_free,
+                    "use_case": use_case,
+                    "was_humanized": validation.get("is_valid", True) if HUMANIZATION_AVAILABLE else False,
+                }
+            )
+            return
+
+        yield _finalize(
+            self._build_all_failed_response(user_message, chat_id, messages, business_context, fallback_providers, use_case)
+        )
+
+    def _resolve_fallback_providers(self, use_case: str, free_only: bool, business_context: dict | None) -> list[LLMProvider]:
+        """Orden de proveedores para esta petición (prioriza modelos sin censura en negocios sensibles)"""
         business_type = business_context.get("business_type") if business_context else None
         if HUMANIZATION_AVAILABLE and business_type and sensitive_handler.is_sensitive_business(business_type):
             logger.info("🔞 Negocio sensible detectado: %s - Priorizando modelos sin censura", business_type)
@@ -404,100 +1001,41 @@ class MultiProviderLLM:
             fallback_providers = self.get_fallback_order(use_case, free_only)
 
         logger.info("Usando caso: %s, solo gratuitos: %s", use_case, free_only)
+        return fallback_providers
 
-        # Intentar con cada proveedor
-        for provider in fallback_providers:
-            try:
-                logger.info("Intentando con proveedor: %s", provider.value)
-                effective_retries = max(1, int(max_retries))
-
-                if self.cache_enabled and CACHE_AVAILABLE:
-                    cached = await get_cached_llm_response(prompt_hash, provider.value)
-                    if cached and cached.get("response"):
-                        return _finalize(
-                            {
-                                "success": True,
-                                "response": cached["response"],
-                                "provider": provider.value,
-                                "model": self.providers[provider].model,
-                                "tokens_used": 0,
-                                "is_free": self.providers[provider].is_free,
-                                "use_case": use_case,
-                                "was_humanized": False,
-                                "cached": True,
-                            }
-                        )
-
-                result = await self._call_provider(
-                    provider,
-                    messages,
-                    business_context,
-                    max_retries=effective_retries,
-                )
-
-                if not (result and result.get("success")):
-                    self._record_provider_failure(provider.value)
-
-                if result and result.get("success"):
-                    response_text = result["response"]
-
-                    # VALIDACIÓN DE HUMANIZACIÓN
-                    if HUMANIZATION_AVAILABLE:
-                        # 1. Detectar negación ética
-                        is_ethical_refusal = humanized_responses.detect_llm_ethical_refusal(response_text)
-
-                        if is_ethical_refusal:
-                            logger.error("❌ NEGACIÓN ÉTICA detectada en %s", provider.value)
-                            logger.error("   Respuesta: %s", response_text[:200])
-
-                            # Si no es un modelo sin censura, intentar con siguiente
-                            if provider.value not in ["ollama", "lmstudio", "grok"]:
-                                logger.info("   Intentando con siguiente proveedor...")
-                                continue
-
-                        # 2. Validar que no suene a bot
-                        validation = humanized_responses.validate_llm_response(response_text)
-
-                        if not validation["is_valid"]:
-                            logger.warning("⚠️ Respuesta suena a BOT: %s", validation["issues"])
-                            # Humanizar respuesta
-                            response_text = humanized_responses.humanize_response(response_text)
-                            logger.info("✅ Respuesta humanizada aplicada")
-
-                    if self.cache_enabled and CACHE_AVAILABLE and response_text:
-                        await cache_llm_response(
-                            prompt_hash=prompt_hash,
-                            response=response_text,
-                            provider=provider.value,
-                            ttl=self.cache_ttl_seconds,
-                        )
-
-                    logger.info("✅ Respuesta exitosa de %s", provider.value)
-                    return _finalize(
-                        {
-                            "success": True,
-                            "response": response_text,
-                            "provider": provider.value,
-                            "model": self.providers[provider].model,
-                            "tokens_used": result.get("tokens_used", 0),
-                            "is_free": self.providers[provider].is_free,
-                            "use_case": use_case,
-                            "was_humanized": validation.get("is_valid", True) if HUMANIZATION_AVAILABLE else False,
-                        }
-                    )
-
-            except Exception as e:
-                logger.warning("❌ Error con %s: %s", provider.value, str(e))
-                self._record_provider_failure(provider.value)
-                continue
+    def deadline_fallback_response(
+        self,
+        user_message: str,
+        chat_id: str,
+        history: list[dict[str, str]] | None = None,
+        business_context: dict | None = None,
+    ) -> dict[str, Any]:
+        """Respuesta inmediata para un llamador que agotó su deadline: fallback humanizado o transferencia silenciosa"""
+        messages = [*(history or []), {"role": "user", "content": user_message}]
+        return self._build_all_failed_response(
+            user_message, chat_id, messages, business_context, [], "normal", error_type="timeout"
+        )
 
-        # TODOS LOS PROVEEDORES FALLARON - Manejo inteligente con humanización
-        logger.error("❌ TODOS los proveedores LLM fallaron")
+    def _build_all_failed_response(
+        self,
+        user_message: str,
+        chat_id: str,
+        messages: list[dict[str, str]],
+        business_context: dict | None,
+        fallback_providers: list[LLMProvider],
+        use_case: str,
+        error_type: str = "llm_failure",
+    ) -> dict[str, Any]:
+        """Respuesta cuando TODOS los proveedores fallaron: transferencia silenciosa o fallback humanizado"""
+        if error_type == "timeout":
+            logger.error("⏱️ Deadline agotado antes de obtener respuesta LLM")
+        else:
+            logger.error("❌ TODOS los proveedores LLM fallaron")
 
         if HUMANIZATION_AVAILABLE:
             # Análisis contextual de la falla
             error_response = humanized_responses.get_error_response(
-                user_message=user_message, error_type="llm_failure", conversation_history=messages, context=business_context
+                user_message=user_message, error_type=error_type, conversation_history=messages, context=business_context
             )
 
             # ¿Requiere transferencia silenciosa?
@@ -513,43 +1051,38 @@ class MultiProviderLLM:
                     metadata={
                         "all_llms_failed": True,
                         "attempted_providers": [p.value for p in fallback_providers],
+                        "deadline_exceeded": error_type == "timeout",
                     },
                     notify_client=False,  # SILENCIOSO
                 )
 
-                return _finalize(
-                    {
-                        "success": False,
-                        "response": None,  # NO responder
-                        "action": "silent_transfer",
-                        "transfer_id": transfer_id,
-                        "error": "LLM failure - silent transfer initiated",
-                    }
-                )
+                return {
+                    "success": False,
+                    "response": None,  # NO responder
+                    "action": "silent_transfer",
+                    "transfer_id": transfer_id,
+                    "error": "LLM failure - silent transfer initiated",
+                }
 
             # Dar respuesta humanizada y marcar para reintento
             logger.info("💬 Respuesta humanizada: %s", error_response["response"])
-            return _finalize(
-                {
-                    "success": True,  # Técnicamente "exitoso" porque damos respuesta
-                    "response": error_response["response"],
-                    "action": "humanized_fallback",
-                    "should_retry": error_response.get("should_retry", False),
-                    "delay_before_response": error_response.get("delay_before_response", 0),
-                    "provider": "humanized_fallback",
-                }
-            )
+            return {
+                "success": True,  # Técnicamente "exitoso" porque damos respuesta
+                "response": error_response["response"],
+                "action": "humanized_fallback",
+                "should_retry": error_response.get("should_retry", False),
+                "delay_before_response": error_response.get("delay_before_response", 0),
+                "provider": "humanized_fallback",
+            }
 
         # Sin sistema de humanización, fallback tradicional
-        return _finalize(
-            {
-                "success": False,
-                "error": f"Todos los proveedores para {use_case} no están disponibles",
-                "response": self._get_fallback_response(business_context),
-                "provider": "fallback",
-                "use_case": use_case,
-            }
-        )
+        return {
+            "success": False,
+            "error": f"Todos los proveedores para {use_case} no están disponibles",
+            "response": self._get_fallback_response(business_context),
+            "provider": "fallback",
+            "use_case": use_case,
+        }
 
     def _reorder_for_sensitive(self, providers: list[LLMProvider], preferred: list[str]) -> list[LLMProvider]:
         """
@@ -622,20 +1155,135 @@ class MultiProviderLLM:
                 return await self._call_openrouter(config, messages, max_retries=max_retries)
             return {"success": False, "error": "Proveedor no soportado"}
 
-        if not CIRCUIT_BREAKER_AVAILABLE:
-            return await _dispatch()
+        # Primero el breaker: un circuito abierto no debe gastar cuota
+        breaker = self._get_provider_breaker(provider)
+        if breaker is not None:
+            try:
+                breaker.acquire()
+            except CircuitBreakerOpenException:
+                # Sin llamada de red: no alimenta al router
+                return {"success": False, "error": f"Circuit breaker abierto para {provider.value}"}
 
-        breaker_name = f"llm_{provider.value}"
-        breaker = get_or_create_circuit_breaker(
-            name=breaker_name,
-            failure_threshold=int(os.getenv("LLM_CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5")),
-            recovery_timeout=int(os.getenv("LLM_CIRCUIT_BREAKER_RECOVERY_TIMEOUT", "60")),
+        try:
+            await self._acquire_quota(provider)
+        except QuotaExceededException as e:
+            # Sin llamada de red: ni router ni circuit breaker
+            return {
+                "success": False,
+                "error": f"Cuota agotada para {provider.value} (reintentar en {e.retry_after:.1f}s)",
+                "quota_exhausted": True,
+            }
+
+        started = asyncio.get_event_loop().time()
+        try:
+            with self._attempt_quota(provider):
+                result = await _dispatch()
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure()
+            self._record_routing_outcome(provider, asyncio.get_event_loop().time() - started, False, str(e))
+            raise
+        if breaker is not None:
+            breaker.record_success()
+
+        if result and result.get("retry_after") is not None:
+            await self._block_quota(provider, result["retry_after"])
+
+        success = bool(result and result.get("success"))
+        error = "" if success else str((result or {}).get("error", ""))
+        self._record_routing_outcome(provider, asyncio.get_event_loop().time() - started, success, error)
+        return result
+
+    def _record_routing_outcome(self, provider: LLMProvider, latency_seconds: float, success: bool, error: str = "") -> None:
+        """Alimenta el router adaptativo con el resultado de una llamada a proveedor"""
+        self.router.record_outcome(provider.value, latency_seconds, success, rate_limited="(429)" in error)
+
+    async def _acquire_quota(self, provider: LLMProvider) -> None:
+        """Consumir cuota del proveedor (lanza QuotaExceededException si no hay presupuesto)"""
+        if not self.quota_enabled:
+            return
+        config = self.providers[provider]
+        try:
+            await self.quota.acquire(
+                provider.value,
+                config.model,
+                config.rpm_limit,
+                config.rpd_limit,
+                redis_client=self._shared_redis_client(),
+            )
+        except QuotaExceededException:
+            logger.info("🪣 %s sin cuota disponible, se omite", provider.value)
+            self._inc_metric(f"llm_quota_skipped_{provider.value}")
+            raise
+
+    async def _block_quota(self, provider: LLMProvider, retry_after_seconds: float) -> None:
+        """Honrar un Retry-After del proveedor en el gobernador de cuotas"""
+        if not self.quota_enabled:
+            return
+        self._inc_metric(f"llm_retry_after_{provider.value}")
+        await self.quota.block(
+            provider.value,
+            self.providers[provider].model,
+            retry_after_seconds,
+            redis_client=self._shared_redis_client(),
         )
 
+    def _provider_client_timeout(self) -> aiohttp.ClientTimeout:
+        """Timeout por petición: provider_timeout_seconds recortado al deadline activo"""
+        deadline = current_deadline()
+        if deadline is None:
+            return aiohttp.ClientTimeout(total=self.provider_timeout_seconds)
+        return aiohttp.ClientTimeout(total=deadline.timeout(self.provider_timeout_seconds))
+
+    @staticmethod
+    @contextmanager
+    def _attempt_quota(provider: LLMProvider) -> Iterator[None]:
+        """Durante el bloque, cada reintento HTTP consume cuota de `provider`"""
+        token = _attempt_quota_provider.set(provider)
         try:
-            return await breaker.call(_dispatch)
-        except CircuitBreakerOpenException:
-            return {"success": False, "error": f"Circuit breaker abierto para {provider.value}"}
+            yield
+        finally:
+            _attempt_quota_provider.reset(token)
+
+    async def _retry_backoff(self, attempt: int) -> bool:
+        """
+        Esperar el backoff exponencial antes de otro intento HTTP.
+
+        False si el deadline no alcanza o si el proveedor ya no tiene cuota: cada
+        reintento es una petición más para los límites RPM/RPD del proveedor.
+        """
+        delay = self.retry_base_delay_seconds * (2**attempt)
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() <= delay:
+            deadline.record_exceeded("retry_backoff")
+            return False
+        await asyncio.sleep(delay)
+        provider = _attempt_quota_provider.get()
+        if provider is not None:
+            try:
+                await self._acquire_quota(provider)
+            except QuotaExceededException:
+                return False
+        return True
+
+    @staticmethod
+    def _retry_after_from(response: Any) -> float | None:
+        """Segundos del header Retry-After de una respuesta HTTP (None si no viene)"""
+        headers = getattr(response, "headers", None)
+        if headers is None:
+            return None
+        return parse_retry_after(headers.get("Retry-After"))
+
+    @staticmethod
+    def _get_provider_breaker(provider: LLMProvider) -> Any | None:
+        """Circuit breaker compartido por proveedor (None si el sistema de protección no está disponible)"""
+        if not CIRCUIT_BREAKER_AVAILABLE:
+            return None
+        return get_or_create_circuit_breaker(
+            name=f"llm_{provider.value}",
+            failure_threshold=int(os.getenv("LLM_CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5")),
+            recovery_timeout=int(os.getenv("LLM_CIRCUIT_BREAKER_RECOVERY_TIMEOUT", "60")),
+        )
 
     async def _call_gemini(
         self,
@@ -658,13 +1306,14 @@ class MultiProviderLLM:
             "generationConfig": {"temperature": config.temperature, "maxOutputTokens": config.max_tokens},
         }
 
-        timeout = aiohttp.ClientTimeout(total=self.provider_timeout_seconds)
         transient_statuses = {408, 429, 500, 502, 503, 504}
 
         for attempt in range(max_retries):
             try:
                 async with self._session_scope() as session:
-                    async with session.post(url, headers=headers, json=payload, timeout=timeout) as response:
+                    async with session.post(
+                        url, headers=headers, json=payload, timeout=self._provider_client_timeout()
+                    ) as response:
                         if response.status == 200:
                             data = await response.json()
                             if "candidates" in data and len(data["candidates"]) > 0:
@@ -676,14 +1325,19 @@ class MultiProviderLLM:
                                 }
 
                         error_text = await response.text()
-                        if response.status in transient_statuses and attempt < (max_retries - 1):
-                            await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                            continue
-                        return {"success": False, "error": f"Gemini API Error ({response.status}): {error_text}"}
+                        retry_after = self._retry_after_from(response)
+                        if response.status in transient_statuses and retry_after is None and attempt < (max_retries - 1):
+                            if await self._retry_backoff(attempt):
+                                continue
+                        return {
+                            "success": False,
+                            "error": f"Gemini API Error ({response.status}): {error_text}",
+                            "retry_after": retry_after,
+                        }
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 if attempt < (max_retries - 1):
-                    await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                    continue
+                    if await self._retry_backoff(attempt):
+                        continue
                 return {"success": False, "error": str(e)}
             except Exception as e:
                 return {"success": False, "error": str(e)}
@@ -726,13 +1380,14 @@ class MultiProviderLLM:
     async def _call_ollama(self, config: APIConfig, messages: list[dict], max_retries: int = 3) -> dict:
         """Llama a Ollama local"""
         payload = {"model": config.model, "messages": messages, "stream": False}
-        timeout = aiohttp.ClientTimeout(total=self.provider_timeout_seconds)
         transient_statuses = {408, 429, 500, 502, 503, 504}
 
         for attempt in range(max_retries):
             try:
                 async with self._session_scope() as session:
-                    async with session.post(f"{config.base_url}/api/chat", json=payload, timeout=timeout) as response:
+                    async with session.post(
+                        f"{config.base_url}/api/chat", json=payload, timeout=self._provider_client_timeout()
+                    ) as response:
                         if response.status == 200:
                             data = await response.json()
                             return {
@@ -742,14 +1397,19 @@ class MultiProviderLLM:
                             }
 
                         error_text = await response.text()
-                        if response.status in transient_statuses and attempt < (max_retries - 1):
-                            await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                            continue
-                        return {"success": False, "error": f"Ollama Error ({response.status}): {error_text}"}
+                        retry_after = self._retry_after_from(response)
+                        if response.status in transient_statuses and retry_after is None and attempt < (max_retries - 1):
+                            if await self._retry_backoff(attempt):
+                                continue
+                        return {
+                            "success": False,
+                            "error": f"Ollama Error ({response.status}): {error_text}",
+                            "retry_after": retry_after,
+                        }
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 if attempt < (max_retries - 1):
-                    await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                    continue
+                    if await self._retry_backoff(attempt):
+                        continue
                 return {"success": False, "error": f"Ollama Exception: {str(e)}"}
             except Exception as e:
                 return {"success": False, "error": str(e)}
@@ -795,14 +1455,16 @@ class MultiProviderLLM:
         if system_message.strip():
             payload["system"] = system_message.strip()
 
-        timeout = aiohttp.ClientTimeout(total=self.provider_timeout_seconds)
         transient_statuses = {408, 429, 500, 502, 503, 504}
 
         for attempt in range(max_retries):
             try:
                 async with self._session_scope() as session:
                     async with session.post(
-                        f"{config.base_url}/v1/messages", headers=headers, json=payload, timeout=timeout
+                        f"{config.base_url}/v1/messages",
+                        headers=headers,
+                        json=payload,
+                        timeout=self._provider_client_timeout(),
                     ) as response:
                         if response.status == 200:
                             data = await response.json()
@@ -817,14 +1479,19 @@ class MultiProviderLLM:
                                 }
 
                         error_text = await response.text()
-                        if response.status in transient_statuses and attempt < (max_retries - 1):
-                            await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                            continue
-                        return {"success": False, "error": f"Claude API Error ({response.status}): {error_text}"}
+                        retry_after = self._retry_after_from(response)
+                        if response.status in transient_statuses and retry_after is None and attempt < (max_retries - 1):
+                            if await self._retry_backoff(attempt):
+                                continue
+                        return {
+                            "success": False,
+                            "error": f"Claude API Error ({response.status}): {error_text}",
+                            "retry_after": retry_after,
+                        }
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 if attempt < (max_retries - 1):
-                    await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                    continue
+                    if await self._retry_backoff(attempt):
+                        continue
                 return {"success": False, "error": f"Claude Exception: {str(e)}"}
             except Exception as e:
                 return {"success": False, "error": f"Claude Exception: {str(e)}"}
@@ -855,19 +1522,13 @@ class MultiProviderLLM:
           meta-llama/llama-3.3-70b-instruct:free
           deepseek/deepseek-r1:free
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {config.api_key}",
-            "HTTP-Referer": os.getenv("OPENROUTER_SITE_URL", "http://localhost:8003"),
-            "X-Title": os.getenv("OPENROUTER_APP_NAME", "WhatsApp Chatbot"),
-        }
+        headers = self._openrouter_headers(config)
         payload = {
             "model": config.model,
             "messages": messages,
             "temperature": config.temperature,
             "max_tokens": config.max_tokens,
         }
-        timeout = aiohttp.ClientTimeout(total=self.provider_timeout_seconds)
         transient_statuses = {408, 429, 500, 502, 503, 504}
 
         for attempt in range(max_retries):
@@ -877,7 +1538,7 @@ class MultiProviderLLM:
                         f"{config.base_url}/chat/completions",
                         headers=headers,
                         json=payload,
-                        timeout=timeout,
+                        timeout=self._provider_client_timeout(),
                     ) as response:
                         if response.status == 200:
                             data = await response.json()
@@ -888,20 +1549,35 @@ class MultiProviderLLM:
                             }
 
                         error_text = await response.text()
-                        if response.status in transient_statuses and attempt < (max_retries - 1):
-                            await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                            continue
-                        return {"success": False, "error": f"OpenRouter Error ({response.status}): {error_text}"}
+                        retry_after = self._retry_after_from(response)
+                        if response.status in transient_statuses and retry_after is None and attempt < (max_retries - 1):
+                            if await self._retry_backoff(attempt):
+                                continue
+                        return {
+                            "success": False,
+                            "error": f"OpenRouter Error ({response.status}): {error_text}",
+                            "retry_after": retry_after,
+                        }
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 if attempt < (max_retries - 1):
-                    await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                    continue
+                    if await self._retry_backoff(attempt):
+                        continue
                 return {"success": False, "error": f"OpenRouter Exception: {str(e)}"}
             except Exception as e:
                 return {"success": False, "error": f"OpenRouter Exception: {str(e)}"}
 
         return {"success": False, "error": "OpenRouter retries exhausted"}
 
+    @staticmethod
+    def _openrouter_headers(config: APIConfig) -> dict[str, str]:
+        """Headers de OpenRouter (auth + identificación de la app)"""
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {config.api_key}",
+            "HTTP-Referer": os.getenv("OPENROUTER_SITE_URL", "http://localhost:8003"),
+            "X-Title": os.getenv("OPENROUTER_APP_NAME", "WhatsApp Chatbot"),
+        }
+
     async def _call_openai_compatible(
         self,
         provider_label: str,
@@ -925,7 +1601,6 @@ class MultiProviderLLM:
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
-        timeout = aiohttp.ClientTimeout(total=self.provider_timeout_seconds)
         transient_statuses = {408, 429, 500, 502, 503, 504}
 
         for attempt in range(max_retries):
@@ -935,7 +1610,7 @@ class MultiProviderLLM:
                         f"{base_url}/chat/completions",
                         headers=headers,
                         json=payload,
-                        timeout=timeout,
+                        timeout=self._provider_client_timeout(),
                     ) as response:
                         if response.status == 200:
                             data = await response.json()
@@ -946,20 +1621,305 @@ class MultiProviderLLM:
                             }
 
                         error_text = await response.text()
-                        if response.status in transient_statuses and attempt < (max_retries - 1):
-                            await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                            continue
-                        return {"success": False, "error": f"{provider_label} Error ({response.status}): {error_text}"}
+                        retry_after = self._retry_after_from(response)
+                        if response.status in transient_statuses and retry_after is None and attempt < (max_retries - 1):
+                            if await self._retry_backoff(attempt):
+                                continue
+                        return {
+                            "success": False,
+                            "error": f"{provider_label} Error ({response.status}): {error_text}",
+                            "retry_after": retry_after,
+                        }
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 if attempt < (max_retries - 1):
-                    await asyncio.sleep(self.retry_base_delay_seconds * (2**attempt))
-                    continue
+                    if await self._retry_backoff(attempt):
+                        continue
                 return {"success": False, "error": f"{provider_label} Exception: {str(e)}"}
             except Exception as e:
                 return {"success": False, "error": f"{provider_label} Exception: {str(e)}"}
 
         return {"success": False, "error": f"{provider_label} retries exhausted"}
 
+    async def _stream_provider(
+        self,
+        provider: LLMProvider,
+        messages: list[dict[str, str]],
+        max_retries: int = 3,
+    ) -> AsyncIterator[str]:
+        """Streaming de un proveedor específico, protegido por su circuit breaker"""
+        config = self.providers[provider]
+
+        if provider == LLMProvider.GEMINI:
+            stream = self._stream_gemini(config, messages, max_retries=max_retries)
+        elif provider == LLMProvider.CLAUDE:
+            stream = self._stream_claude(config, messages, max_retries=max_retries)
+        elif provider == LLMProvider.OLLAMA:
+            stream = self._stream_ollama(config, messages, max_retries=max_retries)
+        elif provider in (LLMProvider.OPENAI, LLMProvider.XAI, LLMProvider.LM_STUDIO, LLMProvider.OPENROUTER):
+            labels = {
+                LLMProvider.OPENAI: "OpenAI",
+                LLMProvider.XAI: "xAI",
+                LLMProvider.LM_STUDIO: "LM Studio",
+                LLMProvider.OPENROUTER: "OpenRouter",
+            }
+            stream = self._stream_openai_compatible(
+                provider_label=labels[provider],
+                base_url=config.base_url,
+                api_key=config.api_key,
+                model=config.model,
+                messages=messages,
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                max_retries=max_retries,
+                include_auth_header=provider != LLMProvider.LM_STUDIO,
+                extra_headers=self._openrouter_headers(config) if provider == LLMProvider.OPENROUTER else None,
+            )
+        else:
+            raise LLMStreamError("Proveedor no soportado")
+
+        breaker = self._get_provider_breaker(provider)
+        if breaker is not None:
+            try:
+                breaker.acquire()
+            except CircuitBreakerOpenException as e:
+                raise LLMStreamError(f"Circuit breaker abierto para {provider.value}") from e
+
+        try:
+            await self._acquire_quota(provider)
+        except QuotaExceededException as e:
+            raise LLMStreamError(f"Cuota agotada para {provider.value}") from e
+
+        try:
+            while True:
+                # El contexto se fija por paso: entre fragmentos el consumidor no lo hereda
+                with self._attempt_quota(provider):
+                    try:
+                        chunk = await anext(stream)
+                    except StopAsyncIteration:
+                        break
+                yield chunk
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure()
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None:
+                await self._block_quota(provider, retry_after)
+            raise
+        if breaker is not None:
+            breaker.record_success()
+
+    async def _stream_request(
+        self,
+        provider_label: str,
+        url: str,
+        headers: dict[str, str],
+        payload: dict[str, Any],
+        parse_line: Callable[[str], str | None],
+        max_retries: int,
+    ) -> AsyncIterator[str]:
+        """
+        POST en modo streaming: parsea el cuerpo línea a línea (SSE o NDJSON) con `parse_line`.
+
+        Solo se reintenta mientras no se haya emitido ningún fragmento al consumidor.
+        """
+        transient_statuses = {408, 429, 500, 502, 503, 504}
+
+        for attempt in range(max_retries):
+            emitted = False
+            try:
+                async with self._session_scope() as session:
+                    async with session.post(
+                        url, headers=headers, json=payload, timeout=self._provider_client_timeout()
+                    ) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            retry_after = self._retry_after_from(response)
+                            if response.status in transient_statuses and retry_after is None and attempt < (max_retries - 1):
+                                if await self._retry_backoff(attempt):
+                                    continue
+                            raise LLMStreamError(
+                                f"{provider_label} Error ({response.status}): {error_text}", retry_after=retry_after
+                            )
+
+                        async for raw_line in response.content:
+                            line = raw_line.decode("utf-8", errors="ignore").strip()
+                            if not line:
+                                continue
+                            text = parse_line(line)
+                            if text:
+                                emitted = True
+                                yield text
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not emitted and attempt < (max_retries - 1):
+                    if await self._retry_backoff(attempt):
+                        continue
+                raise LLMStreamError(f"{provider_label} Exception: {str(e)}") from e
+
+        raise LLMStreamError(f"{provider_label} retries exhausted")
+
+    @staticmethod
+    def _sse_json(line: str) -> dict[str, Any] | None:
+        """Extrae el JSON de una línea `data: {...}` de Server-Sent Events"""
+        if not line.startswith("data:"):
+            return None
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            return None
+        try:
+            parsed = json.loads(data)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    @classmethod
+    def _parse_openai_stream_line(cls, line: str) -> str | None:
+        chunk = cls._sse_json(line)
+        if not chunk:
+            return None
+        if chunk.get("error"):
+            raise LLMStreamError(str(chunk["error"]))
+        choices = chunk.get("choices") or []
+        if not choices:
+            return None
+        return (choices[0].get("delta") or {}).get("content") or None
+
+    @classmethod
+    def _parse_claude_stream_line(cls, line: str) -> str | None:
+        event = cls._sse_json(line)
+        if not event:
+            return None
+        if event.get("type") == "error":
+            raise LLMStreamError(str(event.get("error")))
+        if event.get("type") != "content_block_delta":
+            return None
+        return (event.get("delta") or {}).get("text") or None
+
+    @classmethod
+    def _parse_gemini_stream_line(cls, line: str) -> str | None:
+        chunk = cls._sse_json(line)
+        if not chunk:
+            return None
+        candidates = chunk.get("candidates") or []
+        if not candidates:
+            return None
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts) or None
+
+    @staticmethod
+    def _parse_ollama_stream_line(line: str) -> str | None:
+        try:
+            chunk = json.loads(line)
+        except ValueError:
+            return None
+        if chunk.get("error"):
+            raise LLMStreamError(f"Ollama Error: {chunk['error']}")
+        return (chunk.get("message") or {}).get("content") or None
+
+    async def _stream_openai_compatible(
+        self,
+        provider_label: str,
+        base_url: str,
+        api_key: str | None,
+        model: str,
+        messages: list[dict],
+        temperature: float,
+        max_tokens: int,
+        max_retries: int,
+        include_auth_header: bool = True,
+        extra_headers: dict[str, str] | None = None,
+    ) -> AsyncIterator[str]:
+        """Streaming SSE para APIs compatibles con OpenAI `/chat/completions`."""
+        headers = {"Content-Type": "application/json"}
+        if include_auth_header and api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        if extra_headers:
+            headers.update(extra_headers)
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        async for chunk in self._stream_request(
+            provider_label,
+            f"{base_url}/chat/completions",
+            headers,
+            payload,
+            self._parse_openai_stream_line,
+            max_retries,
+        ):
+            yield chunk
+
+    async def _stream_claude(self, config: APIConfig, messages: list[dict], max_retries: int = 3) -> AsyncIterator[str]:
+        """Streaming SSE de Claude (eventos `content_block_delta`)"""
+        headers = {"Content-Type": "application/json", "X-Api-Key": config.api_key, "anthropic-version": "2023-06-01"}
+
+        claude_messages = []
+        system_message = ""
+        for msg in messages:
+            if msg["role"] == "system":
+                system_message += msg["content"] + "\n"
+            else:
+                claude_messages.append({"role": msg["role"], "content": msg["content"]})
+
+        payload = {
+            "model": config.model,
+            "messages": claude_messages,
+            "max_tokens": config.max_tokens,
+            "temperature": config.temperature,
+            "stream": True,
+        }
+        if system_message.strip():
+            payload["system"] = system_message.strip()
+
+        async for chunk in self._stream_request(
+            "Claude",
+            f"{config.base_url}/v1/messages",
+            headers,
+            payload,
+            self._parse_claude_stream_line,
+            max_retries,
+        ):
+            yield chunk
+
+    async def _stream_gemini(self, config: APIConfig, messages: list[dict], max_retries: int = 3) -> AsyncIterator[str]:
+        """Streaming SSE de Gemini (`streamGenerateContent?alt=sse`)"""
+        contents = [
+            {"role": "user" if msg["role"] == "user" else "model", "parts": [{"text": msg["content"]}]} for msg in messages
+        ]
+        payload = {
+            "contents": contents,
+            "generationConfig": {"temperature": config.temperature, "maxOutputTokens": config.max_tokens},
+        }
+        headers = {"Content-Type": "application/json", "x-goog-api-key": config.api_key}
+
+        async for chunk in self._stream_request(
+            "Gemini",
+            f"{config.base_url}/models/{config.model}:streamGenerateContent?alt=sse",
+            headers,
+            payload,
+            self._parse_gemini_stream_line,
+            max_retries,
+        ):
+            yield chunk
+
+    async def _stream_ollama(self, config: APIConfig, messages: list[dict], max_retries: int = 3) -> AsyncIterator[str]:
+        """Streaming NDJSON de Ollama (`/api/chat` con stream=true)"""
+        payload = {"model": config.model, "messages": messages, "stream": True}
+
+        async for chunk in self._stream_request(
+            "Ollama",
+            f"{config.base_url}/api/chat",
+            {"Content-Type": "application/json"},
+            payload,
+            self._parse_ollama_stream_line,
+            max_retries,
+        ):
+            yield chunk
+
     def _get_fallback_response(self, context: dict | None = None) -> str:
         """Respuesta de emergencia cuando todos los proveedores fallan"""
         business_name = context.get("business_name", "nuestro negocio") if context else "nuestro negocio"
@@ -982,6 +1942,8 @@ class MultiProviderLLM:
                 "is_free": config.is_free,
                 "is_reasoning": config.is_reasoning,
                 "capabilities": self._get_provider_capabilities(config),
+                "routing": self.router.snapshot(provider.value, config.is_free),
+                "quota": self.quota.snapshot(provider.value, config.model, config.rpm_limit, config.rpd_limit),
             }
             for provider, config in self.providers.items()
         ]
@@ -0,0 +1,38 @@
+"""
+📞 Normalización de números de teléfono
+Forma canónica: dígitos E.164 sin '+' (la misma que usa WhatsApp en los chat_id).
+"""
+
+import re
+from typing import Any
+
+_PHONE_SEPARATORS = re.compile(r"[\s\-().]")
+
+
+def normalize_phone(raw: Any, default_country_code: str = "") -> tuple[str | None, str | None]:
+    """
+    Normalizar un número a dígitos E.164 sin '+'
+
+    Returns:
+        (número, None) si es válido; (None, motivo) si se rechaza
+    """
+    if raw is None:
+        return None, "empty"
+    if isinstance(raw, float) and raw.is_integer():
+        # Excel guarda los números como float
+        raw = int(raw)
+    value = _PHONE_SEPARATORS.sub("", str(raw).removesuffix("@c.us"))
+    if not value:
+        return None, "empty"
+    if value.startswith("+"):
+        value = value[1:]
+    elif value.startswith("00"):
+        value = value[2:]
+    elif default_country_code and len(value) == 10:
+        # Número nacional sin indicativo
+        value = default_country_code + value
+    if not value.isdigit():
+        return None, "invalid_characters"
+    if not 8 <= len(value) <= 15:
+        return None, "invalid_length"
+    return value, None
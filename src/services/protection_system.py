@@ -59,15 +59,7 @@ class CircuitBreaker:
     async def call(self, func: Callable, *args, **kwargs) -> Any:
         """Ejecutar función con protección Circuit Breaker"""
 
-        self.stats.total_requests += 1
-
-        if self.state == CircuitBreakerState.OPEN:
-            if self._should_attempt_reset():
-                self.state = CircuitBreakerState.HALF_OPEN
-                self.stats.state_changed_at = datetime.now(timezone.utc)
-                logger.info(f"Circuit breaker {self.name}: OPEN -> HALF_OPEN")
-            else:
-                raise CircuitBreakerOpenException(f"Circuit breaker {self.name} is OPEN")
+        self.acquire()
 
         try:
             # Ejecutar función
@@ -84,6 +76,31 @@ class CircuitBreaker:
             self._on_failure()
             raise e
 
+    def acquire(self) -> None:
+        """
+        Registrar un intento y validar el estado del circuito.
+
+        Para flujos que no se pueden envolver en call() (p.ej. streaming), usar
+        acquire() antes de empezar y record_success()/record_failure() al terminar.
+        """
+        self.stats.total_requests += 1
+
+        if self.state == CircuitBreakerState.OPEN:
+            if self._should_attempt_reset():
+                self.state = CircuitBreakerState.HALF_OPEN
+                self.stats.state_changed_at = datetime.now(timezone.utc)
+                logger.info(f"Circuit breaker {self.name}: OPEN -> HALF_OPEN")
+            else:
+                raise CircuitBreakerOpenException(f"Circuit breaker {self.name} is OPEN")
+
+    def record_success(self) -> None:
+        """Registrar éxito de una llamada iniciada con acquire()"""
+        self._on_success()
+
+    def record_failure(self) -> None:
+        """Registrar fallo de una llamada iniciada con acquire()"""
+        self._on_failure()
+
     def _should_attempt_reset(self) -> bool:
         """Verificar si debemos intentar reset después del timeout"""
         if self.stats.last_failure_time is None:
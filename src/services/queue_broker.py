@@ -2,17 +2,26 @@
 
 Baseline implementation:
 - `InMemoryQueueBroker` for local/dev.
-- `RedisQueueBroker` placeholder for production rollout.
+- `RedisQueueBroker` placeholder for production rollout (plain list, at-most-once).
+- `RedisStreamsQueueBroker` / `AsyncRedisStreamsQueueBroker`: Redis Streams with a
+  consumer group, explicit acks, reclaim of idle pending entries and a dead-letter
+  stream after `max_deliveries`.
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import os
 import queue
-from dataclasses import dataclass
+import socket
+import time
+from dataclasses import dataclass, field
 from typing import Any, Protocol
 
+logger = logging.getLogger(__name__)
+
 
 class QueueBroker(Protocol):
     def enqueue(self, topic: str, payload: dict[str, Any]) -> None: ...
@@ -20,6 +29,14 @@ class QueueBroker(Protocol):
     def dequeue(self, topic: str, timeout_seconds: int = 1) -> dict[str, Any] | None: ...
 
 
+class AsyncQueueBroker(Protocol):
+    """Same contract as `QueueBroker`, for use inside the event loop (FastAPI)."""
+
+    async def enqueue(self, topic: str, payload: dict[str, Any]) -> None: ...
+
+    async def dequeue(self, topic: str, timeout_seconds: int = 1) -> dict[str, Any] | None: ...
+
+
 @dataclass
 class InMemoryQueueBroker:
     _queues: dict[str, queue.Queue]
@@ -62,12 +79,354 @@ class RedisQueueBroker:
         return json.loads(raw)
 
 
+@dataclass
+class AsyncInMemoryQueueBroker:
+    _queues: dict[str, asyncio.Queue]
+
+    def __init__(self) -> None:
+        self._queues = {}
+
+    def _get_q(self, topic: str) -> asyncio.Queue:
+        if topic not in self._queues:
+            self._queues[topic] = asyncio.Queue()
+        return self._queues[topic]
+
+    async def enqueue(self, topic: str, payload: dict[str, Any]) -> None:
+        self._get_q(topic).put_nowait(payload)
+
+    async def dequeue(self, topic: str, timeout_seconds: int = 1) -> dict[str, Any] | None:
+        try:
+            return await asyncio.wait_for(self._get_q(topic).get(), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            return None
+
+
+@dataclass
+class BrokerMessage:
+    """Entry read from a stream; must be acked with its `id` once processed."""
+
+    id: str
+    topic: str
+    payload: dict[str, Any]
+    deliveries: int = 1
+
+
+def _default_consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _is_busy_group(error: Exception) -> bool:
+    return "BUSYGROUP" in str(error)
+
+
+def _is_missing_group(error: Exception) -> bool:
+    return "NOGROUP" in str(error)
+
+
+def _decode_payload(fields: dict[Any, Any]) -> dict[str, Any] | None:
+    raw = fields.get("payload", fields.get(b"payload"))
+    if raw is None:
+        return None
+    try:
+        payload = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _as_str(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+@dataclass
+class _StreamsBrokerBase:
+    """Settings and response parsing shared by the sync and async streams brokers."""
+
+    redis_url: str = "redis://localhost:6379/0"
+    group: str = "workers"
+    consumer: str = field(default_factory=_default_consumer_name)
+    maxlen: int = 100_000
+    max_deliveries: int = 5
+    claim_idle_ms: int = 60_000
+    read_count: int = 10
+    dead_letter_suffix: str = ":dead"
+    client: Any = None
+
+    def __post_init__(self) -> None:
+        self._groups_ready: set[str] = set()
+
+    def dead_letter_topic(self, topic: str) -> str:
+        return f"{topic}{self.dead_letter_suffix}"
+
+    @staticmethod
+    def _entry_fields(payload: dict[str, Any]) -> dict[str, str]:
+        return {"payload": json.dumps(payload, ensure_ascii=False)}
+
+    @staticmethod
+    def _read_entries(response: Any) -> list[tuple[Any, Any]]:
+        """XREADGROUP reply (RESP2 list or RESP3 dict) -> [(id, fields)]"""
+        if not response:
+            return []
+        streams = response.items() if isinstance(response, dict) else response
+        entries: list[tuple[Any, Any]] = []
+        for _, stream_entries in streams:
+            entries.extend(stream_entries)
+        return entries
+
+    def _sort_entries(
+        self, topic: str, entries: list[tuple[Any, Any]], deliveries: dict[str, int]
+    ) -> tuple[list[BrokerMessage], list[tuple[str, dict[Any, Any] | None, int]]]:
+        """Split entries into deliverable messages and dead letters (poison or too many deliveries)"""
+        live: list[BrokerMessage] = []
+        dead: list[tuple[str, dict[Any, Any] | None, int]] = []
+        for raw_id, fields in entries:
+            if fields is None:
+                # Trimmed by MAXLEN while pending: nothing left to deliver
+                continue
+            entry_id = _as_str(raw_id)
+            count = deliveries.get(entry_id, 1)
+            payload = _decode_payload(fields)
+            if payload is None or count > self.max_deliveries:
+                dead.append((entry_id, fields, count))
+            else:
+                live.append(BrokerMessage(id=entry_id, topic=topic, payload=payload, deliveries=count))
+        return live, dead
+
+    def _dead_letter_fields(self, topic: str, entry_id: str, fields: dict[Any, Any], deliveries: int) -> dict[str, str]:
+        raw = fields.get("payload", fields.get(b"payload", ""))
+        return {
+            "payload": _as_str(raw),
+            "source_topic": topic,
+            "source_id": entry_id,
+            "deliveries": str(deliveries),
+            "dead_lettered_at": str(int(time.time())),
+        }
+
+    @staticmethod
+    def _pending_deliveries(pending: list[Any]) -> dict[str, int]:
+        deliveries: dict[str, int] = {}
+        for rows in pending:
+            for row in rows or []:
+                deliveries[_as_str(row["message_id"])] = int(row["times_delivered"])
+        return deliveries
+
+
+@dataclass
+class RedisStreamsQueueBroker(_StreamsBrokerBase):
+    """
+    At-least-once broker on Redis Streams (XADD / XREADGROUP / XACK / XAUTOCLAIM).
+
+    Consumers in the same `group` share the stream: each entry goes to one of them
+    and stays pending until acked. Entries idle longer than `claim_idle_ms` (crashed
+    or stuck consumer) are reclaimed by the next `read`; after `max_deliveries` they
+    are moved to `<topic>:dead` instead. Streams are trimmed to ~`maxlen` on XADD.
+    """
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.client is None:
+            import redis  # type: ignore
+
+            self.client = redis.Redis.from_url(self.redis_url, decode_responses=True)
+
+    def _ensure_group(self, topic: str) -> None:
+        if topic in self._groups_ready:
+            return
+        try:
+            self.client.xgroup_create(topic, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if not _is_busy_group(e):
+                raise
+        self._groups_ready.add(topic)
+
+    def enqueue(self, topic: str, payload: dict[str, Any]) -> None:
+        self.client.xadd(topic, self._entry_fields(payload), maxlen=self.maxlen, approximate=True)
+
+    def read(self, topic: str, count: int | None = None, block_ms: int | None = None) -> list[BrokerMessage]:
+        """Up to `count` messages: reclaimed idle entries first, then new ones (blocking up to `block_ms`)"""
+        count = count or self.read_count
+        self._ensure_group(topic)
+        try:
+            messages = self.reclaim(topic, count)
+            if len(messages) < count:
+                response = self.client.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {topic: ">"},
+                    count=count - len(messages),
+                    block=None if messages else block_ms,
+                )
+                live, dead = self._sort_entries(topic, self._read_entries(response), {})
+                self._move_to_dead_letter(topic, dead)
+                messages.extend(live)
+            return messages
+        except Exception as e:
+            if _is_missing_group(e):
+                # Stream deleted under us: recreate the group on the next read
+                self._groups_ready.discard(topic)
+            raise
+
+    def reclaim(self, topic: str, count: int | None = None) -> list[BrokerMessage]:
+        """Take over entries idle for more than `claim_idle_ms`, dead-lettering the exhausted ones"""
+        self._ensure_group(topic)
+        reply = self.client.xautoclaim(
+            topic, self.group, self.consumer, self.claim_idle_ms, start_id="0-0", count=count or self.read_count
+        )
+        entries = reply[1] if reply else []
+        if not entries:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, _ in entries:
+            pipe.xpending_range(topic, self.group, entry_id, entry_id, 1)
+        live, dead = self._sort_entries(topic, entries, self._pending_deliveries(pipe.execute()))
+        self._move_to_dead_letter(topic, dead)
+        return live
+
+    def ack(self, topic: str, *message_ids: str) -> int:
+        if not message_ids:
+            return 0
+        return int(self.client.xack(topic, self.group, *message_ids))
+
+    def _move_to_dead_letter(self, topic: str, dead: list[tuple[str, dict[Any, Any] | None, int]]) -> None:
+        if not dead:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        for entry_id, fields, deliveries in dead:
+            pipe.xadd(
+                self.dead_letter_topic(topic),
+                self._dead_letter_fields(topic, entry_id, fields or {}, deliveries),
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+            pipe.xack(topic, self.group, entry_id)
+        pipe.execute()
+        logger.warning("Moved %d entries from %s to dead-letter stream", len(dead), topic)
+
+    def dequeue(self, topic: str, timeout_seconds: int = 1) -> dict[str, Any] | None:
+        """`QueueBroker` compatibility: read one entry and ack it right away (at-most-once)"""
+        messages = self.read(topic, count=1, block_ms=max(1, int(timeout_seconds * 1000)))
+        if not messages:
+            return None
+        self.ack(topic, messages[0].id)
+        return messages[0].payload
+
+
+@dataclass
+class AsyncRedisStreamsQueueBroker(_StreamsBrokerBase):
+    """`RedisStreamsQueueBroker` on `redis.asyncio`: same semantics, without blocking a thread."""
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.client is None:
+            import redis.asyncio as aioredis  # type: ignore
+
+            self.client = aioredis.Redis.from_url(self.redis_url, decode_responses=True)
+
+    async def _ensure_group(self, topic: str) -> None:
+        if topic in self._groups_ready:
+            return
+        try:
+            await self.client.xgroup_create(topic, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if not _is_busy_group(e):
+                raise
+        self._groups_ready.add(topic)
+
+    async def enqueue(self, topic: str, payload: dict[str, Any]) -> None:
+        await self.client.xadd(topic, self._entry_fields(payload), maxlen=self.maxlen, approximate=True)
+
+    async def read(self, topic: str, count: int | None = None, block_ms: int | None = None) -> list[BrokerMessage]:
+        count = count or self.read_count
+        await self._ensure_group(topic)
+        try:
+            messages = await self.reclaim(topic, count)
+            if len(messages) < count:
+                response = await self.client.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {topic: ">"},
+                    count=count - len(messages),
+                    block=None if messages else block_ms,
+                )
+                live, dead = self._sort_entries(topic, self._read_entries(response), {})
+                await self._move_to_dead_letter(topic, dead)
+                messages.extend(live)
+            return messages
+        except Exception as e:
+            if _is_missing_group(e):
+                self._groups_ready.discard(topic)
+            raise
+
+    async def reclaim(self, topic: str, count: int | None = None) -> list[BrokerMessage]:
+        await self._ensure_group(topic)
+        reply = await self.client.xautoclaim(
+            topic, self.group, self.consumer, self.claim_idle_ms, start_id="0-0", count=count or self.read_count
+        )
+        entries = reply[1] if reply else []
+        if not entries:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, _ in entries:
+            pipe.xpending_range(topic, self.group, entry_id, entry_id, 1)
+        live, dead = self._sort_entries(topic, entries, self._pending_deliveries(await pipe.execute()))
+        await self._move_to_dead_letter(topic, dead)
+        return live
+
+    async def ack(self, topic: str, *message_ids: str) -> int:
+        if not message_ids:
+            return 0
+        return int(await self.client.xack(topic, self.group, *message_ids))
+
+    async def _move_to_dead_letter(self, topic: str, dead: list[tuple[str, dict[Any, Any] | None, int]]) -> None:
+        if not dead:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        for entry_id, fields, deliveries in dead:
+            pipe.xadd(
+                self.dead_letter_topic(topic),
+                self._dead_letter_fields(topic, entry_id, fields or {}, deliveries),
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+            pipe.xack(topic, self.group, entry_id)
+        await pipe.execute()
+        logger.warning("Moved %d entries from %s to dead-letter stream", len(dead), topic)
+
+    async def dequeue(self, topic: str, timeout_seconds: int = 1) -> dict[str, Any] | None:
+        messages = await self.read(topic, count=1, block_ms=max(1, int(timeout_seconds * 1000)))
+        if not messages:
+            return None
+        await self.ack(topic, messages[0].id)
+        return messages[0].payload
+
+
+def _streams_settings() -> dict[str, Any]:
+    return {
+        "redis_url": os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        "group": os.getenv("QUEUE_BROKER_GROUP", "workers"),
+        "consumer": os.getenv("QUEUE_BROKER_CONSUMER") or _default_consumer_name(),
+        "maxlen": int(os.getenv("QUEUE_BROKER_MAXLEN", "100000")),
+        "max_deliveries": int(os.getenv("QUEUE_BROKER_MAX_DELIVERIES", "5")),
+        "claim_idle_ms": int(os.getenv("QUEUE_BROKER_CLAIM_IDLE_MS", "60000")),
+        "read_count": int(os.getenv("QUEUE_BROKER_READ_COUNT", "10")),
+    }
+
+
 def get_queue_broker() -> QueueBroker:
     backend = os.getenv("QUEUE_BROKER_BACKEND", "memory").lower()
     if backend == "redis":
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         return RedisQueueBroker(redis_url=redis_url)
+    if backend == "redis_streams":
+        return RedisStreamsQueueBroker(**_streams_settings())
     return InMemoryQueueBroker()
 
 
+def get_async_queue_broker() -> AsyncQueueBroker:
+    backend = os.getenv("QUEUE_BROKER_BACKEND", "memory").lower()
+    if backend == "redis_streams":
+        return AsyncRedisStreamsQueueBroker(**_streams_settings())
+    return AsyncInMemoryQueueBroker()
+
+
 queue_broker = get_queue_broker()
@@ -0,0 +1,273 @@
+"""
+🔔 Señales de despertar para los consumidores de la cola de mensajes
+Al encolar se emite una señal y los consumidores (sender del automator, heartbeat
+del scheduler, /ws/metrics) esperan esa señal en vez de consultar la tabla a
+intervalo fijo; el intervalo queda solo como respaldo largo.
+
+- PostgreSQL: pg_notify dentro de la transacción del encolado (se entrega al hacer
+  commit y se descarta en rollback) + un hilo con LISTEN por proceso.
+- Redis (REDIS_URL configurado): PUBLISH tras el commit + un hilo suscrito.
+- SQLite / nodo único: solo eventos en proceso (threading.Event / asyncio.Event).
+
+Cada señal lleva un tipo en el payload: "enqueue" (mensajes nuevos en la cola) o
+"due" (el dispatcher avisa que vencieron mensajes programados). wait()/wait_async()
+despiertan con cualquiera; subscribe() puede filtrar por tipo.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import select
+import threading
+from collections.abc import Callable, Collection
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+_CHANNEL_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+SIGNAL_KINDS = ("enqueue", "due")
+
+
+def _signal_kind(payload: Any) -> str:
+    """Tipo de señal desde el payload de NOTIFY/PUBLISH (vacío o desconocido = encolado)"""
+    if isinstance(payload, bytes):
+        payload = payload.decode(errors="replace")
+    return payload if payload in SIGNAL_KINDS else "enqueue"
+
+
+def _database_dialect() -> str:
+    try:
+        from src.models.admin_db import engine
+
+        return engine.dialect.name
+    except Exception as e:
+        logger.debug("Dialecto de base de datos no disponible: %s", e)
+        return "sqlite"
+
+
+class QueueWakeup:
+    """
+    Señal "hay mensajes nuevos en la cola" entre productores y consumidores.
+
+    Los productores llaman notify_in_transaction(session) antes del commit y
+    notify_committed() después. Los consumidores usan wait() (hilos), wait_async()
+    (event loop) o subscribe(callback); todos devuelven/llaman apenas llega una señal
+    y, si no llega ninguna, al vencer el respaldo.
+    """
+
+    def __init__(self, backend: str | None = None, channel: str | None = None, fallback_seconds: float | None = None) -> None:
+        self.channel = channel or os.getenv("QUEUE_WAKEUP_CHANNEL", "message_queue_wakeup")
+        if not _CHANNEL_RE.match(self.channel):
+            raise ValueError(f"Canal de señal inválido: {self.channel!r}")
+        self.fallback_seconds = (
+            fallback_seconds if fallback_seconds is not None else float(os.getenv("QUEUE_WAKEUP_FALLBACK_SECONDS", "30"))
+        )
+        self.backend = self._resolve_backend((backend or os.getenv("QUEUE_WAKEUP_BACKEND", "auto")).lower())
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._async_waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._callbacks: list[tuple[Callable[[], None], frozenset[str] | None]] = []
+        self._listener: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._redis_client: Any = None
+        self.stats = {"sent": 0, "received": 0, "listener_errors": 0}
+
+    @staticmethod
+    def _resolve_backend(backend: str) -> str:
+        if backend != "auto":
+            return backend
+        if _database_dialect() == "postgresql":
+            return "postgres"
+        # REDIS_URL tiene valor por defecto en todo el proyecto: solo se usa si está configurado
+        if os.getenv("REDIS_URL") and REDIS_AVAILABLE:
+            return "redis"
+        return "local"
+
+    # ── Productores ──
+
+    def notify_in_transaction(self, session: Any, kind: str = "enqueue") -> None:
+        """pg_notify en la transacción del encolado (no-op fuera de PostgreSQL)"""
+        if self.backend != "postgres":
+            return
+        from sqlalchemy import text
+
+        session.execute(text("SELECT pg_notify(:channel, :kind)"), {"channel": self.channel, "kind": kind})
+
+    def notify_committed(self, kind: str = "enqueue") -> None:
+        """Despertar a los consumidores tras el commit (proceso local + Redis)"""
+        self.stats["sent"] += 1
+        if self.backend == "redis":
+            try:
+                self._redis().publish(self.channel, kind)
+            except Exception as e:
+                logger.debug("No se pudo publicar señal de cola en Redis: %s", e)
+        # En postgres/redis el propio proceso también recibe la señal por el listener;
+        # despertar localmente ya evita esperar ese viaje de ida y vuelta
+        self._fire(kind)
+
+    def broadcast(self, kind: str = "enqueue") -> None:
+        """Señal fuera de un encolado (p. ej. kind="due": un mensaje programado acaba de vencer)"""
+        if self.backend == "postgres":
+            from src.models.admin_db import get_session
+
+            session = get_session()
+            try:
+                self.notify_in_transaction(session, kind)
+                session.commit()
+            except Exception as e:
+                logger.debug("No se pudo emitir pg_notify de cola: %s", e)
+            finally:
+                session.close()
+        self.notify_committed(kind)
+
+    # ── Consumidores ──
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Bloquear el hilo hasta una señal o el respaldo. True si hubo señal"""
+        self.start_listener()
+        signalled = self._event.wait(self.fallback_seconds if timeout is None else timeout)
+        self._event.clear()
+        return signalled
+
+    async def wait_async(self, timeout: float | None = None) -> bool:
+        """Esperar una señal sin bloquear el event loop. True si hubo señal"""
+        self.start_listener()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), self.fallback_seconds if timeout is None else timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._async_waiters.discard(waiter)
+
+    def subscribe(self, callback: Callable[[], None], kinds: Collection[str] | None = None) -> None:
+        """Registrar un callback que se ejecuta (en el hilo que recibe la señal) con cada señal de `kinds` (None = todas)"""
+        with self._lock:
+            self._callbacks.append((callback, frozenset(kinds) if kinds is not None else None))
+        self.start_listener()
+
+    def _fire(self, kind: str = "enqueue") -> None:
+        self._event.set()
+        with self._lock:
+            waiters = list(self._async_waiters)
+            callbacks = [callback for callback, kinds in self._callbacks if kinds is None or kind in kinds]
+        for loop, event in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("⚠️ Error en callback de señal de cola: %s", e)
+
+    # ── Listener entre procesos ──
+
+    def start_listener(self) -> None:
+        if self.backend not in ("postgres", "redis"):
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._stop.clear()
+            target = self._listen_postgres if self.backend == "postgres" else self._listen_redis
+            self._listener = threading.Thread(target=target, name="queue-wakeup-listener", daemon=True)
+            self._listener.start()
+
+    def stop_listener(self) -> None:
+        self._stop.set()
+        listener = self._listener
+        if listener is not None and listener.is_alive():
+            listener.join(timeout=2)
+
+    def _received(self, kind: str) -> None:
+        self.stats["received"] += 1
+        self._fire(kind)
+
+    def _listen_postgres(self) -> None:
+        from src.models.admin_db import engine
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                # Conexión dedicada (fuera del pool) en autocommit para LISTEN
+                raw = engine.raw_connection()
+                raw.detach()
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                logger.info("🔔 Escuchando señales de cola en PostgreSQL (%s)", self.channel)
+                backoff = 1.0
+                # Lo encolado mientras no escuchábamos no se notificó: despertar una vez
+                self._fire()
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    if connection.notifies:
+                        kinds = {_signal_kind(notify.payload) for notify in connection.notifies}
+                        connection.notifies.clear()
+                        for kind in sorted(kinds):
+                            self._received(kind)
+            except Exception as e:
+                self.stats["listener_errors"] += 1
+                logger.warning("⚠️ Listener de señales de cola caído (%s), reintentando en %.0fs", e, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception as e:
+                        logger.debug("Error cerrando conexión LISTEN: %s", e)
+
+    def _redis(self) -> Any:
+        if self._redis_client is None:
+            self._redis_client = redis.Redis.from_url(self.redis_url, socket_timeout=2, socket_connect_timeout=2)
+        return self._redis_client
+
+    def _listen_redis(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                logger.info("🔔 Escuchando señales de cola en Redis (%s)", self.channel)
+                backoff = 1.0
+                self._fire()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._received(_signal_kind(message.get("data")))
+            except Exception as e:
+                self.stats["listener_errors"] += 1
+                logger.warning("⚠️ Suscripción de señales de cola caída (%s), reintentando en %.0fs", e, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception as e:
+                        logger.debug("Error cerrando suscripción de señales: %s", e)
+
+
+# Instancia global
+queue_wakeup = QueueWakeup()
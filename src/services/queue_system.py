@@ -4,24 +4,118 @@ Gestión centralizada de todos los mensajes salientes (bulk, scheduled, manual)
 """
 
 import contextlib
+import csv
+import io
+import json
 import logging
+import math
+import os
+import random
+import re
+import time
 import uuid
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from typing import Any
 
-from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text, or_
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    Text,
+    Update,
+    case,
+    delete,
+    false,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
 
 from src.models.admin_db import get_session
 from src.models.models import Base
+from src.services.llm_quota import TokenBucket
+from src.services.queue_signals import queue_wakeup
+from src.services.suppression_list import SuppressedRecipientError, suppression_list
 
 logger = logging.getLogger(__name__)
 
+try:
+    from src.services.metrics import observe_histogram
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _chunks(items: list[Any], size: int) -> list[list[Any]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devuelve datetimes naive (guardados en UTC)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _campaign_id_of(metadata: dict[str, Any] | None) -> str | None:
+    campaign_id = (metadata or {}).get("campaign_id")
+    return str(campaign_id) if campaign_id else None
+
+
+# Columnas que escribe la inserción masiva (COPY en PostgreSQL, executemany en el resto)
+BULK_INSERT_COLUMNS = (
+    "message_id",
+    "chat_id",
+    "message",
+    "status",
+    "priority",
+    "scheduled_at",
+    "created_at",
+    "retry_count",
+    "max_retries",
+    "extra_data",
+    "campaign_id",
+)
+
+
+def build_message_record(
+    chat_id: str,
+    message: str,
+    priority: int = 0,
+    scheduled_at: datetime | None = None,
+    metadata: dict[str, Any] | None = None,
+    max_retries: int = 3,
+    created_at: datetime | None = None,
+) -> dict[str, Any]:
+    """Fila completa de message_queue para inserción masiva (sin objetos ORM)"""
+    return {
+        "message_id": f"msg_{uuid.uuid4().hex[:16]}",
+        "chat_id": chat_id,
+        "message": message,
+        "status": "pending",
+        "priority": priority,
+        "scheduled_at": scheduled_at,
+        "created_at": created_at or _utcnow(),
+        "retry_count": 0,
+        "max_retries": max_retries,
+        "extra_data": metadata or {},
+        "campaign_id": _campaign_id_of(metadata),
+    }
+
+
 class MessageStatus(str, Enum):
     """Estados posibles de un mensaje"""
 
@@ -33,11 +127,18 @@ class MessageStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+# Estados que un worker puede reclamar (RETRY vuelve a la cola cuando llega su scheduled_at)
+CLAIMABLE_STATUSES = (MessageStatus.PENDING.value, MessageStatus.RETRY.value)
+
+
 class QueuedMessage(Base):
     """Modelo de mensaje en cola"""
 
     __tablename__ = "message_queue"
-    __table_args__ = (Index("ix_queued_message_status_scheduled", "status", "scheduled_at"),)
+    __table_args__ = (
+        Index("ix_queued_message_status_scheduled", "status", "scheduled_at"),
+        Index("ix_message_queue_campaign_status", "campaign_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     message_id = Column(String(100), unique=True, nullable=False, index=True)
@@ -53,6 +154,27 @@ class QueuedMessage(Base):
     max_retries = Column(Integer, default=3, nullable=False)
     error_message = Column(Text, nullable=True)
     extra_data = Column(JSON, nullable=True)  # campaign_id, media, etc.
+    # Copia indexada de extra_data["campaign_id"] para operar por campaña sin leer la cola
+    campaign_id = Column(String(100), nullable=True)
+    # Reclamo (lease) del worker que lo está enviando; vencido, el reaper lo devuelve a pending
+    claimed_by = Column(String(100), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+
+
+# Índices parciales: solo filas reclamables (en el orden de claim_messages) y leases activos
+Index(
+    "ix_message_queue_claimable",
+    QueuedMessage.priority.desc(),
+    QueuedMessage.created_at,
+    postgresql_where=QueuedMessage.status.in_(CLAIMABLE_STATUSES),
+    sqlite_where=QueuedMessage.status.in_(CLAIMABLE_STATUSES),
+)
+Index(
+    "ix_message_queue_lease_until",
+    QueuedMessage.lease_until,
+    postgresql_where=QueuedMessage.status == MessageStatus.PROCESSING.value,
+    sqlite_where=QueuedMessage.status == MessageStatus.PROCESSING.value,
+)
 
 
 class Campaign(Base):
@@ -72,10 +194,134 @@ class Campaign(Base):
     extra_data = Column(JSON, nullable=True)
 
 
+class DeadLetterMessage(Base):
+    """Mensaje que agotó sus reintentos o falló con un error permanente, fuera de la cola caliente"""
+
+    __tablename__ = "message_dead_letters"
+    __table_args__ = (
+        Index("ix_dead_letters_campaign_failed", "campaign_id", "failed_at"),
+        Index("ix_dead_letters_error_class_failed", "error_class", "failed_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    message_id = Column(String(100), unique=True, nullable=False, index=True)
+    chat_id = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)
+    campaign_id = Column(String(100), nullable=True)
+    extra_data = Column(JSON, nullable=True)
+    retry_count = Column(Integer, default=0, nullable=False)
+    max_retries = Column(Integer, default=3, nullable=False)
+    error_class = Column(String(40), nullable=False)
+    last_error = Column(Text, nullable=True)
+    queued_at = Column(DateTime, nullable=True)
+    failed_at = Column(DateTime, default=_utcnow, nullable=False, index=True)
+    # Marca del requeue en curso: las filas marcadas se mueven juntas en la misma transacción
+    requeue_batch = Column(String(32), nullable=True)
+
+
+# Clase de error -> patrón sobre el texto del error (errores de Playwright, códigos de Graph API).
+# El primero que coincide gana; sin coincidencia la clase es "unknown".
+ERROR_CLASS_PATTERNS: tuple[tuple[str, re.Pattern[str]], ...] = (
+    ("suppressed", re.compile(r"^suppressed\b", re.I)),
+    ("invalid_recipient", re.compile(r"\b(131026|131030)\b|invalid.{0,20}(phone|number|recipient)|not.{0,5}whatsapp", re.I)),
+    ("rejected", re.compile(r"\b(131047|131051|131052)\b|re-?engagement|unsupported message|rejected", re.I)),
+    ("rate_limited", re.compile(r"\b(429|130429|131048|131056)\b|rate.?limit|too many", re.I)),
+    ("auth", re.compile(r"\b(401|403|190)\b|unauthori[sz]ed|token.{0,20}expired", re.I)),
+    ("session", re.compile(r"session|logged out|not logged|disconnected|target closed|page closed|browser", re.I)),
+    ("timeout", re.compile(r"timeout|timed out", re.I)),
+)
+
+# Reintentar no cambia el resultado: van directo a dead letters
+DEFAULT_PERMANENT_ERROR_CLASSES = frozenset({"suppressed", "invalid_recipient", "rejected"})
+# Error con el que se descartan al reclamar los mensajes a números suprimidos
+SUPPRESSED_ERROR = "suppressed: destinatario en la lista de supresión"
+# Error con el que se registra un lease vencido (clase "timeout", reintentable)
+LEASE_EXPIRED_ERROR = "lease timeout: el worker no confirmó el envío antes de que venciera el lease"
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Backoff exponencial con full jitter: el reintento n espera uniforme(0, min(max, base * multiplier^(n-1))).
+
+    Así, cuando cae la sesión de WhatsApp, miles de reintentos no vuelven en el mismo instante.
+    """
+
+    base_seconds: float = 60.0
+    max_delay_seconds: float = 3600.0
+    multiplier: float = 2.0
+    permanent_error_classes: frozenset[str] = DEFAULT_PERMANENT_ERROR_CLASSES
+    rng: random.Random = field(default_factory=random.Random)
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        permanent = os.getenv("QUEUE_PERMANENT_ERROR_CLASSES")
+        return cls(
+            base_seconds=float(os.getenv("QUEUE_RETRY_BASE_SECONDS", "60")),
+            max_delay_seconds=float(os.getenv("QUEUE_RETRY_MAX_DELAY_SECONDS", "3600")),
+            multiplier=float(os.getenv("QUEUE_RETRY_MULTIPLIER", "2")),
+            permanent_error_classes=(
+                frozenset(name.strip() for name in permanent.split(",") if name.strip())
+                if permanent is not None
+                else DEFAULT_PERMANENT_ERROR_CLASSES
+            ),
+        )
+
+    @staticmethod
+    def classify(error: str | None) -> str:
+        for error_class, pattern in ERROR_CLASS_PATTERNS:
+            if error and pattern.search(error):
+                return error_class
+        return "unknown"
+
+    def is_retryable(self, error_class: str) -> bool:
+        return error_class not in self.permanent_error_classes
+
+    def delay_seconds(self, retry_count: int) -> float:
+        ceiling = min(self.max_delay_seconds, self.base_seconds * self.multiplier ** max(0, retry_count - 1))
+        return self.rng.uniform(0.0, ceiling)
+
+
+def _copy_value(value: Any) -> Any:
+    """Valor de una celda CSV para COPY (NULL como \\N, JSON serializado, fechas ISO)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, dict | list):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _outside_paused_campaigns(query: Any) -> Any:
+    """Excluir mensajes de campañas pausadas (LEFT JOIN por campaign_id, ambos lados indexados)"""
+    return query.outerjoin(Campaign, Campaign.campaign_id == QueuedMessage.campaign_id).where(
+        or_(Campaign.status.is_(None), Campaign.status != "paused")
+    )
+
+
+def _in_campaigns(campaign_ids: list[str | None]) -> Any:
+    """Filtro por campaña; None en la lista selecciona los mensajes sin campaña (manuales)"""
+    named = [campaign_id for campaign_id in campaign_ids if campaign_id is not None]
+    clauses = [QueuedMessage.campaign_id.in_(named)] if named else []
+    if None in campaign_ids:
+        clauses.append(QueuedMessage.campaign_id.is_(None))
+    return or_(*clauses) if clauses else false()
+
+
+class CampaignImportingError(ValueError):
+    """La campaña está importando su audiencia: no se puede pausar ni reanudar aún"""
+
+
 class QueueManager:
     """Gestor de la cola de mensajes"""
 
     def __init__(self) -> None:
+        self.lease_seconds = int(os.getenv("QUEUE_LEASE_SECONDS", "120"))
+        # Tamaño de bloque de los IN (...) en operaciones por lote
+        self.batch_chunk_size = max(1, int(os.getenv("QUEUE_BATCH_CHUNK_SIZE", "500")))
+        self.retry_policy = RetryPolicy.from_env()
         logger.info("📬 Queue Manager inicializado")
 
     def enqueue_message(
@@ -100,7 +346,13 @@ class QueueManager:
 
         Returns:
             message_id generado
+
+        Raises:
+            SuppressedRecipientError: si chat_id está en la lista de supresión
         """
+        if suppression_list.is_suppressed(chat_id):
+            logger.info("🚫 No se encola mensaje para %s: está en la lista de supresión", chat_id)
+            raise SuppressedRecipientError(f"{chat_id} está en la lista de supresión")
         try:
             session = get_session()
 
@@ -116,11 +368,14 @@ class QueueManager:
                 priority=priority,
                 scheduled_at=when,
                 extra_data=metadata or {},
+                campaign_id=_campaign_id_of(metadata),
                 max_retries=max_retries,
             )
 
             session.add(queued_msg)
+            queue_wakeup.notify_in_transaction(session)
             session.commit()
+            queue_wakeup.notify_committed()
 
             logger.info("✅ Mensaje encolado: %s para %s", message_id, chat_id)
             return message_id
@@ -135,33 +390,38 @@ class QueueManager:
                 session.close()
 
     def enqueue_bulk_messages(self, rows: list[dict[str, Any]]) -> list[str]:
-        """Bulk enqueue messages with a single DB transaction for campaign-scale throughput."""
+        """Bulk enqueue messages with a single DB transaction for campaign-scale throughput.
+
+        Rows whose chat_id is in the suppression list are skipped: the returned ids
+        cover only the rows actually enqueued.
+        """
+        allowed = [row for row in rows if not suppression_list.is_suppressed(row.get("chat_id"))]
+        if len(allowed) < len(rows):
+            logger.info("🚫 %d destinatarios omitidos por lista de supresión", len(rows) - len(allowed))
+        rows = allowed
         if not rows:
             return []
 
         session = get_session()
         try:
-            prepared: list[QueuedMessage] = []
-            ids: list[str] = []
-
-            for row in rows:
-                message_id = f"msg_{uuid.uuid4().hex[:16]}"
-                ids.append(message_id)
-                prepared.append(
-                    QueuedMessage(
-                        message_id=message_id,
-                        chat_id=str(row.get("chat_id") or "").strip(),
-                        message=str(row.get("message") or ""),
-                        status=MessageStatus.PENDING,
-                        priority=int(row.get("priority") or 0),
-                        scheduled_at=row.get("when"),
-                        extra_data=row.get("metadata") or {},
-                        max_retries=max(1, int(row.get("max_retries") or 3)),
-                    )
+            now = _utcnow()
+            records = [
+                build_message_record(
+                    chat_id=str(row.get("chat_id") or "").strip(),
+                    message=str(row.get("message") or ""),
+                    priority=int(row.get("priority") or 0),
+                    scheduled_at=row.get("when"),
+                    metadata=row.get("metadata"),
+                    max_retries=max(1, int(row.get("max_retries") or 3)),
+                    created_at=now,
                 )
-
-            session.bulk_save_objects(prepared)
+                for row in rows
+            ]
+            ids = [record["message_id"] for record in records]
+            self._insert_records(session, records)
+            queue_wakeup.notify_in_transaction(session)
             session.commit()
+            queue_wakeup.notify_committed()
             return ids
         except Exception as e:
             logger.error("❌ Error encolando bulk messages: %s", e)
@@ -186,7 +446,9 @@ class QueueManager:
         try:
             session = get_session()
 
-            query = session.query(QueuedMessage).filter(QueuedMessage.status == MessageStatus.PENDING)
+            query = _outside_paused_campaigns(
+                session.query(QueuedMessage).filter(QueuedMessage.status == MessageStatus.PENDING)
+            )
 
             if include_scheduled:
                 # Solo incluir mensajes cuya hora llegó
@@ -206,24 +468,256 @@ class QueueManager:
             logger.error("❌ Error obteniendo mensajes pendientes: %s", e)
             return []
 
-    def mark_as_sent(self, message_id: str) -> bool:
-        """Marcar mensaje como enviado"""
+    def get_scheduled_window(self, horizon_seconds: float, limit: int = 1000) -> list[dict[str, Any]]:
+        """
+        Próxima ventana de mensajes programados, para el dispatcher del scheduler
+
+        Devuelve los mensajes reclamables con scheduled_at hasta now + horizon_seconds
+        (incluye los ya vencidos que nadie reclamó), fuera de campañas pausadas y
+        ordenados por scheduled_at. Solo lee las columnas que necesita el heap.
+
+        Returns:
+            Lista de {"message_id", "scheduled_at", "priority"}
+        """
+        session = get_session()
         try:
-            session = get_session()
+            until = _utcnow() + timedelta(seconds=horizon_seconds)
+            rows = session.execute(
+                _outside_paused_campaigns(select(QueuedMessage.message_id, QueuedMessage.scheduled_at, QueuedMessage.priority))
+                .where(
+                    QueuedMessage.status.in_(CLAIMABLE_STATUSES),
+                    QueuedMessage.scheduled_at.is_not(None),
+                    QueuedMessage.scheduled_at <= until,
+                )
+                .order_by(QueuedMessage.scheduled_at.asc(), QueuedMessage.priority.desc())
+                .limit(limit)
+            ).all()
+            return [
+                {"message_id": row.message_id, "scheduled_at": _as_utc(row.scheduled_at), "priority": int(row.priority or 0)}
+                for row in rows
+            ]
+        except Exception as e:
+            logger.error("❌ Error leyendo ventana de mensajes programados: %s", e)
+            return []
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
 
-            msg = session.query(QueuedMessage).filter(QueuedMessage.message_id == message_id).first()
+    def get_ready_campaign_ids(self) -> list[str | None]:
+        """Campañas con mensajes listos para reclamar (None = mensajes manuales, sin campaña)"""
+        session = get_session()
+        try:
+            rows = session.execute(
+                _outside_paused_campaigns(select(QueuedMessage.campaign_id))
+                .where(
+                    QueuedMessage.status.in_(CLAIMABLE_STATUSES),
+                    or_(QueuedMessage.scheduled_at.is_(None), QueuedMessage.scheduled_at <= _utcnow()),
+                )
+                .distinct()
+            ).scalars()
+            return list(rows)
+        except Exception as e:
+            logger.error("❌ Error listando campañas con mensajes listos: %s", e)
+            return []
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
 
-            if msg:
-                msg.status = MessageStatus.SENT
-                msg.sent_at = datetime.now(timezone.utc)
-                msg.processed_at = datetime.now(timezone.utc)
-                session.commit()
+    def claim_messages(
+        self,
+        worker_id: str,
+        limit: int = 10,
+        lease_seconds: int | None = None,
+        campaign_ids: list[str | None] | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Reclamar atómicamente mensajes listos para enviar
 
-                # Actualizar campaign si aplica
-                if msg.extra_data and msg.extra_data.get("campaign_id"):
-                    self._update_campaign_stats(msg.extra_data["campaign_id"], sent=True)
+        Los mensajes reclamados pasan a 'processing' con un lease a nombre de worker_id;
+        otro worker no los verá hasta que el lease venza (reap_expired_leases). En
+        PostgreSQL la subconsulta usa FOR UPDATE SKIP LOCKED, así varios workers drenan
+        la cola en paralelo sin bloquearse; en SQLite el UPDATE único ya es atómico
+        (un solo escritor) y el filtro de estado evita reclamar dos veces.
 
-            session.close()
+        Args:
+            worker_id: Identificador del worker que envía
+            limit: Cantidad máxima a reclamar
+            lease_seconds: Duración del lease (por defecto QUEUE_LEASE_SECONDS)
+            campaign_ids: Reclamar solo de estas campañas (None en la lista = mensajes sin campaña)
+
+        Returns:
+            Mensajes reclamados, en orden de prioridad y antigüedad
+        """
+        if limit <= 0:
+            return []
+
+        session = get_session()
+        try:
+            now = _utcnow()
+            lease_until = now + timedelta(seconds=lease_seconds or self.lease_seconds)
+
+            dialect = session.get_bind().dialect
+            claim = self._claim_statement(worker_id, limit, now, lease_until, dialect.name, campaign_ids)
+            if dialect.update_returning:
+                claimed_ids = list(session.execute(claim.returning(QueuedMessage.id)).scalars())
+            else:
+                session.execute(claim)
+                claimed_ids = list(
+                    session.execute(
+                        select(QueuedMessage.id).where(
+                            QueuedMessage.status == MessageStatus.PROCESSING.value,
+                            QueuedMessage.claimed_by == worker_id,
+                            QueuedMessage.lease_until == lease_until,
+                        )
+                    ).scalars()
+                )
+            session.commit()
+
+            if not claimed_ids:
+                return []
+            messages = (
+                session.query(QueuedMessage)
+                .filter(QueuedMessage.id.in_(claimed_ids))
+                .order_by(QueuedMessage.priority.desc(), QueuedMessage.created_at.asc())
+                .all()
+            )
+            logger.debug("📥 Worker %s reclamó %d mensajes", worker_id, len(messages))
+            self._observe_claim_latency(messages, now)
+            claimed = [self._message_to_dict(msg) for msg in messages]
+        except Exception as e:
+            logger.error("❌ Error reclamando mensajes: %s", e)
+            with contextlib.suppress(Exception):
+                session.rollback()
+            return []
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+        # Opt-outs posteriores al encolado: se descartan aquí, antes de llegar al sender
+        suppressed = [msg["message_id"] for msg in claimed if suppression_list.is_suppressed(msg["chat_id"])]
+        if suppressed:
+            self.mark_many_failed([(message_id, SUPPRESSED_ERROR) for message_id in suppressed])
+            logger.info("🚫 %d mensajes descartados por lista de supresión", len(suppressed))
+            dropped = set(suppressed)
+            claimed = [msg for msg in claimed if msg["message_id"] not in dropped]
+        return claimed
+
+    @staticmethod
+    def _observe_claim_latency(messages: list[QueuedMessage], claimed_at: datetime) -> None:
+        """Latencia encolado → reclamo (desde scheduled_at si el mensaje estaba programado)"""
+        if not METRICS_AVAILABLE:
+            return
+        for msg in messages:
+            ready_at = _as_utc(msg.created_at)
+            if msg.scheduled_at is not None:
+                ready_at = max(ready_at, _as_utc(msg.scheduled_at))
+            observe_histogram("queue_enqueue_to_claim_seconds", max(0.0, (claimed_at - ready_at).total_seconds()))
+
+    @staticmethod
+    def _claim_statement(
+        worker_id: str,
+        limit: int,
+        now: datetime,
+        lease_until: datetime,
+        dialect_name: str,
+        campaign_ids: list[str | None] | None = None,
+    ) -> Update:
+        """UPDATE ... WHERE id IN (SELECT ... [FOR UPDATE SKIP LOCKED]) con guarda de estado"""
+        candidates = _outside_paused_campaigns(select(QueuedMessage.id)).where(
+            QueuedMessage.status.in_(CLAIMABLE_STATUSES),
+            or_(QueuedMessage.scheduled_at.is_(None), QueuedMessage.scheduled_at <= now),
+        )
+        if campaign_ids is not None:
+            candidates = candidates.where(_in_campaigns(campaign_ids))
+        candidates = candidates.order_by(QueuedMessage.priority.desc(), QueuedMessage.created_at.asc()).limit(limit)
+        if dialect_name == "postgresql":
+            # Solo se bloquean filas de la cola (la campaña es el lado nulable del LEFT JOIN)
+            candidates = candidates.with_for_update(skip_locked=True, of=QueuedMessage)
+
+        return (
+            update(QueuedMessage)
+            .where(QueuedMessage.id.in_(candidates.scalar_subquery()))
+            .where(QueuedMessage.status.in_(CLAIMABLE_STATUSES))
+            .values(status=MessageStatus.PROCESSING.value, claimed_by=worker_id, lease_until=lease_until)
+            .execution_options(synchronize_session=False)
+        )
+
+    def reap_expired_leases(self) -> int:
+        """
+        Liberar los mensajes cuyo lease venció (worker caído o colgado).
+
+        Un lease vencido cuenta como un intento fallido: pasa por la misma política
+        de reintentos que mark_as_failed (backoff, y dead letter al agotar
+        max_retries), así un mensaje que tumba al worker no se reintenta sin fin.
+        """
+        try:
+            reaped = self._run_in_transaction(self._reap_expired_in_session)
+        except Exception as e:
+            logger.error("❌ Error liberando leases vencidos: %s", e)
+            return 0
+        if reaped:
+            logger.warning("♻️ %d mensajes con lease vencido devueltos a la cola como intento fallido", reaped)
+        return reaped
+
+    def _reap_expired_in_session(self, session: Any) -> int:
+        rows = self._lock_rows(
+            session,
+            select(QueuedMessage.message_id).where(
+                QueuedMessage.status == MessageStatus.PROCESSING.value,
+                QueuedMessage.lease_until < _utcnow(),
+            ),
+        )
+        if not rows:
+            return 0
+        return self._mark_failed_in_session(session, [(row.message_id, LEASE_EXPIRED_ERROR) for row in rows])
+
+    def release(self, message_ids: list[str], worker_id: str) -> int:
+        """
+        Devolver a la cola mensajes reclamados que el worker no llegó a intentar enviar.
+
+        A diferencia del reaper no cuenta como intento: retry_count no cambia y el
+        mensaje vuelve a 'pending' (o a 'retry' si ya tenía reintentos). Solo se
+        liberan las filas que siguen en 'processing' a nombre de worker_id.
+        """
+        if not message_ids:
+            return 0
+        try:
+            released = self._run_in_transaction(self._release_in_session, message_ids, worker_id)
+        except Exception as e:
+            logger.error("❌ Error liberando mensajes reclamados: %s", e)
+            return 0
+        if released:
+            queue_wakeup.notify_committed()
+            logger.info("↩️ %d mensajes retenidos por %s devueltos a la cola sin contar intento", released, worker_id)
+        return released
+
+    def _release_in_session(self, session: Any, message_ids: list[str], worker_id: str) -> int:
+        released = 0
+        for chunk in _chunks(message_ids, self.batch_chunk_size):
+            result = session.execute(
+                update(QueuedMessage)
+                .where(
+                    QueuedMessage.message_id.in_(chunk),
+                    QueuedMessage.status == MessageStatus.PROCESSING.value,
+                    QueuedMessage.claimed_by == worker_id,
+                )
+                .values(
+                    status=case(
+                        (QueuedMessage.retry_count > 0, MessageStatus.RETRY.value),
+                        else_=MessageStatus.PENDING.value,
+                    ),
+                    claimed_by=None,
+                    lease_until=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            released += int(result.rowcount or 0)
+        return released
+
+    def mark_as_sent(self, message_id: str) -> bool:
+        """Marcar mensaje como enviado"""
+        try:
+            self._run_in_transaction(self._mark_sent_in_session, [message_id])
             return True
 
         except Exception as e:
@@ -233,36 +727,504 @@ class QueueManager:
     def mark_as_failed(self, message_id: str, error: str) -> bool:
         """Marcar mensaje como fallido"""
         try:
-            session = get_session()
+            learned: list[str] = []
+            self._run_in_transaction(self._mark_failed_in_session, [(message_id, error)], learned)
+            suppression_list.announce(learned)
+            return True
 
-            msg = session.query(QueuedMessage).filter(QueuedMessage.message_id == message_id).first()
+        except Exception as e:
+            logger.error("❌ Error marcando mensaje como fallido: %s", e)
+            return False
 
-            if msg:
-                msg.retry_count += 1
-                msg.error_message = error
-                msg.processed_at = datetime.now(timezone.utc)
+    def mark_many_sent(self, message_ids: list[str]) -> int:
+        """
+        Marcar un lote de mensajes como enviados en una sola transacción
 
-                if msg.retry_count >= msg.max_retries:
-                    msg.status = MessageStatus.FAILED
-                    # Actualizar campaign
-                    if msg.extra_data and msg.extra_data.get("campaign_id"):
-                        self._update_campaign_stats(msg.extra_data["campaign_id"], failed=True)
-                else:
-                    msg.status = MessageStatus.RETRY
-                    # Reprogramar para dentro de X minutos
-                    msg.scheduled_at = datetime.now(timezone.utc) + timedelta(minutes=5 * msg.retry_count)
+        Un UPDATE por bloque de ids, contadores de campaña con UPDATE atómico
+        (sent_messages = sent_messages + n) agrupado por campaña y cierre de las
+        campañas que quedan completas. Los mensajes ya enviados no se cuentan dos veces.
 
-                session.commit()
+        Returns:
+            Cantidad de mensajes que pasaron a 'sent'
+        """
+        if not message_ids:
+            return 0
+        try:
+            return self._run_in_transaction(self._mark_sent_in_session, list(dict.fromkeys(message_ids)))
+        except Exception as e:
+            logger.error("❌ Error marcando lote como enviado (%d mensajes): %s", len(message_ids), e)
+            return 0
 
-            session.close()
-            return True
+    def mark_many_failed(self, failures: list[tuple[str, str]]) -> int:
+        """
+        Registrar un lote de fallos de envío en una sola transacción
+
+        Los que agotan max_retries o fallan con un error permanente pasan a la tabla
+        de dead letters con su último error (y suman failed_messages en su campaña);
+        el resto a 'retry', reprogramados según retry_policy (exponencial con jitter).
+
+        Args:
+            failures: Pares (message_id, error)
 
+        Returns:
+            Cantidad de mensajes actualizados
+        """
+        if not failures:
+            return 0
+        try:
+            learned: list[str] = []
+            updated = self._run_in_transaction(self._mark_failed_in_session, list(dict(failures).items()), learned)
+            suppression_list.announce(learned)
+            return updated
         except Exception as e:
-            logger.error("❌ Error marcando mensaje como fallido: %s", e)
+            logger.error("❌ Error marcando lote como fallido (%d mensajes): %s", len(failures), e)
+            return 0
+
+    def requeue_dead_letters(
+        self,
+        campaign_id: str | None = None,
+        error_class: str | None = None,
+        failed_after: datetime | None = None,
+        failed_before: datetime | None = None,
+    ) -> int:
+        """
+        Devolver a la cola los dead letters que cumplen el filtro, en una sola transacción
+
+        Marca las filas con un token, las copia a message_queue como 'pending' con
+        retry_count en 0 (INSERT ... SELECT), descuenta failed_messages de sus campañas
+        (reabriendo las que estaban completas) y borra las marcadas. Los de campañas
+        canceladas no se reencolan.
+
+        Returns:
+            Cantidad de mensajes reencolados
+        """
+        try:
+            requeued = self._run_in_transaction(
+                self._requeue_dead_letters_in_session, campaign_id, error_class, failed_after, failed_before
+            )
+        except Exception as e:
+            logger.error("❌ Error reencolando dead letters: %s", e)
+            return 0
+        if requeued:
+            queue_wakeup.notify_committed()
+            logger.info("♻️ %d mensajes reencolados desde dead letters", requeued)
+        return requeued
+
+    def _requeue_dead_letters_in_session(
+        self,
+        session: Any,
+        campaign_id: str | None,
+        error_class: str | None,
+        failed_after: datetime | None,
+        failed_before: datetime | None,
+    ) -> int:
+        now = _utcnow()
+        token = uuid.uuid4().hex
+        cancelled = select(Campaign.campaign_id).where(Campaign.status == "cancelled")
+        conditions = [
+            DeadLetterMessage.requeue_batch.is_(None),
+            or_(DeadLetterMessage.campaign_id.is_(None), DeadLetterMessage.campaign_id.not_in(cancelled)),
+        ]
+        if campaign_id is not None:
+            conditions.append(DeadLetterMessage.campaign_id == campaign_id)
+        if error_class is not None:
+            conditions.append(DeadLetterMessage.error_class == error_class)
+        if failed_after is not None:
+            conditions.append(DeadLetterMessage.failed_at >= failed_after)
+        if failed_before is not None:
+            conditions.append(DeadLetterMessage.failed_at < failed_before)
+
+        marked = session.execute(
+            update(DeadLetterMessage)
+            .where(*conditions)
+            .values(requeue_batch=token)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not marked:
+            return 0
+
+        in_batch = DeadLetterMessage.requeue_batch == token
+        session.execute(
+            insert(QueuedMessage).from_select(
+                [
+                    "message_id",
+                    "chat_id",
+                    "message",
+                    "status",
+                    "priority",
+                    "created_at",
+                    "retry_count",
+                    "max_retries",
+                    "extra_data",
+                    "campaign_id",
+                ],
+                select(
+                    DeadLetterMessage.message_id,
+                    DeadLetterMessage.chat_id,
+                    DeadLetterMessage.message,
+                    literal(MessageStatus.PENDING.value, String),
+                    DeadLetterMessage.priority,
+                    literal(now, DateTime),
+                    literal(0, Integer),
+                    DeadLetterMessage.max_retries,
+                    DeadLetterMessage.extra_data,
+                    DeadLetterMessage.campaign_id,
+                ).where(in_batch),
+            )
+        )
+
+        per_campaign = session.execute(
+            select(DeadLetterMessage.campaign_id, func.count())
+            .where(in_batch, DeadLetterMessage.campaign_id.is_not(None))
+            .group_by(DeadLetterMessage.campaign_id)
+        ).all()
+        for row_campaign_id, count in per_campaign:
+            session.execute(
+                update(Campaign)
+                .where(Campaign.campaign_id == row_campaign_id)
+                .values(
+                    failed_messages=case((Campaign.failed_messages > count, Campaign.failed_messages - count), else_=0),
+                    status=case((Campaign.status == "completed", "active"), else_=Campaign.status),
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        session.execute(delete(DeadLetterMessage).where(in_batch).execution_options(synchronize_session=False))
+        queue_wakeup.notify_in_transaction(session)
+        return int(marked)
+
+    def dead_letter_summary(self) -> list[dict[str, Any]]:
+        """Dead letters agrupados por campaña y clase de error (cantidad y último fallo)"""
+        session = get_session()
+        try:
+            rows = session.execute(
+                select(
+                    DeadLetterMessage.campaign_id,
+                    DeadLetterMessage.error_class,
+                    func.count().label("count"),
+                    func.max(DeadLetterMessage.failed_at).label("last_failed_at"),
+                )
+                .group_by(DeadLetterMessage.campaign_id, DeadLetterMessage.error_class)
+                .order_by(func.count().desc())
+            ).all()
+            return [
+                {
+                    "campaign_id": row.campaign_id,
+                    "error_class": row.error_class,
+                    "count": int(row.count),
+                    "last_failed_at": row.last_failed_at.isoformat() if row.last_failed_at else None,
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            logger.error("❌ Error resumiendo dead letters: %s", e)
+            return []
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def get_campaign_chat_ids(self, campaign_id: str, chat_ids: list[str]) -> set[str]:
+        """Cuáles de estos chat_id ya están encolados en la campaña"""
+        session = get_session()
+        try:
+            found: set[str] = set()
+            for chunk in _chunks(list(chat_ids), self.batch_chunk_size):
+                found.update(
+                    session.execute(
+                        select(QueuedMessage.chat_id).where(
+                            QueuedMessage.campaign_id == campaign_id, QueuedMessage.chat_id.in_(chunk)
+                        )
+                    ).scalars()
+                )
+            return found
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def append_campaign_messages(self, campaign_id: str, records: list[dict[str, Any]]) -> int | None:
+        """
+        Insertar un bloque de la audiencia de una campaña en importación
+
+        Suma el bloque a total_messages en la misma transacción. Devuelve None (sin
+        insertar nada) si la campaña ya no está en 'importing' (p. ej. fue cancelada).
+        """
+        session = get_session()
+        try:
+            found = session.execute(
+                update(Campaign)
+                .where(Campaign.campaign_id == campaign_id, Campaign.status == "importing")
+                .values(total_messages=Campaign.total_messages + len(records))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not found:
+                session.rollback()
+                return None
+            self._insert_records(session, records)
+            queue_wakeup.notify_in_transaction(session)
+            session.commit()
+            queue_wakeup.notify_committed()
+            return len(records)
+        except Exception:
+            with contextlib.suppress(Exception):
+                session.rollback()
+            raise
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def finish_campaign_import(self, campaign_id: str) -> bool:
+        """Pasar la campaña de 'importing' a 'active' (y cerrarla si ya se envió todo)"""
+        session = get_session()
+        try:
+            found = session.execute(
+                update(Campaign)
+                .where(Campaign.campaign_id == campaign_id, Campaign.status == "importing")
+                .values(status="active")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if found:
+                # Mientras importaba no se cierra: lo enviado durante la importación cuenta ahora
+                self._apply_campaign_deltas(session, sent={campaign_id: 0})
+            session.commit()
+            return bool(found)
+        except Exception as e:
+            logger.error("❌ Error cerrando importación de campaña %s: %s", campaign_id, e)
+            with contextlib.suppress(Exception):
+                session.rollback()
             return False
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
 
-    def create_campaign(self, name: str, created_by: str, total_messages: int, metadata: dict[str, Any] | None = None) -> str:
-        """Crear una nueva campaña"""
+    @staticmethod
+    def _insert_records(session: Any, records: list[dict[str, Any]]) -> None:
+        """INSERT masivo: COPY FROM STDIN en PostgreSQL, executemany en el resto"""
+        if not records:
+            return
+        if session.get_bind().dialect.name != "postgresql":
+            session.execute(insert(QueuedMessage), records)
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records:
+            writer.writerow([_copy_value(record[column]) for column in BULK_INSERT_COLUMNS])
+        buffer.seek(0)
+        columns = ", ".join(BULK_INSERT_COLUMNS)
+        cursor = session.connection().connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {QueuedMessage.__tablename__} ({columns}) FROM STDIN "
+                "WITH (FORMAT csv, NULL '\\N', FORCE_NOT_NULL (chat_id, message))",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+    def _run_in_transaction(self, operation, *args: Any) -> Any:
+        session = get_session()
+        try:
+            result = operation(session, *args)
+            session.commit()
+            return result
+        except Exception:
+            with contextlib.suppress(Exception):
+                session.rollback()
+            raise
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def _mark_sent_in_session(self, session: Any, message_ids: list[str]) -> int:
+        now = _utcnow()
+        campaign_deltas: dict[str, int] = {}
+        updated = 0
+        for chunk in _chunks(message_ids, self.batch_chunk_size):
+            # Leer campaña antes del UPDATE; el guard de estado descarta los ya enviados
+            rows = self._lock_rows(
+                session,
+                select(QueuedMessage.id, QueuedMessage.campaign_id).where(
+                    QueuedMessage.message_id.in_(chunk), QueuedMessage.status != MessageStatus.SENT.value
+                ),
+            )
+            if not rows:
+                continue
+            ids = [row.id for row in rows]
+            result = session.execute(
+                update(QueuedMessage)
+                .where(QueuedMessage.id.in_(ids), QueuedMessage.status != MessageStatus.SENT.value)
+                .values(
+                    status=MessageStatus.SENT.value,
+                    sent_at=now,
+                    processed_at=now,
+                    claimed_by=None,
+                    lease_until=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            updated += int(result.rowcount or 0)
+            for row in rows:
+                if row.campaign_id:
+                    campaign_deltas[row.campaign_id] = campaign_deltas.get(row.campaign_id, 0) + 1
+
+        self._apply_campaign_deltas(session, sent=campaign_deltas)
+        return updated
+
+    def _mark_failed_in_session(self, session: Any, failures: list[tuple[str, str]], learned: list[str] | None = None) -> int:
+        now = _utcnow()
+        errors = dict(failures)
+        failed_deltas: dict[str, int] = {}
+        # Destinatarios que la plataforma rechazó por inválidos: pasan a la lista de supresión
+        invalid_recipients: list[str] = []
+        retries: list[dict[str, Any]] = []
+        # (error, clase) -> ids: un INSERT ... SELECT + DELETE por grupo hacia la tabla de dead letters
+        dead: dict[tuple[str, str], list[int]] = {}
+        for chunk in _chunks(list(errors), self.batch_chunk_size):
+            rows = self._lock_rows(
+                session,
+                select(
+                    QueuedMessage.id,
+                    QueuedMessage.message_id,
+                    QueuedMessage.chat_id,
+                    QueuedMessage.retry_count,
+                    QueuedMessage.max_retries,
+                    QueuedMessage.campaign_id,
+                ).where(QueuedMessage.message_id.in_(chunk)),
+            )
+            for row in rows:
+                error = errors[row.message_id]
+                error_class = self.retry_policy.classify(error)
+                retry_count = int(row.retry_count or 0) + 1
+                if retry_count >= int(row.max_retries or 0) or not self.retry_policy.is_retryable(error_class):
+                    dead.setdefault((error, error_class), []).append(row.id)
+                    if error_class == "invalid_recipient":
+                        invalid_recipients.append(row.chat_id)
+                    if row.campaign_id:
+                        failed_deltas[row.campaign_id] = failed_deltas.get(row.campaign_id, 0) + 1
+                    continue
+                # Cada fila con su propio jitter: los reintentos no vuelven todos a la vez
+                retries.append(
+                    {
+                        "id": row.id,
+                        "status": MessageStatus.RETRY.value,
+                        "retry_count": retry_count,
+                        "error_message": error,
+                        "processed_at": now,
+                        "claimed_by": None,
+                        "lease_until": None,
+                        "scheduled_at": now + timedelta(seconds=self.retry_policy.delay_seconds(retry_count)),
+                    }
+                )
+
+        updated = 0
+        for chunk in _chunks(retries, self.batch_chunk_size):
+            # UPDATE por clave primaria en executemany (valores distintos por fila)
+            session.execute(update(QueuedMessage), chunk)
+            updated += len(chunk)
+        for (error, error_class), ids in dead.items():
+            for chunk in _chunks(ids, self.batch_chunk_size):
+                updated += self._move_to_dead_letters(session, chunk, error, error_class, now)
+
+        self._apply_campaign_deltas(session, failed=failed_deltas)
+        if invalid_recipients:
+            added = suppression_list.add_in_session(session, invalid_recipients, "invalid", source="send_failure")
+            if learned is not None:
+                learned.extend(added)
+        return updated
+
+    @staticmethod
+    def _move_to_dead_letters(session: Any, ids: list[int], error: str, error_class: str, now: datetime) -> int:
+        """Sacar de la cola caliente los mensajes agotados: INSERT ... SELECT a dead letters y DELETE"""
+        session.execute(
+            insert(DeadLetterMessage).from_select(
+                [
+                    "message_id",
+                    "chat_id",
+                    "message",
+                    "priority",
+                    "campaign_id",
+                    "extra_data",
+                    "retry_count",
+                    "max_retries",
+                    "error_class",
+                    "last_error",
+                    "queued_at",
+                    "failed_at",
+                ],
+                select(
+                    QueuedMessage.message_id,
+                    QueuedMessage.chat_id,
+                    QueuedMessage.message,
+                    QueuedMessage.priority,
+                    QueuedMessage.campaign_id,
+                    QueuedMessage.extra_data,
+                    QueuedMessage.retry_count + 1,
+                    QueuedMessage.max_retries,
+                    literal(error_class, String),
+                    literal(error, Text),
+                    QueuedMessage.created_at,
+                    literal(now, DateTime),
+                ).where(QueuedMessage.id.in_(ids)),
+            )
+        )
+        result = session.execute(
+            delete(QueuedMessage).where(QueuedMessage.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        return int(result.rowcount or 0)
+
+    @staticmethod
+    def _lock_rows(session: Any, query: Any) -> list[Any]:
+        """Ejecutar la lectura previa al UPDATE bloqueando las filas en PostgreSQL"""
+        if session.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update()
+        return list(session.execute(query).all())
+
+    @staticmethod
+    def _apply_campaign_deltas(session: Any, sent: dict[str, int] | None = None, failed: dict[str, int] | None = None) -> None:
+        """Sumar contadores de campaña sin read-modify-write y cerrar las campañas completas"""
+        sent = sent or {}
+        failed = failed or {}
+        campaign_ids = sorted(set(sent) | set(failed))
+        if not campaign_ids:
+            return
+
+        try:
+            for campaign_id in campaign_ids:
+                session.execute(
+                    update(Campaign)
+                    .where(Campaign.campaign_id == campaign_id)
+                    .values(
+                        sent_messages=Campaign.sent_messages + sent.get(campaign_id, 0),
+                        failed_messages=Campaign.failed_messages + failed.get(campaign_id, 0),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+            session.execute(
+                update(Campaign)
+                .where(
+                    Campaign.campaign_id.in_(campaign_ids),
+                    Campaign.status == "active",
+                    Campaign.total_messages > 0,
+                    Campaign.sent_messages + Campaign.failed_messages >= Campaign.total_messages,
+                )
+                .values(status="completed")
+                .execution_options(synchronize_session=False)
+            )
+        except Exception as e:
+            # Se propaga: el lote entero (estados + contadores) se revierte junto
+            logger.error("❌ Error actualizando stats de campaña: %s", e)
+            raise
+
+    def create_campaign(
+        self,
+        name: str,
+        created_by: str,
+        total_messages: int,
+        metadata: dict[str, Any] | None = None,
+        status: str = "active",
+    ) -> str:
+        """Crear una nueva campaña ('importing' mientras se carga su audiencia por bloques)"""
         try:
             session = get_session()
 
@@ -272,7 +1234,7 @@ class QueueManager:
             campaign = Campaign(
                 campaign_id=campaign_id,
                 name=name,
-                status="active",
+                status=status,
                 created_by=created_by,
                 total_messages=total_messages,
                 extra_data=metadata or {},
@@ -353,40 +1315,86 @@ class QueueManager:
                 session.close()
 
     def pause_campaign(self, campaign_id: str) -> bool:
-        """Pausar una campaña"""
+        """
+        Pausar una campaña (sus mensajes encolados dejan de salir hasta reanudarla)
+
+        Raises:
+            CampaignImportingError: si la campaña aún está importando su audiencia
+        """
         return self._update_campaign_status(campaign_id, "paused")
 
     def resume_campaign(self, campaign_id: str) -> bool:
-        """Reanudar una campaña"""
-        return self._update_campaign_status(campaign_id, "active")
-
-    def cancel_campaign(self, campaign_id: str) -> bool:
-        """Cancelar una campaña"""
-        try:
-            session = get_session()
-
-            # Actualizar estado de campaña
-            campaign = session.query(Campaign).filter(Campaign.campaign_id == campaign_id).first()
+        """
+        Reanudar una campaña
 
-            if not campaign:
-                return False
+        Raises:
+            CampaignImportingError: si la campaña aún está importando su audiencia
+        """
+        return self._update_campaign_status(campaign_id, "active")
 
-            campaign.status = "cancelled"
+    def expire_stale_imports(self, older_than_seconds: float) -> int:
+        """
+        Pausar campañas que quedaron en 'importing' sin un job vivo
 
-            # Cancelar mensajes pendientes de esta campaña
-            # Obtener todos los mensajes pendientes y filtrar por campaign_id
-            queued_messages = (
-                session.query(QueuedMessage)
-                .filter(QueuedMessage.status.in_([MessageStatus.PENDING, MessageStatus.RETRY]))
+        Los jobs de importación viven en memoria del proceso: si el proceso se reinicia a
+        mitad de una importación la campaña quedaría en 'importing' para siempre. Se deja
+        pausada (no sale una audiencia parcial sin que alguien lo decida) con el motivo
+        en metadata["import_error"]. Devuelve cuántas campañas se pausaron.
+        """
+        cutoff = _utcnow() - timedelta(seconds=older_than_seconds)
+        session = get_session()
+        try:
+            stale = (
+                session.query(Campaign)
+                .filter(Campaign.status == "importing", Campaign.created_at < cutoff)
+                .with_for_update()
                 .all()
             )
+            for campaign in stale:
+                campaign.status = "paused"
+                campaign.extra_data = {
+                    **(campaign.extra_data or {}),
+                    "import_error": "Importación interrumpida: audiencia parcial, revisar antes de reanudar",
+                }
+            session.commit()
+            for campaign in stale:
+                logger.warning(
+                    "⚠️ Importación de %s interrumpida: campaña pausada con %d mensajes",
+                    campaign.campaign_id,
+                    campaign.total_messages,
+                )
+            return len(stale)
+        except Exception as e:
+            logger.error("❌ Error expirando importaciones colgadas: %s", e)
+            with contextlib.suppress(Exception):
+                session.rollback()
+            return 0
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
 
-            for msg in queued_messages:
-                if msg.extra_data and msg.extra_data.get("campaign_id") == campaign_id:
-                    msg.status = MessageStatus.CANCELLED
-                    msg.processed_at = datetime.now(timezone.utc)
+    def cancel_campaign(self, campaign_id: str) -> bool:
+        """Cancelar una campaña y sus mensajes aún no enviados (un UPDATE por tabla)"""
+        session = get_session()
+        try:
+            found = session.execute(
+                update(Campaign)
+                .where(Campaign.campaign_id == campaign_id)
+                .values(status="cancelled")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not found:
+                session.rollback()
+                return False
 
+            result = session.execute(
+                update(QueuedMessage)
+                .where(QueuedMessage.campaign_id == campaign_id, QueuedMessage.status.in_(CLAIMABLE_STATUSES))
+                .values(status=MessageStatus.CANCELLED.value, processed_at=_utcnow())
+                .execution_options(synchronize_session=False)
+            )
             session.commit()
+            logger.info("🛑 Campaña %s cancelada (%d mensajes cancelados)", campaign_id, result.rowcount or 0)
             return True
 
         except Exception as e:
@@ -399,41 +1407,37 @@ class QueueManager:
                 session.close()
 
     def _update_campaign_status(self, campaign_id: str, status: str) -> bool:
-        """Actualizar estado de campaña"""
+        """Actualizar estado de campaña (nunca el de una que está importando su audiencia)"""
+        session = get_session()
         try:
-            session = get_session()
-
-            campaign = session.query(Campaign).filter(Campaign.campaign_id == campaign_id).first()
-
-            if campaign:
-                campaign.status = status
-                session.commit()
-
-            session.close()
+            # El importador solo agrega bloques mientras la campaña sigue en 'importing':
+            # cambiarle el estado cortaría la importación y dejaría la audiencia a medias
+            result = session.execute(
+                update(Campaign)
+                .where(Campaign.campaign_id == campaign_id, Campaign.status != "importing")
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
+                importing = session.execute(
+                    select(Campaign.id).where(Campaign.campaign_id == campaign_id, Campaign.status == "importing")
+                ).first()
+                if importing:
+                    raise CampaignImportingError(f"La campaña {campaign_id} aún está importando su audiencia")
+                return False
+            session.commit()
             return True
 
+        except CampaignImportingError:
+            raise
         except Exception as e:
             logger.error("❌ Error actualizando estado de campaña: %s", e)
+            with contextlib.suppress(Exception):
+                session.rollback()
             return False
-
-    def _update_campaign_stats(self, campaign_id: str, sent: bool = False, failed: bool = False) -> None:
-        """Actualizar estadísticas de campaña"""
-        try:
-            session = get_session()
-
-            campaign = session.query(Campaign).filter(Campaign.campaign_id == campaign_id).first()
-
-            if campaign:
-                if sent:
-                    campaign.sent_messages += 1
-                if failed:
-                    campaign.failed_messages += 1
-                session.commit()
-
-            session.close()
-
-        except Exception as e:
-            logger.error("❌ Error actualizando stats de campaña: %s", e)
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
 
     def _message_to_dict(self, msg: QueuedMessage) -> dict[str, Any]:
         """Convertir mensaje a diccionario"""
@@ -446,9 +1450,284 @@ class QueueManager:
             "scheduled_at": msg.scheduled_at.isoformat() if msg.scheduled_at else None,
             "created_at": msg.created_at.isoformat(),
             "retry_count": msg.retry_count,
+            "claimed_by": msg.claimed_by,
+            "lease_until": msg.lease_until.isoformat() if msg.lease_until else None,
+            "campaign_id": msg.campaign_id,
             "metadata": msg.extra_data,  # Mantener 'metadata' en API por compatibilidad
         }
 
 
+@dataclass(frozen=True)
+class SendRatePreset:
+    """Ritmo de salida de un número emisor: ráfaga + recarga continua, con tope diario opcional"""
+
+    per_second: float
+    burst: int
+    per_day: int | None = None
+
+
+# WhatsApp Web: ritmo humano (~10/min) para no disparar bloqueos del número.
+# Cloud API: ~80 msg/s de throughput por número; el tier de mensajería limita las
+# conversaciones iniciadas por el negocio en 24h (aproximado aquí como mensajes/día,
+# del lado conservador).
+SEND_RATE_PRESETS: dict[str, SendRatePreset] = {
+    "web": SendRatePreset(per_second=1 / 6, burst=3),
+    "cloud_tier_250": SendRatePreset(per_second=80, burst=80, per_day=250),
+    "cloud_tier_1k": SendRatePreset(per_second=80, burst=80, per_day=1_000),
+    "cloud_tier_10k": SendRatePreset(per_second=80, burst=80, per_day=10_000),
+    "cloud_tier_100k": SendRatePreset(per_second=80, burst=80, per_day=100_000),
+    "cloud_unlimited": SendRatePreset(per_second=80, burst=80),
+}
+
+# Margen antes de que venza el lease de un mensaje retenido: pasado ese punto se libera
+# (QueueManager.release, sin contar intento) en vez de enviarlo con el lease a punto de caducar
+LEASE_SAFETY_SECONDS = 10.0
+
+
+def _default_send_rate_preset() -> SendRatePreset:
+    name = os.getenv("WHATSAPP_SEND_RATE_PRESET") or ("cloud_tier_1k" if os.getenv("WHATSAPP_MODE") == "cloud" else "web")
+    if name not in SEND_RATE_PRESETS:
+        logger.warning("⚠️ Preset de envío desconocido %r; usando 'web'", name)
+        name = "web"
+    return SEND_RATE_PRESETS[name]
+
+
+def _parse_campaign_weights(raw: str) -> dict[str, float]:
+    """'camp_a=3,camp_b=0.5' -> {"camp_a": 3.0, "camp_b": 0.5}"""
+    weights: dict[str, float] = {}
+    for item in raw.split(","):
+        campaign_id, _, weight = item.partition("=")
+        if campaign_id.strip() and weight.strip():
+            try:
+                weights[campaign_id.strip()] = float(weight)
+            except ValueError:
+                logger.warning("⚠️ Peso de campaña inválido: %r", item)
+    return weights
+
+
+class SendGovernor:
+    """
+    Planificador de envíos sobre mensajes ya reclamados, para un número emisor.
+
+    - Token bucket global del número (SEND_RATE_PRESETS, con tope diario en Cloud API).
+    - Separación mínima entre dos envíos al mismo destinatario. Los mensajes manuales
+      tienen su propia separación (0 por defecto: una respuesta no espera a la campaña).
+      Un destinatario en espera no frena al resto de su clase: sale el primer
+      mensaje de la clase cuyo destinatario ya puede recibir.
+    - Cola justa ponderada por clase (cada campaña y los mensajes manuales): una
+      campaña grande no deja sin turno a las respuestas manuales.
+
+    refill() reclama de la BD hasta max_held mensajes repartidos por peso;
+    next_ready() devuelve el próximo mensaje a enviar ya, o cuánto esperar.
+    El reloj es inyectable para probarlo con tiempo virtual.
+    """
+
+    def __init__(
+        self,
+        sender_id: str = "default",
+        preset: SendRatePreset | None = None,
+        recipient_spacing_seconds: float | None = None,
+        manual_recipient_spacing_seconds: float | None = None,
+        manual_weight: float | None = None,
+        campaign_weights: dict[str, float] | None = None,
+        max_held: int | None = None,
+        lease_seconds: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.sender_id = sender_id
+        self.preset = preset or _default_send_rate_preset()
+        self.recipient_spacing_seconds = (
+            recipient_spacing_seconds
+            if recipient_spacing_seconds is not None
+            else float(os.getenv("SEND_RECIPIENT_SPACING_SECONDS", "30"))
+        )
+        self.manual_recipient_spacing_seconds = (
+            manual_recipient_spacing_seconds
+            if manual_recipient_spacing_seconds is not None
+            else float(os.getenv("SEND_MANUAL_RECIPIENT_SPACING_SECONDS", "0"))
+        )
+        self.manual_weight = manual_weight if manual_weight is not None else float(os.getenv("SEND_MANUAL_WEIGHT", "4"))
+        self.campaign_weights = (
+            campaign_weights
+            if campaign_weights is not None
+            else _parse_campaign_weights(os.getenv("SEND_CAMPAIGN_WEIGHTS", ""))
+        )
+        self.max_held = max(1, max_held or int(os.getenv("SEND_GOVERNOR_MAX_HELD", "10")))
+        self.lease_seconds = lease_seconds or float(os.getenv("QUEUE_LEASE_SECONDS", "120"))
+        self._clock = clock
+
+        now = clock()
+        self._buckets = [
+            TokenBucket(
+                capacity=float(self.preset.burst),
+                refill_per_second=self.preset.per_second,
+                tokens=float(self.preset.burst),
+                updated_at=now,
+            )
+        ]
+        if self.preset.per_day:
+            self._buckets.append(
+                TokenBucket(
+                    capacity=float(self.preset.per_day),
+                    refill_per_second=self.preset.per_day / 86400.0,
+                    tokens=float(self.preset.per_day),
+                    updated_at=now,
+                )
+            )
+
+        # Clase = campaign_id (None = manual) -> [(retenido_desde, mensaje)] en orden de reclamo
+        self._queues: dict[str | None, deque[tuple[float, dict[str, Any]]]] = {}
+        # Start-time fair queuing: tiempo virtual por clase y del sistema
+        self._virtual_time: dict[str | None, float] = {}
+        self._system_virtual_time = 0.0
+        self._last_sent: dict[str, float] = {}
+        self.stats = {"released": 0, "lease_expired": 0}
+        # Manager y worker del último refill(): a ellos se devuelven los mensajes que vencen retenidos
+        self._manager: QueueManager | None = None
+        self._worker_id: str | None = None
+
+    def weight(self, campaign_id: str | None) -> float:
+        weight = self.manual_weight if campaign_id is None else self.campaign_weights.get(campaign_id, 1.0)
+        return max(weight, 0.01)
+
+    def set_campaign_weight(self, campaign_id: str, weight: float) -> None:
+        self.campaign_weights[campaign_id] = weight
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, messages: list[dict[str, Any]]) -> None:
+        """Retener mensajes reclamados hasta que el planificador les dé turno"""
+        now = self._clock()
+        for message in messages:
+            campaign_id = message.get("campaign_id") or None
+            queue = self._queues.setdefault(campaign_id, deque())
+            if not queue:
+                # Una clase que vuelve a tener mensajes no acumula crédito del tiempo que estuvo vacía
+                self._virtual_time[campaign_id] = max(self._virtual_time.get(campaign_id, 0.0), self._system_virtual_time)
+            queue.append((now, message))
+
+    def refill(self, manager: QueueManager, worker_id: str) -> int:
+        """Reclamar mensajes hasta max_held, repartiendo el hueco por peso entre las clases listas"""
+        self._manager, self._worker_id = manager, worker_id
+        room = self.max_held - self.pending()
+        if room <= 0:
+            return 0
+        campaign_ids = manager.get_ready_campaign_ids()
+        if not campaign_ids:
+            return 0
+
+        total_weight = sum(self.weight(campaign_id) for campaign_id in campaign_ids)
+        ordered = sorted(campaign_ids, key=lambda campaign_id: -self.weight(campaign_id))
+        shares = {campaign_id: max(1, round(room * self.weight(campaign_id) / total_weight)) for campaign_id in ordered}
+        claimed = 0
+        for campaign_id in ordered:
+            limit = min(room - claimed, shares[campaign_id])
+            if limit <= 0:
+                break
+            messages = manager.claim_messages(worker_id, limit=limit, campaign_ids=[campaign_id])
+            self.submit(messages)
+            claimed += len(messages)
+        return claimed
+
+    def _drop_expired(self, now: float) -> None:
+        """Soltar los mensajes retenidos cerca de vencer su lease y devolverlos a la cola sin contar intento"""
+        max_hold = self.lease_seconds - LEASE_SAFETY_SECONDS
+        expired: dict[str, list[str]] = {}
+        for queue in self._queues.values():
+            while queue and now - queue[0][0] >= max_hold:
+                _, message = queue.popleft()
+                self.stats["lease_expired"] += 1
+                logger.warning("⏳ Mensaje %s retenido hasta vencer su lease; vuelve a la cola", message.get("message_id"))
+                worker_id = message.get("claimed_by") or self._worker_id
+                if worker_id and message.get("message_id"):
+                    expired.setdefault(worker_id, []).append(message["message_id"])
+        if self._manager is None:
+            return
+        for worker_id, message_ids in expired.items():
+            self._manager.release(message_ids, worker_id)
+
+    def _recipient_spacing(self, campaign_id: str | None) -> float:
+        return self.manual_recipient_spacing_seconds if campaign_id is None else self.recipient_spacing_seconds
+
+    def _first_ready(self, campaign_id: str | None, now: float) -> tuple[int | None, float]:
+        """(posición del primer mensaje de la clase cuyo destinatario ya puede recibir, 0) o (None, espera mínima)"""
+        spacing = self._recipient_spacing(campaign_id)
+        wait = math.inf
+        for index, (_, message) in enumerate(self._queues[campaign_id]):
+            ready_in = self._last_sent.get(message.get("chat_id"), -math.inf) + spacing - now
+            if ready_in <= 0:
+                return index, 0.0
+            wait = min(wait, ready_in)
+        return None, wait
+
+    def _select(self, now: float) -> tuple[str | None, int, float]:
+        """(clase a enviar, posición en su cola, 0) o (None, 0, segundos hasta que algo pueda salir)"""
+        eligible: dict[str | None, int] = {}
+        recipient_wait = math.inf
+        for campaign_id, queue in self._queues.items():
+            if not queue:
+                continue
+            index, ready_in = self._first_ready(campaign_id, now)
+            if index is None:
+                recipient_wait = min(recipient_wait, ready_in)
+            else:
+                eligible[campaign_id] = index
+        if not eligible:
+            return None, 0, recipient_wait
+
+        for bucket in self._buckets:
+            bucket.refill(now)
+        rate_wait = max(bucket.seconds_until_available() for bucket in self._buckets)
+        if rate_wait > 0:
+            return None, 0, rate_wait
+
+        # Menor tiempo virtual primero; a igualdad, manuales antes que campañas
+        chosen = min(eligible, key=lambda c: (self._virtual_time.get(c, 0.0), c is not None, c or ""))
+        return chosen, eligible[chosen], 0.0
+
+    def seconds_until_ready(self) -> float:
+        """Cuánto falta para que next_ready() pueda entregar algo (inf si no hay mensajes retenidos)"""
+        now = self._clock()
+        self._drop_expired(now)
+        return self._select(now)[2]
+
+    def next_ready(self) -> tuple[dict[str, Any] | None, float]:
+        """(mensaje a enviar ahora, 0) o (None, segundos de espera); consume presupuesto al entregar"""
+        now = self._clock()
+        self._drop_expired(now)
+        campaign_id, index, wait = self._select(now)
+        if wait > 0:
+            return None, wait
+
+        queue = self._queues[campaign_id]
+        held_since, message = queue[index]
+        del queue[index]
+        for bucket in self._buckets:
+            bucket.tokens -= 1
+        self._system_virtual_time = self._virtual_time.get(campaign_id, 0.0)
+        self._virtual_time[campaign_id] = self._system_virtual_time + 1.0 / self.weight(campaign_id)
+        self._last_sent[message.get("chat_id")] = now
+        if len(self._last_sent) > 1024:
+            horizon = now - max(self.recipient_spacing_seconds, self.manual_recipient_spacing_seconds)
+            self._last_sent = {chat_id: ts for chat_id, ts in self._last_sent.items() if ts > horizon}
+
+        self.stats["released"] += 1
+        if METRICS_AVAILABLE:
+            observe_histogram("send_governor_hold_seconds", now - held_since)
+        return message, 0.0
+
+
+_send_governors: dict[str, SendGovernor] = {}
+
+
+def get_send_governor(sender_id: str | None = None) -> SendGovernor:
+    """Gobernador del número emisor (WHATSAPP_PHONE_ID por defecto), uno por proceso"""
+    sender_id = sender_id or os.getenv("WHATSAPP_PHONE_ID") or "default"
+    if sender_id not in _send_governors:
+        _send_governors[sender_id] = SendGovernor(sender_id=sender_id)
+    return _send_governors[sender_id]
+
+
 # Instancia global
 queue_manager = QueueManager()
@@ -0,0 +1,192 @@
+"""
+⏱️ Dispatcher de mensajes programados
+Carga la próxima ventana de mensajes con scheduled_at en un min-heap, duerme hasta
+el vencimiento más próximo (o hasta una señal de encolado) y, al vencer, emite
+por lotes una señal de cola "due" para que los senders los reclamen de la BD en
+cuanto vencen y no en el próximo sondeo.
+
+La base de datos sigue siendo la fuente de verdad: el heap es solo un índice en
+memoria de la ventana y se reconstruye en cada recarga.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from src.services.queue_signals import queue_wakeup
+from src.services.queue_system import queue_manager
+
+logger = logging.getLogger(__name__)
+
+try:
+    from src.services.metrics import inc_counter, observe_histogram, set_gauge
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Ventana (segundos) sobre la que se calcula scheduler_dispatch_rate_per_second
+RATE_WINDOW_SECONDS = 60.0
+
+
+class ScheduledDispatcher:
+    """
+    Min-heap de (vencimiento, -prioridad, message_id) sobre la ventana programada.
+
+    run_once() recarga la ventana si hace falta y despacha lo vencido;
+    seconds_until_next() dice cuánto dormir hasta el próximo vencimiento o recarga.
+    start() lo ejecuta en un hilo; wake() lo despierta antes de tiempo.
+    """
+
+    def __init__(
+        self,
+        load_window: Callable[[], list[dict[str, Any]]] | None = None,
+        batch_size: int | None = None,
+        horizon_seconds: float | None = None,
+        window_limit: int | None = None,
+        refresh_seconds: float | None = None,
+        notify: Callable[[], None] | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.horizon_seconds = (
+            horizon_seconds if horizon_seconds is not None else float(os.getenv("SCHEDULER_WINDOW_SECONDS", "300"))
+        )
+        self.window_limit = window_limit or int(os.getenv("SCHEDULER_WINDOW_LIMIT", "1000"))
+        self.batch_size = max(1, batch_size or int(os.getenv("SCHEDULER_DISPATCH_BATCH_SIZE", "100")))
+        self.refresh_seconds = refresh_seconds or queue_wakeup.fallback_seconds
+
+        self._load_window = load_window or (
+            lambda: queue_manager.get_scheduled_window(self.horizon_seconds, self.window_limit)
+        )
+        # Señal "due": la reciben los senders; el dispatcher solo escucha "enqueue", así su
+        # propio aviso (que vuelve por LISTEN/pub-sub) no le fuerza una recarga de la ventana
+        self._notify = notify or (lambda: queue_wakeup.broadcast(kind="due"))
+        self._clock = clock
+
+        self._heap: list[tuple[float, int, str]] = []
+        # (message_id, vencimiento) ya despachados: un reintento reprogramado vuelve a entrar
+        self._dispatched: set[tuple[str, float]] = set()
+        self._window_full = False
+        self._loaded_at: float | None = None
+        self._reload_needed = True
+        self._rate_samples: deque[tuple[float, int]] = deque()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stats = {"dispatched": 0, "batches": 0, "reloads": 0}
+
+    # ── Heap ──
+
+    def reload(self) -> int:
+        """Reconstruir el heap con la ventana actual; devuelve cuántos mensajes quedan por despachar"""
+        rows = self._load_window()
+        window: set[tuple[str, float]] = set()
+        heap: list[tuple[float, int, str]] = []
+        for row in rows:
+            due_at = row["scheduled_at"].timestamp()
+            key = (row["message_id"], due_at)
+            window.add(key)
+            if key not in self._dispatched:
+                heap.append((due_at, -int(row.get("priority") or 0), row["message_id"]))
+        heapq.heapify(heap)
+
+        self._heap = heap
+        self._dispatched &= window
+        self._window_full = len(rows) >= self.window_limit
+        self._loaded_at = self._clock()
+        self.stats["reloads"] += 1
+        return len(heap)
+
+    def dispatch_due(self) -> int:
+        """Entregar por lotes todo lo vencido; devuelve cuántos mensajes se despacharon"""
+        now = self._clock()
+        dispatched = 0
+        while self._heap and self._heap[0][0] <= now:
+            batch: list[tuple[float, int, str]] = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap))
+            self._dispatch(batch, now)
+            dispatched += len(batch)
+
+        if dispatched and not self._heap and self._window_full:
+            # La ventana venía recortada por window_limit: traer lo que no cupo
+            self._reload_needed = True
+        self._update_rate(now)
+        return dispatched
+
+    def _dispatch(self, batch: list[tuple[float, int, str]], now: float) -> None:
+        self._notify()
+
+        self._dispatched.update((message_id, due_at) for due_at, _, message_id in batch)
+        self.stats["dispatched"] += len(batch)
+        self.stats["batches"] += 1
+        self._rate_samples.append((now, len(batch)))
+        if METRICS_AVAILABLE:
+            inc_counter("scheduler_messages_dispatched", len(batch))
+            for due_at, _, _ in batch:
+                observe_histogram("scheduler_dispatch_lateness_seconds", max(0.0, now - due_at))
+        logger.debug("⏱️ Despachados %d mensajes programados", len(batch))
+
+    def _update_rate(self, now: float) -> None:
+        while self._rate_samples and now - self._rate_samples[0][0] > RATE_WINDOW_SECONDS:
+            self._rate_samples.popleft()
+        if METRICS_AVAILABLE:
+            set_gauge(
+                "scheduler_dispatch_rate_per_second",
+                sum(count for _, count in self._rate_samples) / RATE_WINDOW_SECONDS,
+            )
+
+    # ── Bucle ──
+
+    def run_once(self) -> int:
+        """Recargar la ventana si corresponde y despachar lo vencido"""
+        now = self._clock()
+        if self._reload_needed or self._loaded_at is None or now - self._loaded_at >= self.refresh_seconds:
+            self._reload_needed = False
+            self.reload()
+        return self.dispatch_due()
+
+    def seconds_until_next(self) -> float:
+        """Tiempo hasta el próximo vencimiento o la próxima recarga de respaldo"""
+        if self._reload_needed:
+            return 0.0
+        now = self._clock()
+        loaded_at = self._loaded_at if self._loaded_at is not None else now
+        wait = self.refresh_seconds - (now - loaded_at)
+        if self._heap:
+            wait = min(wait, self._heap[0][0] - now)
+        return max(0.0, wait)
+
+    def wake(self) -> None:
+        """Recargar la ventana ya (llegaron mensajes nuevos)"""
+        self._reload_needed = True
+        self._wake.set()
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Error en dispatcher de mensajes programados: %s", e)
+            if self._wake.wait(self.seconds_until_next()):
+                self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="scheduled-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
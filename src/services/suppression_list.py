@@ -0,0 +1,529 @@
+"""
+🚫 Lista de supresión de envíos (opt-outs, números bloqueados e inválidos)
+La fuente de verdad es la tabla suppressed_numbers. Cada proceso la mantiene en
+memoria como un filtro de Bloom más un set exacto de los números suprimidos: el
+filtro responde "no suprimido" (la inmensa mayoría de los destinatarios) sin tocar
+el set, y el set confirma los positivos, así un falso positivo del filtro nunca
+bloquea un envío. Encolado y envío consultan la lista en O(1), sin ir a la BD.
+
+- Recarga incremental por id cada SUPPRESSION_REFRESH_SECONDS: altas nuevas de
+  suppressed_numbers y bajas de suppression_removals (una fila por baja, que los
+  demás procesos aplican aunque no haya Redis). Las bajas se quitan del set y el
+  filtro se reconstruye en segundo plano cuando acumula demasiadas (un filtro de
+  Bloom no admite borrados).
+- En PostgreSQL los ids no se confirman en orden: una fila con id menor puede
+  aparecer después de leído un id mayor. Cada recarga vuelve a leer las filas
+  creadas en los últimos SUPPRESSION_REFRESH_OVERLAP_SECONDS (antes de la recarga
+  anterior), así esas confirmaciones tardías no se pierden.
+- Con REDIS_URL configurado, altas y bajas se publican en un canal y los demás
+  procesos las aplican al instante.
+"""
+
+import contextlib
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import Column, DateTime, Integer, String, delete, func, select
+
+from src.models.admin_db import get_session
+from src.models.models import Base
+from src.services.phone_numbers import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+SUPPRESSION_REASONS = ("opt_out", "blocked", "invalid")
+# Filas por consulta al reconstruir o recargar desde la BD
+LOAD_BATCH_SIZE = 10_000
+# Números por mensaje publicado en Redis
+PUBLISH_BATCH_SIZE = 1_000
+# Fracción de bajas (sobre la capacidad) a partir de la cual se reconstruye el filtro
+STALE_REBUILD_RATIO = 0.1
+# Antigüedad a partir de la cual se borran las filas de bajas (un proceso que arranca carga todo de cero)
+REMOVAL_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class SuppressedNumber(Base):
+    """Número al que no se le envían mensajes"""
+
+    __tablename__ = "suppressed_numbers"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    phone = Column(String(20), unique=True, nullable=False, index=True)
+    reason = Column(String(20), nullable=False, index=True)
+    source = Column(String(50), nullable=True)
+    created_by = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=_utcnow, nullable=False, index=True)
+
+
+class SuppressionRemoval(Base):
+    """Baja de la lista de supresión: los demás procesos la leen en la recarga incremental"""
+
+    __tablename__ = "suppression_removals"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    phone = Column(String(20), nullable=False)
+    removed_by = Column(String(100), nullable=True)
+    removed_at = Column(DateTime, default=_utcnow, nullable=False, index=True)
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre enteros (números E.164) con doble hashing de un blake2b"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    def _hashes(self, key: int) -> tuple[int, int]:
+        digest = hashlib.blake2b(key.to_bytes(8, "little"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, key: int) -> None:
+        first, step = self._hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * step) % size
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: int) -> bool:
+        first, step = self._hashes(key)
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * step) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class SuppressionList:
+    """
+    Filtro de Bloom + set exacto de la tabla suppressed_numbers.
+
+    is_suppressed() es la consulta de los caminos calientes (encolado y envío);
+    add()/remove() escriben en la BD y propagan el cambio a los demás procesos.
+    """
+
+    def __init__(
+        self,
+        capacity: int | None = None,
+        error_rate: float | None = None,
+        refresh_seconds: float | None = None,
+        overlap_seconds: float | None = None,
+        default_country_code: str | None = None,
+        backend: str | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.capacity = capacity or int(os.getenv("SUPPRESSION_BLOOM_CAPACITY", "1000000"))
+        self.error_rate = error_rate or float(os.getenv("SUPPRESSION_BLOOM_ERROR_RATE", "0.001"))
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else float(os.getenv("SUPPRESSION_REFRESH_SECONDS", "60"))
+        )
+        self.overlap_seconds = (
+            overlap_seconds if overlap_seconds is not None else float(os.getenv("SUPPRESSION_REFRESH_OVERLAP_SECONDS", "300"))
+        )
+        self.default_country_code = (
+            default_country_code if default_country_code is not None else os.getenv("AUDIENCE_DEFAULT_COUNTRY_CODE", "")
+        )
+        self.channel = os.getenv("SUPPRESSION_CHANNEL", "suppression_updates")
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        backend = (backend or os.getenv("SUPPRESSION_SYNC_BACKEND", "auto")).lower()
+        if backend == "auto":
+            # REDIS_URL tiene valor por defecto en todo el proyecto: solo se usa si está configurado
+            backend = "redis" if os.getenv("REDIS_URL") and REDIS_AVAILABLE else "local"
+        self.backend = backend
+        self._clock = clock
+
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._exact: set[int] = set()
+        self._last_id = 0
+        self._last_removal_id = 0
+        self._removed = 0
+        self._loaded = False
+        self._refreshed_at = 0.0
+        # Inicio (UTC) de la última carga o recarga completada: base de la ventana de solapamiento
+        self._synced_at: datetime | None = None
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._listener: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._redis_client: Any = None
+
+    # ── Consulta ──
+
+    def key(self, chat_id: Any) -> int | None:
+        """Clave numérica del destinatario (None si no es un número de teléfono)"""
+        phone, _ = normalize_phone(chat_id, self.default_country_code)
+        return int(phone) if phone else None
+
+    def is_suppressed(self, chat_id: Any) -> bool:
+        self._ensure_fresh()
+        key = self.key(chat_id)
+        return key is not None and key in self._bloom and key in self._exact
+
+    def partition(self, chat_ids: Iterable[Any]) -> tuple[list[Any], list[Any]]:
+        """(permitidos, suprimidos) conservando el orden"""
+        allowed: list[Any] = []
+        suppressed: list[Any] = []
+        for chat_id in chat_ids:
+            (suppressed if self.is_suppressed(chat_id) else allowed).append(chat_id)
+        return allowed, suppressed
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    # ── Carga ──
+
+    def _ensure_fresh(self) -> None:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.rebuild()
+            return
+        if self.refresh_seconds and self._clock() - self._refreshed_at >= self.refresh_seconds:
+            # Un solo hilo recarga; el resto sigue consultando lo que ya hay en memoria
+            if self._lock.acquire(blocking=False):
+                try:
+                    self.refresh()
+                finally:
+                    self._lock.release()
+
+    def _rows_after(self, model: Any, last_id: int, *criteria: Any) -> Iterable[tuple[int, str]]:
+        session = get_session()
+        try:
+            while True:
+                rows = session.execute(
+                    select(model.id, model.phone)
+                    .where(model.id > last_id, *criteria)
+                    .order_by(model.id)
+                    .limit(LOAD_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    return
+                yield from rows
+                last_id = rows[-1].id
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def _last_removal(self) -> int:
+        session = get_session()
+        try:
+            return int(session.execute(select(func.max(SuppressionRemoval.id))).scalar() or 0)
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def _still_suppressed(self, phones: list[str]) -> set[str]:
+        session = get_session()
+        try:
+            return set(session.execute(select(SuppressedNumber.phone).where(SuppressedNumber.phone.in_(phones))).scalars())
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+
+    def rebuild(self) -> int:
+        """Reconstruir filtro y set desde cero con toda la tabla"""
+        exact: set[int] = set()
+        last_id = 0
+        started_at = _utcnow()
+        try:
+            # Las bajas anteriores a la carga completa ya están reflejadas en la tabla
+            last_removal_id = self._last_removal()
+            for row_id, phone in self._rows_after(SuppressedNumber, 0):
+                exact.add(int(phone))
+                last_id = row_id
+        except Exception as e:
+            # Sin carga completa: la recarga incremental (desde el id 0) la completa después
+            logger.error("❌ Error cargando lista de supresión: %s", e)
+            self._loaded = True
+            self._refreshed_at = self._clock()
+            return len(self._exact)
+
+        self.capacity = max(self.capacity, 2 * len(exact))
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        for key in exact:
+            bloom.add(key)
+        self._bloom, self._exact = bloom, exact
+        self._last_id = last_id
+        self._last_removal_id = last_removal_id
+        self._removed = 0
+        self._loaded = True
+        self._refreshed_at = self._clock()
+        self._synced_at = started_at
+        self.start_listener()
+        logger.info("🚫 Lista de supresión cargada: %d números (%d KB de filtro)", len(exact), bloom.size_bytes // 1024)
+        return len(exact)
+
+    def refresh(self) -> int:
+        """Recarga incremental de altas y bajas (id nuevo o dentro del solapamiento); devuelve cuántos cambios aplicó"""
+        applied = 0
+        started_at = _utcnow()
+        since = (self._synced_at or started_at) - timedelta(seconds=self.overlap_seconds)
+        try:
+            last_id = self._last_id
+            for row_id, phone in self._rows_after(SuppressedNumber, last_id):
+                applied += self._index_new(int(phone))
+                self._last_id = row_id
+            # Ids menores confirmados después de la recarga anterior
+            for _, phone in self._rows_after(
+                SuppressedNumber, 0, SuppressedNumber.id <= last_id, SuppressedNumber.created_at >= since
+            ):
+                applied += self._index_new(int(phone))
+
+            last_removal_id = self._last_removal_id
+            removals: list[tuple[int, str]] = list(self._rows_after(SuppressionRemoval, last_removal_id))
+            late_removals = self._rows_after(
+                SuppressionRemoval, 0, SuppressionRemoval.id <= last_removal_id, SuppressionRemoval.removed_at >= since
+            )
+            phones = list({phone for _, phone in [*removals, *late_removals]})
+            if phones:
+                # Un número quitado y vuelto a agregar sigue suprimido: manda el estado actual de la tabla
+                current: set[str] = set()
+                for start in range(0, len(phones), LOAD_BATCH_SIZE):
+                    current |= self._still_suppressed(phones[start : start + LOAD_BATCH_SIZE])
+                for phone in phones:
+                    if phone not in current and int(phone) in self._exact:
+                        self._unindex(int(phone))
+                        applied += 1
+            if removals:
+                self._last_removal_id = removals[-1][0]
+            self._synced_at = started_at
+        except Exception as e:
+            logger.warning("⚠️ Error recargando lista de supresión: %s", e)
+        self._refreshed_at = self._clock()
+        if self._removed > self.capacity * STALE_REBUILD_RATIO or len(self._exact) > self.capacity:
+            self._rebuild_in_background()
+        return applied
+
+    def invalidate(self) -> None:
+        """Descartar lo cargado: la próxima consulta reconstruye desde la BD"""
+        with self._lock:
+            self._loaded = False
+
+    def _rebuild_in_background(self) -> None:
+        def _run() -> None:
+            if not self._rebuilding.acquire(blocking=False):
+                return
+            try:
+                with self._lock:
+                    self.rebuild()
+            finally:
+                self._rebuilding.release()
+
+        threading.Thread(target=_run, name="suppression-rebuild", daemon=True).start()
+
+    def _index(self, key: int) -> None:
+        self._bloom.add(key)
+        self._exact.add(key)
+
+    def _index_new(self, key: int) -> int:
+        """Indexar desde la recarga; 1 si el número no estaba en memoria"""
+        if key in self._exact:
+            return 0
+        self._index(key)
+        return 1
+
+    def _unindex(self, key: int) -> None:
+        # El bit queda en el filtro: el set exacto descarta ese falso positivo
+        if key in self._exact:
+            self._exact.discard(key)
+            self._removed += 1
+
+    # ── Escritura ──
+
+    def add(
+        self,
+        chat_ids: Iterable[Any],
+        reason: str,
+        source: str | None = None,
+        created_by: str | None = None,
+    ) -> list[str]:
+        """Suprimir números; devuelve los que se agregaron (normalizados, sin los ya suprimidos)"""
+        session = get_session()
+        try:
+            added = self.add_in_session(session, chat_ids, reason, source=source, created_by=created_by)
+            session.commit()
+        except Exception:
+            with contextlib.suppress(Exception):
+                session.rollback()
+            raise
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+        self.announce(added)
+        return added
+
+    def add_in_session(
+        self,
+        session: Any,
+        chat_ids: Iterable[Any],
+        reason: str,
+        source: str | None = None,
+        created_by: str | None = None,
+    ) -> list[str]:
+        """Insertar en la transacción del llamador; tras el commit hay que llamar announce()"""
+        if reason not in SUPPRESSION_REASONS:
+            raise ValueError(f"Motivo de supresión inválido: {reason!r}")
+        phones = list(dict.fromkeys(phone for phone, _ in map(self._normalize, chat_ids) if phone))
+        added: list[str] = []
+        for start in range(0, len(phones), PUBLISH_BATCH_SIZE):
+            chunk = phones[start : start + PUBLISH_BATCH_SIZE]
+            existing = set(session.execute(select(SuppressedNumber.phone).where(SuppressedNumber.phone.in_(chunk))).scalars())
+            new = [phone for phone in chunk if phone not in existing]
+            session.add_all(
+                SuppressedNumber(phone=phone, reason=reason, source=source, created_by=created_by) for phone in new
+            )
+            added.extend(new)
+        session.flush()
+        return added
+
+    def _normalize(self, chat_id: Any) -> tuple[str | None, str | None]:
+        return normalize_phone(chat_id, self.default_country_code)
+
+    def announce(self, phones: list[str]) -> None:
+        """Aplicar altas ya confirmadas en la BD a este proceso y publicarlas a los demás"""
+        if not phones:
+            return
+        for phone in phones:
+            self._index(int(phone))
+        self._publish("+", phones)
+
+    def remove(self, chat_id: Any, removed_by: str | None = None) -> bool:
+        """Quitar un número de la lista (p. ej. el contacto volvió a aceptar mensajes)"""
+        phone, _ = self._normalize(chat_id)
+        if phone is None:
+            return False
+        session = get_session()
+        try:
+            result = session.execute(delete(SuppressedNumber).where(SuppressedNumber.phone == phone))
+            if result.rowcount:
+                # Fila de baja para los procesos que no reciben el aviso por Redis
+                session.add(SuppressionRemoval(phone=phone, removed_by=removed_by))
+                cutoff = _utcnow() - timedelta(seconds=REMOVAL_RETENTION_SECONDS)
+                session.execute(delete(SuppressionRemoval).where(SuppressionRemoval.removed_at < cutoff))
+            session.commit()
+        except Exception as e:
+            logger.error("❌ Error quitando número de la lista de supresión: %s", e)
+            with contextlib.suppress(Exception):
+                session.rollback()
+            return False
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+        if not result.rowcount:
+            return False
+        self._unindex(int(phone))
+        self._publish("-", [phone])
+        return True
+
+    def summary(self) -> dict[str, Any]:
+        """Totales por motivo (desde la BD) y estado del filtro en memoria"""
+        session = get_session()
+        try:
+            by_reason = dict(
+                session.execute(select(SuppressedNumber.reason, func.count()).group_by(SuppressedNumber.reason)).all()
+            )
+        finally:
+            with contextlib.suppress(Exception):
+                session.close()
+        return {
+            "total": sum(by_reason.values()),
+            "by_reason": by_reason,
+            "in_memory": len(self._exact),
+            "bloom_bytes": self._bloom.size_bytes,
+            "bloom_error_rate": self.error_rate,
+        }
+
+    # ── Sincronización entre procesos ──
+
+    def _redis(self) -> Any:
+        if self._redis_client is None:
+            self._redis_client = redis.Redis.from_url(self.redis_url, socket_timeout=2, socket_connect_timeout=2)
+        return self._redis_client
+
+    def _publish(self, operation: str, phones: list[str]) -> None:
+        if self.backend != "redis":
+            return
+        try:
+            for start in range(0, len(phones), PUBLISH_BATCH_SIZE):
+                self._redis().publish(self.channel, operation + ",".join(phones[start : start + PUBLISH_BATCH_SIZE]))
+        except Exception as e:
+            # La recarga incremental lo recoge igual en el próximo refresh
+            logger.debug("No se pudo publicar cambio de supresión en Redis: %s", e)
+
+    def apply_update(self, payload: str) -> None:
+        """Aplicar un cambio publicado por otro proceso ('+n1,n2' altas, '-n1' bajas)"""
+        operation, phones = payload[:1], [phone for phone in payload[1:].split(",") if phone.isdigit()]
+        for phone in phones:
+            if operation == "+":
+                self._index(int(phone))
+            elif operation == "-":
+                self._unindex(int(phone))
+
+    def start_listener(self) -> None:
+        if self.backend != "redis" or (self._listener is not None and self._listener.is_alive()):
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen_redis, name="suppression-listener", daemon=True)
+        self._listener.start()
+
+    def stop_listener(self) -> None:
+        self._stop.set()
+        listener = self._listener
+        if listener is not None and listener.is_alive():
+            listener.join(timeout=2)
+
+    def _listen_redis(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                backoff = 1.0
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        data = message.get("data")
+                        self.apply_update(data.decode() if isinstance(data, bytes) else str(data))
+            except Exception as e:
+                logger.warning("⚠️ Suscripción de supresiones caída (%s), reintentando en %.0fs", e, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    with contextlib.suppress(Exception):
+                        pubsub.close()
+
+
+class SuppressedRecipientError(ValueError):
+    """El destinatario está en la lista de supresión"""
+
+
+# Instancia global
+suppression_list = SuppressionList()
@@ -0,0 +1,267 @@
+"""
+✂️ Presupuesto de tokens para el historial de conversación
+Estima tokens localmente por familia de proveedor y, si el prompt excede el
+presupuesto, conserva los mensajes de sistema y los últimos N turnos literales
+(un turno = un mensaje del usuario y las respuestas que le siguen).
+Los turnos anteriores se reemplazan por un resumen incremental que se genera en
+segundo plano y se guarda junto a la conversación (tabla conversation_summaries).
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import math
+import os
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    from src.services.metrics import inc_counter, observe_histogram
+
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Caracteres por token aproximados de cada familia de tokenizer
+CHARS_PER_TOKEN = {"openai": 4.0, "claude": 3.5, "gemini": 4.0, "llama": 3.6}
+
+PROVIDER_FAMILIES = {
+    "openai": "openai",
+    "xai": "openai",
+    "grok": "openai",
+    "openrouter": "openai",
+    "claude": "claude",
+    "gemini": "gemini",
+    "ollama": "llama",
+    "lmstudio": "llama",
+}
+
+# Tokens de formato por mensaje (rol, separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "RESUMEN DE LA CONVERSACIÓN PREVIA:\n"
+
+Summarizer = Callable[[str | None, list[dict[str, str]]], Awaitable[str | None]]
+
+
+def provider_family(provider: str) -> str:
+    """Familia de tokenizer de un proveedor (openai por defecto)"""
+    return PROVIDER_FAMILIES.get(provider, "openai")
+
+
+def estimate_tokens(text: str, family: str = "openai") -> int:
+    """Estimación local de tokens de un texto (sin tokenizer, O(1) sobre la longitud)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN.get(family, 4.0))
+
+
+def estimate_messages_tokens(messages: list[dict[str, str]], family: str = "openai") -> int:
+    return sum(MESSAGE_OVERHEAD_TOKENS + estimate_tokens(str(msg.get("content", "")), family) for msg in messages)
+
+
+def history_fingerprint(messages: list[dict[str, str]]) -> str:
+    """Huella de un prefijo del historial: valida que un resumen guardado siga aplicando"""
+    payload = json.dumps(
+        [[msg.get("role", ""), msg.get("content", "")] for msg in messages], ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _load_stored_summary(chat_id: str) -> dict[str, Any] | None:
+    import chat_sessions
+
+    return chat_sessions.get_conversation_summary(chat_id)
+
+
+def _save_stored_summary(chat_id: str, summary: str, covered_messages: int, fingerprint: str) -> None:
+    import chat_sessions
+
+    chat_sessions.save_conversation_summary(chat_id, summary, covered_messages, fingerprint)
+
+
+class TokenBudgetManager:
+    """
+    Etapa de presupuesto de tokens previa a la llamada al proveedor.
+
+    apply() nunca espera al LLM: usa el último resumen guardado que siga siendo válido
+    (huella del prefijo resumido) y agenda en segundo plano el resumen de los turnos
+    que todavía no cubre. Mientras tanto esos turnos se incluyen literalmente, del más
+    reciente al más antiguo, hasta llenar el presupuesto.
+    """
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        max_prompt_tokens: int | None = None,
+        keep_last_turns: int | None = None,
+        summary_loader: Callable[[str], dict[str, Any] | None] = _load_stored_summary,
+        summary_saver: Callable[[str, str, int, str], None] = _save_stored_summary,
+    ) -> None:
+        self.enabled = enabled if enabled is not None else os.getenv("LLM_TOKEN_BUDGET_ENABLED", "true").lower() == "true"
+        self.max_prompt_tokens = (
+            max_prompt_tokens if max_prompt_tokens is not None else int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "4000"))
+        )
+        self.keep_last_turns = max(
+            1, keep_last_turns if keep_last_turns is not None else int(os.getenv("LLM_HISTORY_KEEP_TURNS", "3"))
+        )
+        self._summary_loader = summary_loader
+        self._summary_saver = summary_saver
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+
+    async def apply(
+        self,
+        messages: list[dict[str, str]],
+        chat_id: str | None,
+        family: str = "openai",
+        summarizer: Summarizer | None = None,
+    ) -> list[dict[str, str]]:
+        """Devolver los mensajes ajustados al presupuesto (o los mismos si ya caben)"""
+        if not self.enabled or not messages:
+            return messages
+
+        tokens_before = estimate_messages_tokens(messages, family)
+        if tokens_before <= self.max_prompt_tokens:
+            return messages
+
+        system = [msg for msg in messages if msg.get("role") == "system"]
+        conversation = [msg for msg in messages if msg.get("role") != "system"]
+        split = self._recent_turns_start(conversation)
+        older = conversation[:split]
+        recent = conversation[split:]
+
+        summary_text: str | None = None
+        covered = 0
+        if older and chat_id:
+            stored = await self._load_summary(chat_id)
+            if stored and 0 < int(stored.get("covered_messages") or 0) <= len(older):
+                stored_covered = int(stored["covered_messages"])
+                if stored.get("fingerprint") == history_fingerprint(older[:stored_covered]):
+                    summary_text = stored.get("summary") or None
+                    covered = stored_covered if summary_text else 0
+
+            pending = older[covered:]
+            if pending and summarizer is not None:
+                self._schedule_refresh(chat_id, summary_text, covered, older, summarizer, family)
+        else:
+            pending = older
+
+        prefix = list(system)
+        if summary_text:
+            prefix.append({"role": "system", "content": f"{SUMMARY_PREFIX}{summary_text}"})
+
+        trimmed = prefix + self._fit_newest(prefix, pending + recent, family)
+
+        tokens_after = estimate_messages_tokens(trimmed, family)
+        saved = max(0, tokens_before - tokens_after)
+        logger.info(
+            "✂️ Historial ajustado para chat %s: %d → %d tokens estimados (%d mensajes omitidos, resumen=%s)",
+            chat_id,
+            tokens_before,
+            tokens_after,
+            len(messages) - len(trimmed) + (1 if summary_text else 0),
+            bool(summary_text),
+        )
+        if METRICS_AVAILABLE:
+            inc_counter("llm_history_trimmed")
+            inc_counter("llm_prompt_tokens_saved", saved)
+            observe_histogram("llm_prompt_tokens_estimated", float(tokens_after))
+            if summary_text:
+                inc_counter("llm_history_summary_used")
+        return trimmed
+
+    def _recent_turns_start(self, conversation: list[dict[str, str]]) -> int:
+        """Índice donde empiezan los últimos keep_last_turns turnos (cada uno abre con un mensaje del usuario)"""
+        user_positions = [index for index, msg in enumerate(conversation) if msg.get("role") == "user"]
+        if len(user_positions) <= self.keep_last_turns:
+            return 0
+        return user_positions[-self.keep_last_turns]
+
+    def _summary_chunks(self, pending: list[dict[str, str]], family: str) -> list[list[dict[str, str]]]:
+        """Partir los turnos pendientes, del más antiguo al más reciente, en bloques que caben en el presupuesto"""
+        chunks: list[list[dict[str, str]]] = []
+        chunk: list[dict[str, str]] = []
+        available = self.max_prompt_tokens
+        for msg in pending:
+            cost = estimate_messages_tokens([msg], family)
+            if chunk and cost > available:
+                chunks.append(chunk)
+                chunk, available = [], self.max_prompt_tokens
+            chunk.append(msg)
+            available -= cost
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _fit_newest(self, prefix: list[dict[str, str]], candidates: list[dict[str, str]], family: str) -> list[dict[str, str]]:
+        """Conservar los mensajes más recientes que quepan (siempre el último)"""
+        available = self.max_prompt_tokens - estimate_messages_tokens(prefix, family)
+        kept: list[dict[str, str]] = []
+        for msg in reversed(candidates):
+            cost = estimate_messages_tokens([msg], family)
+            if kept and cost > available:
+                break
+            kept.append(msg)
+            available -= cost
+        kept.reverse()
+        return kept
+
+    async def _load_summary(self, chat_id: str) -> dict[str, Any] | None:
+        try:
+            return await asyncio.to_thread(self._summary_loader, chat_id)
+        except Exception as e:
+            logger.debug("No se pudo cargar resumen de conversación %s: %s", chat_id, e)
+            return None
+
+    def _schedule_refresh(
+        self,
+        chat_id: str,
+        previous_summary: str | None,
+        covered: int,
+        older: list[dict[str, str]],
+        summarizer: Summarizer,
+        family: str,
+    ) -> None:
+        """Agendar (una vez por chat) el resumen incremental de los turnos pendientes"""
+        running = self._refresh_tasks.get(chat_id)
+        if running is not None and not running.done():
+            return
+
+        # El resumidor recibe bloques que caben en el presupuesto, del más antiguo al más
+        # reciente; cada bloque extiende el resumen anterior y solo entonces cuenta como cubierto
+        chunks = self._summary_chunks(older[covered:], family)
+
+        async def _refresh() -> None:
+            summary, covered_messages = previous_summary, covered
+            try:
+                for chunk in chunks:
+                    extended = await summarizer(summary, chunk)
+                    if not extended or not extended.strip():
+                        return
+                    summary, covered_messages = extended.strip(), covered_messages + len(chunk)
+                    fingerprint = history_fingerprint(older[:covered_messages])
+                    await asyncio.to_thread(self._summary_saver, chat_id, summary, covered_messages, fingerprint)
+                    if METRICS_AVAILABLE:
+                        inc_counter("llm_history_summaries")
+                logger.info("📝 Resumen de conversación actualizado para chat %s (%d mensajes)", chat_id, covered_messages)
+            except Exception as e:
+                logger.warning("⚠️ No se pudo generar resumen de conversación %s: %s", chat_id, e)
+                if METRICS_AVAILABLE:
+                    inc_counter("llm_history_summary_failures")
+            finally:
+                if self._refresh_tasks.get(chat_id) is task:
+                    del self._refresh_tasks[chat_id]
+
+        # Contexto limpio: el resumen no hereda el deadline de la respuesta en curso
+        task = asyncio.get_running_loop().create_task(_refresh(), context=contextvars.Context())
+        self._refresh_tasks[chat_id] = task
+
+    async def wait_for_refreshes(self) -> None:
+        """Esperar los resúmenes en curso (tests y apagado ordenado)"""
+        tasks = [task for task in self._refresh_tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
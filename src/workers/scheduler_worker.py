@@ -32,7 +32,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 from crypto import is_key_rotation_due
+from src.services.queue_signals import queue_wakeup
 from src.services.queue_system import queue_manager
+from src.services.scheduled_dispatcher import ScheduledDispatcher
 
 
 class SchedulerWorker:
@@ -40,6 +42,7 @@ class SchedulerWorker:
 
     def __init__(self) -> None:
         self.scheduler = BackgroundScheduler()
+        self.dispatcher = ScheduledDispatcher()
         self.running = False
         logger.info("⏰ Scheduler Worker inicializado")
 
@@ -51,12 +54,11 @@ class SchedulerWorker:
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
 
-        # Programar tarea de procesamiento cada 30 segundos
         self.scheduler.add_job(
-            func=self.process_scheduled_messages,
-            trigger=IntervalTrigger(seconds=30),
-            id="process_scheduled",
-            name="Procesar mensajes programados",
+            func=self.reap_expired_leases,
+            trigger=IntervalTrigger(seconds=int(os.getenv("QUEUE_REAPER_INTERVAL_SECONDS", "60"))),
+            id="reap_expired_leases",
+            name="Devolver a la cola mensajes con lease vencido",
             replace_existing=True,
         )
 
@@ -70,6 +72,9 @@ class SchedulerWorker:
 
         self.scheduler.start()
         self.running = True
+        # El dispatcher duerme hasta el próximo scheduled_at; cada encolado lo despierta
+        self.dispatcher.start()
+        queue_wakeup.subscribe(self._on_queue_wakeup, kinds=("enqueue",))
 
         logger.info("✅ Scheduler Worker activo")
 
@@ -83,17 +88,34 @@ class SchedulerWorker:
             self.shutdown()
 
     def process_scheduled_messages(self) -> None:
-        """DB-backed scheduler: currently acts as heartbeat/visibility checkpoint."""
+        """Una pasada del dispatcher: recargar la ventana programada y despachar lo vencido."""
         try:
-            pending_due = queue_manager.get_pending_messages(limit=1, include_scheduled=True)
-            logger.debug("Scheduler heartbeat - due messages snapshot: %s", len(pending_due))
+            self.dispatcher.reload()
+            dispatched = self.dispatcher.dispatch_due()
+            logger.debug("Scheduler - mensajes programados despachados: %s", dispatched)
         except Exception as e:
             logger.error("❌ Error procesando mensajes programados: %s", e)
 
+    def _on_queue_wakeup(self) -> None:
+        """Despertar al dispatcher al recibir una señal de encolado."""
+        if not self.running:
+            return
+        self.dispatcher.wake()
+
+    def reap_expired_leases(self) -> None:
+        """Liberar mensajes reclamados por workers que no confirmaron a tiempo."""
+        try:
+            reaped = queue_manager.reap_expired_leases()
+            logger.debug("Reaper de leases: %s mensajes devueltos a pending", reaped)
+        except Exception as e:
+            logger.error("❌ Error liberando leases vencidos: %s", e)
+
     def shutdown(self) -> None:
         """Apagar el worker de forma ordenada"""
         logger.info("🛑 Apagando Scheduler Worker...")
         self.running = False
+        self.dispatcher.stop()
+        queue_wakeup.stop_listener()
 
         if self.scheduler.running:
             self.scheduler.shutdown(wait=True)
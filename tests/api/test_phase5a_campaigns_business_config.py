@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import copy
 import json
+import os
 from datetime import datetime
 
 import pytest
@@ -11,7 +12,10 @@ from fastapi.testclient import TestClient
 
 from src.routers import business_config as business_config_router
 from src.routers import campaigns as campaigns_router
+from src.routers import contacts as contacts_router
 from src.routers import deps
+from src.services.audience_import import AudienceImportJob, audience_importer
+from src.services.queue_system import CampaignImportingError
 
 pytestmark = [pytest.mark.api]
 
@@ -119,3 +123,154 @@ def test_business_config_update_export_import_and_reset(
     reset_resp = client.post("/api/business/config/reset", headers=admin_headers)
     assert reset_resp.status_code == 200
     assert reset_resp.json().get("success") is True
+
+
+def test_requeue_dead_letters_requires_filter_and_passes_it_through(
+    client: TestClient,
+    admin_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls: list[dict] = []
+
+    def _requeue(**filters) -> int:
+        calls.append(filters)
+        return 7
+
+    monkeypatch.setattr(campaigns_router.queue_manager, "requeue_dead_letters", _requeue)
+
+    response = client.post("/api/campaigns/dead-letters/requeue", headers=admin_headers, json={})
+    assert response.status_code == 400
+
+    response = client.post(
+        "/api/campaigns/dead-letters/requeue",
+        headers=admin_headers,
+        json={"campaign_id": "camp_dlq", "error_class": "session"},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json() == {"success": True, "requeued": 7}
+    assert calls == [{"campaign_id": "camp_dlq", "error_class": "session"}]
+
+    summary = client.get("/api/campaigns/dead-letters", headers=admin_headers)
+    assert summary.status_code == 200
+    assert isinstance(summary.json(), list)
+
+
+def test_import_campaign_audience_starts_background_job(
+    client: TestClient,
+    admin_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    started: dict = {}
+
+    def _create_campaign(name: str, created_by: str, total_messages: int, metadata=None, status: str = "active") -> str:
+        assert (total_messages, status) == (0, "importing")
+        return "camp_import"
+
+    def _start(path: str, file_format: str, campaign_id: str, template: str, **kwargs) -> AudienceImportJob:
+        with open(path, encoding="utf-8") as handle:
+            started.update(content=handle.read(), file_format=file_format, campaign_id=campaign_id, **kwargs)
+        os.remove(path)
+        job = AudienceImportJob(job_id="imp_api", campaign_id=campaign_id, filename=kwargs["filename"])
+        monkeypatch.setitem(audience_importer._jobs, job.job_id, job)
+        return job
+
+    monkeypatch.setattr(campaigns_router.queue_manager, "create_campaign", _create_campaign)
+    monkeypatch.setattr(campaigns_router.audience_importer, "start", _start)
+
+    response = client.post(
+        "/api/campaigns/import",
+        headers=admin_headers,
+        data={"name": "Importada", "template": "Hola", "scheduled_at": "2030-01-01T10:00:00Z"},
+        files={"file": ("audiencia.csv", b"telefono\n573001112233\n", "text/csv")},
+    )
+    assert response.status_code == 202, response.text
+    assert response.json()["job_id"] == "imp_api"
+    assert started["content"] == "telefono\n573001112233\n"
+    assert (started["file_format"], started["campaign_id"]) == ("csv", "camp_import")
+    assert started["scheduled_base"].isoformat() == "2030-01-01T10:00:00+00:00"
+
+    status = client.get("/api/campaigns/import/imp_api", headers=admin_headers)
+    assert status.status_code == 200
+    assert status.json()["status"] == "queued"
+    assert client.get("/api/campaigns/import/imp_missing", headers=admin_headers).status_code == 404
+
+    rejected = client.post(
+        "/api/campaigns/import",
+        headers=admin_headers,
+        data={"name": "Importada", "template": "Hola"},
+        files={"file": ("audiencia.pdf", b"%PDF", "application/pdf")},
+    )
+    assert rejected.status_code == 400
+
+
+def test_suppressions_crud_and_campaign_skips_suppressed_contacts(
+    client: TestClient,
+    admin_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    response = client.post("/api/suppressions", headers=admin_headers, json={"phones": ["573002224455"], "reason": "spam"})
+    assert response.status_code == 400
+
+    response = client.post("/api/suppressions", headers=admin_headers, json={"phones": ["+57 300 222 4455", "573002224455"]})
+    assert response.status_code == 200, response.text
+    assert (response.json()["added"], response.json()["phones"]) == (1, ["573002224455"])
+
+    check = client.get("/api/suppressions", headers=admin_headers, params={"phone": "573002224455"})
+    assert check.status_code == 200
+    assert check.json()["suppressed"] is True
+    assert check.json()["by_reason"] == {"opt_out": 1}
+
+    captured_rows: list[dict] = []
+
+    def _enqueue_bulk(rows: list[dict]) -> list[str]:
+        captured_rows.extend(rows)
+        return [f"msg-{idx}" for idx, _ in enumerate(rows, start=1)]
+
+    monkeypatch.setattr(campaigns_router.queue_manager, "create_campaign", lambda **kwargs: "camp_suppressed")
+    monkeypatch.setattr(campaigns_router.queue_manager, "enqueue_bulk_messages", _enqueue_bulk)
+
+    campaign = {"name": "Con opt-outs", "template": "Hola", "contacts": ["573001112233", "573002224455"]}
+    response = client.post("/api/campaigns", headers=admin_headers, json=campaign)
+    assert response.status_code == 200, response.text
+    assert (response.json()["total_messages"], response.json()["suppressed"]) == (1, 1)
+    assert [row["chat_id"] for row in captured_rows] == ["573001112233"]
+
+    response = client.post("/api/campaigns", headers=admin_headers, json={**campaign, "contacts": ["573002224455"]})
+    assert response.status_code == 400
+
+    assert client.delete("/api/suppressions/573002224455", headers=admin_headers).status_code == 200
+    assert client.delete("/api/suppressions/573002224455", headers=admin_headers).status_code == 404
+    assert (
+        client.get("/api/suppressions", headers=admin_headers, params={"phone": "573002224455"}).json()["suppressed"] is False
+    )
+
+
+def test_pause_resume_importing_campaign_returns_conflict(
+    client: TestClient,
+    admin_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def _importing(campaign_id: str) -> bool:
+        raise CampaignImportingError(f"La campaña {campaign_id} aún está importando su audiencia")
+
+    monkeypatch.setattr(campaigns_router.queue_manager, "pause_campaign", _importing)
+    monkeypatch.setattr(campaigns_router.queue_manager, "resume_campaign", _importing)
+
+    assert client.post("/api/campaigns/camp_import/pause", headers=admin_headers).status_code == 409
+    assert client.post("/api/campaigns/camp_import/resume", headers=admin_headers).status_code == 409
+
+
+def test_contact_writes_invalidate_cached_context(
+    client: TestClient,
+    admin_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    invalidated: list[str | None] = []
+    monkeypatch.setattr(contacts_router.context_loader, "invalidate", invalidated.append)
+
+    response = client.post("/api/contacts", headers=admin_headers, json={"contact_id": "573005556677", "label": "Cliente"})
+    assert response.status_code == 200, response.text
+    response = client.delete("/api/allowed-contacts/573005556677", headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    assert invalidated == ["573005556677", "573005556677"]
@@ -3,11 +3,16 @@ Tests for the Cache System — Redis with in-memory fallback.
 """
 
 import asyncio
+import fnmatch
+import time
+from unittest.mock import patch
 
 import pytest
 from cachetools import TTLCache
 
+from src.services import cache_system
 from src.services.cache_system import (
+    AccountedTTLCache,
     CacheManager,
     cache_business_config,
     cache_conversation_context,
@@ -15,6 +20,7 @@ from src.services.cache_system import (
     get_cached_business_config,
     get_cached_conversation_context,
     get_cached_llm_response,
+    get_cached_llm_responses,
 )
 
 pytestmark = pytest.mark.unit
@@ -123,6 +129,258 @@ class TestCacheManager:
         assert all(item == {"value": "ok"} for item in results)
 
 
+class _FakeRedisPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        # Cada comando se encola y se ejecuta contra _FakeRedis en execute()
+        return lambda *args: self.ops.append((name, args))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = []
+        for name, args in self.ops:
+            results.append(getattr(self.redis, f"_{name}")(*args))
+        return results
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.hashes = {}
+        self.sets = {}
+        self.hll = {}
+        self.published = []
+        self.round_trips = 0
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, px=None):
+        self.round_trips += 1
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def exists(self, key):
+        self.round_trips += 1
+        return int(key in self.data)
+
+    async def eval(self, script, numkeys, key, token):
+        self.round_trips += 1
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+    async def hgetall(self, key):
+        self.round_trips += 1
+        return {field: str(value) for field, value in self.hashes.get(key, {}).items()}
+
+    async def smembers(self, key):
+        self.round_trips += 1
+        return set(self.sets.get(key, set()))
+
+    async def scan_iter(self, match):
+        self.round_trips += 1
+        for key in [k for k in self.data if fnmatch.fnmatchcase(k, match)]:
+            yield key
+
+    # Comandos ejecutados desde el pipeline
+    def _setex(self, key, ttl, value):
+        self.data[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def _pttl(self, key):
+        if key not in self.data:
+            return -2
+        return self.ttls[key] * 1000 if key in self.ttls else -1
+
+    def _publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    def _sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+        return len(members)
+
+    def _pfadd(self, key, *members):
+        self.hll.setdefault(key, set()).update(members)
+        return 1
+
+    def _pfcount(self, key):
+        return len(self.hll.get(key, set()))
+
+    def _expire(self, key, ttl):
+        return True
+
+    def _hincrby(self, key, field, amount):
+        bucket = self.hashes.setdefault(key, {})
+        bucket[field] = bucket.get(field, 0) + amount
+        return bucket[field]
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def publish(self, channel, message):
+        self.round_trips += 1
+        self.published.append((channel, message))
+
+    def pipeline(self, transaction=True):
+        return _FakeRedisPipeline(self)
+
+
+def _redis_backed_manager(redis=None) -> CacheManager:
+    # Sin REDIS_AVAILABLE el constructor no agenda la conexión real que reemplazaría al fake
+    with patch.object(cache_system, "REDIS_AVAILABLE", False):
+        cm = CacheManager()
+    cm._redis_init_attempted = True
+    cm.redis_client = redis or _FakeRedis()
+    cm.cache_enabled = True
+    cm._generations_synced_at = time.monotonic()  # sin HGETALL inicial: cuenta solo las idas y vueltas de datos
+    return cm
+
+
+class TestBatchedOperations:
+    """get_many/set_many: una ida y vuelta por lote."""
+
+    @pytest.mark.asyncio
+    async def test_memory_get_many_omits_missing(self):
+        cm = CacheManager()
+        cm._redis_init_attempted = True
+        assert await cm.set_many({"a": 1, "b": {"x": 2}}, ttl=60) is True
+
+        assert await cm.get_many(["a", "b", "missing"]) == {"a": 1, "b": {"x": 2}}
+        assert await cm.get_many([]) == {}
+
+    @pytest.mark.asyncio
+    async def test_redis_batches_use_single_round_trip(self):
+        cm = _redis_backed_manager()
+
+        await cm.set_many({"k1": "v1", "k2": [1, 2]}, ttl=30)
+        found = await cm.get_many(["k1", "k2", "k3"])
+
+        assert found == {"k1": "v1", "k2": [1, 2]}
+        assert cm.redis_client.round_trips == 2
+        assert set(cm.redis_client.data) == {"chatbot:k1", "chatbot:k2"}
+
+
+class TestTwoTierCache:
+    """L1 por proceso delante de Redis con invalidación por pub/sub."""
+
+    @pytest.mark.asyncio
+    async def test_l1_serves_repeated_reads_without_redis(self):
+        cm = _redis_backed_manager()
+        cm.redis_client.data["chatbot:cfg"] = '{"v": 1}'
+
+        assert await cm.get("cfg") == {"v": 1}
+        assert await cm.get("cfg") == {"v": 1}
+        assert await cm.get("missing") is None
+
+        assert cm.redis_client.round_trips == 2
+        tiers = (await cm.get_stats())["tiers"]
+        assert (tiers["l1"]["hits"], tiers["l1"]["misses"]) == (1, 2)
+        assert (tiers["l2"]["hits"], tiers["l2"]["misses"]) == (1, 1)
+        assert tiers["l1"]["hit_ratio"] == pytest.approx(0.333, abs=0.001)
+
+    @pytest.mark.asyncio
+    async def test_writes_publish_invalidation_in_same_round_trip(self):
+        cm = _redis_backed_manager()
+
+        await cm.set("cfg", {"v": 2}, ttl=30)
+        await cm.delete("cfg")
+
+        channels = [channel for channel, _ in cm.redis_client.published]
+        assert channels == [cm.invalidation_channel, cm.invalidation_channel]
+        assert cm.redis_client.round_trips == 3  # pipeline(setex+publish), delete, publish
+        assert "chatbot:cfg" not in cm.l1_cache
+
+    @pytest.mark.asyncio
+    async def test_remote_invalidation_drops_l1_entries(self):
+        redis = _FakeRedis()
+        writer = _redis_backed_manager(redis)
+        reader = _redis_backed_manager(redis)
+        redis.data["chatbot:faq:1"] = '"vieja"'
+        redis.data["chatbot:faq:2"] = '"otra"'
+        await reader.get_many(["faq:1", "faq:2"])
+
+        await writer.set("faq:1", "nueva", ttl=30)
+        for _, message in redis.published:
+            reader._handle_invalidation(message)
+        assert await reader.get("faq:1") == "nueva"
+
+        reader._handle_invalidation(writer._invalidation_message(patterns=["chatbot:faq:*"]))
+        assert len(reader.l1_cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_own_invalidations_are_ignored(self):
+        cm = _redis_backed_manager()
+        await cm.set("cfg", {"v": 3}, ttl=30)
+
+        cm._handle_invalidation(cm.redis_client.published[-1][1])
+
+        assert cm._l1_get("chatbot:cfg") == (True, {"v": 3})
+
+    @pytest.mark.asyncio
+    async def test_l1_never_outlives_the_redis_ttl(self):
+        cm = _redis_backed_manager()
+        await cm.set("otp:1", "1234", ttl=1)
+        cm.redis_client.data["chatbot:corta"] = '"x"'
+        cm.redis_client.ttls["chatbot:corta"] = 2
+
+        assert await cm.get("corta") == "x"
+        clock = time.monotonic()
+        with patch.object(cache_system.time, "monotonic", return_value=clock + 2.5):
+            assert cm._l1_get("chatbot:otp:1") == (False, None)
+            assert cm._l1_get("chatbot:corta") == (False, None)
+
+    @pytest.mark.asyncio
+    async def test_l1_hits_return_independent_copies(self):
+        cm = _redis_backed_manager()
+        await cm.set("cfg", {"items": [1]}, ttl=30)
+
+        first = await cm.get("cfg")
+        first["items"].append(2)
+
+        assert await cm.get("cfg") == {"items": [1]}
+        assert cm.redis_client.round_trips == 1
+
+    @pytest.mark.asyncio
+    async def test_l1_disabled_goes_straight_to_redis(self):
+        cm = _redis_backed_manager()
+        cm.two_tier_enabled = False
+        cm.redis_client.data["chatbot:cfg"] = '"x"'
+
+        assert await cm.get("cfg") == "x"
+        assert await cm.get("cfg") == "x"
+
+        assert cm.redis_client.round_trips == 2
+        assert len(cm.l1_cache) == 0
+
+
 class TestConvenienceFunctions:
     """Test the module-level convenience functions."""
 
@@ -143,6 +401,14 @@ class TestConvenienceFunctions:
         assert result is not None
         assert "AI response text" in str(result)
 
+    @pytest.mark.asyncio
+    async def test_llm_responses_batch_lookup(self):
+        """Lookup of several providers for one prompt returns only cached ones."""
+        await cache_llm_response("hash-batch", "respuesta xai", "xai", ttl=60)
+        result = await get_cached_llm_responses("hash-batch", ["gemini", "xai", "openai"])
+        assert list(result) == ["xai"]
+        assert result["xai"]["response"] == "respuesta xai"
+
     @pytest.mark.asyncio
     async def test_session_context_cache(self):
         """Cache and retrieve session context."""
@@ -182,3 +448,268 @@ class TestCacheKeyHashing:
                 found = True
                 break
         assert found, "Key should be stored in memory cache"
+
+
+class TestMemoryAccounting:
+    """Contadores incrementales del caché en memoria por namespace."""
+
+    def _cache(self, maxsize=3, ttl=10):
+        clock = {"now": 0.0}
+        cache = AccountedTTLCache(
+            maxsize=maxsize, ttl=ttl, timer=lambda: clock["now"], namespace_of=lambda key: key.split(":", 1)[0]
+        )
+        return cache, clock
+
+    def test_set_replace_and_delete_adjust_counts_and_bytes(self):
+        cache, _clock = self._cache()
+        cache["llm:a"] = "x" * 10
+        cache["llm:b"] = "y" * 5
+        cache["llm:a"] = "z" * 2
+        del cache["llm:b"]
+
+        stats = cache.namespace_stats()["llm"]
+        assert (stats["keys"], stats["bytes"], stats["evictions"]) == (1, 2, 0)
+        assert cache.total_bytes == 2
+
+    def test_lru_eviction_and_expiry_are_counted(self):
+        cache, clock = self._cache(maxsize=2, ttl=10)
+        cache["conv:1"] = "a"
+        cache["conv:2"] = "b"
+        cache["cfg:1"] = "c"  # expulsa conv:1 por capacidad
+        clock["now"] = 11.0
+
+        stats = cache.namespace_stats()
+        assert stats["conv"]["evictions"] == 1
+        assert stats["conv"]["expirations"] == 1
+        assert stats["cfg"]["expirations"] == 1
+        assert cache.total_bytes == 0 and len(cache) == 0
+
+    def test_clear_is_not_counted_as_eviction(self):
+        cache, _clock = self._cache()
+        cache["llm:a"] = "x"
+        cache.clear()
+
+        assert cache.namespace_stats()["llm"] == {
+            "keys": 0,
+            "bytes": 0,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_manager_reports_namespace_hits_and_misses(self):
+        cm = CacheManager()
+        cm._redis_init_attempted = True
+        await cm.set_many({"business_config:1": {"n": 1}, "conversation:s1": ["hola"]}, ttl=60)
+        await cm.get("business_config:1")
+        await cm.get_many(["business_config:2", "conversation:s1"])
+
+        stats = await cm.get_stats()
+
+        assert stats["namespaces"]["business_config"]["hits"] == 1
+        assert stats["namespaces"]["business_config"]["misses"] == 1
+        assert stats["namespaces"]["conversation"]["keys"] == 1
+        assert stats["memory_size_bytes"] == len(str({"n": 1})) + len(str(["hola"]))
+
+
+class TestCompressedValues:
+    """Valores grandes viajan comprimidos; las entradas JSON antiguas se siguen leyendo."""
+
+    @pytest.mark.asyncio
+    async def test_large_context_is_compressed_in_redis(self):
+        cm = _redis_backed_manager()
+        context = [{"role": "user", "content": f"turno {i}: necesito ayuda con mi pedido"} for i in range(60)]
+
+        await cm.set("conversation:s1", context, ttl=60)
+        cm.l1_cache.clear()
+
+        stored = cm.redis_client.data["chatbot:conversation:s1"]
+        assert stored[:1] in (b"\x02", b"\x03")
+        assert await cm.get("conversation:s1") == context
+        codec = (await cm.get_stats())["codec"]
+        assert codec["compressed"] == 1
+        assert codec["compression_ratio"] > 3
+
+
+class TestGetOrSet:
+    """get_or_set: single-flight entre workers, stale-while-revalidate y caché negativo."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_across_workers_call_factory_once(self):
+        redis = _FakeRedis()
+        workers = [_redis_backed_manager(redis), _redis_backed_manager(redis)]
+        calls = {"count": 0}
+
+        async def factory():
+            calls["count"] += 1
+            await asyncio.sleep(0.05)
+            return {"plan": "anual"}
+
+        results = await asyncio.gather(*[workers[i % 2].get_or_set("pricing:plan", factory, ttl=60) for i in range(20)])
+
+        assert calls["count"] == 1
+        assert all(result == {"plan": "anual"} for result in results)
+        assert not any(key.startswith("chatbot:cache:lock:") for key in redis.data)
+
+    @pytest.mark.asyncio
+    async def test_lock_table_does_not_grow_with_distinct_keys(self):
+        cm = CacheManager()
+        cm._redis_init_attempted = True
+
+        for i in range(50):
+            await cm.get_or_set(f"k:{i}", lambda i=i: i, ttl=60)
+
+        assert len(cm._key_locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_stale_value_is_served_while_refreshing(self):
+        cm = CacheManager()
+        cm._redis_init_attempted = True
+        now = time.time()
+        stale = {"__cache_entry__": 1, "value": "viejo", "soft_expires_at": now - 1, "hard_expires_at": now + 60}
+        await cm.set("catalogo", stale, ttl=120)
+        calls = {"count": 0}
+
+        async def factory():
+            calls["count"] += 1
+            return "nuevo"
+
+        first = await asyncio.gather(*[cm.get_or_set("catalogo", factory, ttl=60) for _ in range(5)])
+        await cm.wait_for_refreshes()
+
+        assert first == ["viejo"] * 5
+        assert calls["count"] == 1
+        assert await cm.get_or_set("catalogo", factory, ttl=60) == "nuevo"
+
+    @pytest.mark.asyncio
+    async def test_entry_past_hard_ttl_is_recomputed(self):
+        cm = CacheManager()
+        cm._redis_init_attempted = True
+        now = time.time()
+        expired = {"__cache_entry__": 1, "value": "viejo", "soft_expires_at": now - 10, "hard_expires_at": now - 1}
+        await cm.set("catalogo", expired, ttl=120)
+
+        assert await cm.get_or_set("catalogo", lambda: "nuevo", ttl=60) == "nuevo"
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_cached_as_negative_entry(self):
+        cm = CacheManager()
+        cm._redis_init_attempted = True
+        calls = {"count": 0}
+
+        def lookup():
+            calls["count"] += 1
+            return None
+
+        assert await cm.get_or_set("contacto:404", lookup, ttl=60, negative_ttl=30) is None
+        assert await cm.get_or_set("contacto:404", lookup, ttl=60, negative_ttl=30) is None
+        assert calls["count"] == 1
+
+        assert await cm.get_or_set("contacto:405", lookup, ttl=60, negative_ttl=0) is None
+        assert await cm.get_or_set("contacto:405", lookup, ttl=60, negative_ttl=0) is None
+        assert calls["count"] == 3
+
+
+class TestNamespaceGenerations:
+    """Invalidación de namespaces por generación (HINCRBY) en lugar de SCAN."""
+
+    @pytest.mark.asyncio
+    async def test_namespace_clear_is_single_increment_without_scan(self):
+        cm = _redis_backed_manager()
+        await cm.set_many({"llm_response:a": 1, "llm_response:b": 2, "business_config:x": {"n": 1}}, ttl=60)
+        round_trips = cm.redis_client.round_trips
+
+        invalidated = await cm.clear_pattern("llm_response:*")
+
+        assert invalidated == 2
+        # HGETALL (sincronizar) + pipeline(PFCOUNT, HINCRBY) + PUBLISH
+        assert cm.redis_client.round_trips - round_trips == 3
+        assert await cm.get("llm_response:a") is None
+        assert await cm.get("business_config:x") == {"n": 1}
+
+        await cm.set("llm_response:a", 10, ttl=60)
+        assert "chatbot:llm_response:g1:a" in cm.redis_client.data
+        assert await cm.get("llm_response:a") == 10
+
+    @pytest.mark.asyncio
+    async def test_clear_all_bumps_every_known_namespace(self):
+        cm = _redis_backed_manager()
+        await cm.set_many({"conversation:s1": [], "llm_faq:v1:entry:1": {"r": 1}, "suelta": 1}, ttl=60)
+
+        await cm.clear_pattern("*")
+
+        assert await cm.get_many(["conversation:s1", "llm_faq:v1:entry:1", "suelta"]) == {}
+        assert cm.redis_client.hashes[cm.generations_key] == {"": 1, "conversation": 1, "llm_faq": 1}
+
+    @pytest.mark.asyncio
+    async def test_other_workers_follow_new_generation(self):
+        redis = _FakeRedis()
+        writer = _redis_backed_manager(redis)
+        reader = _redis_backed_manager(redis)
+        await writer.set("business_config:biz1", {"v": 1}, ttl=60)
+        assert await reader.get("business_config:biz1") == {"v": 1}
+
+        await writer.clear_pattern("business_config:*")
+        reader._handle_invalidation(redis.published[-1][1])
+
+        assert reader._generations["business_config"] == 1
+        assert await reader.get("business_config:biz1") is None
+
+    @pytest.mark.asyncio
+    async def test_partial_pattern_scans_current_generation_only(self, monkeypatch):
+        cm = _redis_backed_manager()
+        monkeypatch.setattr(cache_system, "cache_manager", cm)
+        await cm.set_many({"business_config:biz1": 1, "business_config:biz2": 2}, ttl=60)
+
+        await cache_system.invalidate_business_cache("biz1")
+
+        assert await cm.get_many(["business_config:biz1", "business_config:biz2"]) == {"business_config:biz2": 2}
+
+    @pytest.mark.asyncio
+    async def test_literal_rest_deletes_keys_without_scan(self, monkeypatch):
+        cm = _redis_backed_manager()
+        monkeypatch.setattr(cache_system, "cache_manager", cm)
+        await cm.set_many({"business_config:biz1": 1, "business_profile:biz1": 2, "business_config:biz2": 3}, ttl=60)
+
+        def _no_scan(*args, **kwargs):
+            raise AssertionError("un resto literal no debe recorrer el keyspace")
+
+        monkeypatch.setattr(cm.redis_client, "scan_iter", _no_scan)
+        deleted = await cm.clear_pattern("business_*:biz1")
+
+        assert deleted == 2
+        assert await cm.get_many(["business_config:biz1", "business_profile:biz1", "business_config:biz2"]) == {
+            "business_config:biz2": 3
+        }
+
+    @pytest.mark.asyncio
+    async def test_glob_rest_still_scans(self):
+        cm = _redis_backed_manager()
+        await cm.set_many({"business_config:biz1": 1, "business_config:biz2": 2, "business_config:x": 3}, ttl=60)
+
+        deleted = await cm.clear_pattern("business_config:biz*")
+
+        assert deleted == 2
+        assert await cm.get("business_config:x") == 3
+
+    @pytest.mark.asyncio
+    async def test_stats_count_keys_per_namespace_without_scan(self):
+        cm = _redis_backed_manager()
+        cm.redis_client.info = _async_return({"redis_version": "7.2"})
+        await cm.set_many({"llm_response:a": 1, "llm_response:b": 2, "conversation:s1": []}, ttl=60)
+        await cm.set("llm_response:a", 3, ttl=60)
+
+        stats = await cm.get_stats()
+
+        assert stats["namespaces"]["llm_response"] == {"generation": 0, "keys": 2}
+        assert stats["namespaces"]["conversation"] == {"generation": 0, "keys": 1}
+        assert stats["our_keys"] == 3
+
+
+def _async_return(value):
+    async def _call(*args, **kwargs):
+        return value
+
+    return _call
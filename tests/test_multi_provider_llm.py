@@ -2,12 +2,20 @@
 Tests para el sistema Multi-Provider LLM
 """
 
+import asyncio
 import os
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from src.services.multi_provider_llm import APIConfig, LLMProvider, MultiProviderLLM
+from src.services.protection_system import CircuitBreakerOpenException
+
+
+@pytest.fixture(autouse=True)
+def _isolated_faq_cache(monkeypatch):
+    """El caché FAQ es compartido entre instancias: se activa solo en sus propios tests"""
+    monkeypatch.setenv("LLM_FAQ_CACHE_ENABLED", "false")
 
 
 class TestMultiProviderLLM:
@@ -271,6 +279,628 @@ class TestMultiProviderLLM:
         assert "Gratuito" in capabilities
 
 
+class _FakeStreamContent:
+    """Async iterator over raw body lines, mimicking aiohttp's StreamReader."""
+
+    def __init__(self, lines: list[str]):
+        self._lines = [line.encode("utf-8") + b"\n" for line in lines]
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for line in self._lines:
+            yield line
+
+
+def _streaming_session(status: int, lines: list[str]) -> MagicMock:
+    response = MagicMock()
+    response.status = status
+    response.content = _FakeStreamContent(lines)
+    response.text = AsyncMock(return_value="stream error")
+
+    post_cm = AsyncMock()
+    post_cm.__aenter__ = AsyncMock(return_value=response)
+    post_cm.__aexit__ = AsyncMock(return_value=False)
+
+    session = MagicMock()
+    session.closed = False
+    session.post = MagicMock(return_value=post_cm)
+    return session
+
+
+class TestGenerateResponseStream:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {"OPENAI_API_KEY": "test_openai_key", "AI_FALLBACK_ORDER": "openai", "GEMINI_API_KEY": ""},
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_deltas_then_done(self):
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        llm.set_http_session(
+            _streaming_session(
+                200,
+                [
+                    'data: {"choices": [{"delta": {"content": "Hola, "}}]}',
+                    'data: {"choices": [{"delta": {"content": "claro que sí."}}]}',
+                    "data: [DONE]",
+                ],
+            )
+        )
+
+        events = [event async for event in llm.generate_response_stream([{"role": "user", "content": "hola"}])]
+
+        deltas = [event["text"] for event in events if event["type"] == "delta"]
+        assert deltas == ["Hola, ", "claro que sí."]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["success"] is True
+        assert events[-1]["provider"] == "openai"
+        assert events[-1]["response"]
+        payload = llm._http_session.post.call_args.kwargs["json"]
+        assert payload["stream"] is True
+
+    @pytest.mark.asyncio
+    async def test_stream_failure_ends_with_all_failed_payload(self):
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        llm.retry_base_delay_seconds = 0
+        llm.set_http_session(_streaming_session(500, []))
+
+        events = [event async for event in llm.generate_response_stream([{"role": "user", "content": "hola"}])]
+
+        assert [event["type"] for event in events] == ["done"]
+        final = events[-1]
+        assert final.get("action") in ("silent_transfer", "humanized_fallback") or final.get("provider") == "fallback"
+
+    def test_stream_line_parsers(self):
+        assert (
+            MultiProviderLLM._parse_claude_stream_line(
+                'data: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hi"}}'
+            )
+            == "Hi"
+        )
+        assert MultiProviderLLM._parse_claude_stream_line('data: {"type": "message_stop"}') is None
+        assert (
+            MultiProviderLLM._parse_gemini_stream_line('data: {"candidates": [{"content": {"parts": [{"text": "Ho"}]}}]}')
+            == "Ho"
+        )
+        assert MultiProviderLLM._parse_ollama_stream_line('{"message": {"content": "la"}, "done": false}') == "la"
+        assert MultiProviderLLM._parse_openai_stream_line("data: [DONE]") is None
+
+
+class TestHedgedRequests:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "GEMINI_API_KEY": "test_gemini_key",
+                "OPENAI_API_KEY": "test_openai_key",
+                "AI_FALLBACK_ORDER": "gemini,openai",
+                "LLM_HEDGING_ENABLED": "true",
+                "LLM_HEDGE_DELAY_SECONDS": "0.05",
+            },
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_hedged_and_cancelled(self):
+        from src.services.metrics import get_metrics_snapshot
+
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        primary_cancelled = asyncio.Event()
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            if provider == LLMProvider.GEMINI:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    primary_cancelled.set()
+                    raise
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 12}
+
+        llm._call_provider = fake_call_provider
+        before = get_metrics_snapshot()["counters"]
+
+        result = await llm.generate_response([{"role": "user", "content": "hola"}])
+
+        after = get_metrics_snapshot()["counters"]
+        assert result["provider"] == "openai"
+        assert primary_cancelled.is_set()
+        assert after.get("llm_hedge_fired_gemini", 0) == before.get("llm_hedge_fired_gemini", 0) + 1
+        assert after.get("llm_hedge_won_openai", 0) == before.get("llm_hedge_won_openai", 0) + 1
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_does_not_fire_hedge(self):
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        called = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            called.append(provider)
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 5}
+
+        llm._call_provider = fake_call_provider
+
+        result = await llm.generate_response([{"role": "user", "content": "hola"}])
+
+        assert result["provider"] == "gemini"
+        assert called == [LLMProvider.GEMINI]
+
+    def test_hedge_delay_uses_observed_p95(self):
+        llm = MultiProviderLLM()
+        for i in range(100):
+            llm._record_provider_latency(LLMProvider.GEMINI, 0.01 * (i + 1))
+
+        assert llm._hedge_delay_seconds(LLMProvider.GEMINI) == pytest.approx(0.96)
+        assert llm._hedge_delay_seconds(LLMProvider.OPENAI) == pytest.approx(0.05)
+
+
+class TestAdaptiveRouting:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {"GEMINI_API_KEY": "test_gemini_key", "XAI_API_KEY": "test_xai_key", "AI_FALLBACK_ORDER": "gemini,xai"},
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_call_provider_outcomes_reorder_fallback(self):
+        llm = MultiProviderLLM()
+        assert llm.get_fallback_order() == [LLMProvider.GEMINI, LLMProvider.XAI]
+
+        async def failing_gemini(config, messages, context=None, max_retries=3):
+            return {"success": False, "error": "Gemini API Error (429): quota"}
+
+        llm._call_gemini = failing_gemini
+        for _ in range(3):
+            await llm._call_provider(LLMProvider.GEMINI, [{"role": "user", "content": "hola"}])
+
+        assert llm.get_fallback_order() == [LLMProvider.XAI, LLMProvider.GEMINI]
+        gemini = next(p for p in llm.get_available_providers() if p["provider"] == "gemini")
+        assert gemini["routing"]["samples"] == 3
+        assert gemini["routing"]["rate_limit_rate"] > 0
+
+    def test_static_order_when_adaptive_routing_disabled(self):
+        llm = MultiProviderLLM()
+        llm.adaptive_routing_enabled = False
+        llm.router.record_outcome("gemini", 60.0, success=False)
+
+        assert llm.get_fallback_order() == [LLMProvider.GEMINI, LLMProvider.XAI]
+
+
+class TestSingleFlight:
+    def setup_method(self):
+        self.env_patcher = patch.dict(os.environ, {"GEMINI_API_KEY": "test_gemini_key", "AI_FALLBACK_ORDER": "gemini"})
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_prompts_share_one_provider_call(self):
+        from src.services.metrics import get_metrics_snapshot
+
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        calls = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            await asyncio.sleep(0.05)
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 8}
+
+        llm._call_provider = fake_call_provider
+        before = get_metrics_snapshot()["counters"].get("llm_coalesced_requests", 0)
+
+        messages = [{"role": "user", "content": "¿Cuál es el horario?"}]
+        results = await asyncio.gather(*(llm.generate_response(list(messages)) for _ in range(4)))
+
+        assert calls == [LLMProvider.GEMINI]
+        assert all(r["response"] == results[0]["response"] for r in results)
+        assert get_metrics_snapshot()["counters"]["llm_coalesced_requests"] == before + 3
+        assert llm.single_flight.inflight_count == 0
+
+    @pytest.mark.asyncio
+    async def test_disabled_single_flight_calls_provider_per_request(self):
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        llm.single_flight_enabled = False
+        calls = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            await asyncio.sleep(0.01)
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 8}
+
+        llm._call_provider = fake_call_provider
+
+        messages = [{"role": "user", "content": "hola"}]
+        await asyncio.gather(llm.generate_response(list(messages)), llm.generate_response(list(messages)))
+
+        assert len(calls) == 2
+
+
+class TestQuotaGovernor:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {
+                "GEMINI_API_KEY": "test_gemini_key",
+                "XAI_API_KEY": "test_xai_key",
+                "AI_FALLBACK_ORDER": "gemini,xai",
+                "GEMINI_RPM_LIMIT": "1",
+                "LLM_ADAPTIVE_ROUTING_ENABLED": "false",
+            },
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_provider_without_budget_is_skipped_without_network_call(self):
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        calls = []
+
+        async def fake_gemini(config, messages, context=None, max_retries=3):
+            calls.append("gemini")
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 3}
+
+        async def fake_xai(config, messages, max_retries=3):
+            calls.append("xai")
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 3}
+
+        llm._call_gemini = fake_gemini
+        llm._call_xai = fake_xai
+
+        first = await llm.generate_response([{"role": "user", "content": "primera"}])
+        second = await llm.generate_response([{"role": "user", "content": "segunda"}])
+
+        assert first["provider"] == "gemini"
+        assert second["provider"] == "xai"
+        assert calls == ["gemini", "xai"]
+        gemini = next(p for p in llm.get_available_providers() if p["provider"] == "gemini")
+        assert gemini["quota"]["rpm_limit"] == 1
+        assert gemini["quota"]["rpm_remaining"] == 0
+
+    @pytest.mark.asyncio
+    async def test_retry_after_skips_backoff_and_blocks_provider(self):
+        mock_response = MagicMock()
+        mock_response.status = 429
+        mock_response.headers = {"Retry-After": "30"}
+        mock_response.text = AsyncMock(return_value="quota exceeded")
+
+        mock_post_cm = AsyncMock()
+        mock_post_cm.__aenter__ = AsyncMock(return_value=mock_response)
+        mock_post_cm.__aexit__ = AsyncMock(return_value=False)
+
+        mock_session = MagicMock()
+        mock_session.closed = False
+        mock_session.post = MagicMock(return_value=mock_post_cm)
+
+        llm = MultiProviderLLM()
+        llm.providers[LLMProvider.GEMINI].rpm_limit = None
+        llm.set_http_session(mock_session)
+
+        result = await llm._call_provider(LLMProvider.GEMINI, [{"role": "user", "content": "hola"}], max_retries=3)
+
+        assert result["success"] is False
+        assert result["retry_after"] == 30.0
+        assert mock_session.post.call_count == 1
+        assert llm.get_available_providers()[0]["quota"]["blocked_for_seconds"] > 25
+
+        blocked = await llm._call_provider(LLMProvider.GEMINI, [{"role": "user", "content": "hola"}])
+        assert blocked["quota_exhausted"] is True
+        assert mock_session.post.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_each_http_retry_consumes_quota(self):
+        mock_response = MagicMock()
+        mock_response.status = 503
+        mock_response.headers = {}
+        mock_response.text = AsyncMock(return_value="unavailable")
+
+        mock_post_cm = AsyncMock()
+        mock_post_cm.__aenter__ = AsyncMock(return_value=mock_response)
+        mock_post_cm.__aexit__ = AsyncMock(return_value=False)
+
+        mock_session = MagicMock()
+        mock_session.closed = False
+        mock_session.post = MagicMock(return_value=mock_post_cm)
+
+        llm = MultiProviderLLM()
+        llm.retry_base_delay_seconds = 0
+        llm.providers[LLMProvider.GEMINI].rpm_limit = 2
+        llm.set_http_session(mock_session)
+
+        result = await llm._call_provider(LLMProvider.GEMINI, [{"role": "user", "content": "hola"}], max_retries=3)
+
+        # Tercer intento sin cuota: se corta en 2 peticiones HTTP
+        assert result["success"] is False
+        assert mock_session.post.call_count == 2
+        assert llm.get_available_providers()[0]["quota"]["rpm_remaining"] == 0
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_does_not_consume_quota(self):
+        llm = MultiProviderLLM()
+        breaker = MagicMock()
+        breaker.acquire.side_effect = CircuitBreakerOpenException("open")
+        llm._get_provider_breaker = MagicMock(return_value=breaker)
+
+        result = await llm._call_provider(LLMProvider.GEMINI, [{"role": "user", "content": "hola"}])
+
+        assert "Circuit breaker abierto" in result["error"]
+        assert llm.get_available_providers()[0]["quota"]["rpm_remaining"] == 1
+
+
+class TestDeadlinePropagation:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {"GEMINI_API_KEY": "test_gemini_key", "XAI_API_KEY": "test_xai_key", "AI_FALLBACK_ORDER": "gemini,xai"},
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_expired_deadline_skips_providers_and_uses_fallback(self):
+        from src.services.deadline import Deadline
+
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        calls = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            return {"success": True, "response": "Claro, con gusto te ayudo.", "tokens_used": 1}
+
+        llm._call_provider = fake_call_provider
+        deadline = Deadline(0)
+
+        result = await llm.generate_response(
+            [{"role": "user", "content": "¿Qué opciones de financiación tienen para el plan anual?"}],
+            business_context={"chat_id": "573001112233"},
+            deadline=deadline,
+        )
+
+        assert calls == []
+        assert result.get("action") in ("humanized_fallback", "silent_transfer") or result.get("provider") == "fallback"
+        assert "provider_attempt" in deadline.exceeded_stages
+        assert "context_loading" in deadline.exceeded_stages
+
+    @pytest.mark.asyncio
+    async def test_slow_provider_moves_to_fallback_within_budget(self):
+        from src.services.deadline import Deadline
+
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        llm.hedging_enabled = False
+        calls = []
+
+        async def slow_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            await asyncio.sleep(0.3)
+            return {"success": False, "error": "timeout"}
+
+        llm._call_provider = slow_call_provider
+
+        started = asyncio.get_running_loop().time()
+        await llm.generate_response([{"role": "user", "content": "hola"}], deadline=Deadline(0.2))
+
+        assert calls == [LLMProvider.GEMINI]
+        assert asyncio.get_running_loop().time() - started < 0.6
+
+    @pytest.mark.asyncio
+    async def test_client_timeout_and_backoff_respect_active_deadline(self):
+        from src.services.deadline import Deadline, deadline_scope
+
+        llm = MultiProviderLLM()
+        llm.provider_timeout_seconds = 30
+        llm.retry_base_delay_seconds = 1.0
+        assert llm._provider_client_timeout().total == 30
+
+        with deadline_scope(Deadline(0.5)):
+            assert llm._provider_client_timeout().total <= 0.5
+            assert await llm._retry_backoff(0) is False
+
+
+class TestTokenBudget:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {"GEMINI_API_KEY": "test_gemini_key", "XAI_API_KEY": "test_xai_key", "AI_FALLBACK_ORDER": "gemini,xai"},
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_long_history_is_trimmed_before_provider_call(self):
+        from src.services.token_budget import TokenBudgetManager, estimate_messages_tokens
+
+        llm = MultiProviderLLM()
+        llm.cache_enabled = False
+        llm.single_flight_enabled = False
+        llm.token_budget = TokenBudgetManager(
+            enabled=True,
+            max_prompt_tokens=500,
+            keep_last_turns=2,
+            summary_loader=lambda chat_id: None,
+            summary_saver=lambda *args: None,
+        )
+        sent = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            sent.append(messages)
+            return {"success": True, "response": "Claro, te cuento los planes disponibles.", "tokens_used": 1}
+
+        llm._call_provider = fake_call_provider
+        history = [{"role": "system", "content": "Eres un asesor."}]
+        history += [{"role": "user" if i % 2 == 0 else "assistant", "content": f"mensaje {i} " + "z" * 300} for i in range(20)]
+
+        result = await llm.generate_response(history, business_context={"chat_id": "573009998877"}, inject_contexts=False)
+        await llm.token_budget.wait_for_refreshes()
+
+        assert result["success"] is True
+        # La primera llamada es la respuesta; las siguientes, el resumen en segundo plano
+        assert sent[0][0] == history[0]
+        assert sent[0][-4:] == history[-4:]
+        assert estimate_messages_tokens(sent[0], "gemini") <= 500
+        assert any("Nuevos mensajes" in call[-1]["content"] for call in sent[1:])
+
+
+class TestBatchedCacheLookup:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {"GEMINI_API_KEY": "test_gemini_key", "XAI_API_KEY": "test_xai_key", "AI_FALLBACK_ORDER": "gemini,xai"},
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_single_batched_lookup_finds_any_provider(self, monkeypatch):
+        from src.services import multi_provider_llm
+
+        lookups = []
+
+        async def fake_lookup(prompt_hash, providers):
+            lookups.append(list(providers))
+            return {"xai": {"response": "Respuesta cacheada de xai"}}
+
+        monkeypatch.setattr(multi_provider_llm, "get_cached_llm_responses", fake_lookup)
+        llm = MultiProviderLLM()
+        llm.single_flight_enabled = False
+        calls = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            return {"success": False, "error": "no debería llamarse"}
+
+        llm._call_provider = fake_call_provider
+
+        result = await llm.generate_response([{"role": "user", "content": "hola"}], inject_contexts=False)
+
+        assert calls == []
+        assert len(lookups) == 1 and set(lookups[0]) == {"gemini", "xai"}
+        assert result["provider"] == "xai"
+        assert result["cached"] is True
+
+
+class TestFAQCache:
+    def setup_method(self):
+        self.env_patcher = patch.dict(
+            os.environ,
+            {"GEMINI_API_KEY": "test_gemini_key", "XAI_API_KEY": "test_xai_key", "AI_FALLBACK_ORDER": "gemini,xai"},
+        )
+        self.env_patcher.start()
+
+    def teardown_method(self):
+        self.env_patcher.stop()
+
+    @pytest.mark.asyncio
+    async def test_first_turn_faq_is_answered_from_cache_across_chats(self, monkeypatch):
+        from src.services import llm_faq_cache
+        from src.services.cache_system import CacheManager
+
+        memory_cache = CacheManager()
+        memory_cache._redis_init_attempted = True
+        monkeypatch.setattr(llm_faq_cache, "cache_manager", memory_cache)
+        monkeypatch.setattr(llm_faq_cache, "_current_config_version", lambda: "test-version")
+
+        llm = MultiProviderLLM()
+        llm.single_flight_enabled = False
+        llm.faq_cache = llm_faq_cache.FAQResponseCache(enabled=True)
+        calls = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            return {"success": True, "response": "Atendemos de 8 a 6, de lunes a sábado.", "tokens_used": 7}
+
+        llm._call_provider = fake_call_provider
+
+        first = await llm.generate_response(
+            [{"role": "user", "content": "¿Cuál es el horario de atención?"}],
+            business_context={"chat_id": "573000000001"},
+            inject_contexts=False,
+        )
+        second = await llm.generate_response(
+            [{"role": "user", "content": "cual es el horario de atencion"}],
+            business_context={"chat_id": "573000000002"},
+            inject_contexts=False,
+        )
+
+        assert len(calls) == 1
+        assert second["response"] == first["response"]
+        assert second["faq_cache"] == "exact"
+        assert second["cached"] is True
+
+    @pytest.mark.asyncio
+    async def test_personalized_faq_answer_is_not_served_to_other_profiles(self, monkeypatch):
+        from src.services import llm_faq_cache
+        from src.services import multi_provider_llm as mpl
+        from src.services.cache_system import CacheManager
+
+        memory_cache = CacheManager()
+        memory_cache._redis_init_attempted = True
+        monkeypatch.setattr(llm_faq_cache, "cache_manager", memory_cache)
+        monkeypatch.setattr(llm_faq_cache, "_current_config_version", lambda: "test-version")
+        profiles = {"573000000011": "Cliente: Ana, plan oro", "573000000012": "Cliente: Luis, plan básico"}
+        profiles["573000000013"] = profiles["573000000011"]
+
+        async def fake_section(chat_id):
+            return profiles[chat_id]
+
+        monkeypatch.setattr(mpl.context_loader, "get_context_section", fake_section)
+
+        llm = MultiProviderLLM()
+        llm.single_flight_enabled = False
+        llm.faq_cache = llm_faq_cache.FAQResponseCache(enabled=True)
+        calls = []
+
+        async def fake_call_provider(provider, messages, business_context=None, max_retries=3):
+            calls.append(provider)
+            section = next(m["content"] for m in messages if m["content"].startswith("CONTEXTOS ACTIVOS"))
+            name = section.split("Cliente: ")[1].split(",")[0]
+            return {"success": True, "response": f"Hola {name}, atendemos de 8 a 6.", "tokens_used": 7}
+
+        llm._call_provider = fake_call_provider
+
+        async def ask(chat_id):
+            return await llm.generate_response(
+                [{"role": "user", "content": "¿Cuál es el horario?"}], business_context={"chat_id": chat_id}
+            )
+
+        ana, luis, same_profile = await ask("573000000011"), await ask("573000000012"), await ask("573000000013")
+
+        assert ana["response"] == "Hola Ana, atendemos de 8 a 6."
+        assert luis["response"] == "Hola Luis, atendemos de 8 a 6."
+        assert not luis.get("cached")
+        # Mismo contexto inyectado: la respuesta sí se reutiliza
+        assert same_profile["faq_cache"] == "exact"
+        assert len(calls) == 2
+
+
 class TestAPIConfig:
     """Tests para la configuración de API"""
 
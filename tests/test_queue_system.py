@@ -2,15 +2,54 @@
 Tests para el sistema de cola de mensajes
 """
 
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
 import pytest
 
-from src.models.admin_db import engine
+from src.models.admin_db import engine, get_session
 from src.models.models import Base
-from src.services.queue_system import QueueManager
+from src.services.queue_system import (
+    LEASE_EXPIRED_ERROR,
+    LEASE_SAFETY_SECONDS,
+    SEND_RATE_PRESETS,
+    DeadLetterMessage,
+    MessageStatus,
+    QueuedMessage,
+    QueueManager,
+    RetryPolicy,
+    SendGovernor,
+    SendRatePreset,
+)
 
 pytestmark = pytest.mark.unit
 
 
+def _message(message_id: str) -> QueuedMessage:
+    session = get_session()
+    try:
+        return session.query(QueuedMessage).filter(QueuedMessage.message_id == message_id).one()
+    finally:
+        session.close()
+
+
+def _queued(message_id: str) -> bool:
+    session = get_session()
+    try:
+        return session.query(QueuedMessage).filter(QueuedMessage.message_id == message_id).count() > 0
+    finally:
+        session.close()
+
+
+def _dead_letter(message_id: str) -> DeadLetterMessage:
+    session = get_session()
+    try:
+        return session.query(DeadLetterMessage).filter(DeadLetterMessage.message_id == message_id).one()
+    finally:
+        session.close()
+
+
 class TestQueueSystem:
     @classmethod
     def setup_class(cls):
@@ -58,6 +97,21 @@ class TestQueueSystem:
         assert "chat_pending_1" in chat_ids
         assert "chat_pending_2" in chat_ids
 
+    def test_get_scheduled_window_is_bounded_and_ordered(self):
+        now = datetime.now(timezone.utc)
+        later = self.queue_manager.enqueue_message("window_later", "m", when=now + timedelta(seconds=120))
+        sooner = self.queue_manager.enqueue_message("window_sooner", "m", when=now + timedelta(seconds=60))
+        outside = self.queue_manager.enqueue_message("window_outside", "m", when=now + timedelta(hours=2))
+        immediate = self.queue_manager.enqueue_message("window_immediate", "m")
+
+        window = self.queue_manager.get_scheduled_window(horizon_seconds=600, limit=100_000)
+
+        ids = [row["message_id"] for row in window]
+        assert ids.index(sooner) < ids.index(later)
+        assert outside not in ids
+        assert immediate not in ids
+        assert all(row["scheduled_at"].tzinfo is not None for row in window)
+
     @pytest.mark.parametrize(
         ("operation", "args"),
         [
@@ -116,5 +170,509 @@ class TestQueueSystem:
         assert result is True
 
 
+class TestQueueClaims:
+    """claim_messages: reclamo atómico con lease y reaper de leases vencidos."""
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.create_all(bind=engine)
+
+    def setup_method(self):
+        self.queue_manager = QueueManager()
+        # Prioridad alta: estos mensajes quedan primeros aunque la cola tenga otros
+        self.low = self.queue_manager.enqueue_message("claim_low", "baja", priority=900)
+        self.high = self.queue_manager.enqueue_message("claim_high", "alta", priority=901)
+
+    def test_claim_marks_processing_with_lease_in_priority_order(self):
+        claimed = self.queue_manager.claim_messages("worker-a", limit=2, lease_seconds=60)
+
+        assert [msg["message_id"] for msg in claimed] == [self.high, self.low]
+        assert all(msg["status"] == MessageStatus.PROCESSING for msg in claimed)
+        assert all(msg["claimed_by"] == "worker-a" and msg["lease_until"] for msg in claimed)
+        pending_ids = {msg["message_id"] for msg in self.queue_manager.get_pending_messages(limit=1000)}
+        assert not pending_ids & {self.high, self.low}
+
+    def test_workers_never_claim_the_same_message(self):
+        first = self.queue_manager.claim_messages("worker-a", limit=1)
+        second = self.queue_manager.claim_messages("worker-b", limit=1)
+
+        assert first[0]["message_id"] == self.high
+        assert second[0]["message_id"] == self.low
+
+    def test_expired_lease_is_reaped_as_a_failed_attempt(self):
+        self.queue_manager.retry_policy = RetryPolicy(base_seconds=0)
+        self.queue_manager.claim_messages("worker-a", limit=2, lease_seconds=-1)
+
+        assert self.queue_manager.reap_expired_leases() >= 2
+
+        reaped = _message(self.high)
+        assert reaped.status == MessageStatus.RETRY.value
+        assert reaped.retry_count == 1
+        assert reaped.error_message == LEASE_EXPIRED_ERROR
+        reclaimed = self.queue_manager.claim_messages("worker-b", limit=2)
+        assert {msg["message_id"] for msg in reclaimed} == {self.high, self.low}
+
+    def test_message_that_keeps_expiring_its_lease_is_dead_lettered(self):
+        self.queue_manager.retry_policy = RetryPolicy(base_seconds=0)
+        poison = self.queue_manager.enqueue_message("claim_poison", "veneno", priority=902, max_retries=2)
+
+        for _ in range(2):
+            claimed = self.queue_manager.claim_messages("worker-a", limit=1, lease_seconds=-1)
+            assert claimed[0]["message_id"] == poison
+            self.queue_manager.reap_expired_leases()
+
+        dead = _dead_letter(poison)
+        assert dead.error_class == "timeout"
+        assert dead.retry_count == 2
+
+    def test_release_returns_claims_without_counting_an_attempt(self):
+        claimed = self.queue_manager.claim_messages("worker-a", limit=2)
+        ids = [msg["message_id"] for msg in claimed]
+
+        assert self.queue_manager.release(ids, "worker-b") == 0
+        assert self.queue_manager.release(ids, "worker-a") == 2
+
+        released = _message(self.high)
+        assert (released.status, released.retry_count, released.claimed_by) == (MessageStatus.PENDING.value, 0, None)
+        assert self.queue_manager.reap_expired_leases() == 0
+
+    def test_governor_releases_held_messages_before_their_lease_expires(self):
+        clock = _VirtualClock()
+        governor = SendGovernor(
+            preset=SendRatePreset(per_second=1 / 600, burst=1),
+            recipient_spacing_seconds=0,
+            manual_recipient_spacing_seconds=0,
+            max_held=2,
+            lease_seconds=60,
+            clock=clock,
+        )
+        governor.refill(self.queue_manager, "worker-a")
+        sent, _ = governor.next_ready()
+
+        # El token bucket retiene el segundo mensaje hasta pasar el margen del lease
+        clock.now = 60 - LEASE_SAFETY_SECONDS
+        assert governor.next_ready()[0] is None
+        assert governor.pending() == 0
+
+        held_id = ({self.high, self.low} - {sent["message_id"]}).pop()
+        held = _message(held_id)
+        assert (held.status, held.retry_count, held.claimed_by) == (MessageStatus.PENDING.value, 0, None)
+        assert governor.stats["lease_expired"] == 1
+
+    def test_ack_clears_lease(self):
+        claimed = self.queue_manager.claim_messages("worker-a", limit=1)
+        assert self.queue_manager.mark_as_sent(claimed[0]["message_id"]) is True
+
+        assert self.queue_manager.reap_expired_leases() == 0
+        assert self.queue_manager.claim_messages("worker-b", limit=1)[0]["message_id"] == self.low
+
+    def test_claim_records_enqueue_to_claim_latency(self):
+        from src.services.metrics import get_metrics_snapshot
+
+        before = get_metrics_snapshot()["histograms"]["queue_enqueue_to_claim_seconds"]["count"]
+        self.queue_manager.claim_messages("worker-a", limit=2)
+
+        latency = get_metrics_snapshot()["histograms"]["queue_enqueue_to_claim_seconds"]
+        assert latency["count"] == min(before + 2, 1000)
+        assert latency["p50"] >= 0
+
+    def test_postgresql_claim_uses_skip_locked(self):
+        from sqlalchemy.dialects import postgresql
+
+        now = datetime.now(timezone.utc)
+        statement = QueueManager._claim_statement("worker-a", 5, now, now, "postgresql")
+
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "FOR UPDATE OF message_queue SKIP LOCKED" in sql
+        assert "LEFT OUTER JOIN campaigns" in sql
+        assert sql.startswith("UPDATE message_queue SET")
+
+
+class TestBatchedTransitions:
+    """mark_many_sent / mark_many_failed: UPDATE por lote y contadores de campaña agregados."""
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.create_all(bind=engine)
+
+    def setup_method(self):
+        self.queue_manager = QueueManager()
+        self.campaign_id = self.queue_manager.create_campaign(name="Lote", created_by="test_user", total_messages=4)
+
+    def _enqueue(self, count: int, max_retries: int = 3) -> list[str]:
+        rows = [
+            {
+                "chat_id": f"batch_{i}",
+                "message": "hola",
+                "metadata": {"campaign_id": self.campaign_id},
+                "max_retries": max_retries,
+            }
+            for i in range(count)
+        ]
+        return self.queue_manager.enqueue_bulk_messages(rows)
+
+    def test_mark_many_sent_aggregates_campaign_counters_and_completes(self):
+        ids = self._enqueue(4)
+
+        assert self.queue_manager.mark_many_sent(ids) == 4
+        # Repetir el ack no vuelve a contar
+        assert self.queue_manager.mark_many_sent(ids) == 0
+
+        status = self.queue_manager.get_campaign_status(self.campaign_id)
+        assert status["sent_messages"] == 4
+        assert status["status"] == "completed"
+        assert all(_message(m).status == MessageStatus.SENT for m in ids)
+
+    def test_mark_many_failed_retries_until_exhausted(self):
+        retrying = self._enqueue(2, max_retries=3)
+        exhausted = self._enqueue(1, max_retries=1)
+
+        failures = [(message_id, "timeout") for message_id in retrying + exhausted]
+        assert self.queue_manager.mark_many_failed(failures) == 3
+
+        assert {_message(m).status for m in retrying} == {MessageStatus.RETRY}
+        dead = _dead_letter(exhausted[0])
+        assert (dead.error_class, dead.last_error, dead.retry_count) == ("timeout", "timeout", 1)
+        assert not _queued(exhausted[0])
+        status = self.queue_manager.get_campaign_status(self.campaign_id)
+        assert (status["sent_messages"], status["failed_messages"], status["status"]) == (0, 1, "active")
+
+    def test_batch_is_chunked(self):
+        self.queue_manager.batch_chunk_size = 2
+        ids = self._enqueue(5)
+
+        assert self.queue_manager.mark_many_sent(ids) == 5
+        assert self.queue_manager.get_campaign_status(self.campaign_id)["sent_messages"] == 5
+
+    @pytest.mark.slow
+    def test_batch_ack_of_ten_thousand_messages(self, record_property):
+        ids = self._enqueue(10_000)
+        sample = ids[:200]
+
+        started = time.perf_counter()
+        for message_id in sample:
+            self.queue_manager.mark_as_sent(message_id)
+        per_message = (time.perf_counter() - started) / len(sample)
+
+        started = time.perf_counter()
+        assert self.queue_manager.mark_many_sent(ids[len(sample) :]) == len(ids) - len(sample)
+        batched = (time.perf_counter() - started) / (len(ids) - len(sample))
+
+        # Los tiempos dependen de la máquina: se reportan, no se comparan
+        record_property("ack_per_message_us", round(per_message * 1e6, 2))
+        record_property("ack_batched_us", round(batched * 1e6, 2))
+
+        session = get_session()
+        try:
+            sent = (
+                session.query(QueuedMessage)
+                .filter(QueuedMessage.campaign_id == self.campaign_id, QueuedMessage.status == MessageStatus.SENT)
+                .count()
+            )
+        finally:
+            session.close()
+        assert sent == len(ids)
+        assert self.queue_manager.get_campaign_status(self.campaign_id)["sent_messages"] == len(ids)
+
+
+class TestRetryPolicy:
+    def test_classifies_errors(self):
+        policy = RetryPolicy()
+
+        assert policy.classify("(#131026) Message undeliverable") == "invalid_recipient"
+        assert policy.classify("Re-engagement message required (131047)") == "rejected"
+        assert policy.classify("HTTP 429 Too Many Requests") == "rate_limited"
+        assert policy.classify("Target closed") == "session"
+        assert policy.classify("Timeout 30000ms exceeded") == "timeout"
+        assert policy.classify("algo raro") == "unknown"
+        assert policy.classify(None) == "unknown"
+        assert not policy.is_retryable("invalid_recipient") and policy.is_retryable("session")
+
+    def test_delay_is_exponential_with_full_jitter_and_capped(self):
+        policy = RetryPolicy(base_seconds=10, max_delay_seconds=100, rng=random.Random(7))
+
+        for retry_count, ceiling in [(1, 10), (2, 20), (3, 40), (4, 80), (5, 100), (20, 100)]:
+            delays = [policy.delay_seconds(retry_count) for _ in range(200)]
+            assert all(0 <= delay <= ceiling for delay in delays)
+            # Con jitter los reintentos no caen todos en el mismo instante
+            assert max(delays) - min(delays) > ceiling / 2
+
+    def test_from_env(self, monkeypatch):
+        monkeypatch.setenv("QUEUE_RETRY_BASE_SECONDS", "5")
+        monkeypatch.setenv("QUEUE_PERMANENT_ERROR_CLASSES", "invalid_recipient, auth")
+
+        policy = RetryPolicy.from_env()
+        assert policy.base_seconds == 5
+        assert policy.permanent_error_classes == {"invalid_recipient", "auth"}
+
+
+class TestDeadLetters:
+    """Fallos agotados/permanentes fuera de la cola caliente y reencolado en bloque."""
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.create_all(bind=engine)
+
+    def setup_method(self):
+        self.queue_manager = QueueManager()
+        self.queue_manager.retry_policy = RetryPolicy(base_seconds=60, max_delay_seconds=600, rng=random.Random(1))
+        self.campaign_id = self.queue_manager.create_campaign(name="DLQ", created_by="test_user", total_messages=3)
+        self.ids = self.queue_manager.enqueue_bulk_messages(
+            [{"chat_id": f"dlq_{i}", "message": "hola", "metadata": {"campaign_id": self.campaign_id}} for i in range(3)]
+        )
+
+    def test_retries_get_individual_jittered_schedules(self):
+        before = datetime.now(timezone.utc)
+        assert self.queue_manager.mark_many_failed([(m, "Target closed") for m in self.ids]) == 3
+
+        scheduled = [_message(m).scheduled_at.replace(tzinfo=timezone.utc) for m in self.ids]
+        assert {_message(m).status for m in self.ids} == {MessageStatus.RETRY}
+        assert all(before <= at <= before + timedelta(seconds=61) for at in scheduled)
+        assert len(set(scheduled)) == 3
+
+    def test_permanent_error_skips_retries(self):
+        assert self.queue_manager.mark_as_failed(self.ids[0], "(#131026) Message undeliverable") is True
+
+        assert not _queued(self.ids[0])
+        assert _dead_letter(self.ids[0]).error_class == "invalid_recipient"
+        assert self.queue_manager.get_campaign_status(self.campaign_id)["failed_messages"] == 1
+
+    def test_requeue_by_campaign_restores_counters(self):
+        self.queue_manager.mark_many_sent(self.ids[:1])
+        self.queue_manager.mark_many_failed([(m, "(#131026) invalid") for m in self.ids[1:]])
+        assert self.queue_manager.get_campaign_status(self.campaign_id)["status"] == "completed"
+
+        summary = [row for row in self.queue_manager.dead_letter_summary() if row["campaign_id"] == self.campaign_id]
+        assert [(row["error_class"], row["count"]) for row in summary] == [("invalid_recipient", 2)]
+
+        assert self.queue_manager.requeue_dead_letters(campaign_id=self.campaign_id) == 2
+        assert self.queue_manager.requeue_dead_letters(campaign_id=self.campaign_id) == 0
+
+        requeued = [_message(m) for m in self.ids[1:]]
+        assert {(msg.status, msg.retry_count) for msg in requeued} == {(MessageStatus.PENDING, 0)}
+        assert {msg.campaign_id for msg in requeued} == {self.campaign_id}
+        status = self.queue_manager.get_campaign_status(self.campaign_id)
+        assert (status["sent_messages"], status["failed_messages"], status["status"]) == (1, 0, "active")
+
+    def test_requeue_filters_by_error_class_and_window(self):
+        self.queue_manager.mark_as_failed(self.ids[0], "(#131026) invalid")
+        self.queue_manager.mark_as_failed(self.ids[1], "(#131047) re-engagement")
+        later = datetime.now(timezone.utc) + timedelta(hours=1)
+
+        assert self.queue_manager.requeue_dead_letters(campaign_id=self.campaign_id, failed_after=later) == 0
+        assert self.queue_manager.requeue_dead_letters(campaign_id=self.campaign_id, error_class="rejected") == 1
+        assert _queued(self.ids[1]) and not _queued(self.ids[0])
+
+    def test_cancelled_campaign_is_not_requeued(self):
+        self.queue_manager.mark_as_failed(self.ids[0], "(#131026) invalid")
+        self.queue_manager.cancel_campaign(self.campaign_id)
+
+        assert self.queue_manager.requeue_dead_letters(campaign_id=self.campaign_id) == 0
+        assert not _queued(self.ids[0])
+
+
+class TestCampaignScopedOperations:
+    """campaign_id indexado: cancelar/pausar por campaña sin recorrer la cola."""
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.create_all(bind=engine)
+
+    def setup_method(self):
+        self.queue_manager = QueueManager()
+        self.campaign_id = self.queue_manager.create_campaign(name="Scoped", created_by="test_user", total_messages=2)
+        self.other_id = self.queue_manager.create_campaign(name="Otra", created_by="test_user", total_messages=1)
+        metadata = {"campaign_id": self.campaign_id}
+        self.ids = [
+            self.queue_manager.enqueue_message("scoped_1", "a", priority=950, metadata=metadata),
+            *self.queue_manager.enqueue_bulk_messages(
+                [{"chat_id": "scoped_2", "message": "b", "priority": 950, "metadata": metadata}]
+            ),
+        ]
+        self.other = self.queue_manager.enqueue_message(
+            "scoped_other", "c", priority=950, metadata={"campaign_id": self.other_id}
+        )
+
+    def _pending_ids(self) -> set[str]:
+        return {msg["message_id"] for msg in self.queue_manager.get_pending_messages(limit=1000)}
+
+    def test_enqueue_copies_campaign_id_to_column(self):
+        assert {_message(m).campaign_id for m in self.ids} == {self.campaign_id}
+
+    def test_cancel_only_touches_its_campaign(self):
+        assert self.queue_manager.cancel_campaign(self.campaign_id) is True
+
+        assert {_message(m).status for m in self.ids} == {MessageStatus.CANCELLED}
+        assert _message(self.other).status == MessageStatus.PENDING
+        assert self.queue_manager.get_campaign_status(self.campaign_id)["status"] == "cancelled"
+        assert self.queue_manager.cancel_campaign("camp_inexistente") is False
+
+    def test_paused_campaign_is_neither_listed_nor_claimed(self):
+        assert self.queue_manager.pause_campaign(self.campaign_id) is True
+
+        assert not self._pending_ids() & set(self.ids)
+        assert self.other in self._pending_ids()
+        claimed = {msg["message_id"] for msg in self.queue_manager.claim_messages("worker-a", limit=3)}
+        assert self.other in claimed and not claimed & set(self.ids)
+
+        assert self.queue_manager.resume_campaign(self.campaign_id) is True
+        assert set(self.ids) <= self._pending_ids()
+
+    def test_claim_can_be_scoped_to_campaigns(self):
+        claimed = self.queue_manager.claim_messages("worker-a", limit=10, campaign_ids=[self.other_id])
+        assert [msg["message_id"] for msg in claimed] == [self.other]
+
+        assert self.campaign_id in self.queue_manager.get_ready_campaign_ids()
+        assert self.other_id not in self.queue_manager.get_ready_campaign_ids()
+
+    def test_pause_unknown_campaign_returns_false(self):
+        assert self.queue_manager.pause_campaign("camp_inexistente") is False
+
+
+class _VirtualClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _outbound(message_id: str, chat_id: str, campaign_id: str | None = None) -> dict:
+    return {"message_id": message_id, "chat_id": chat_id, "campaign_id": campaign_id}
+
+
+class TestSendGovernor:
+    """SendGovernor: token bucket por número, separación por destinatario y reparto justo, con reloj virtual."""
+
+    def _governor(self, clock, **kwargs) -> SendGovernor:
+        options = {
+            "preset": SendRatePreset(per_second=1, burst=1),
+            "recipient_spacing_seconds": 0,
+            "manual_recipient_spacing_seconds": 0,
+            "manual_weight": 1,
+            "campaign_weights": {},
+            "lease_seconds": 120,
+            "clock": clock,
+        }
+        options.update(kwargs)
+        return SendGovernor(**options)
+
+    def _drain(self, governor, clock, until: float) -> list[tuple[float, str]]:
+        released = []
+        while clock.now <= until:
+            message, wait = governor.next_ready()
+            if message is None:
+                if wait == float("inf"):
+                    break
+                clock.now += wait
+                continue
+            released.append((clock.now, message["message_id"]))
+        return released
+
+    def test_token_bucket_paces_the_sending_number(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, preset=SendRatePreset(per_second=0.5, burst=2))
+        governor.submit([_outbound(f"m{i}", f"chat{i}") for i in range(4)])
+
+        released = self._drain(governor, clock, until=60)
+
+        assert [at for at, _ in released] == [0.0, 0.0, 2.0, 4.0]
+
+    def test_daily_cap_from_cloud_tier(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, preset=SendRatePreset(per_second=80, burst=80, per_day=2))
+        governor.submit([_outbound(f"m{i}", f"chat{i}") for i in range(3)])
+
+        assert governor.next_ready()[0] is not None
+        assert governor.next_ready()[0] is not None
+        message, wait = governor.next_ready()
+        assert message is None
+        assert wait == pytest.approx(86400 / 2)
+        assert set(SEND_RATE_PRESETS) >= {"web", "cloud_tier_250", "cloud_tier_1k", "cloud_unlimited"}
+
+    def test_same_recipient_is_spaced(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, preset=SendRatePreset(per_second=100, burst=100), recipient_spacing_seconds=30)
+        governor.submit([_outbound("a1", "alice", "camp_a"), _outbound("a2", "alice", "camp_a")])
+        governor.submit([_outbound("b1", "bob", "camp_b")])
+
+        released = self._drain(governor, clock, until=60)
+
+        assert released == [(0.0, "a1"), (0.0, "b1"), (30.0, "a2")]
+
+    def test_blocked_recipient_does_not_block_its_class(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, preset=SendRatePreset(per_second=100, burst=100), recipient_spacing_seconds=30)
+        governor.submit([_outbound("a1", "alice", "camp"), _outbound("a2", "alice", "camp"), _outbound("c1", "carol", "camp")])
+
+        released = self._drain(governor, clock, until=60)
+
+        assert released == [(0.0, "a1"), (0.0, "c1"), (30.0, "a2")]
+
+    def test_manual_messages_use_their_own_recipient_spacing(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, preset=SendRatePreset(per_second=100, burst=100), recipient_spacing_seconds=30)
+        governor.submit([_outbound("c1", "alice", "camp")])
+        governor.submit([_outbound("m1", "alice"), _outbound("m2", "alice")])
+
+        released = self._drain(governor, clock, until=60)
+
+        # La respuesta manual no espera; la campaña sí respeta la separación tras ella
+        assert released == [(0.0, "m1"), (0.0, "m2"), (30.0, "c1")]
+
+        clock.now = 0.0
+        spaced = self._governor(clock, preset=SendRatePreset(per_second=100, burst=100), manual_recipient_spacing_seconds=5)
+        spaced.submit([_outbound("m3", "bob"), _outbound("m4", "bob")])
+        assert self._drain(spaced, clock, until=10) == [(0.0, "m3"), (5.0, "m4")]
+
+    def test_weighted_fair_interleaving_between_campaigns_and_manual(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, manual_weight=2, campaign_weights={"big": 1})
+        governor.submit([_outbound(f"big{i}", f"c{i}", "big") for i in range(6)])
+        governor.submit([_outbound(f"man{i}", f"m{i}") for i in range(4)])
+
+        order = [message_id for _, message_id in self._drain(governor, clock, until=5)]
+
+        assert order == ["man0", "big0", "man1", "man2", "big1", "man3"]
+
+    def test_late_campaign_does_not_get_credit_for_idle_time(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock)
+        governor.submit([_outbound(f"a{i}", f"a{i}", "camp_a") for i in range(5)])
+        self._drain(governor, clock, until=2)
+
+        governor.submit([_outbound(f"b{i}", f"b{i}", "camp_b") for i in range(3)])
+        order = [message_id for _, message_id in self._drain(governor, clock, until=6)]
+
+        assert order == ["b0", "a3", "b1", "a4"]
+
+    def test_messages_held_past_their_lease_are_dropped(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, preset=SendRatePreset(per_second=0.01, burst=1), lease_seconds=30)
+        governor.submit([_outbound("m1", "c1"), _outbound("m2", "c2")])
+        assert governor.next_ready()[0]["message_id"] == "m1"
+
+        clock.now = 25
+        assert governor.next_ready() == (None, float("inf"))
+        assert governor.stats["lease_expired"] == 1
+
+    def test_refill_splits_room_by_weight(self):
+        clock = _VirtualClock()
+        governor = self._governor(clock, manual_weight=3, campaign_weights={"camp": 1}, max_held=4)
+        calls = []
+
+        class _Manager:
+            def get_ready_campaign_ids(self):
+                return ["camp", None]
+
+            def claim_messages(self, worker_id, limit, campaign_ids):
+                calls.append((campaign_ids, limit))
+                return [_outbound(f"{campaign_ids[0]}{i}", f"x{i}", campaign_ids[0]) for i in range(limit)]
+
+        assert governor.refill(_Manager(), "worker") == 4
+        assert calls == [([None], 3), (["camp"], 1)]
+        assert governor.refill(_Manager(), "worker") == 0
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.models.admin_db import engine, get_session
+from src.models.models import Base
+from src.services.audience_import import AudienceImporter, AudienceImportJob, normalize_phone
+from src.services.queue_system import Campaign, CampaignImportingError, QueuedMessage, queue_manager
+from src.services.suppression_list import suppression_list
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def _tables():
+    Base.metadata.create_all(bind=engine)
+
+
+def _campaign(name: str = "Importación") -> str:
+    return queue_manager.create_campaign(name=name, created_by="test_user", total_messages=0, status="importing")
+
+
+def _queued(campaign_id: str) -> list[QueuedMessage]:
+    session = get_session()
+    try:
+        return session.query(QueuedMessage).filter(QueuedMessage.campaign_id == campaign_id).order_by(QueuedMessage.id).all()
+    finally:
+        session.close()
+
+
+def _run(importer: AudienceImporter, path, campaign_id: str, file_format: str = "csv", **kwargs) -> AudienceImportJob:
+    job = AudienceImportJob(job_id="imp_test", campaign_id=campaign_id, filename=path.name)
+    return importer.run(job, str(path), file_format, "Hola", **kwargs)
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("+57 300 111-2233", ("573001112233", None)),
+        ("0057 3001112233", ("573001112233", None)),
+        ("3001112233", ("573001112233", None)),
+        (573001112233.0, ("573001112233", None)),
+        ("573001112233@c.us", ("573001112233", None)),
+        ("", (None, "empty")),
+        (None, (None, "empty")),
+        ("57300abc2233", (None, "invalid_characters")),
+        ("+1234", (None, "invalid_length")),
+    ],
+)
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw, default_country_code="57") == expected
+
+
+def test_csv_import_dedupes_rejects_and_inserts_in_chunks(tmp_path):
+    path = tmp_path / "audiencia.csv"
+    path.write_text(
+        "nombre;telefono\nAna;+57 300 111 2233\nBeto;573001112233\nCami;abc\nDani;+573004445566\nEli;+573007778899\n",
+        encoding="utf-8",
+    )
+    campaign_id = _campaign()
+    scheduled_base = datetime(2030, 1, 1, 10, 0, tzinfo=timezone.utc)
+
+    job = _run(AudienceImporter(chunk_size=2), path, campaign_id, scheduled_base=scheduled_base, delay_seconds=30)
+
+    assert (job.status, job.rows_read, job.accepted, job.rejected) == ("completed", 5, 3, 2)
+    assert job.rejected_reasons == {"duplicate": 1, "invalid_characters": 1}
+    assert job.rejected_samples[0] == {"row": 3, "value": "573001112233", "reason": "duplicate"}
+    assert not path.exists()
+
+    queued = _queued(campaign_id)
+    assert [msg.chat_id for msg in queued] == ["573001112233", "573004445566", "573007778899"]
+    assert [(msg.scheduled_at - queued[0].scheduled_at).total_seconds() for msg in queued] == [0, 30, 60]
+    status = queue_manager.get_campaign_status(campaign_id)
+    assert (status["status"], status["total_messages"]) == ("active", 3)
+
+
+def test_dedupe_falls_back_to_database_past_the_memory_cap(tmp_path):
+    path = tmp_path / "audiencia.csv"
+    path.write_text("573000000001\n573000000002\n573000000003\n573000000001\n573000000003\n", encoding="utf-8")
+    campaign_id = _campaign()
+
+    job = _run(AudienceImporter(chunk_size=1, dedupe_max_entries=1), path, campaign_id)
+
+    assert (job.accepted, job.rejected_reasons) == (3, {"duplicate": 2})
+    assert len(_queued(campaign_id)) == 3
+
+
+def test_xlsx_import(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Nombre", "Celular"])
+    sheet.append(["Ana", 573001112233])
+    sheet.append(["Beto", None])
+    path = tmp_path / "audiencia.xlsx"
+    workbook.save(path)
+    campaign_id = _campaign()
+
+    job = _run(AudienceImporter(), path, campaign_id, file_format="xlsx")
+
+    assert (job.status, job.accepted, job.rejected_reasons) == ("completed", 1, {"empty": 1})
+    assert [msg.chat_id for msg in _queued(campaign_id)] == ["573001112233"]
+
+
+def test_cancelled_campaign_stops_the_import(tmp_path):
+    path = tmp_path / "audiencia.csv"
+    path.write_text("573001112233\n573004445566\n", encoding="utf-8")
+    campaign_id = _campaign()
+    queue_manager.cancel_campaign(campaign_id)
+
+    job = _run(AudienceImporter(), path, campaign_id)
+
+    assert job.status == "cancelled"
+    assert _queued(campaign_id) == []
+
+
+def test_suppressed_numbers_are_rejected(tmp_path):
+    path = tmp_path / "audiencia.csv"
+    path.write_text("573001112233\n573004445566\n", encoding="utf-8")
+    suppression_list.add(["573004445566"], "opt_out")
+    campaign_id = _campaign()
+
+    job = _run(AudienceImporter(), path, campaign_id)
+
+    assert (job.accepted, job.rejected_reasons) == (1, {"suppressed": 1})
+    assert [msg.chat_id for msg in _queued(campaign_id)] == ["573001112233"]
+
+
+def test_importing_campaign_cannot_be_paused_or_resumed():
+    campaign_id = _campaign()
+
+    with pytest.raises(CampaignImportingError):
+        queue_manager.pause_campaign(campaign_id)
+    with pytest.raises(CampaignImportingError):
+        queue_manager.resume_campaign(campaign_id)
+    assert queue_manager.get_campaign_status(campaign_id)["status"] == "importing"
+    assert queue_manager.pause_campaign("camp_missing") is False
+
+
+def test_stale_imports_are_paused_with_the_reason():
+    stale_id, fresh_id = _campaign("Vieja"), _campaign("Nueva")
+    session = get_session()
+    try:
+        session.query(Campaign).filter(Campaign.campaign_id == stale_id).update(
+            {Campaign.created_at: datetime.now(timezone.utc) - timedelta(hours=2)}
+        )
+        session.commit()
+    finally:
+        session.close()
+
+    assert queue_manager.expire_stale_imports(3600) == 1
+
+    stale = queue_manager.get_campaign_status(stale_id)
+    assert stale["status"] == "paused"
+    assert "import_error" in stale["metadata"]
+    assert queue_manager.get_campaign_status(fresh_id)["status"] == "importing"
@@ -0,0 +1,72 @@
+import json
+import zlib
+
+import pytest
+
+from src.services.cache_codec import HEADER_ZLIB, HEADER_ZSTD, ZSTD_AVAILABLE, CacheCodec
+
+pytestmark = pytest.mark.unit
+
+
+def _conversation(turns: int = 40) -> list[dict[str, str]]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Mensaje {i}: quisiera información del plan anual."}
+        for i in range(turns)
+    ]
+
+
+def test_small_values_are_plain_json_readable_by_older_workers() -> None:
+    codec = CacheCodec(compression="zlib", min_compress_bytes=1024)
+
+    stored = codec.encode({"plan": "anual", "precio": 100})
+
+    assert json.loads(stored) == {"plan": "anual", "precio": 100}
+    assert codec.get_stats()["compressed"] == 0
+
+
+def test_large_values_are_compressed_with_header_and_round_trip() -> None:
+    codec = CacheCodec(compression="zlib", min_compress_bytes=256)
+    value = _conversation()
+
+    stored = codec.encode(value)
+
+    assert stored[:1] == HEADER_ZLIB
+    assert codec.decode(stored) == value
+    stats = codec.get_stats()
+    assert stats["compressed"] == 1
+    assert stats["compression_ratio"] > 3
+    assert stats["avg_encode_ms"] >= 0 and stats["avg_decode_ms"] >= 0
+
+
+def test_legacy_json_entries_still_decode() -> None:
+    codec = CacheCodec()
+
+    assert codec.decode('{"response": "hola", "provider": "gemini"}') == {"response": "hola", "provider": "gemini"}
+    assert codec.decode(b"[1, 2, 3]") == [1, 2, 3]
+
+
+def test_json_serializer_and_disabled_compression() -> None:
+    codec = CacheCodec(serializer="json", compression="none", min_compress_bytes=0)
+    value = _conversation(5)
+
+    stored = codec.encode(value)
+
+    assert stored[:1] == b"["
+    assert codec.decode(stored) == value
+
+
+def test_entries_written_by_other_codec_settings_are_readable() -> None:
+    writer = CacheCodec(serializer="orjson", compression="zlib", min_compress_bytes=0)
+    reader = CacheCodec(serializer="json", compression="none")
+
+    assert reader.decode(writer.encode(_conversation(10))) == _conversation(10)
+    assert reader.decode(HEADER_ZLIB + zlib.compress(b'{"a": 1}')) == {"a": 1}
+
+
+@pytest.mark.skipif(ZSTD_AVAILABLE, reason="solo aplica sin zstandard instalado")
+def test_zstd_entry_without_zstandard_fails_loudly() -> None:
+    codec = CacheCodec(compression="zstd")
+
+    assert codec.compression == "zlib"
+    with pytest.raises(ValueError):
+        codec.decode(HEADER_ZSTD + b"\x00")
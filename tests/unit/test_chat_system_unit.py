@@ -54,3 +54,50 @@ async def test_process_message_records_user_and_bot_messages(monkeypatch) -> Non
     assert "user_message" in sent_types
     assert "typing" in sent_types
     assert "bot_message" in sent_types
+
+
+class FakeStreamingLLM:
+    async def generate_response_stream(self, messages, business_context=None):
+        assert messages[-1] == {"role": "user", "content": "hola"}
+        assert business_context == {"chat_id": "chat-7"}
+        yield {"type": "delta", "text": "Hola", "provider": "openai"}
+        yield {"type": "delta", "text": " 👋", "provider": "openai"}
+        yield {"type": "done", "success": True, "response": "Hola 👋", "provider": "openai"}
+
+
+@pytest.mark.asyncio
+async def test_process_message_streams_partial_chunks_when_llm_configured() -> None:
+    manager = ChatConnectionManager(llm_client=FakeStreamingLLM())
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, session_id="chat-7")
+
+    await manager.process_message("chat-7", "hola", websocket)
+
+    chunks = [msg["delta"] for msg in websocket.sent_messages if msg.get("type") == "bot_message_chunk"]
+    assert chunks == ["Hola", " 👋"]
+    assert websocket.sent_messages[-1]["type"] == "bot_message"
+    assert websocket.sent_messages[-1]["message"] == "Hola 👋"
+    assert manager.chat_sessions["chat-7"]["messages"][-1]["content"] == "Hola 👋"
+
+
+@pytest.mark.asyncio
+async def test_global_chat_manager_streams_through_llm_manager(monkeypatch) -> None:
+    from src.services.chat_system import chat_manager
+    from src.services.multi_provider_llm import llm_manager
+
+    assert chat_manager.llm_client is llm_manager
+
+    async def _fake_stream(messages, business_context=None):
+        yield {"type": "delta", "text": "Hola", "provider": "openai"}
+        yield {"type": "done", "success": True, "response": "Hola", "provider": "openai"}
+
+    monkeypatch.setattr(llm_manager, "generate_response_stream", _fake_stream)
+    monkeypatch.setattr(chat_manager, "chat_sessions", {})
+    monkeypatch.setattr(chat_manager, "active_connections", [])
+    websocket = FakeWebSocket()
+    await chat_manager.connect(websocket, session_id="chat-global")
+
+    await chat_manager.process_message("chat-global", "hola", websocket)
+
+    assert [msg["delta"] for msg in websocket.sent_messages if msg.get("type") == "bot_message_chunk"] == ["Hola"]
+    assert websocket.sent_messages[-1]["message"] == "Hola"
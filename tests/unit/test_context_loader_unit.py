@@ -56,3 +56,82 @@ def test_load_active_strategy_handles_missing_dependency() -> None:
     # (forzamos chat_id improbable para no depender de DB)
     result = loader.load_active_strategy("chat-no-dependency-needed")
     assert result is None or isinstance(result, dict)
+
+
+def _count_loads(loader: ContextLoader, monkeypatch) -> list[str]:
+    calls: list[str] = []
+
+    def fake_load(chat_id: str, user_id: str | None = None) -> dict:
+        calls.append(chat_id)
+        return {"contact_objective": f"objetivo {chat_id}"}
+
+    monkeypatch.setattr(loader, "load_all_contexts_single_session", fake_load)
+    return calls
+
+
+async def test_get_context_section_serves_cached_rendered_section(monkeypatch) -> None:
+    loader = ContextLoader(cache_ttl_seconds=60, cache_max_entries=10)
+    calls = _count_loads(loader, monkeypatch)
+
+    first = await loader.get_context_section("chat-cache-1")
+    second = await loader.get_context_section("chat-cache-1")
+
+    assert "objetivo chat-cache-1" in first
+    assert second == first
+    assert calls == ["chat-cache-1"]
+
+
+async def test_invalidate_forces_reload_for_that_chat_only(monkeypatch) -> None:
+    loader = ContextLoader(cache_ttl_seconds=60, cache_max_entries=10)
+    calls = _count_loads(loader, monkeypatch)
+
+    await loader.get_context_section("chat-a")
+    await loader.get_context_section("chat-b")
+    loader.invalidate("chat-a")
+    await loader.get_context_section("chat-a")
+    await loader.get_context_section("chat-b")
+
+    assert calls == ["chat-a", "chat-b", "chat-a"]
+
+    loader.invalidate()
+    await loader.get_context_section("chat-b")
+    assert calls[-1] == "chat-b"
+
+
+async def test_invalidation_during_load_does_not_cache_stale_section(monkeypatch) -> None:
+    loader = ContextLoader(cache_ttl_seconds=60, cache_max_entries=10)
+    calls: list[str] = []
+
+    def fake_load(chat_id: str, user_id: str | None = None) -> dict:
+        calls.append(chat_id)
+        loader.invalidate(chat_id)  # escritura concurrente mientras se carga
+        return {"contact_objective": "viejo"}
+
+    monkeypatch.setattr(loader, "load_all_contexts_single_session", fake_load)
+
+    await loader.get_context_section("chat-race")
+    await loader.get_context_section("chat-race")
+
+    assert calls == ["chat-race", "chat-race"]
+
+
+async def test_cache_disabled_with_zero_ttl(monkeypatch) -> None:
+    loader = ContextLoader(cache_ttl_seconds=0)
+    calls = _count_loads(loader, monkeypatch)
+
+    await loader.get_context_section("chat-nocache")
+    await loader.get_context_section("chat-nocache")
+
+    assert calls == ["chat-nocache", "chat-nocache"]
+
+
+def test_chat_sessions_writes_invalidate_context_cache(monkeypatch) -> None:
+    import chat_sessions
+    from src.services import context_loader as context_loader_module
+
+    invalidated: list[str | None] = []
+    monkeypatch.setattr(context_loader_module.context_loader, "invalidate", invalidated.append)
+
+    chat_sessions._invalidate_context_cache("chat-write-1")
+
+    assert invalidated == ["chat-write-1"]
@@ -0,0 +1,153 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from src.services.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    deadline_scope,
+    run_sync_with_deadline,
+)
+from src.services.metrics import get_metrics_snapshot
+
+pytestmark = pytest.mark.unit
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_timeout_is_capped_by_remaining_budget() -> None:
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+
+    assert deadline.timeout(30) == pytest.approx(10)
+    assert deadline.timeout(4) == pytest.approx(4)
+
+    clock.now += 9.5
+    assert deadline.timeout(30) == pytest.approx(0.5)
+
+    clock.now += 5
+    assert deadline.expired()
+    assert deadline.timeout(30) > 0  # nunca 0: aiohttp lo interpretaría como "sin timeout"
+
+
+def test_check_records_stage_once() -> None:
+    clock = FakeClock()
+    deadline = Deadline(1, clock=clock)
+    clock.now += 2
+    before = get_metrics_snapshot()["counters"].get("deadline_exceeded_context_loading", 0)
+
+    for _ in range(2):
+        with pytest.raises(DeadlineExceeded) as exc:
+            deadline.check("context_loading")
+        assert exc.value.stage == "context_loading"
+
+    assert deadline.exceeded_stages == ["context_loading"]
+    assert get_metrics_snapshot()["counters"]["deadline_exceeded_context_loading"] == before + 1
+
+
+def test_scope_sets_and_restores_current_deadline() -> None:
+    deadline = Deadline(5)
+    assert current_deadline() is None
+    with deadline_scope(deadline):
+        assert current_deadline() is deadline
+    assert current_deadline() is None
+
+
+@pytest.mark.asyncio
+async def test_run_sync_propagates_deadline_to_thread() -> None:
+    deadline = Deadline(5)
+
+    result = await run_sync_with_deadline(deadline, "pipeline", lambda: current_deadline())
+
+    assert result is deadline
+
+
+@pytest.mark.asyncio
+async def test_run_sync_does_not_wait_for_slow_thread() -> None:
+    deadline = Deadline(0.2)
+    started = asyncio.get_running_loop().time()
+
+    with pytest.raises(DeadlineExceeded):
+        await run_sync_with_deadline(deadline, "pipeline", time.sleep, 1.0)
+
+    assert asyncio.get_running_loop().time() - started < 0.8
+    assert deadline.exceeded_stages == ["pipeline"]
+
+
+def test_webhook_does_not_overwrite_history_after_context_timeout(monkeypatch, client) -> None:
+    from types import SimpleNamespace
+
+    from src.routers import webhooks
+
+    stored = [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "¡Hola!"}]
+    saved: list[list[dict]] = []
+    loads: list[int] = []
+
+    def _load_last_context(chat_id: str) -> list[dict]:
+        loads.append(1)
+        if len(loads) == 1:
+            time.sleep(0.5)  # la primera carga agota el presupuesto
+        return list(stored)
+
+    provider = SimpleNamespace(
+        receive_message=lambda body: SimpleNamespace(chat_id="573001112233", text="¿y el precio?"),
+        send_message=lambda chat_id, text: SimpleNamespace(success=True, error=None),
+    )
+    monkeypatch.setenv("REPLY_DEADLINE_SECONDS", "0.2")
+    monkeypatch.setattr(webhooks, "verify_webhook_signature", lambda body, signature: True)
+    monkeypatch.setattr(webhooks, "get_provider", lambda: provider)
+    monkeypatch.setattr(webhooks.alert_manager, "check_alert_rules", lambda *args: None)
+    monkeypatch.setitem(sys.modules, "stub_chat", SimpleNamespace(chat=lambda text, chat_id, history: "Cuesta 10"))
+    monkeypatch.setitem(
+        sys.modules,
+        "chat_sessions",
+        SimpleNamespace(load_last_context=_load_last_context, save_context=lambda chat_id, history: saved.append(history)),
+    )
+
+    response = client.post("/webhooks/whatsapp", json={})
+
+    assert response.json() == {"status": "ok"}
+    assert len(saved) == 1
+    assert saved[0][:2] == stored
+    assert saved[0][2] == {"role": "user", "content": "¿y el precio?"}
+
+
+@pytest.mark.asyncio
+async def test_api_chat_timed_out_pipeline_does_not_mutate_saved_history(monkeypatch) -> None:
+    from types import SimpleNamespace
+
+    from src.routers import chat_core
+
+    saved: list[list[dict]] = []
+
+    def _slow_chat(text: str, chat_id: str, history: list[dict]) -> str:
+        time.sleep(0.4)
+        history.append({"role": "assistant", "content": "respuesta tardía"})
+        return "respuesta tardía"
+
+    monkeypatch.setenv("REPLY_DEADLINE_SECONDS", "0.1")
+    monkeypatch.setattr(chat_core, "_prepare_user_message", lambda payload: payload.message)
+    monkeypatch.setattr(chat_core, "_run_adaptive_cycle", lambda: asyncio.sleep(0))
+    monkeypatch.setattr(chat_core, "stub_chat", SimpleNamespace(chat=_slow_chat))
+    monkeypatch.setattr(
+        chat_core.llm_manager, "deadline_fallback_response", lambda text, chat_id, history: {"response": "Un momento"}
+    )
+    monkeypatch.setattr(
+        chat_core,
+        "chat_sessions",
+        SimpleNamespace(load_last_context=lambda chat_id: [], save_context=lambda chat_id, history: saved.append(history)),
+    )
+
+    await chat_core.api_chat(chat_core.ChatIn(chat_id="c1", message="hola"), current_user={})
+    await asyncio.sleep(0.5)  # el hilo abandonado termina después de guardar
+
+    assert saved == [[{"role": "user", "content": "hola"}, {"role": "assistant", "content": "Un momento"}]]
@@ -0,0 +1,81 @@
+import pytest
+
+from src.services import llm_faq_cache
+from src.services.cache_system import CacheManager
+from src.services.llm_faq_cache import (
+    FAQResponseCache,
+    minhash_signature,
+    normalize_question,
+    signature_similarity,
+)
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def faq(monkeypatch) -> FAQResponseCache:
+    manager = CacheManager()
+    manager._redis_init_attempted = True  # solo memoria
+    monkeypatch.setattr(llm_faq_cache, "cache_manager", manager)
+    monkeypatch.setattr(llm_faq_cache, "_current_config_version", lambda: "v1")
+    return FAQResponseCache(enabled=True, ttl_seconds=60, similarity_threshold=0.75)
+
+
+def test_normalize_question_strips_case_accents_and_punctuation() -> None:
+    assert normalize_question("¿Cuál es el HORARIO?!") == "cual es el horario"
+    assert normalize_question("  Información,   por favor... ") == "informacion por favor"
+
+
+def test_minhash_similarity_separates_paraphrases_from_other_questions() -> None:
+    base = minhash_signature(normalize_question("cuál es el horario de atención"))
+    close = minhash_signature(normalize_question("cual es el horario de atencion?"))
+    other = minhash_signature(normalize_question("cuánto cuesta el plan anual"))
+
+    assert signature_similarity(base, close) == 1.0
+    assert signature_similarity(base, other) < 0.5
+
+
+def test_only_short_history_turns_are_eligible(faq: FAQResponseCache) -> None:
+    first_turn = [{"role": "system", "content": "prompt"}, {"role": "user", "content": "¿Horario?"}]
+    long_chat = first_turn + [{"role": "assistant", "content": "9 a 6"}, {"role": "user", "content": "¿y sábados?"}]
+
+    assert faq.question_for(first_turn) == "horario"
+    assert faq.question_for(long_chat) is None
+    assert faq.question_for([{"role": "user", "content": "x" * 500}]) is None
+
+
+async def test_exact_and_near_duplicate_hits(faq: FAQResponseCache) -> None:
+    await faq.store(normalize_question("¿Cuál es el horario de atención?"), "De 9 a 6 de lunes a viernes", "gemini")
+
+    exact = await faq.lookup(normalize_question("cual es el horario de atencion"))
+    near = await faq.lookup(normalize_question("Hola, cuál es el horario de atención?"))
+    miss = await faq.lookup(normalize_question("¿Tienen parqueadero?"))
+
+    assert exact["match"] == "exact"
+    assert near["match"] == "near" and near["response"] == "De 9 a 6 de lunes a viernes"
+    assert miss is None
+    stats = faq.stats()
+    assert (stats["hits"], stats["near_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(0.667, abs=0.001)
+
+
+async def test_near_duplicate_requires_same_numbers(faq: FAQResponseCache) -> None:
+    await faq.store(normalize_question("precio del plan de 12 meses"), "Cuesta 100", "gemini")
+
+    assert await faq.lookup(normalize_question("precio del plan de 6 meses")) is None
+
+
+async def test_entries_are_scoped_to_config_version(faq: FAQResponseCache, monkeypatch) -> None:
+    await faq.store("horario", "De 9 a 6", "gemini")
+    monkeypatch.setattr(llm_faq_cache, "_current_config_version", lambda: "v2")
+
+    assert await faq.lookup("horario") is None
+
+
+async def test_expired_entry_is_ignored_and_purge_clears(faq: FAQResponseCache) -> None:
+    await faq.store("horario", "De 9 a 6", "gemini", ttl_seconds=60)
+    await faq.store("domicilios", "Sí, sin costo", "gemini", ttl_seconds=-1)
+
+    assert await faq.lookup("domicilios") is None
+    assert await faq.purge() > 0
+    assert await faq.lookup("horario") is None
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from src.services.llm_quota import QuotaExceededException, QuotaGovernor, parse_retry_after
+
+pytestmark = pytest.mark.unit
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """Respuestas predefinidas del script Lua de token bucket"""
+
+    def __init__(self, eval_result=None, fail: bool = False) -> None:
+        self.eval_result = eval_result
+        self.fail = fail
+        self.sets: dict[str, tuple[str, int | None]] = {}
+
+    async def eval(self, script, numkeys, *args):
+        if self.fail:
+            raise ConnectionError("redis caído")
+        return self.eval_result
+
+    async def set(self, key, value, px=None):
+        self.sets[key] = (value, px)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_rpm_bucket_exhausts_and_refills() -> None:
+    clock = FakeClock()
+    governor = QuotaGovernor(redis_enabled=False, clock=clock)
+
+    for _ in range(3):
+        await governor.acquire("gemini", "flash", rpm_limit=3)
+
+    with pytest.raises(QuotaExceededException) as exc:
+        await governor.acquire("gemini", "flash", rpm_limit=3)
+    assert exc.value.retry_after == pytest.approx(20.0)
+
+    clock.now += 20
+    await governor.acquire("gemini", "flash", rpm_limit=3)
+
+
+@pytest.mark.asyncio
+async def test_all_windows_must_have_budget() -> None:
+    clock = FakeClock()
+    governor = QuotaGovernor(redis_enabled=False, clock=clock)
+
+    await governor.acquire("openrouter", "m:free", rpm_limit=20, rpd_limit=1)
+    with pytest.raises(QuotaExceededException):
+        await governor.acquire("openrouter", "m:free", rpm_limit=20, rpd_limit=1)
+
+    snapshot = governor.snapshot("openrouter", "m:free", rpm_limit=20, rpd_limit=1)
+    assert snapshot["rpm_remaining"] == 19
+    assert snapshot["rpd_remaining"] == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_blocks_even_unlimited_provider() -> None:
+    clock = FakeClock()
+    governor = QuotaGovernor(redis_enabled=False, clock=clock)
+
+    await governor.block("xai", "grok", 30)
+    with pytest.raises(QuotaExceededException) as exc:
+        await governor.acquire("xai", "grok")
+    assert exc.value.retry_after == pytest.approx(30.0)
+
+    clock.now += 31
+    await governor.acquire("xai", "grok")
+
+
+@pytest.mark.asyncio
+async def test_redis_result_is_used_and_mirrored() -> None:
+    clock = FakeClock()
+    governor = QuotaGovernor(redis_enabled=True, clock=clock, key_prefix="t:")
+
+    await governor.acquire("gemini", "flash", rpm_limit=15, redis_client=FakeRedis(eval_result=[1, 4]))
+    assert governor.snapshot("gemini", "flash", rpm_limit=15)["rpm_remaining"] == 4
+
+    with pytest.raises(QuotaExceededException) as exc:
+        await governor.acquire("gemini", "flash", rpm_limit=15, redis_client=FakeRedis(eval_result=[0, 1500]))
+    assert exc.value.retry_after == pytest.approx(1.5)
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_memory_and_block_is_shared() -> None:
+    governor = QuotaGovernor(redis_enabled=True, clock=FakeClock(), key_prefix="t:")
+
+    await governor.acquire("gemini", "flash", rpm_limit=1, redis_client=FakeRedis(fail=True))
+    with pytest.raises(QuotaExceededException):
+        await governor.acquire("gemini", "flash", rpm_limit=1, redis_client=FakeRedis(fail=True))
+
+    redis_client = FakeRedis()
+    await governor.block("gemini", "flash", 2.5, redis_client=redis_client)
+    assert redis_client.sets["t:gemini:flash:blocked"][1] == 2500
+
+
+def test_parse_retry_after_formats() -> None:
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 <= parse_retry_after(future) <= 60
@@ -0,0 +1,73 @@
+import pytest
+
+from src.services.llm_routing import ProviderRouter
+
+pytestmark = pytest.mark.unit
+
+
+def _router(**overrides) -> ProviderRouter:
+    params = {
+        "alpha": 0.5,
+        "prior_latency_seconds": 2.0,
+        "failure_penalty": 4.0,
+        "cost_weight": 0.25,
+        "recovery_half_life_seconds": 0,
+    }
+    params.update(overrides)
+    return ProviderRouter(**params)
+
+
+def test_rank_keeps_static_order_without_observations() -> None:
+    router = _router()
+    assert router.rank(["gemini", "xai", "openai"]) == ["gemini", "xai", "openai"]
+
+
+def test_fresh_router_does_not_reorder_paid_providers_behind_free_ones() -> None:
+    router = _router(cost_weight=1.0)
+    static_order = ["openai", "gemini", "claude", "xai"]
+    is_free = {"openai": False, "gemini": True, "claude": False, "xai": True}
+
+    assert router.rank(static_order, is_free=is_free) == static_order
+
+
+def test_degraded_provider_moves_behind_healthy_one() -> None:
+    router = _router()
+    for _ in range(5):
+        router.record_outcome("gemini", 30.0, success=False)
+        router.record_outcome("xai", 1.0, success=True)
+
+    assert router.rank(["gemini", "xai"]) == ["xai", "gemini"]
+    snapshot = router.snapshot("gemini")
+    assert snapshot["success_rate"] < 0.1
+    assert snapshot["samples"] == 5
+
+
+def test_rate_limits_raise_failure_probability() -> None:
+    router = _router()
+    router.record_outcome("gemini", 1.0, success=False, rate_limited=True)
+    router.record_outcome("openrouter", 1.0, success=False)
+
+    assert router.snapshot("gemini")["rate_limit_rate"] == pytest.approx(0.5)
+    assert router.score("gemini") > router.score("openrouter")
+
+
+def test_cost_weight_penalizes_paid_providers() -> None:
+    router = _router(cost_weight=1.0)
+    router.record_outcome("openai", 1.0, success=True)
+    router.record_outcome("gemini", 1.0, success=True)
+
+    ranked = router.rank(["openai", "gemini"], is_free={"openai": False, "gemini": True})
+    assert ranked == ["gemini", "openai"]
+
+
+def test_stale_statistics_recover_towards_prior(monkeypatch) -> None:
+    router = _router(recovery_half_life_seconds=10)
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("src.services.llm_routing.time.monotonic", lambda: clock["now"])
+
+    router.record_outcome("gemini", 20.0, success=False)
+    degraded = router.score("gemini")
+    clock["now"] += 100
+
+    assert router.score("gemini") < degraded
+    assert router.score("gemini") == pytest.approx(2.0, rel=0.01)
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from src.services.llm_single_flight import SingleFlight
+
+pytestmark = pytest.mark.unit
+
+
+class FakeRedis:
+    """Subconjunto en memoria de redis.asyncio usado por SingleFlight"""
+
+    def __init__(self) -> None:
+        self.store: dict[str, str] = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def exists(self, key):
+        return int(key in self.store)
+
+    async def eval(self, script, numkeys, key, token):
+        if self.store.get(key) == token:
+            del self.store[key]
+            return 1
+        return 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_leader_result() -> None:
+    flight = SingleFlight(redis_enabled=False)
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return {"response": "ok"}
+
+    results = await asyncio.gather(*(flight.run("k", factory) for _ in range(5)))
+
+    assert calls == 1
+    assert [source for _, source in results].count(None) == 1
+    assert [source for _, source in results].count("local") == 4
+    assert flight.inflight_count == 0
+
+
+@pytest.mark.asyncio
+async def test_leader_exception_propagates_to_followers() -> None:
+    flight = SingleFlight(redis_enabled=False)
+
+    async def factory():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(flight.run("k", factory), flight.run("k", factory), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.inflight_count == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_lets_follower_run_its_own_call() -> None:
+    flight = SingleFlight(redis_enabled=False)
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(5)
+
+    async def fast():
+        return "follower"
+
+    leader = asyncio.create_task(flight.run("k", slow))
+    await started.wait()
+    follower = asyncio.create_task(flight.run("k", fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == ("follower", None)
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_shares_result_across_workers() -> None:
+    redis_client = FakeRedis()
+    worker_a = SingleFlight(redis_enabled=True, poll_interval_seconds=0.01, key_prefix="t:")
+    worker_b = SingleFlight(redis_enabled=True, poll_interval_seconds=0.01, key_prefix="t:")
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"response": "ok", "provider": "gemini"}
+
+    first, second = await asyncio.gather(
+        worker_a.run("k", factory, redis_client=redis_client),
+        worker_b.run("k", factory, redis_client=redis_client),
+    )
+
+    assert calls == 1
+    assert first == ({"response": "ok", "provider": "gemini"}, None)
+    assert second == ({"response": "ok", "provider": "gemini"}, "redis")
+    assert "t:lock:k" not in redis_client.store
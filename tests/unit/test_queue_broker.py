@@ -1,4 +1,14 @@
-from src.services.queue_broker import InMemoryQueueBroker
+import json
+
+from redis.exceptions import ResponseError
+
+from src.services.queue_broker import (
+    AsyncRedisStreamsQueueBroker,
+    InMemoryQueueBroker,
+    RedisStreamsQueueBroker,
+    get_async_queue_broker,
+    get_queue_broker,
+)
 
 
 def test_in_memory_queue_broker_roundtrip() -> None:
@@ -18,3 +28,231 @@ def test_in_memory_queue_broker_empty_returns_none() -> None:
     payload = broker.dequeue("missing", timeout_seconds=1)
 
     assert payload is None
+
+
+class _FakeStreamsRedis:
+    """Redis Streams en memoria: XADD/XREADGROUP/XACK/XAUTOCLAIM/XPENDING con reloj manual."""
+
+    def __init__(self) -> None:
+        self.streams: dict[str, list[tuple[str, dict[str, str]]]] = {}
+        self.groups: dict[tuple[str, str], dict] = {}
+        self.now_ms = 0
+        self._seq = 0
+
+    @staticmethod
+    def _seq_of(entry_id: str) -> int:
+        return int(entry_id.split("-")[0])
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        self._seq += 1
+        entry_id = f"{self._seq}-0"
+        stream = self.streams.setdefault(name, [])
+        stream.append((entry_id, dict(fields)))
+        if maxlen is not None and len(stream) > maxlen:
+            del stream[: len(stream) - maxlen]
+        return entry_id
+
+    def xgroup_create(self, name, groupname, id="0", mkstream=False):
+        if (name, groupname) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        if mkstream:
+            self.streams.setdefault(name, [])
+        self.groups[(name, groupname)] = {"last": 0, "pending": {}}
+        return True
+
+    def xreadgroup(self, groupname, consumername, streams, count=None, block=None):
+        reply = []
+        for name in streams:
+            group = self.groups[(name, groupname)]
+            fresh = [entry for entry in self.streams.get(name, []) if self._seq_of(entry[0]) > group["last"]][:count]
+            for entry_id, _ in fresh:
+                group["pending"][entry_id] = {"consumer": consumername, "delivered": self.now_ms, "count": 1}
+                group["last"] = self._seq_of(entry_id)
+            if fresh:
+                reply.append([name, fresh])
+        return reply
+
+    def xack(self, name, groupname, *ids):
+        pending = self.groups[(name, groupname)]["pending"]
+        return sum(1 for entry_id in ids if pending.pop(entry_id, None) is not None)
+
+    def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id="0-0", count=None):
+        pending = self.groups[(name, groupname)]["pending"]
+        entries = dict(self.streams.get(name, []))
+        claimed, deleted = [], []
+        for entry_id in sorted(pending, key=self._seq_of):
+            info = pending[entry_id]
+            if self.now_ms - info["delivered"] < min_idle_time:
+                continue
+            if entry_id not in entries:
+                pending.pop(entry_id)
+                deleted.append(entry_id)
+                continue
+            info.update(consumer=consumername, delivered=self.now_ms, count=info["count"] + 1)
+            claimed.append((entry_id, entries[entry_id]))
+            if count and len(claimed) >= count:
+                break
+        return ["0-0", claimed, deleted]
+
+    def xpending_range(self, name, groupname, min, max, count, consumername=None, idle=None):
+        pending = self.groups[(name, groupname)]["pending"]
+        low, high = self._seq_of(min), self._seq_of(max)
+        return [
+            {
+                "message_id": entry_id,
+                "consumer": info["consumer"],
+                "time_since_delivered": self.now_ms - info["delivered"],
+                "times_delivered": info["count"],
+            }
+            for entry_id, info in sorted(pending.items(), key=lambda item: self._seq_of(item[0]))
+            if low <= self._seq_of(entry_id) <= high
+        ][:count]
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis: _FakeStreamsRedis) -> None:
+        self._redis = redis
+        self._calls: list = []
+
+    def __getattr__(self, name):
+        def queue_call(*args, **kwargs):
+            self._calls.append((getattr(self._redis, name), args, kwargs))
+            return self
+
+        return queue_call
+
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self._calls]
+
+
+class _FakeAsyncStreamsRedis:
+    def __init__(self, redis: _FakeStreamsRedis) -> None:
+        self._redis = redis
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        pipe = _FakePipeline(self._redis)
+
+        class _AsyncPipeline:
+            def __getattr__(self, name):
+                return getattr(pipe, name)
+
+            async def execute(self):
+                return pipe.execute()
+
+        return _AsyncPipeline()
+
+
+def _streams_broker(redis: _FakeStreamsRedis, consumer: str, **overrides) -> RedisStreamsQueueBroker:
+    settings = {"max_deliveries": 3, "claim_idle_ms": 1000, "read_count": 10, **overrides}
+    return RedisStreamsQueueBroker(client=redis, consumer=consumer, **settings)
+
+
+def test_streams_broker_read_ack_roundtrip() -> None:
+    redis = _FakeStreamsRedis()
+    broker = _streams_broker(redis, "worker-a")
+
+    broker.enqueue("events", {"id": "evt_1"})
+    messages = broker.read("events")
+
+    assert [m.payload for m in messages] == [{"id": "evt_1"}]
+    assert messages[0].deliveries == 1
+    assert broker.ack("events", messages[0].id) == 1
+    assert redis.groups[("events", "workers")]["pending"] == {}
+
+
+def test_streams_consumers_split_batched_reads() -> None:
+    redis = _FakeStreamsRedis()
+    first, second = _streams_broker(redis, "worker-a"), _streams_broker(redis, "worker-b")
+    for i in range(5):
+        first.enqueue("events", {"n": i})
+
+    batch_a = first.read("events", count=3)
+    batch_b = second.read("events", count=3)
+
+    assert [m.payload["n"] for m in batch_a] == [0, 1, 2]
+    assert [m.payload["n"] for m in batch_b] == [3, 4]
+
+
+def test_unacked_entry_is_reclaimed_after_idle_time() -> None:
+    redis = _FakeStreamsRedis()
+    crashed, survivor = _streams_broker(redis, "worker-a"), _streams_broker(redis, "worker-b")
+    crashed.enqueue("events", {"id": "evt_1"})
+    crashed.read("events")
+
+    assert survivor.read("events") == []
+    redis.now_ms += 1500
+    reclaimed = survivor.read("events")
+
+    assert [(m.payload["id"], m.deliveries) for m in reclaimed] == [("evt_1", 2)]
+    assert redis.groups[("events", "workers")]["pending"][reclaimed[0].id]["consumer"] == "worker-b"
+
+
+def test_entry_moves_to_dead_letter_after_max_deliveries() -> None:
+    redis = _FakeStreamsRedis()
+    broker = _streams_broker(redis, "worker-a", max_deliveries=2)
+    broker.enqueue("events", {"id": "poison"})
+
+    assert len(broker.read("events")) == 1
+    redis.now_ms += 1500
+    assert broker.read("events")[0].deliveries == 2
+    redis.now_ms += 1500
+
+    assert broker.read("events") == []
+    dead_id, dead_fields = redis.streams["events:dead"][0]
+    assert json.loads(dead_fields["payload"]) == {"id": "poison"}
+    assert dead_fields["deliveries"] == "3"
+    assert redis.groups[("events", "workers")]["pending"] == {}
+
+
+def test_malformed_entry_goes_straight_to_dead_letter() -> None:
+    redis = _FakeStreamsRedis()
+    broker = _streams_broker(redis, "worker-a")
+    redis.xadd("events", {"payload": "no es json"})
+    broker.enqueue("events", {"id": "ok"})
+
+    assert [m.payload for m in broker.read("events")] == [{"id": "ok"}]
+    assert redis.streams["events:dead"][0][1]["payload"] == "no es json"
+
+
+def test_streams_are_trimmed_to_maxlen() -> None:
+    redis = _FakeStreamsRedis()
+    broker = _streams_broker(redis, "worker-a", maxlen=3)
+    for i in range(5):
+        broker.enqueue("events", {"n": i})
+
+    assert [json.loads(fields["payload"])["n"] for _, fields in redis.streams["events"]] == [2, 3, 4]
+
+
+async def test_async_streams_broker_matches_sync_semantics() -> None:
+    redis = _FakeStreamsRedis()
+    broker = AsyncRedisStreamsQueueBroker(client=_FakeAsyncStreamsRedis(redis), consumer="api", claim_idle_ms=1000)
+
+    await broker.enqueue("events", {"id": "evt_1"})
+    await broker.enqueue("events", {"id": "evt_2"})
+    assert await broker.dequeue("events") == {"id": "evt_1"}
+
+    pending = await broker.read("events")
+    redis.now_ms += 1500
+    reclaimed = await broker.read("events")
+    assert [m.id for m in reclaimed] == [m.id for m in pending]
+    assert await broker.ack("events", reclaimed[0].id) == 1
+
+
+def test_get_queue_broker_selects_streams_backend(monkeypatch) -> None:
+    monkeypatch.setenv("QUEUE_BROKER_BACKEND", "redis_streams")
+    monkeypatch.setenv("QUEUE_BROKER_MAX_DELIVERIES", "7")
+
+    assert isinstance(get_queue_broker(), RedisStreamsQueueBroker)
+    assert get_queue_broker().max_deliveries == 7
+    assert isinstance(get_async_queue_broker(), AsyncRedisStreamsQueueBroker)
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.services import queue_system
+from src.services.queue_signals import QueueWakeup, _signal_kind
+from src.services.queue_system import QueueManager
+
+pytestmark = pytest.mark.unit
+
+
+class _RecordingSession:
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, dict]] = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params or {}))
+
+
+def test_wait_returns_on_signal_and_times_out_without_one() -> None:
+    wakeup = QueueWakeup(backend="local", fallback_seconds=5)
+    threading.Timer(0.05, wakeup.notify_committed).start()
+
+    started = time.monotonic()
+    assert wakeup.wait() is True
+    assert time.monotonic() - started < 2
+    assert wakeup.wait(timeout=0.05) is False
+
+
+async def test_wait_async_is_woken_from_another_thread() -> None:
+    wakeup = QueueWakeup(backend="local", fallback_seconds=5)
+    waiter = asyncio.create_task(wakeup.wait_async())
+    await asyncio.sleep(0)
+
+    await asyncio.to_thread(wakeup.notify_committed)
+
+    assert await asyncio.wait_for(waiter, timeout=1) is True
+    assert await wakeup.wait_async(timeout=0.01) is False
+
+
+def test_subscribers_are_called_per_signal() -> None:
+    wakeup = QueueWakeup(backend="local")
+    calls: list[int] = []
+    wakeup.subscribe(lambda: calls.append(1))
+
+    wakeup.notify_committed()
+    wakeup.notify_committed()
+
+    assert calls == [1, 1]
+
+
+def test_subscribers_can_filter_by_kind() -> None:
+    wakeup = QueueWakeup(backend="local")
+    calls: list[str] = []
+    wakeup.subscribe(lambda: calls.append("enqueue"), kinds=("enqueue",))
+    wakeup.subscribe(lambda: calls.append("any"))
+
+    wakeup.broadcast(kind="due")
+    wakeup._received(_signal_kind(b"due"))
+    wakeup._received(_signal_kind(""))
+
+    assert calls == ["any", "any", "enqueue", "any"]
+    assert wakeup.wait(timeout=0) is True
+
+
+def test_pg_notify_only_inside_postgres_transactions() -> None:
+    session = _RecordingSession()
+
+    QueueWakeup(backend="local").notify_in_transaction(session)
+    assert session.statements == []
+
+    QueueWakeup(backend="postgres", channel="queue_wakeup").notify_in_transaction(session)
+    assert session.statements == [("SELECT pg_notify(:channel, :kind)", {"channel": "queue_wakeup", "kind": "enqueue"})]
+
+
+def test_redis_backend_publishes_after_commit() -> None:
+    published: list[tuple[str, str]] = []
+    wakeup = QueueWakeup(backend="redis", channel="queue_wakeup")
+    wakeup._redis_client = type("Redis", (), {"publish": lambda self, channel, msg: published.append((channel, msg))})()
+
+    wakeup.notify_committed()
+
+    assert published == [("queue_wakeup", "enqueue")]
+    assert wakeup._event.is_set()
+
+
+def test_invalid_channel_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        QueueWakeup(backend="local", channel="canal; DROP")
+
+
+def test_enqueue_wakes_consumers(monkeypatch) -> None:
+    wakeup = QueueWakeup(backend="local")
+    monkeypatch.setattr(queue_system, "queue_wakeup", wakeup)
+    manager = QueueManager()
+
+    manager.enqueue_message("wakeup_1", "hola")
+    assert wakeup.wait(timeout=0) is True
+
+    manager.enqueue_bulk_messages([{"chat_id": "wakeup_2", "message": "hola"}])
+    assert wakeup.wait(timeout=0) is True
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.services.metrics import get_metrics_snapshot
+from src.services.queue_signals import QueueWakeup
+from src.services.scheduled_dispatcher import ScheduledDispatcher
+
+pytestmark = pytest.mark.unit
+
+
+class _Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _row(message_id: str, at: float, priority: int = 0) -> dict:
+    return {"message_id": message_id, "scheduled_at": datetime.fromtimestamp(at, timezone.utc), "priority": priority}
+
+
+def _dispatcher(rows: list[dict], clock: _Clock, **kwargs) -> tuple[ScheduledDispatcher, list[int]]:
+    notified: list[int] = []
+    dispatcher = ScheduledDispatcher(
+        load_window=lambda: list(rows), notify=lambda: notified.append(1), clock=clock, refresh_seconds=30, **kwargs
+    )
+    return dispatcher, notified
+
+
+def test_sleeps_until_earliest_due_time() -> None:
+    clock = _Clock(1000.0)
+    dispatcher, notified = _dispatcher([_row("late", 1020), _row("soon", 1005)], clock)
+
+    assert dispatcher.run_once() == 0
+    assert dispatcher.seconds_until_next() == pytest.approx(5)
+    assert notified == []
+
+    clock.now = 1005.0
+    assert dispatcher.run_once() == 1
+    assert dispatcher.seconds_until_next() == pytest.approx(15)
+    assert notified == [1]
+
+
+def test_due_messages_are_signalled_in_batches_by_due_time_then_priority() -> None:
+    clock = _Clock(1000.0)
+    rows = [_row("b", 990), _row("a", 990, priority=5), _row("c", 995), _row("future", 2000)]
+    batches: list[list[str]] = []
+    dispatcher, notified = _dispatcher(rows, clock, batch_size=2)
+    original = dispatcher._dispatch
+    dispatcher._dispatch = lambda batch, now: (batches.append([m for _, _, m in batch]), original(batch, now))
+
+    assert dispatcher.run_once() == 3
+
+    assert batches == [["a", "b"], ["c"]]
+    assert notified == [1, 1]
+
+
+def test_reload_does_not_dispatch_twice_but_picks_up_rescheduled_retry() -> None:
+    clock = _Clock(1000.0)
+    rows = [_row("m1", 990)]
+    dispatcher, _ = _dispatcher(rows, clock)
+
+    assert dispatcher.run_once() == 1
+    dispatcher.wake()
+    assert dispatcher.run_once() == 0
+
+    rows[0] = _row("m1", 1000)
+    dispatcher.wake()
+    assert dispatcher.run_once() == 1
+
+
+def test_wake_forces_reload_and_ignores_own_due_signal_from_the_listener() -> None:
+    clock = _Clock(1000.0)
+    rows: list[dict] = []
+    wakeup = QueueWakeup(backend="local")
+    dispatcher = ScheduledDispatcher(
+        load_window=lambda: list(rows), notify=lambda: wakeup.broadcast(kind="due"), clock=clock, refresh_seconds=30
+    )
+    wakeup.subscribe(dispatcher.wake, kinds=("enqueue",))
+    dispatcher.run_once()
+    assert dispatcher.seconds_until_next() == pytest.approx(30)
+
+    rows.append(_row("new", 999))
+    wakeup.notify_committed()
+    assert dispatcher.seconds_until_next() == 0
+    assert dispatcher.run_once() == 1
+    assert dispatcher.seconds_until_next() == pytest.approx(30)
+
+    # Su propio aviso "due" de vuelta por LISTEN/pub-sub no fuerza otra recarga
+    wakeup._received("due")
+    assert dispatcher.seconds_until_next() == pytest.approx(30)
+
+
+def test_records_lateness_and_dispatch_rate() -> None:
+    clock = _Clock(1000.0)
+    before = get_metrics_snapshot()["counters"]["scheduler_messages_dispatched"]
+    dispatcher, _ = _dispatcher([_row("x", 997), _row("y", 999)], clock)
+
+    dispatcher.run_once()
+
+    snapshot = get_metrics_snapshot()
+    assert snapshot["counters"]["scheduler_messages_dispatched"] == before + 2
+    assert snapshot["histograms"]["scheduler_dispatch_lateness_seconds"]["max"] >= 3
+    assert snapshot["gauges"]["scheduler_dispatch_rate_per_second"] == pytest.approx(2 / 60)
@@ -5,16 +5,16 @@ from src.workers.scheduler_worker import SchedulerWorker
 pytestmark = pytest.mark.unit
 
 
-def test_process_scheduled_messages_uses_db_queue_snapshot(monkeypatch) -> None:
+def test_process_scheduled_messages_reloads_window_and_dispatches(monkeypatch) -> None:
     worker = SchedulerWorker()
 
     calls = {"count": 0}
 
-    def _fake_get_pending_messages(limit=10, include_scheduled=True):
+    def _fake_get_scheduled_window(horizon_seconds, limit=1000):
         calls["count"] += 1
-        return [{"message_id": "m1"}]
+        return []
 
-    monkeypatch.setattr("src.workers.scheduler_worker.queue_manager.get_pending_messages", _fake_get_pending_messages)
+    monkeypatch.setattr("src.services.scheduled_dispatcher.queue_manager.get_scheduled_window", _fake_get_scheduled_window)
     worker.process_scheduled_messages()
     assert calls["count"] == 1
 
@@ -23,3 +23,16 @@ def test_check_fernet_rotation_does_not_raise(monkeypatch) -> None:
     worker = SchedulerWorker()
     monkeypatch.setattr("src.workers.scheduler_worker.is_key_rotation_due", lambda rotation_days: (False, 3.2))
     worker.check_fernet_rotation()
+
+
+def test_queue_wakeup_wakes_dispatcher() -> None:
+    worker = SchedulerWorker()
+    woken: list[int] = []
+    worker.dispatcher.wake = lambda: woken.append(1)
+
+    worker._on_queue_wakeup()
+    assert woken == []
+
+    worker.running = True
+    worker._on_queue_wakeup()
+    assert woken == [1]
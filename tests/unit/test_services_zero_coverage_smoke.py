@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pytest
 
@@ -92,12 +92,14 @@ def test_scheduler_worker_processes_due_messages(monkeypatch) -> None:
 
     captured = {"calls": 0}
 
-    def _fake_get_pending_messages(limit=10, include_scheduled=True):
+    def _fake_get_scheduled_window(horizon_seconds, limit=1000):
         captured["calls"] += 1
-        return [{"message_id": "msg_test", "status": "pending"}]
+        return [{"message_id": "msg_test", "scheduled_at": datetime(2026, 2, 13, 10, 0, tzinfo=timezone.utc), "priority": 0}]
 
-    monkeypatch.setattr("src.workers.scheduler_worker.queue_manager.get_pending_messages", _fake_get_pending_messages)
+    monkeypatch.setattr("src.services.scheduled_dispatcher.queue_manager.get_scheduled_window", _fake_get_scheduled_window)
+    worker.dispatcher._notify = lambda: None
 
     worker.process_scheduled_messages()
 
     assert captured["calls"] == 1
+    assert worker.dispatcher.stats["dispatched"] == 1
@@ -0,0 +1,200 @@
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from src.models.admin_db import engine, get_session
+from src.models.models import Base
+from src.services.queue_system import DeadLetterMessage, QueueManager
+from src.services.suppression_list import (
+    BloomFilter,
+    SuppressedNumber,
+    SuppressedRecipientError,
+    SuppressionList,
+    suppression_list,
+)
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def _tables():
+    Base.metadata.create_all(bind=engine)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _local(**kwargs) -> SuppressionList:
+    return SuppressionList(backend="local", default_country_code="57", **kwargs)
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    members = range(573_000_000_000, 573_000_010_000)
+    for key in members:
+        bloom.add(key)
+
+    assert all(key in bloom for key in members)
+    false_positives = sum(key in bloom for key in range(574_000_000_000, 574_000_050_000))
+    assert false_positives / 50_000 < 0.02
+
+
+def test_add_normalizes_and_remove_restores():
+    suppressions = _local()
+
+    assert suppressions.add(["+57 300 111 2233", "3001112233", "abc"], "opt_out", source="test") == ["573001112233"]
+    assert suppressions.add(["573001112233"], "blocked") == []
+    assert suppressions.is_suppressed("573001112233@c.us")
+    assert not suppressions.is_suppressed("573004445566")
+    assert suppressions.partition(["3001112233", "573004445566"]) == (["573004445566"], ["3001112233"])
+    assert suppressions.summary()["by_reason"] == {"opt_out": 1}
+
+    assert suppressions.remove("+573001112233") is True
+    assert suppressions.remove("+573001112233") is False
+    assert not suppressions.is_suppressed("573001112233")
+
+
+def test_invalid_reason_is_rejected():
+    with pytest.raises(ValueError):
+        _local().add(["573001112233"], "spam")
+
+
+def test_incremental_refresh_picks_up_rows_from_other_processes():
+    clock = _Clock()
+    suppressions = _local(refresh_seconds=60, clock=clock)
+    assert not suppressions.is_suppressed("573009990000")
+
+    session = get_session()
+    try:
+        session.add(SuppressedNumber(phone="573009990000", reason="opt_out", source="other_worker"))
+        session.commit()
+    finally:
+        session.close()
+
+    assert not suppressions.is_suppressed("573009990000")
+    clock.now = 61
+    assert suppressions.is_suppressed("573009990000")
+
+
+def test_refresh_picks_up_lower_ids_committed_late():
+    clock = _Clock()
+    suppressions = _local(refresh_seconds=60, clock=clock)
+    session = get_session()
+    try:
+        base = int(session.execute(select(func.max(SuppressedNumber.id))).scalar() or 0)
+        session.add(SuppressedNumber(id=base + 10, phone="573009990020", reason="opt_out"))
+        session.commit()
+        assert suppressions.is_suppressed("573009990020")
+
+        # Transacción que tomó un id menor pero confirmó después de la carga (PostgreSQL)
+        session.add(SuppressedNumber(id=base + 5, phone="573009990021", reason="opt_out"))
+        session.commit()
+    finally:
+        session.close()
+
+    clock.now = 61
+    assert suppressions.is_suppressed("573009990021")
+    assert suppressions.refresh() == 0
+
+
+def test_removal_reaches_other_processes_without_redis():
+    clock = _Clock()
+    api, worker = _local(), _local(refresh_seconds=60, clock=clock)
+    api.add(["573009990001", "573009990002"], "opt_out")
+    assert worker.is_suppressed("573009990001") and worker.is_suppressed("573009990002")
+
+    assert api.remove("573009990001", removed_by="admin") is True
+    # Quitado y vuelto a agregar: la baja vieja no debe des-suprimirlo
+    api.remove("573009990002")
+    api.add(["573009990002"], "blocked")
+
+    assert worker.is_suppressed("573009990001")
+    clock.now = 61
+    assert not worker.is_suppressed("573009990001")
+    assert worker.is_suppressed("573009990002")
+
+    # Un proceso que arranca después no re-aplica bajas ya reflejadas en la tabla
+    late = _local(refresh_seconds=60, clock=clock)
+    assert late.is_suppressed("573009990002")
+    clock.now = 200
+    assert late.is_suppressed("573009990002")
+
+
+def test_apply_update_from_other_process():
+    suppressions = _local()
+    suppressions.rebuild()
+
+    suppressions.apply_update("+573001112233,573004445566")
+    assert suppressions.is_suppressed("573004445566")
+
+    suppressions.apply_update("-573004445566")
+    assert not suppressions.is_suppressed("573004445566")
+    assert suppressions.is_suppressed("573001112233")
+
+
+def test_queue_skips_and_drops_suppressed_recipients():
+    manager = QueueManager()
+    kept, dropped = manager.enqueue_bulk_messages(
+        [{"chat_id": "573007770001", "message": "hola"}, {"chat_id": "573007770002", "message": "hola"}]
+    )
+    suppression_list.add(["573007770002"], "opt_out")
+
+    with pytest.raises(SuppressedRecipientError):
+        manager.enqueue_message("573007770002", "hola")
+    assert manager.enqueue_bulk_messages([{"chat_id": "573007770002", "message": "hola"}]) == []
+
+    claimed = manager.claim_messages("worker-a", limit=10)
+    assert [msg["message_id"] for msg in claimed] == [kept]
+
+    session = get_session()
+    try:
+        dead = session.query(DeadLetterMessage).filter(DeadLetterMessage.message_id == dropped).one()
+    finally:
+        session.close()
+    assert dead.error_class == "suppressed"
+
+
+def test_invalid_recipient_failures_are_learned():
+    manager = QueueManager()
+    message_id = manager.enqueue_message("573007770003", "hola")
+
+    assert manager.mark_as_failed(message_id, "(#131026) Message undeliverable") is True
+
+    assert suppression_list.is_suppressed("573007770003")
+    assert suppression_list.summary()["by_reason"] == {"invalid": 1}
+
+
+def _check_cost(suppressions: SuppressionList, probes: list[str]) -> float:
+    started = time.perf_counter()
+    for phone in probes:
+        suppressions.is_suppressed(phone)
+    return (time.perf_counter() - started) / len(probes)
+
+
+@pytest.mark.slow
+def test_check_cost_with_a_million_suppressed_numbers(record_property):
+    """Benchmark: reporta el costo por consulta con 1k y 1M números (no falla por tiempos)"""
+    probes = [str(574_000_000_000 + i) for i in range(20_000)]
+
+    small = _local(capacity=1_000_000, refresh_seconds=0)
+    small.rebuild()
+    small.apply_update("+" + ",".join(str(573_000_000_000 + i) for i in range(1_000)))
+
+    large = _local(capacity=1_000_000, refresh_seconds=0)
+    large.rebuild()
+    for start in range(0, 1_000_000, 10_000):
+        large.apply_update("+" + ",".join(str(573_000_000_000 + i) for i in range(start, start + 10_000)))
+    assert len(large) == 1_000_000
+    assert large.is_suppressed("573000999999")
+    assert not any(large.is_suppressed(phone) for phone in probes[:1_000])
+
+    small_cost = min(_check_cost(small, probes) for _ in range(3))
+    large_cost = min(_check_cost(large, probes) for _ in range(3))
+    record_property("suppression_check_us_1k", round(small_cost * 1e6, 2))
+    record_property("suppression_check_us_1m", round(large_cost * 1e6, 2))
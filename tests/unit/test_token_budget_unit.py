@@ -0,0 +1,180 @@
+import pytest
+
+from src.services.token_budget import (
+    SUMMARY_PREFIX,
+    TokenBudgetManager,
+    estimate_messages_tokens,
+    estimate_tokens,
+    history_fingerprint,
+    provider_family,
+)
+
+pytestmark = pytest.mark.unit
+
+
+def _history(turns: int, size: int = 400) -> list[dict[str, str]]:
+    messages = [{"role": "system", "content": "Eres un asesor de ventas."}]
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"turno {i} " + "x" * size})
+    return messages
+
+
+class _MemoryStore:
+    def __init__(self) -> None:
+        self.rows: dict[str, dict] = {}
+
+    def load(self, chat_id: str) -> dict | None:
+        return self.rows.get(chat_id)
+
+    def save(self, chat_id: str, summary: str, covered_messages: int, fingerprint: str) -> None:
+        self.rows[chat_id] = {"summary": summary, "covered_messages": covered_messages, "fingerprint": fingerprint}
+
+
+def _manager(store: _MemoryStore, budget: int = 600, keep: int = 2) -> TokenBudgetManager:
+    return TokenBudgetManager(
+        enabled=True,
+        max_prompt_tokens=budget,
+        keep_last_turns=keep,
+        summary_loader=store.load,
+        summary_saver=store.save,
+    )
+
+
+def test_estimator_depends_on_provider_family() -> None:
+    text = "a" * 350
+    assert provider_family("xai") == "openai"
+    assert provider_family("desconocido") == "openai"
+    assert estimate_tokens(text, "claude") == 100
+    assert estimate_tokens(text, "openai") == 88
+    assert estimate_tokens("", "gemini") == 0
+    assert estimate_messages_tokens([{"role": "user", "content": text}], "claude") == 104
+
+
+async def test_messages_within_budget_are_untouched() -> None:
+    manager = _manager(_MemoryStore(), budget=10_000)
+    messages = _history(6)
+
+    assert await manager.apply(messages, "chat-1") is messages
+
+
+async def test_over_budget_keeps_system_and_last_turns_and_schedules_summary() -> None:
+    store = _MemoryStore()
+    manager = _manager(store)
+    messages = _history(20)
+    received: list[tuple[str | None, int]] = []
+
+    async def summarizer(previous: str | None, turns: list[dict[str, str]]) -> str:
+        received.append((previous, len(turns)))
+        return "cliente interesado en plan anual"
+
+    trimmed = await manager.apply(messages, "chat-2", summarizer=summarizer)
+    await manager.wait_for_refreshes()
+
+    assert trimmed[0] == messages[0]
+    assert trimmed[-4:] == messages[-4:]
+    assert estimate_messages_tokens(trimmed) <= 600
+    # 16 mensajes anteriores (~105 tokens c/u) no caben en un solo pedido: bloques encadenados
+    assert [count for _, count in received] == [5, 5, 5, 1]
+    assert received[0][0] is None
+    assert all(previous == "cliente interesado en plan anual" for previous, _ in received[1:])
+    assert store.rows["chat-2"]["covered_messages"] == 16
+    assert store.rows["chat-2"]["fingerprint"] == history_fingerprint(messages[1:17])
+
+
+async def test_stored_summary_replaces_older_turns_and_rolls_forward() -> None:
+    store = _MemoryStore()
+    manager = _manager(store)
+    messages = _history(20)
+    older = messages[1:17]
+    store.save("chat-3", "resumen previo", len(older), history_fingerprint(older))
+
+    trimmed = await manager.apply(messages, "chat-3")
+    assert trimmed[1] == {"role": "system", "content": f"{SUMMARY_PREFIX}resumen previo"}
+    assert trimmed[2:] == messages[-4:]
+
+    # Dos turnos nuevos: el resumen sigue valiendo para su prefijo y se extiende en segundo plano
+    received: list[tuple[str | None, int]] = []
+
+    async def summarizer(previous: str | None, turns: list[dict[str, str]]) -> str:
+        received.append((previous, len(turns)))
+        return "resumen extendido"
+
+    longer = _history(22)
+    trimmed = await manager.apply(longer, "chat-3", summarizer=summarizer)
+    await manager.wait_for_refreshes()
+
+    assert trimmed[1]["content"].endswith("resumen previo")
+    assert received == [("resumen previo", 2)]
+    assert store.rows["chat-3"] == {
+        "summary": "resumen extendido",
+        "covered_messages": 18,
+        "fingerprint": history_fingerprint(longer[1:19]),
+    }
+
+
+async def test_summary_with_stale_fingerprint_is_ignored() -> None:
+    store = _MemoryStore()
+    manager = _manager(store)
+    store.save("chat-4", "resumen de otra historia", 10, "no-coincide")
+
+    trimmed = await manager.apply(_history(20), "chat-4")
+
+    assert all(not msg["content"].startswith(SUMMARY_PREFIX) for msg in trimmed)
+
+
+async def test_failed_summary_keeps_previous_state() -> None:
+    store = _MemoryStore()
+    manager = _manager(store)
+
+    async def summarizer(previous: str | None, turns: list[dict[str, str]]) -> str:
+        raise RuntimeError("proveedor caído")
+
+    trimmed = await manager.apply(_history(20), "chat-5", summarizer=summarizer)
+    await manager.wait_for_refreshes()
+
+    assert trimmed[-1]["content"].startswith("turno 19")
+    assert "chat-5" not in store.rows
+
+
+async def test_last_message_is_kept_even_if_it_alone_exceeds_budget() -> None:
+    manager = _manager(_MemoryStore(), budget=50, keep=1)
+    messages = [{"role": "user", "content": "y" * 1000}]
+
+    trimmed = await manager.apply(messages, None)
+
+    assert trimmed == messages
+
+
+async def test_summary_records_only_chunks_actually_summarized() -> None:
+    store = _MemoryStore()
+    manager = _manager(store)
+    messages = _history(20)
+    calls: list[int] = []
+
+    async def summarizer(previous: str | None, turns: list[dict[str, str]]) -> str:
+        calls.append(len(turns))
+        if len(calls) > 1:
+            raise RuntimeError("proveedor caído")
+        return "primer bloque"
+
+    await manager.apply(messages, "chat-6", summarizer=summarizer)
+    await manager.wait_for_refreshes()
+
+    assert store.rows["chat-6"]["covered_messages"] == 5
+    assert store.rows["chat-6"]["fingerprint"] == history_fingerprint(messages[1:6])
+
+
+async def test_keep_last_turns_counts_user_turns() -> None:
+    manager = _manager(_MemoryStore(), budget=10, keep=2)
+    conversation = [
+        {"role": "user", "content": "hola"},
+        {"role": "assistant", "content": "¡Hola!"},
+        {"role": "user", "content": "precio"},
+        {"role": "assistant", "content": "Cuesta 10"},
+        {"role": "assistant", "content": "¿Te lo reservo?"},
+        {"role": "user", "content": "sí"},
+    ]
+
+    assert manager._recent_turns_start(conversation) == 2
+    assert manager._recent_turns_start(conversation[:2]) == 0
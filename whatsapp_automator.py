@@ -1,12 +1,14 @@
 # whatsapp_automator.py - Versión simplificada y robusta
 
 import contextlib
+import contextvars
 import json
 import logging
 import logging.handlers
 import os
 import os as _os
 import signal
+import socket
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
@@ -22,7 +24,10 @@ from stub_chat import chat as stub_chat
 import chat_sessions
 from admin_db import get_session
 from models import Conversation
-from src.services.queue_system import queue_manager
+from src.services.deadline import Deadline, deadline_scope
+from src.services.multi_provider_llm import llm_manager
+from src.services.queue_signals import queue_wakeup
+from src.services.queue_system import get_send_governor, queue_manager
 
 # --------------------------------------------
 # Definición de logger
@@ -744,15 +749,21 @@ def exit_chat_safely(page) -> None:
         log.warning(f"Error saliendo del chat: {e}")
 
 
+# Identificador de este automator al reclamar mensajes de la cola compartida
+QUEUE_WORKER_ID = f"automator-{socket.gethostname()}-{os.getpid()}"
+# Ritmo de salida del número: token bucket, separación por destinatario y reparto justo por campaña
+send_governor = get_send_governor()
+
+
 def process_manual_queue(page) -> bool:
     """Procesa mensajes pendientes desde cola DB. Retorna True si se procesó algún mensaje."""
     try:
-        pending_messages = queue_manager.get_pending_messages(limit=1, include_scheduled=True)
-        if not pending_messages:
+        # Reclamo con lease (otro sender no tomará los mismos mensajes); el gobernador decide cuál sale
+        send_governor.refill(queue_manager, QUEUE_WORKER_ID)
+        message, _ = send_governor.next_ready()
+        if message is None:
             return False
 
-        # Procesar el primer mensaje pendiente
-        message = pending_messages[0]
         chat_id = message["chat_id"]
         content = message["message"]
         queue_id = message.get("message_id")
@@ -886,6 +897,8 @@ def _process_incoming_messages(page, worker_pool, llm_timeout: int, reasoner_tim
         return False
 
     log.info(f"[{chat_id}] Mensaje entrante: '{incoming}'")
+    # Presupuesto de respuesta: REPLY_DEADLINE_SECONDS, nunca mayor que AUTOMATOR_LLM_TIMEOUT
+    deadline = Deadline(min(llm_timeout, Deadline.from_env().budget_seconds))
     history = chat_sessions.load_last_context(chat_id)
     history.append({"role": "user", "content": incoming})
 
@@ -896,13 +909,22 @@ def _process_incoming_messages(page, worker_pool, llm_timeout: int, reasoner_tim
         session.close()
         chosen_model = mm.choose_model_for_conversation(chat_id, msg_count)
         log.debug(f"[{chat_id}] Modelo elegido: {chosen_model}")
-        reply = worker_pool.submit(stub_chat, incoming, chat_id, history).result(timeout=llm_timeout)
+        with deadline_scope(deadline):
+            context = contextvars.copy_context()
+        # Copia: si vence el deadline el hilo sigue vivo y no debe tocar el historial que se guarda aquí
+        reply_future = worker_pool.submit(context.run, stub_chat, incoming, chat_id, list(history))
+        reply = reply_future.result(timeout=deadline.timeout())
         if not reply or not reply.strip():
             log.warning(f"[{chat_id}] No se generó respuesta (posible problema con LM Studio)")
             return True
     except FuturesTimeoutError:
-        log.error(f"[{chat_id}] Timeout generando respuesta con modelo")
-        return True
+        log.error(f"[{chat_id}] Deadline agotado generando respuesta con modelo")
+        deadline.record_exceeded("pipeline")
+        fallback = llm_manager.deadline_fallback_response(incoming, chat_id, history[:-1])
+        reply = fallback.get("response")
+        if not reply:
+            # Transferencia silenciosa: no responder
+            return True
     except Exception:
         log.exception("Error generando respuesta con stub_chat")
         return True
@@ -971,7 +993,8 @@ def main() -> None:
                 if not handled_incoming:
                     manual_processed = process_manual_queue(page)
                     if not manual_processed:
-                        time.sleep(cfg["messageCheckInterval"])
+                        # Un encolado manual (o el próximo turno del gobernador) despierta al loop antes
+                        queue_wakeup.wait(min(cfg["messageCheckInterval"], send_governor.seconds_until_ready()))
                     continue
 
                 time.sleep(cfg["messageCheckInterval"])